@@ -1,67 +1,70 @@
 #!/usr/bin/env python3
-"""nuScenes mini の各シーンの平均速度を分析"""
+"""nuScenes の各シーンの速度・停止率などを分析（シーンカタログ）"""
 
 import argparse
-import numpy as np
-from nuscenes.nuscenes import NuScenes
-
-
-def analyze_scene_speeds(nusc: NuScenes):
-    """各シーンの平均速度・停止割合を計算"""
-    results = []
-
-    for scene in nusc.scene:
-        sample_token = scene["first_sample_token"]
-        speeds = []
-        prev_pos = None
-
-        while sample_token:
-            sample = nusc.get("sample", sample_token)
-            cam_token = sample["data"]["CAM_FRONT"]
-            cam_data = nusc.get("sample_data", cam_token)
-            ego_pose = nusc.get("ego_pose", cam_data["ego_pose_token"])
-
-            pos = np.array(ego_pose["translation"])
+import sys
+from pathlib import Path
 
-            if prev_pos is not None:
-                # 2Hz サンプリング → 0.5秒間隔
-                dist = np.linalg.norm(pos - prev_pos)
-                speed = dist / 0.5  # m/s
-                speeds.append(speed)
+# src/ をインポートパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
 
-            prev_pos = pos
-            sample_token = sample["next"] if sample["next"] else None
-
-        avg_speed = np.mean(speeds) if speeds else 0
-        stop_ratio = np.sum(np.array(speeds) < 1.0) / len(speeds) if speeds else 0
-
-        results.append({
-            "name": scene["name"],
-            "avg_speed_ms": avg_speed,
-            "avg_speed_kmh": avg_speed * 3.6,
-            "stop_ratio": stop_ratio,
-            "n_frames": len(speeds) + 1
-        })
+import numpy as np
+from nuscenes.nuscenes import NuScenes
 
-    return sorted(results, key=lambda x: x["avg_speed_ms"])
+from nuscenes_gs.archive import load_nuscenes_from_archive
+from nuscenes_gs.catalog import load_or_build_scene_catalog
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--dataroot", type=str, default="data/raw")
+    parser.add_argument("--version", type=str, default="v1.0-mini")
+    parser.add_argument(
+        "--archive",
+        nargs="+",
+        type=str,
+        default=None,
+        help="Uncompressed nuScenes tar(s) to read directly instead of an extracted dataroot",
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default=None,
+        help="Catalog cache (.csv or .parquet, default: data/derived/scene_catalog_<version>.csv)",
+    )
+    parser.add_argument("--refresh", action="store_true", help="Recompute the catalog even if cached")
+    parser.add_argument("--stop-speed", type=float, default=1.0, help="Speed [m/s] below which ego is stopped")
     args = parser.parse_args()
 
-    nusc = NuScenes(version="v1.0-mini", dataroot=args.dataroot, verbose=True)
-    results = analyze_scene_speeds(nusc)
+    if args.archive:
+        nusc = load_nuscenes_from_archive(args.archive, version=args.version, verbose=True)
+    else:
+        nusc = NuScenes(version=args.version, dataroot=args.dataroot, verbose=True)
 
-    print("\n=== Scene Speed Analysis ===")
-    print(f"{'Scene':<15} {'Frames':<8} {'Avg Speed (km/h)':<18} {'Stop Ratio':<12}")
-    print("-" * 60)
-    for r in results:
-        print(f"{r['name']:<15} {r['n_frames']:<8} {r['avg_speed_kmh']:>10.1f}       {r['stop_ratio']:>8.1%}")
+    cache = args.cache or f"data/derived/scene_catalog_{args.version}.csv"
+    catalog = load_or_build_scene_catalog(nusc, cache, refresh=args.refresh, stop_speed=args.stop_speed)
+    print(f"Catalog: {cache}")
 
+    order = np.argsort(catalog["avg_speed_ms"], kind="stable")
+    print("\n=== Scene Speed Analysis ===")
+    print(
+        f"{'Scene':<15} {'Frames':<8} {'Avg Speed (km/h)':<18} {'Stop Ratio':<12}"
+        f"{'Yaw (deg/s)':<13}{'Dyn/frame':<11}{'Tags'}"
+    )
+    print("-" * 90)
+    for i in order:
+        tags = ",".join(t for t in ("night", "rain") if catalog[t][i])
+        if catalog["lidarseg_ratio"][i] == 0:
+            tags = ",".join(filter(None, [tags, "no-lidarseg"]))
+        print(
+            f"{catalog['name'][i]:<15} {catalog['num_samples'][i]:<8} {catalog['avg_speed_ms'][i] * 3.6:>10.1f}"
+            f"       {catalog['stop_ratio'][i]:>8.1%}    {catalog['mean_yaw_rate_dps'][i]:>8.1f}"
+            f"     {catalog['dynamic_per_frame'][i]:>6.1f}     {tags}"
+        )
+
+    slowest = order[0]
     print("\n推奨: 低速シーン（< 20 km/h）または停止率が高いシーンを選択")
-    print(f"最も低速: {results[0]['name']} ({results[0]['avg_speed_kmh']:.1f} km/h)")
+    print(f"最も低速: {catalog['name'][slowest]} ({catalog['avg_speed_ms'][slowest] * 3.6:.1f} km/h)")
 
 
 if __name__ == "__main__":
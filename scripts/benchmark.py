@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""合成 nuScenes データでホットパスをベンチマークするスクリプト.
+
+本物のデータセットも GPU も不要。合成 dataroot を生成（または既存のものを使用）し、
+ステージごとに frames/s・points/s・peak RSS を計測する。
+
+各ステージの出力は SHA-256 でハッシュ化され、golden ファイルと比較される。
+最適化した実装がリファレンス実装とビット単位で一致することの確認に使う。
+ラスタライズのバックエンド（numpy / numba / torch）ごとに全ステージを実行し、
+どのバックエンドの出力も golden（numpy リファレンスの出力）と一致することを確認する。
+（エクスポート系のハッシュは合成画像の JPEG バイトを含むため、golden を作った
+環境と OpenCV のビルドが異なると一致しないことがある）
+
+使い方:
+    python scripts/benchmark.py                       # 計測 + golden 照合
+    python scripts/benchmark.py --stages project_lidar_to_depth
+    python scripts/benchmark.py --backends numpy numba
+    python scripts/benchmark.py --update-golden       # golden を更新（numpy の出力）
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# src/ をインポートパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import cv2
+import numpy as np
+from nuscenes.nuscenes import NuScenes
+
+from nuscenes_gs.backends import BACKENDS, DEFAULT_BACKEND, load_backend, use_backend
+from nuscenes_gs.carving import carve_free_space, carved_point_mask, lidar_sensor_position
+from nuscenes_gs.depth import complete_depth, project_lidar_to_depth, project_lidar_to_depth_batch
+from nuscenes_gs.masks import (
+    compute_w2c,
+    create_label_overlay,
+    load_lidar_points_and_labels,
+    project_bboxes_to_mask,
+    project_lidar_to_mask,
+    project_points_to_image,
+    transform_lidar_to_world,
+)
+from nuscenes_gs.nerfstudio_export import (
+    export_scene_front_with_bbox_masks,
+    export_scene_front_with_depth,
+)
+from nuscenes_gs.normals import estimate_normals, project_normals_to_image
+from nuscenes_gs.poses import compute_c2w
+from nuscenes_gs.radar import load_radar_sweeps, project_radar_to_mask
+from nuscenes_gs.scene_box import compute_scene_normalization
+from nuscenes_gs.semantics import project_lidar_to_labels
+from nuscenes_gs.synthetic import generate_synthetic_dataroot
+
+DEFAULT_GOLDEN = Path(__file__).resolve().parent / "benchmark_golden.json"
+
+
+# --- 計測ユーティリティ ---
+
+def _reset_peak_rss() -> bool:
+    """Linux の peak RSS (VmHWM) をリセットする. 不可なら False."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # フォールバック: プロセス生存期間中の最大 RSS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def hash_arrays(arrays) -> str:
+    """ndarray 列の dtype・shape・内容から SHA-256 を計算."""
+    h = hashlib.sha256()
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr)
+        h.update(str(arr.dtype).encode())
+        h.update(str(arr.shape).encode())
+        h.update(arr.tobytes())
+    return h.hexdigest()
+
+
+def hash_export_dir(export_dir: Path) -> str:
+    """エクスポート結果（poses + 画像 + マスク + 深度）をハッシュ化."""
+    with open(export_dir / "transforms.json") as f:
+        transforms = json.load(f)
+    arrays = [np.array([fr["transform_matrix"] for fr in transforms["frames"]])]
+    for sub in ("images", "masks", "depth"):
+        for p in sorted((export_dir / sub).glob("*")):
+            if p.suffix == ".png":
+                arrays.append(cv2.imread(str(p), cv2.IMREAD_UNCHANGED))
+            else:
+                arrays.append(np.frombuffer(p.read_bytes(), dtype=np.uint8))
+    return hash_arrays(arrays)
+
+
+# --- フレーム入力の準備（計測対象外）---
+
+def load_frame_inputs(nusc: NuScenes) -> list[dict]:
+    """全シーンの keyframe について投影関数の入力を事前に読み込む."""
+    frames = []
+    for scene in nusc.scene:
+        sample_token = scene["first_sample_token"]
+        while sample_token:
+            sample = nusc.get("sample", sample_token)
+            cam_data = nusc.get("sample_data", sample["data"]["CAM_FRONT"])
+            lidar_token = sample["data"]["LIDAR_TOP"]
+            lidar_data = nusc.get("sample_data", lidar_token)
+
+            points_lidar, labels = load_lidar_points_and_labels(nusc, lidar_token)
+            lidar_ego_pose = nusc.get("ego_pose", lidar_data["ego_pose_token"])
+            lidar_calib = nusc.get("calibrated_sensor", lidar_data["calibrated_sensor_token"])
+            points_world = transform_lidar_to_world(points_lidar, lidar_ego_pose, lidar_calib)
+            cam_ego_pose = nusc.get("ego_pose", cam_data["ego_pose_token"])
+            cam_calib = nusc.get("calibrated_sensor", cam_data["calibrated_sensor_token"])
+            radar_points, radar_velocities = load_radar_sweeps(nusc, sample, cam_data["timestamp"])
+            frames.append(
+                {
+                    "sample": sample,
+                    "points_world": points_world,
+                    "labels": labels,
+                    "lidar_ego_pose": lidar_ego_pose,
+                    "lidar_calib": lidar_calib,
+                    "radar_points": radar_points,
+                    "radar_velocities": radar_velocities,
+                    "ego_pose": cam_ego_pose,
+                    "calib": cam_calib,
+                    "w2c": compute_w2c(cam_ego_pose, cam_calib),
+                    "K": np.array(cam_calib["camera_intrinsic"]),
+                    "image_shape": (cam_data["height"], cam_data["width"]),
+                }
+            )
+            sample_token = sample["next"] if sample["next"] else None
+    return frames
+
+
+# --- ステージ定義 ---
+# 各ステージは (nusc, frames, workdir) を受け取り、出力のハッシュを返す。
+
+def stage_compute_c2w(nusc, frames, workdir):
+    return hash_arrays([compute_c2w(f["ego_pose"], f["calib"]) for f in frames])
+
+
+def stage_project_points_to_image(nusc, frames, workdir):
+    outputs = []
+    for f in frames:
+        outputs.extend(project_points_to_image(f["points_world"], f["w2c"], f["K"], f["image_shape"]))
+    return hash_arrays(outputs)
+
+
+def stage_project_lidar_to_depth(nusc, frames, workdir):
+    return hash_arrays(
+        [
+            project_lidar_to_depth(f["points_world"], f["labels"], f["w2c"], f["K"], f["image_shape"])
+            for f in frames
+        ]
+    )
+
+
+def stage_project_lidar_to_depth_batch(nusc, frames, workdir):
+    # 全フレームを1回で処理する。出力は project_lidar_to_depth と同じハッシュになる
+    return hash_arrays(
+        project_lidar_to_depth_batch(
+            [f["points_world"] for f in frames],
+            [f["labels"] for f in frames],
+            [f["w2c"] for f in frames],
+            [f["K"] for f in frames],
+            frames[0]["image_shape"],
+        )
+    )
+
+
+def stage_project_lidar_to_labels(nusc, frames, workdir):
+    return hash_arrays(
+        [
+            project_lidar_to_labels(
+                f["points_world"], f["labels"], f["w2c"], f["K"], f["image_shape"], dilation={17: 9}
+            )
+            for f in frames
+        ]
+    )
+
+
+def stage_estimate_normals(nusc, frames, workdir):
+    points = np.concatenate([f["points_world"] for f in frames])
+    normals, curvature = estimate_normals(points)
+    outputs = [normals, curvature]
+    for f in frames:
+        outputs.append(project_normals_to_image(points, normals, f["w2c"], f["K"], f["image_shape"]))
+    return hash_arrays(outputs)
+
+
+def stage_compute_scene_normalization(nusc, frames, workdir):
+    c2ws = np.array([compute_c2w(f["ego_pose"], f["calib"]) for f in frames])
+    points = np.concatenate([f["points_world"] for f in frames])
+    result = compute_scene_normalization(c2ws, [f["ego_pose"] for f in frames], points)
+    return hash_arrays([result["transform"], result["aabb"], np.array(result["scale_factor"])])
+
+
+def stage_carve_free_space(nusc, frames, workdir):
+    sweeps = [(lidar_sensor_position(f), f["points_world"], f["labels"]) for f in frames]
+    carving = carve_free_space(sweeps)
+    outputs = [carving["carved"]]
+    for f in frames:
+        outputs.append(carved_point_mask(f["points_world"], carving, f["labels"]))
+    return hash_arrays(outputs)
+
+
+def stage_complete_depth(nusc, frames, workdir):
+    outputs = []
+    for f in frames:
+        sparse = project_lidar_to_depth(f["points_world"], f["labels"], f["w2c"], f["K"], f["image_shape"])
+        image = cv2.imread(nusc.get_sample_data_path(f["sample"]["data"]["CAM_FRONT"]))
+        outputs.extend(complete_depth(sparse, image))
+    return hash_arrays(outputs)
+
+
+def stage_create_label_overlay(nusc, frames, workdir):
+    outputs = []
+    for f in frames:
+        uv, valid, distances = project_points_to_image(f["points_world"], f["w2c"], f["K"], f["image_shape"])
+        outputs.append(create_label_overlay(f["image_shape"], uv, f["labels"][valid]))
+        outputs.append(create_label_overlay(f["image_shape"], uv, f["labels"][valid], distances=distances))
+    return hash_arrays(outputs)
+
+
+def stage_project_lidar_to_mask(nusc, frames, workdir):
+    return hash_arrays(
+        [
+            project_lidar_to_mask(
+                f["points_world"], f["labels"], f["w2c"], f["K"], f["image_shape"], dilation_size=64
+            )
+            for f in frames
+        ]
+    )
+
+
+def stage_project_lidar_to_mask_adaptive(nusc, frames, workdir):
+    return hash_arrays(
+        [
+            project_lidar_to_mask(
+                f["points_world"],
+                f["labels"],
+                f["w2c"],
+                f["K"],
+                f["image_shape"],
+                dilation_size=64,
+                dilation_meters=0.5,
+                max_dilation_size=64,
+            )
+            for f in frames
+        ]
+    )
+
+
+def stage_project_radar_to_mask(nusc, frames, workdir):
+    return hash_arrays(
+        [
+            project_radar_to_mask(f["radar_points"], f["radar_velocities"], f["w2c"], f["K"], f["image_shape"])
+            for f in frames
+        ]
+    )
+
+
+def stage_project_bboxes_to_mask(nusc, frames, workdir):
+    return hash_arrays(
+        [
+            project_bboxes_to_mask(nusc, f["sample"], f["w2c"], f["K"], f["image_shape"])
+            for f in frames
+        ]
+    )
+
+
+def stage_export_front_with_depth(nusc, frames, workdir):
+    hashes = []
+    for scene in nusc.scene:
+        out = Path(workdir) / f"{scene['name']}_front_depth_lidar_masked"
+        export_scene_front_with_depth(
+            nusc, scene["token"], out, mask_type="lidar", mask_params={"dilation_size": 64}
+        )
+        hashes.append(hash_export_dir(out))
+    return hashlib.sha256("".join(hashes).encode()).hexdigest()
+
+
+def stage_export_front_with_bbox_masks(nusc, frames, workdir):
+    hashes = []
+    for scene in nusc.scene:
+        out = Path(workdir) / f"{scene['name']}_front_bbox_masked"
+        export_scene_front_with_bbox_masks(nusc, scene["token"], out)
+        hashes.append(hash_export_dir(out))
+    return hashlib.sha256("".join(hashes).encode()).hexdigest()
+
+
+STAGES = {
+    "compute_c2w": stage_compute_c2w,
+    "project_points_to_image": stage_project_points_to_image,
+    "project_lidar_to_depth": stage_project_lidar_to_depth,
+    "project_lidar_to_depth_batch": stage_project_lidar_to_depth_batch,
+    "project_lidar_to_labels": stage_project_lidar_to_labels,
+    "estimate_normals": stage_estimate_normals,
+    "compute_scene_normalization": stage_compute_scene_normalization,
+    "carve_free_space": stage_carve_free_space,
+    "complete_depth": stage_complete_depth,
+    "create_label_overlay": stage_create_label_overlay,
+    "project_lidar_to_mask": stage_project_lidar_to_mask,
+    "project_lidar_to_mask_adaptive": stage_project_lidar_to_mask_adaptive,
+    "project_radar_to_mask": stage_project_radar_to_mask,
+    "project_bboxes_to_mask": stage_project_bboxes_to_mask,
+    "export_front_with_depth": stage_export_front_with_depth,
+    "export_front_with_bbox_masks": stage_export_front_with_bbox_masks,
+}
+
+
+def run_stage(name, nusc, frames, workdir) -> dict:
+    n_points = sum(len(f["points_world"]) for f in frames)
+    _reset_peak_rss()
+    t0 = time.perf_counter()
+    digest = STAGES[name](nusc, frames, workdir)
+    elapsed = time.perf_counter() - t0
+    return {
+        "seconds": elapsed,
+        "frames_per_s": len(frames) / elapsed,
+        "points_per_s": n_points / elapsed,
+        "peak_rss_mb": _peak_rss_mb(),
+        "sha256": digest,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark projection/rasterization/export hot paths on a synthetic nuScenes dataroot"
+    )
+    parser.add_argument(
+        "--dataroot",
+        type=str,
+        default=None,
+        help="Existing synthetic dataroot (default: generate into a temp dir)",
+    )
+    parser.add_argument("--scenes", type=int, default=1, help="Number of scenes (default: 1)")
+    parser.add_argument("--frames", type=int, default=8, help="Keyframes per scene (default: 8)")
+    parser.add_argument("--points", type=int, default=34000, help="Points per LiDAR sweep (default: 34000)")
+    parser.add_argument("--annotations", type=int, default=30, help="Annotations per frame (default: 30)")
+    parser.add_argument(
+        "--image-size",
+        nargs=2,
+        type=int,
+        default=[1600, 900],
+        help="Image width height (default: 1600 900)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument(
+        "--stages",
+        nargs="+",
+        choices=list(STAGES),
+        default=list(STAGES),
+        help="Stages to run (default: all)",
+    )
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        choices=list(BACKENDS),
+        default=list(BACKENDS),
+        help="Rasterization backends to run; uninstalled ones are skipped (default: all)",
+    )
+    parser.add_argument(
+        "--golden",
+        type=str,
+        default=str(DEFAULT_GOLDEN),
+        help="Golden hash file (default: scripts/benchmark_golden.json)",
+    )
+    parser.add_argument(
+        "--update-golden",
+        action="store_true",
+        help="Write the computed hashes to the golden file",
+    )
+    parser.add_argument("--output", type=str, default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    config = {
+        "scenes": args.scenes,
+        "frames": args.frames,
+        "points": args.points,
+        "annotations": args.annotations,
+        "image_size": list(args.image_size),
+        "seed": args.seed,
+    }
+
+    with tempfile.TemporaryDirectory(prefix="nuscenes_gs_bench_") as tmp:
+        dataroot = Path(args.dataroot) if args.dataroot else Path(tmp) / "dataroot"
+        if not (dataroot / "v1.0-mini" / "scene.json").exists():
+            print(f"Generating synthetic dataroot -> {dataroot} ...")
+            generate_synthetic_dataroot(
+                dataroot,
+                n_scenes=args.scenes,
+                frames_per_scene=args.frames,
+                points_per_sweep=args.points,
+                annotations_per_frame=args.annotations,
+                image_size=tuple(args.image_size),
+                seed=args.seed,
+            )
+        nusc = NuScenes(version="v1.0-mini", dataroot=str(dataroot), verbose=False)
+        frames = load_frame_inputs(nusc)
+        print(f"Frames: {len(frames)}, points/frame: {len(frames[0]['points_world'])}")
+
+        results = {}
+        skipped = {}
+        for backend in args.backends:
+            try:
+                load_backend(backend)
+            except ImportError as e:
+                skipped[backend] = str(e)
+                continue
+            with use_backend(backend):
+                results[backend] = {}
+                for name in args.stages:
+                    workdir = Path(tmp) / "out" / backend / name
+                    results[backend][name] = run_stage(name, nusc, frames, workdir)
+
+    # golden 照合（どのバックエンドも numpy リファレンスの golden と一致するはず）
+    golden_path = Path(args.golden)
+    golden = {}
+    if golden_path.exists():
+        with open(golden_path) as f:
+            golden = json.load(f)
+    golden_hashes = golden.get("hashes", {}) if golden.get("config") == config else {}
+
+    print(f"\n{'Stage':<30} {'backend':<8} {'frames/s':>10} {'Mpts/s':>10} {'peakRSS MB':>12}  golden")
+    print("-" * 87)
+    n_mismatch = 0
+    for backend, stage_results in results.items():
+        for name, r in stage_results.items():
+            expected = golden_hashes.get(name)
+            if expected is None:
+                status = "-"
+            elif expected == r["sha256"]:
+                status = "OK"
+            else:
+                status = "MISMATCH"
+                n_mismatch += 1
+            r["golden"] = status
+            print(
+                f"{name:<30} {backend:<8} {r['frames_per_s']:>10.2f} {r['points_per_s'] / 1e6:>10.2f} "
+                f"{r['peak_rss_mb']:>12.1f}  {status}"
+            )
+    for backend, reason in skipped.items():
+        print(f"{'(all stages)':<30} {backend:<8} skipped: {reason}")
+
+    if args.update_golden:
+        if DEFAULT_BACKEND not in results:
+            sys.exit(f"--update-golden needs the {DEFAULT_BACKEND} reference backend")
+        hashes = golden_hashes.copy()
+        hashes.update({name: r["sha256"] for name, r in results[DEFAULT_BACKEND].items()})
+        with open(golden_path, "w") as f:
+            json.dump({"config": config, "hashes": hashes}, f, indent=2)
+        print(f"\nGolden hashes written -> {golden_path}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": config, "results": results}, f, indent=2)
+
+    if n_mismatch and not args.update_golden:
+        print(f"\n{n_mismatch} stage run(s) differ from the golden outputs")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
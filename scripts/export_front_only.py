@@ -11,6 +11,7 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
 
 from nuscenes.nuscenes import NuScenes
 
+from nuscenes_gs.archive import load_nuscenes_from_archive
 from nuscenes_gs.nerfstudio_export import export_scene_front
 
 
@@ -36,10 +37,104 @@ def main() -> None:
         default=None,
         help="Output directory (default: data/derived/scene-XXXX_front)",
     )
+    parser.add_argument(
+        "--archive",
+        nargs="+",
+        type=str,
+        default=None,
+        help="Uncompressed nuScenes tar(s) to read directly instead of an extracted dataroot",
+    )
+    parser.add_argument(
+        "--point-cloud",
+        action="store_true",
+        help="Also export a colorized static LiDAR point cloud (points3D.ply) for Gaussian init",
+    )
+    parser.add_argument(
+        "--downscale",
+        nargs="+",
+        type=int,
+        default=[],
+        help="Also write downscaled images_N/ (and masks_N/, depths_N/) for these factors, e.g. 2 4 8",
+    )
+    parser.add_argument(
+        "--colmap",
+        action="store_true",
+        help="Also write a COLMAP sparse model (sparse/0/*.bin) seeded with static LiDAR points",
+    )
+    parser.add_argument(
+        "--target-frames",
+        type=int,
+        default=None,
+        help="Keep about this many keyframes, spread by LiDAR covisibility (drops redundant stop-and-go frames)",
+    )
+    parser.add_argument(
+        "--max-overlap",
+        type=float,
+        default=None,
+        help="Drop frames whose LiDAR covisibility with the last kept frame is at least this (e.g. 0.9)",
+    )
+    parser.add_argument(
+        "--score-quality",
+        action="store_true",
+        help="Score images (sharpness, exposure) into quality.json; implied by the --min/--max quality flags",
+    )
+    parser.add_argument(
+        "--min-sharpness",
+        type=float,
+        default=None,
+        help="Drop blurry frames whose Laplacian variance (at 1/4 resolution) is below this",
+    )
+    parser.add_argument(
+        "--max-overexposed",
+        type=float,
+        default=None,
+        help="Drop frames with more than this fraction of saturated pixels (e.g. 0.2)",
+    )
+    parser.add_argument(
+        "--max-underexposed",
+        type=float,
+        default=None,
+        help="Drop frames with more than this fraction of crushed-black pixels (e.g. 0.3)",
+    )
+    parser.add_argument(
+        "--blob-store",
+        type=str,
+        default=None,
+        help="Content-addressed store shared by export variants (e.g. data/derived/.cas); outputs become hardlinks",
+    )
+    parser.add_argument(
+        "--normalize-scene",
+        action="store_true",
+        help="Gravity-align and center poses on a robust AABB; writes applied_transform and scene_box",
+    )
+    parser.add_argument(
+        "--scene-box-quantile",
+        type=float,
+        default=0.01,
+        help="With --normalize-scene: per-axis LiDAR outlier fraction trimmed from each end (default: 0.01)",
+    )
     args = parser.parse_args()
 
+    frame_selection = None
+    if args.target_frames is not None or args.max_overlap is not None:
+        frame_selection = {"target_count": args.target_frames}
+        if args.max_overlap is not None:
+            frame_selection["max_overlap"] = args.max_overlap
+
+    quality_filter = {
+        "min_sharpness": args.min_sharpness,
+        "max_overexposed": args.max_overexposed,
+        "max_underexposed": args.max_underexposed,
+    }
+    quality_filter = {k: v for k, v in quality_filter.items() if v is not None}
+    if not quality_filter and not args.score_quality:
+        quality_filter = None
+
     print(f"Loading nuScenes mini from {args.dataroot} ...")
-    nusc = NuScenes(version="v1.0-mini", dataroot=args.dataroot, verbose=False)
+    if args.archive:
+        nusc = load_nuscenes_from_archive(args.archive, version="v1.0-mini", verbose=False)
+    else:
+        nusc = NuScenes(version="v1.0-mini", dataroot=args.dataroot, verbose=False)
 
     scene = nusc.scene[args.scene_index]
     scene_name = scene["name"]
@@ -47,7 +142,18 @@ def main() -> None:
 
     output_dir = args.output or f"data/derived/{scene_name}_front"
 
-    out_path = export_scene_front(nusc, scene["token"], output_dir)
+    out_path = export_scene_front(
+        nusc,
+        scene["token"],
+        output_dir,
+        export_point_cloud=args.point_cloud,
+        downscale_factors=tuple(args.downscale),
+        export_colmap=args.colmap,
+        frame_selection=frame_selection,
+        quality_filter=quality_filter,
+        blob_store=args.blob_store,
+        scene_normalization={"quantile": args.scene_box_quantile} if args.normalize_scene else None,
+    )
     print(f"Exported -> {out_path}")
 
     # サマリ表示
@@ -6,6 +6,8 @@ from pathlib import Path
 
 from nuscenes.nuscenes import NuScenes
 
+from nuscenes_gs.archive import load_nuscenes_from_archive
+from nuscenes_gs.backends import BACKENDS, set_backend
 from nuscenes_gs.nerfstudio_export import export_scene_front_with_bbox_masks
 
 
@@ -16,8 +18,8 @@ def main():
     parser.add_argument(
         "--dataroot",
         type=str,
-        required=True,
-        help="Path to nuScenes data root",
+        default=None,
+        help="Path to nuScenes data root (required unless --archive is given)",
     )
     parser.add_argument(
         "--scene-index",
@@ -38,11 +40,147 @@ def main():
         default=5,
         help="Morphological dilation kernel size (default: 5)",
     )
+    parser.add_argument(
+        "--motion-threshold",
+        type=float,
+        default=None,
+        help="Only mask instances that move at least this far [m] over the scene (default: mask all)",
+    )
+    parser.add_argument(
+        "--radar",
+        action="store_true",
+        help="Also mask far-field movers from velocity-annotated RADAR_FRONT* points",
+    )
+    parser.add_argument(
+        "--radar-min-speed",
+        type=float,
+        default=1.0,
+        help="Compensated RADAR speed [m/s] above which a point is treated as moving (default: 1.0)",
+    )
+    parser.add_argument(
+        "--radar-sweeps",
+        type=int,
+        default=3,
+        help="RADAR sweeps per channel accumulated for each frame (default: 3)",
+    )
+    parser.add_argument(
+        "--archive",
+        nargs="+",
+        type=str,
+        default=None,
+        help="Uncompressed nuScenes tar(s) to read directly instead of an extracted dataroot",
+    )
+    parser.add_argument(
+        "--point-cloud",
+        action="store_true",
+        help="Also export a colorized static LiDAR point cloud (points3D.ply) for Gaussian init",
+    )
+    parser.add_argument(
+        "--downscale",
+        nargs="+",
+        type=int,
+        default=[],
+        help="Also write downscaled images_N/ (and masks_N/, depths_N/) for these factors, e.g. 2 4 8",
+    )
+    parser.add_argument(
+        "--colmap",
+        action="store_true",
+        help="Also write a COLMAP sparse model (sparse/0/*.bin) seeded with static LiDAR points",
+    )
+    parser.add_argument(
+        "--target-frames",
+        type=int,
+        default=None,
+        help="Keep about this many keyframes, spread by LiDAR covisibility (drops redundant stop-and-go frames)",
+    )
+    parser.add_argument(
+        "--max-overlap",
+        type=float,
+        default=None,
+        help="Drop frames whose LiDAR covisibility with the last kept frame is at least this (e.g. 0.9)",
+    )
+    parser.add_argument(
+        "--score-quality",
+        action="store_true",
+        help="Score images (sharpness, exposure) into quality.json; implied by the --min/--max quality flags",
+    )
+    parser.add_argument(
+        "--min-sharpness",
+        type=float,
+        default=None,
+        help="Drop blurry frames whose Laplacian variance (at 1/4 resolution) is below this",
+    )
+    parser.add_argument(
+        "--max-overexposed",
+        type=float,
+        default=None,
+        help="Drop frames with more than this fraction of saturated pixels (e.g. 0.2)",
+    )
+    parser.add_argument(
+        "--max-underexposed",
+        type=float,
+        default=None,
+        help="Drop frames with more than this fraction of crushed-black pixels (e.g. 0.3)",
+    )
+    parser.add_argument(
+        "--max-masked-ratio",
+        type=float,
+        default=None,
+        help="Drop frames whose dynamic mask excludes more than this fraction of pixels",
+    )
+    parser.add_argument(
+        "--blob-store",
+        type=str,
+        default=None,
+        help="Content-addressed store shared by export variants (e.g. data/derived/.cas); outputs become hardlinks",
+    )
+    parser.add_argument(
+        "--normalize-scene",
+        action="store_true",
+        help="Gravity-align and center poses on a robust AABB; writes applied_transform and scene_box",
+    )
+    parser.add_argument(
+        "--scene-box-quantile",
+        type=float,
+        default=0.01,
+        help="With --normalize-scene: per-axis LiDAR outlier fraction trimmed from each end (default: 0.01)",
+    )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        choices=list(BACKENDS),
+        default=None,
+        help="Rasterization backend (default: $NUSCENES_GS_BACKEND or numpy); outputs are identical",
+    )
     args = parser.parse_args()
+    if not args.dataroot and not args.archive:
+        parser.error("--dataroot is required unless --archive is given")
+
+    if args.backend is not None:
+        set_backend(args.backend)
+
+    frame_selection = None
+    if args.target_frames is not None or args.max_overlap is not None:
+        frame_selection = {"target_count": args.target_frames}
+        if args.max_overlap is not None:
+            frame_selection["max_overlap"] = args.max_overlap
+
+    quality_filter = {
+        "min_sharpness": args.min_sharpness,
+        "max_overexposed": args.max_overexposed,
+        "max_underexposed": args.max_underexposed,
+        "max_masked_ratio": args.max_masked_ratio,
+    }
+    quality_filter = {k: v for k, v in quality_filter.items() if v is not None}
+    if not quality_filter and not args.score_quality:
+        quality_filter = None
 
     # NuScenes読み込み
-    print(f"Loading nuScenes from {args.dataroot}...")
-    nusc = NuScenes(version="v1.0-mini", dataroot=args.dataroot, verbose=True)
+    print(f"Loading nuScenes from {args.archive or args.dataroot}...")
+    if args.archive:
+        nusc = load_nuscenes_from_archive(args.archive, version="v1.0-mini", verbose=True)
+    else:
+        nusc = NuScenes(version="v1.0-mini", dataroot=args.dataroot, verbose=True)
 
     # シーン取得
     scene = nusc.scene[args.scene_index]
@@ -60,6 +198,15 @@ def main():
         output_dir,
         dynamic_categories=args.dynamic_categories,
         dilation_size=args.dilation,
+        motion_threshold=args.motion_threshold,
+        radar={"min_speed": args.radar_min_speed, "n_sweeps": args.radar_sweeps} if args.radar else None,
+        export_point_cloud=args.point_cloud,
+        downscale_factors=tuple(args.downscale),
+        export_colmap=args.colmap,
+        frame_selection=frame_selection,
+        quality_filter=quality_filter,
+        blob_store=args.blob_store,
+        scene_normalization={"quantile": args.scene_box_quantile} if args.normalize_scene else None,
     )
 
     print(f"\n✓ Export complete!")
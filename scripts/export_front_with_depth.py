@@ -6,6 +6,8 @@ from pathlib import Path
 
 from nuscenes.nuscenes import NuScenes
 
+from nuscenes_gs.archive import load_nuscenes_from_archive
+from nuscenes_gs.backends import BACKENDS, set_backend
 from nuscenes_gs.nerfstudio_export import export_scene_front_with_depth
 
 
@@ -16,8 +18,8 @@ def main():
     parser.add_argument(
         "--dataroot",
         type=str,
-        required=True,
-        help="Path to nuScenes data root",
+        default=None,
+        help="Path to nuScenes data root (required unless --archive is given)",
     )
     parser.add_argument(
         "--scene-index",
@@ -28,15 +30,108 @@ def main():
     parser.add_argument(
         "--mask-type",
         type=str,
-        choices=["lidar", "bbox", "none"],
+        choices=["lidar", "bbox", "fused", "none"],
         default="none",
-        help='Mask type: "lidar" (LiDAR segmentation), "bbox" (3D bbox), "none" (no mask)',
+        help='Mask type: "lidar" (LiDAR segmentation), "bbox" (3D bbox), "fused" (bbox + LiDAR), "none" (no mask)',
+    )
+    parser.add_argument(
+        "--fusion-policy",
+        type=str,
+        choices=["union", "range", "refine"],
+        default="union",
+        help='Fused masks: "union", "range" (LiDAR near, bbox far) or "refine" (LiDAR inside bboxes)',
+    )
+    parser.add_argument(
+        "--near-range",
+        type=float,
+        default=20.0,
+        help="Fused masks with --fusion-policy range: LiDAR is used up to this distance [m] (default: 20)",
     )
     parser.add_argument(
         "--dilation",
         type=int,
         default=None,
-        help="Morphological dilation kernel size (default: 64 for lidar, 5 for bbox)",
+        help="Morphological dilation kernel size (default: 64 for lidar/fused, 5 for bbox)",
+    )
+    parser.add_argument(
+        "--motion-threshold",
+        type=float,
+        default=None,
+        help="Only mask instances that move at least this far [m] over the scene (default: mask all)",
+    )
+    parser.add_argument(
+        "--radar",
+        action="store_true",
+        help="Also mask far-field movers from velocity-annotated RADAR_FRONT* points",
+    )
+    parser.add_argument(
+        "--radar-min-speed",
+        type=float,
+        default=1.0,
+        help="Compensated RADAR speed [m/s] above which a point is treated as moving (default: 1.0)",
+    )
+    parser.add_argument(
+        "--radar-sweeps",
+        type=int,
+        default=3,
+        help="RADAR sweeps per channel accumulated for each frame (default: 3)",
+    )
+    parser.add_argument(
+        "--dilation-meters",
+        type=float,
+        default=None,
+        help="LiDAR/fused masks: depth-adaptive dilation, kernel ≈ this [m] * fx / depth, capped by --max-dilation",
+    )
+    parser.add_argument(
+        "--max-dilation",
+        type=int,
+        default=128,
+        help="Upper bound [px] of the depth-adaptive kernel with --dilation-meters (default: 128)",
+    )
+    parser.add_argument(
+        "--complete-depth",
+        action="store_true",
+        help="Densify the sparse LiDAR depth (RGB-guided) and write depth_confidence/ maps",
+    )
+    parser.add_argument(
+        "--normals",
+        action="store_true",
+        help="Also write camera-space normal maps (normals/) estimated from the static LiDAR cloud",
+    )
+    parser.add_argument(
+        "--semantics",
+        action="store_true",
+        help="Also write per-pixel lidarseg label images (semantics/) and semantics.json",
+    )
+    parser.add_argument(
+        "--semantic-dilation",
+        nargs="+",
+        type=str,
+        default=[],
+        metavar="CLASS:SIZE",
+        help="Dilate these lidarseg classes into unlabelled pixels (e.g. 9:9 17:15)",
+    )
+    parser.add_argument(
+        "--densify-semantics",
+        action="store_true",
+        help="Fill sparse labels by also projecting a voxelized static LiDAR map of the scene",
+    )
+    parser.add_argument(
+        "--carve-free-space",
+        action="store_true",
+        help="Drop static-labelled points in voxels that other sweeps' rays pass through (depth and point cloud)",
+    )
+    parser.add_argument(
+        "--carve-voxel-size",
+        type=float,
+        default=0.3,
+        help="Free-space carving voxel size in meters (default: 0.3)",
+    )
+    parser.add_argument(
+        "--carve-min-free",
+        type=int,
+        default=2,
+        help="Sweeps that must see a voxel as free before it is carved (default: 2)",
     )
     parser.add_argument(
         "--depth-range",
@@ -45,11 +140,124 @@ def main():
         default=[0.1, 80.0],
         help="Depth range in meters (default: 0.1 80.0)",
     )
+    parser.add_argument(
+        "--archive",
+        nargs="+",
+        type=str,
+        default=None,
+        help="Uncompressed nuScenes tar(s) to read directly instead of an extracted dataroot",
+    )
+    parser.add_argument(
+        "--point-cloud",
+        action="store_true",
+        help="Also export a colorized static LiDAR point cloud (points3D.ply) for Gaussian init",
+    )
+    parser.add_argument(
+        "--downscale",
+        nargs="+",
+        type=int,
+        default=[],
+        help="Also write downscaled images_N/ (and masks_N/, depths_N/) for these factors, e.g. 2 4 8",
+    )
+    parser.add_argument(
+        "--colmap",
+        action="store_true",
+        help="Also write a COLMAP sparse model (sparse/0/*.bin) seeded with static LiDAR points",
+    )
+    parser.add_argument(
+        "--target-frames",
+        type=int,
+        default=None,
+        help="Keep about this many keyframes, spread by LiDAR covisibility (drops redundant stop-and-go frames)",
+    )
+    parser.add_argument(
+        "--max-overlap",
+        type=float,
+        default=None,
+        help="Drop frames whose LiDAR covisibility with the last kept frame is at least this (e.g. 0.9)",
+    )
+    parser.add_argument(
+        "--score-quality",
+        action="store_true",
+        help="Score images (sharpness, exposure) into quality.json; implied by the --min/--max quality flags",
+    )
+    parser.add_argument(
+        "--min-sharpness",
+        type=float,
+        default=None,
+        help="Drop blurry frames whose Laplacian variance (at 1/4 resolution) is below this",
+    )
+    parser.add_argument(
+        "--max-overexposed",
+        type=float,
+        default=None,
+        help="Drop frames with more than this fraction of saturated pixels (e.g. 0.2)",
+    )
+    parser.add_argument(
+        "--max-underexposed",
+        type=float,
+        default=None,
+        help="Drop frames with more than this fraction of crushed-black pixels (e.g. 0.3)",
+    )
+    parser.add_argument(
+        "--max-masked-ratio",
+        type=float,
+        default=None,
+        help="Drop frames whose dynamic mask excludes more than this fraction of pixels",
+    )
+    parser.add_argument(
+        "--blob-store",
+        type=str,
+        default=None,
+        help="Content-addressed store shared by export variants (e.g. data/derived/.cas); outputs become hardlinks",
+    )
+    parser.add_argument(
+        "--normalize-scene",
+        action="store_true",
+        help="Gravity-align and center poses on a robust AABB; writes applied_transform and scene_box",
+    )
+    parser.add_argument(
+        "--scene-box-quantile",
+        type=float,
+        default=0.01,
+        help="With --normalize-scene: per-axis LiDAR outlier fraction trimmed from each end (default: 0.01)",
+    )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        choices=list(BACKENDS),
+        default=None,
+        help="Rasterization backend (default: $NUSCENES_GS_BACKEND or numpy); outputs are identical",
+    )
     args = parser.parse_args()
+    if not args.dataroot and not args.archive:
+        parser.error("--dataroot is required unless --archive is given")
+
+    if args.backend is not None:
+        set_backend(args.backend)
+
+    frame_selection = None
+    if args.target_frames is not None or args.max_overlap is not None:
+        frame_selection = {"target_count": args.target_frames}
+        if args.max_overlap is not None:
+            frame_selection["max_overlap"] = args.max_overlap
+
+    quality_filter = {
+        "min_sharpness": args.min_sharpness,
+        "max_overexposed": args.max_overexposed,
+        "max_underexposed": args.max_underexposed,
+        "max_masked_ratio": args.max_masked_ratio,
+    }
+    quality_filter = {k: v for k, v in quality_filter.items() if v is not None}
+    if not quality_filter and not args.score_quality:
+        quality_filter = None
 
     # NuScenes読み込み
-    print(f"Loading nuScenes from {args.dataroot}...")
-    nusc = NuScenes(version="v1.0-mini", dataroot=args.dataroot, verbose=True)
+    print(f"Loading nuScenes from {args.archive or args.dataroot}...")
+    if args.archive:
+        nusc = load_nuscenes_from_archive(args.archive, version="v1.0-mini", verbose=True)
+    else:
+        nusc = NuScenes(version="v1.0-mini", dataroot=args.dataroot, verbose=True)
 
     # シーン取得
     scene = nusc.scene[args.scene_index]
@@ -66,10 +274,35 @@ def main():
     # マスクパラメータ
     mask_type = None if args.mask_type == "none" else args.mask_type
     mask_params = {}
+    if mask_type is not None:
+        mask_params["motion_threshold"] = args.motion_threshold
+        if args.radar:
+            mask_params["radar"] = {"min_speed": args.radar_min_speed, "n_sweeps": args.radar_sweeps}
     if mask_type == "lidar":
         mask_params["dilation_size"] = args.dilation or 64
+        mask_params["dilation_meters"] = args.dilation_meters
+        mask_params["max_dilation_size"] = args.max_dilation
     elif mask_type == "bbox":
         mask_params["dilation_size"] = args.dilation or 5
+    elif mask_type == "fused":
+        mask_params["policy"] = args.fusion_policy
+        mask_params["lidar_dilation_size"] = args.dilation or 64
+        mask_params["dilation_meters"] = args.dilation_meters
+        mask_params["max_dilation_size"] = args.max_dilation
+        mask_params["near_range"] = args.near_range
+
+    # ラベル画像のパラメータ
+    semantics = None
+    if args.semantics or args.semantic_dilation or args.densify_semantics:
+        semantics = {
+            "dilation": {int(c): int(k) for c, k in (item.split(":") for item in args.semantic_dilation)},
+            "densify": args.densify_semantics,
+        }
+
+    # free-space carving のパラメータ
+    carving = None
+    if args.carve_free_space:
+        carving = {"voxel_size": args.carve_voxel_size, "min_free": args.carve_min_free}
 
     # エクスポート実行
     export_scene_front_with_depth(
@@ -79,11 +312,26 @@ def main():
         mask_type=mask_type,
         mask_params=mask_params,
         depth_range=tuple(args.depth_range),
+        depth_completion=args.complete_depth,
+        semantics=semantics,
+        export_normals=args.normals,
+        carving=carving,
+        export_point_cloud=args.point_cloud,
+        downscale_factors=tuple(args.downscale),
+        export_colmap=args.colmap,
+        frame_selection=frame_selection,
+        quality_filter=quality_filter,
+        blob_store=args.blob_store,
+        scene_normalization={"quantile": args.scene_box_quantile} if args.normalize_scene else None,
     )
 
     print(f"\n✓ Export complete!")
     print(f"  Images: {len(list((output_dir / 'images').glob('*.jpg')))} files")
     print(f"  Depth maps: {len(list((output_dir / 'depth').glob('*.png')))} files")
+    if args.normals:
+        print(f"  Normal maps: {len(list((output_dir / 'normals').glob('*.png')))} files")
+    if semantics is not None:
+        print(f"  Semantics: {len(list((output_dir / 'semantics').glob('*.png')))} files")
     if mask_type:
         print(f"  Masks: {len(list((output_dir / 'masks').glob('*.png')))} files")
     print(f"  Config: {output_dir / 'transforms.json'}")
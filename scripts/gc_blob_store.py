@@ -0,0 +1,34 @@
+"""content-addressed store（data/derived/.cas）のうち、どのエクスポートからも参照されていない blob を削除する.
+
+エクスポートディレクトリを消した後に実行すると、そのディレクトリだけが使っていた
+画像・深度マップなどの blob が消える（他のバリアントと共有している blob は残る）。
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+# src/ をインポートパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from nuscenes_gs.cas import DEFAULT_CAS_DIR, BlobStore
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Remove blobs no export directory links to")
+    parser.add_argument("--blob-store", type=str, default=str(DEFAULT_CAS_DIR), help="Store root")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be removed")
+    args = parser.parse_args()
+
+    removed = BlobStore(args.blob_store).gc(dry_run=args.dry_run)
+    verb = "Would remove" if args.dry_run else "Removed"
+    print(
+        f"{verb} {removed['objects']} blobs ({removed['bytes'] / 1e6:.1f} MB) and {removed['refs']} refs"
+        f" from {args.blob_store}"
+    )
+
+
+if __name__ == "__main__":
+    main()
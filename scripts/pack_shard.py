@@ -0,0 +1,42 @@
+"""エクスポートディレクトリを memory-mapped な学習用シャードに詰めるスクリプト."""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+# src/ をインポートパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from nuscenes_gs.shards import ShardReader, write_shard
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Pack an exported scene (transforms.json + images/masks/depth) into a memory-mapped shard"
+    )
+    parser.add_argument(
+        "export_dirs",
+        nargs="+",
+        type=str,
+        help="Export directories containing transforms.json (e.g. data/derived/scene-0061_front)",
+    )
+    parser.add_argument(
+        "--jpeg",
+        action="store_true",
+        help="Store images as the original JPEG bytes instead of decoded RGB (smaller, decode on read)",
+    )
+    args = parser.parse_args()
+
+    for export_dir in map(Path, args.export_dirs):
+        print(f"Packing {export_dir} ...")
+        shard_dir = write_shard(export_dir, encode_images=args.jpeg)
+        reader = ShardReader(shard_dir)
+        size_mb = sum(p.stat().st_size for p in shard_dir.iterdir()) / 1e6
+        print(f"  frames: {len(reader)}, streams: {', '.join(reader.meta['streams'])}")
+        print(f"  shard: {shard_dir} ({size_mb:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,10 @@
 from __future__ import annotations
 
 import json
+import re
 import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 
 # src ディレクトリを Python パスに追加
@@ -17,6 +20,10 @@ import numpy as np
 import plotly.graph_objects as go
 import streamlit as st
 from PIL import Image
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from nuscenes_gs.masks import DISTANCE_COLORSCALE
+from nuscenes_gs.pointcloud import decimate_points
 
 st.set_page_config(layout="wide", page_title="Pose Viewer")
 
@@ -37,7 +44,7 @@ transforms_path = scene_options[selected_scene]
 # transforms.jsonを先に読み込んでマスクの有無を確認
 with open(transforms_path) as f:
     transforms_data = json.load(f)
-has_masks = "mask_path" in transforms_data["frames"][0] if transforms_data["frames"] else False
+has_masks = any("mask_path" in f for f in transforms_data["frames"])
 
 # --- 表示モード設定 ---
 st.sidebar.markdown("---")
@@ -55,49 +62,251 @@ display_mode = st.sidebar.radio(
     index=0
 )
 
-# LiDAR が必要な場合のみ nuScenes を読み込む
+# LiDAR / BBox 表示のみ nuScenes を読み込む
 show_lidar = display_mode in ["Image + LiDAR", "LiDAR Only"]
-nusc = None
-has_lidarseg = False
-if show_lidar:
-    try:
-        from nuscenes.nuscenes import NuScenes
-        from nuscenes_gs.masks import (
-            compute_w2c,
-            create_label_overlay,
-            load_lidar_points_and_labels,
-            project_points_to_image,
-            transform_lidar_to_world,
+needs_nusc = show_lidar or display_mode == "Image + BBox"
+
+# 1回の描画結果を (シーン, フレーム, モード) ごとに保持する上限（LRU）
+RENDER_CACHE_ENTRIES = 64
+# スライダー位置の前後に先読みするフレーム数
+PREFETCH_RADIUS = 2
+# LiDAR Only 表示の既定の点数上限
+LIDAR_POINT_BUDGET = 20000
+
+
+@st.cache_resource
+def load_nuscenes(dataroot: str):
+    from nuscenes.nuscenes import NuScenes
+
+    return NuScenes(version="v1.0-mini", dataroot=dataroot, verbose=False)
+
+
+@st.cache_resource
+def load_frame_index(dataroot: str, scene_name: str) -> list[dict]:
+    """シーンの keyframe 索引（token・pose・intrinsics を1回で引いておく）."""
+    from nuscenes_gs.frames import build_scene_frame_index
+
+    nusc = load_nuscenes(dataroot)
+    scene = next(s for s in nusc.scene if s["name"] == scene_name)
+    return build_scene_frame_index(nusc, scene["token"])
+
+
+@st.cache_data
+def load_transforms(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def scene_name_of(export_dir: Path) -> str:
+    """エクスポートディレクトリ名からシーン名を取り出す.
+
+    "scene-0757_front" -> "scene-0757", "scene-0757_front_lidar_masked" -> "scene-0757"
+    """
+    match = re.match(r"(scene-\d+)", export_dir.name)
+    if match:
+        return match.group(1)
+    # フォールバック: 最初の2つの部分を結合
+    return "_".join(export_dir.name.split("_")[:2])
+
+
+def source_frame_idx(frame: dict) -> int:
+    """transforms.json のフレームに対応する keyframe 番号（間引き後も images/NNNN.jpg の番号）."""
+    return int(Path(frame["file_path"]).stem)
+
+
+@st.cache_data(max_entries=RENDER_CACHE_ENTRIES, show_spinner=False)
+def project_lidar(dataroot: str, scene_name: str, frame_idx: int) -> dict:
+    """1フレームの LiDAR 点をカメラに投影した結果（画像内の点のみ）."""
+    from nuscenes_gs.masks import (
+        load_lidar_points_and_labels,
+        project_points_to_image,
+        transform_lidar_to_world,
+    )
+
+    nusc = load_nuscenes(dataroot)
+    frame = load_frame_index(dataroot, scene_name)[frame_idx]
+    points_lidar, labels = load_lidar_points_and_labels(nusc, frame["lidar_token"])
+    points_world = transform_lidar_to_world(points_lidar, frame["lidar_ego_pose"], frame["lidar_calib"])
+    uv, valid_mask, distances = project_points_to_image(points_world, frame["w2c"], frame["K"], frame["image_shape"])
+    return {
+        "uv": uv,
+        "labels": labels[valid_mask],
+        "distances": distances,
+        "points_world": points_world[valid_mask],
+        "num_points": len(points_lidar),
+    }
+
+
+def overlay_lidar(
+    img_array: np.ndarray, dataroot: str, scene_name: str, frame_idx: int
+) -> tuple[np.ndarray, list[str]]:
+    from nuscenes_gs.masks import create_label_overlay
+
+    proj = project_lidar(dataroot, scene_name, frame_idx)
+    overlay = create_label_overlay(
+        img_array.shape[:2], proj["uv"], proj["labels"], distances=proj["distances"], point_radius=5
+    )
+    # 2D画像とオーバーレイを合成
+    overlay_mask = overlay.sum(axis=2) > 0
+    img_array[overlay_mask] = (img_array[overlay_mask] * 0.3 + overlay[overlay_mask] * 0.7).astype(np.uint8)
+
+    info = [f"投影点数={len(proj['uv'])}/{proj['num_points']}", f"overlay ピクセル数={overlay_mask.sum()}"]
+    if len(proj["distances"]):
+        info.append(f"距離範囲={proj['distances'].min():.1f}m ~ {proj['distances'].max():.1f}m")
+    return img_array, info
+
+
+def overlay_mask(img_array: np.ndarray, mask_path: Path) -> tuple[np.ndarray, list[str]]:
+    import cv2
+
+    mask = cv2.imread(str(mask_path), cv2.IMREAD_GRAYSCALE)
+    if mask is None:
+        raise FileNotFoundError(f"マスクファイルが見つかりません: {mask_path}")
+
+    # マスクカバレッジ率を計算
+    total_pixels = mask.shape[0] * mask.shape[1]
+    masked_pixels = int(np.count_nonzero(mask))
+    coverage = masked_pixels / total_pixels * 100
+
+    # マスク領域を塗りつぶし（不透明度70%）
+    masked = mask > 0
+    overlay_alpha = 0.7
+    img_array[masked] = (
+        img_array[masked] * (1 - overlay_alpha) + np.array([255, 0, 0]) * overlay_alpha
+    ).astype(np.uint8)
+
+    # 輪郭線を追加（より明確に）
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    cv2.drawContours(img_array, contours, -1, (255, 255, 0), 3)  # 黄色の太線
+
+    return img_array, [
+        f"Mask Coverage: {coverage:.1f}%",
+        f"Masked pixels: {masked_pixels:,} / {total_pixels:,}",
+    ]
+
+
+def overlay_bboxes(
+    img_array: np.ndarray, dataroot: str, scene_name: str, frame_idx: int
+) -> tuple[np.ndarray, list[str]]:
+    from pyquaternion import Quaternion
+
+    from nuscenes_gs.masks import draw_bbox_on_image, project_bbox_to_image
+
+    nusc = load_nuscenes(dataroot)
+    frame = load_frame_index(dataroot, scene_name)[frame_idx]
+    image_shape = img_array.shape[:2]
+
+    # カテゴリに応じた色（動的オブジェクトのみ）
+    colors = {"vehicle.": (0, 255, 0), "human.": (255, 0, 0), "cycle.": (255, 255, 0)}
+
+    bbox_count = 0
+    for ann_token in frame["sample"]["anns"]:
+        ann = nusc.get("sample_annotation", ann_token)
+        category = ann["category_name"]
+        color = next((c for prefix, c in colors.items() if category.startswith(prefix)), None)
+        if color is None:
+            continue
+
+        corners_2d, is_visible = project_bbox_to_image(
+            np.array(ann["translation"]),
+            np.array(ann["size"]),
+            Quaternion(ann["rotation"]).rotation_matrix,
+            frame["w2c"],
+            frame["K"],
+            image_shape,
         )
+        if is_visible and corners_2d is not None:
+            img_array = draw_bbox_on_image(img_array, corners_2d, category, color=color, thickness=2)
+            bbox_count += 1
+
+    return img_array, [f"BBox count: {bbox_count}"]
+
+
+@st.cache_data(max_entries=RENDER_CACHE_ENTRIES, show_spinner=False)
+def render_frame(export_dir: str, frame_pos: int, mode: str, dataroot: str) -> tuple[np.ndarray, str, list[str]]:
+    """(シーン, フレーム, モード) ごとの表示画像・キャプション・サイドバー情報.
+
+    スライダーで戻ったときや先読み済みのフレームは再計算しない。
+    """
+    export_dir = Path(export_dir)
+    frame = load_transforms(str(export_dir / "transforms.json"))["frames"][frame_pos]
+    img_array = np.array(Image.open(export_dir / frame["file_path"]).convert("RGB"))
+    scene_name = scene_name_of(export_dir)
+    frame_idx = source_frame_idx(frame)
+
+    if mode == "Image + LiDAR":
+        img_array, info = overlay_lidar(img_array, dataroot, scene_name, frame_idx)
+        caption = f"Frame {frame_pos} (with LiDAR)"
+    elif mode == "Image + Mask":
+        img_array, info = overlay_mask(img_array, export_dir / frame["mask_path"])
+        caption = f"Frame {frame_pos} (with Mask, {info[0]})"
+    elif mode == "Image + BBox":
+        img_array, info = overlay_bboxes(img_array, dataroot, scene_name, frame_idx)
+        caption = f"Frame {frame_pos} (with BBox, {info[0]})"
+    else:
+        info = []
+        caption = f"Frame {frame_pos}  —  {frame['file_path']}"
+    return img_array, caption, info
 
-        # nuScenes 読み込み
-        @st.cache_resource
-        def load_nuscenes(dataroot: str):
-            return NuScenes(version="v1.0-mini", dataroot=dataroot, verbose=False)
 
+@st.cache_resource
+def prefetch_executor() -> tuple[ThreadPoolExecutor, list[Future]]:
+    """先読み用のワーカースレッド1本と、投入済み future のリスト."""
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="pose-viewer-prefetch"), []
+
+
+def prefetch_neighbours(export_dir: str, frame_pos: int, n_frames: int, mode: str, dataroot: str) -> None:
+    """前後のフレームをバックグラウンドで計算してキャッシュに載せる.
+
+    スライダーを動かすたびに未着手の先読みは取り消し、最新の位置の周辺だけを計算する。
+    """
+    executor, pending = prefetch_executor()
+    for future in pending:
+        future.cancel()
+    pending.clear()
+
+    ctx = get_script_run_ctx()
+
+    def run(task, *args):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        task(*args)
+
+    # 近い順（+1, -1, +2, -2, ...）
+    for offset in range(1, PREFETCH_RADIUS + 1):
+        for pos in (frame_pos + offset, frame_pos - offset):
+            if not 0 <= pos < n_frames:
+                continue
+            if mode == "LiDAR Only":
+                frame = load_transforms(str(Path(export_dir) / "transforms.json"))["frames"][pos]
+                args = (project_lidar, dataroot, scene_name_of(Path(export_dir)), source_frame_idx(frame))
+            else:
+                args = (render_frame, export_dir, pos, mode, dataroot)
+            pending.append(executor.submit(run, *args))
+
+
+nusc = None
+has_lidarseg = False
+dataroot = "data/raw"
+if needs_nusc:
+    try:
         dataroot = st.sidebar.text_input("NuScenes dataroot", "data/raw")
         nusc = load_nuscenes(dataroot)
 
         # lidarseg データパックの確認
-        try:
-            sample_token = nusc.sample[0]["data"]["LIDAR_TOP"]
-            nusc.get("lidarseg", sample_token)
-            has_lidarseg = True
-        except:
-            has_lidarseg = False
-            st.sidebar.warning("⚠ nuScenes-lidarseg データパック未検出")
+        if show_lidar:
+            try:
+                sample_token = nusc.sample[0]["data"]["LIDAR_TOP"]
+                nusc.get("lidarseg", sample_token)
+                has_lidarseg = True
+            except Exception:
+                has_lidarseg = False
+                st.sidebar.warning("⚠ nuScenes-lidarseg データパック未検出")
     except Exception as e:
         st.sidebar.error(f"nuScenes 読み込みエラー: {e}")
-        show_lidar = False
+        needs_nusc = show_lidar = False
 
 # --- データ読み込み ---
 
-@st.cache_data
-def load_transforms(path: str) -> dict:
-    with open(path) as f:
-        return json.load(f)
-
-
 data = load_transforms(str(transforms_path))
 frames = data["frames"]
 n_frames = len(frames)
@@ -191,327 +400,121 @@ with col_plot:
 
 with col_image:
     img_path = transforms_path.parent / frames[frame_idx]["file_path"]
+    export_dir = str(transforms_path.parent)
+    default_caption = f"Frame {frame_idx} / {n_frames - 1}  —  {frames[frame_idx]['file_path']}"
 
-    if img_path.exists():
-        img = Image.open(img_path)
-
-        # LiDAR overlay の処理
-        if show_lidar and nusc and has_lidarseg:
-            try:
-                # シーン名をディレクトリ名から抽出
-                # "scene-0757_front" -> "scene-0757"
-                # "scene-0757_front_lidar_masked" -> "scene-0757"
-                dir_name = transforms_path.parent.name
-                # "scene-XXXX" の形式を抽出
-                import re
-                match = re.match(r"(scene-\d+)", dir_name)
-                if match:
-                    scene_name = match.group(1)
-                else:
-                    # フォールバック: 最初の2つの部分を結合
-                    scene_name = "_".join(dir_name.split("_")[:2])
-
-                st.sidebar.info(f"Debug: シーン名={scene_name}, フレーム={frame_idx}")
-
-                # シーンを検索
-                scene_idx = [s["name"] for s in nusc.scene].index(scene_name)
-                scene = nusc.scene[scene_idx]
-
-                # フレーム token を取得
-                sample_token = scene["first_sample_token"]
-                for _ in range(frame_idx):
-                    sample = nusc.get("sample", sample_token)
-                    sample_token = sample["next"]
-                    if not sample_token:
-                        break
-
-                if sample_token:
-                    sample = nusc.get("sample", sample_token)
-                    cam_token = sample["data"]["CAM_FRONT"]
-                    lidar_token = sample["data"]["LIDAR_TOP"]
-
-                    # データ取得
-                    cam_data = nusc.get("sample_data", cam_token)
-                    lidar_data = nusc.get("sample_data", lidar_token)
-
-                    # LiDAR 点群と labels 読み込み
-                    points_lidar, labels = load_lidar_points_and_labels(nusc, lidar_token)
-
-                    # 座標変換
-                    lidar_ego_pose = nusc.get("ego_pose", lidar_data["ego_pose_token"])
-                    lidar_calib = nusc.get("calibrated_sensor", lidar_data["calibrated_sensor_token"])
-                    points_world = transform_lidar_to_world(points_lidar, lidar_ego_pose, lidar_calib)
-
-                    # カメラパラメータ
-                    cam_ego_pose = nusc.get("ego_pose", cam_data["ego_pose_token"])
-                    cam_calib = nusc.get("calibrated_sensor", cam_data["calibrated_sensor_token"])
-                    w2c = compute_w2c(cam_ego_pose, cam_calib)
-
-                    # intrinsics
-                    K = np.array(cam_calib["camera_intrinsic"])
-                    image_shape = (img.height, img.width)
-
-                    # 2D 投影
-                    uv, valid_mask, distances = project_points_to_image(points_world, w2c, K, image_shape)
-                    valid_labels = labels[valid_mask]
-
-                    st.sidebar.success(f"Debug: 投影点数={len(uv)}/{len(points_lidar)}")
-                    st.sidebar.info(f"Debug: 距離範囲={distances.min():.1f}m ~ {distances.max():.1f}m")
-
-                    # オーバーレイ生成（距離ベースの色分け）
-                    overlay = create_label_overlay(image_shape, uv, valid_labels, distances=distances, point_radius=5)
-
-                    # デバッグ: overlay のピクセル数を確認
-                    overlay_pixels = (overlay.sum(axis=2) > 0).sum()
-                    st.sidebar.info(f"Debug: overlay ピクセル数={overlay_pixels}")
-
-                    # 表示モードに応じた処理
-                    if display_mode == "Image + LiDAR":
-                        # 2D画像とオーバーレイを合成
-                        img_array = np.array(img)
-                        overlay_mask = overlay.sum(axis=2) > 0
-                        img_array[overlay_mask] = (img_array[overlay_mask] * 0.3 + overlay[overlay_mask] * 0.7).astype(np.uint8)
-                        img_with_overlay = Image.fromarray(img_array)
-                        st.image(img_with_overlay, caption=f"Frame {frame_idx} (with LiDAR)", use_container_width=True)
-
-                    elif display_mode == "LiDAR Only":
-                        # 3D点群ビュー
-                        # カメラ位置を取得
-                        cam_pos = np.array(cam_ego_pose["translation"])
-
-                        # 距離で色分け（RGB値を計算）
-                        min_dist = distances.min()
-                        max_dist = distances.max()
-                        normalized_dist = (distances - min_dist) / (max_dist - min_dist + 1e-6)
-
-                        # RGB配列を生成
-                        colors = []
-                        for dist_norm in normalized_dist:
-                            if dist_norm < 0.33:
-                                r, g, b = 0, int(255 * (dist_norm / 0.33)), int(255 * (1 - dist_norm / 0.33))
-                            elif dist_norm < 0.67:
-                                r, g, b = int(255 * ((dist_norm - 0.33) / 0.34)), 255, 0
-                            else:
-                                r, g, b = 255, int(255 * (1 - (dist_norm - 0.67) / 0.33)), 0
-                            colors.append(f'rgb({r},{g},{b})')
-
-                        # 画像境界内の点のworld座標を取得
-                        valid_points_world = points_world[valid_mask]
-
-                        # 3D scatter plot
-                        fig_3d = go.Figure()
-
-                        # LiDAR点群
-                        fig_3d.add_trace(go.Scatter3d(
-                            x=valid_points_world[:, 0],
-                            y=valid_points_world[:, 1],
-                            z=valid_points_world[:, 2],
-                            mode='markers',
-                            marker=dict(
-                                size=2,
-                                color=colors,
-                                opacity=0.6
-                            ),
-                            name='LiDAR points',
-                            hovertemplate='<b>Position</b><br>X: %{x:.2f}<br>Y: %{y:.2f}<br>Z: %{z:.2f}<extra></extra>'
-                        ))
-
-                        # カメラ位置
-                        fig_3d.add_trace(go.Scatter3d(
-                            x=[cam_pos[0]],
-                            y=[cam_pos[1]],
-                            z=[cam_pos[2]],
-                            mode='markers',
-                            marker=dict(size=8, color='red', symbol='diamond'),
-                            name='Camera',
-                            hovertemplate='<b>Camera</b><br>X: %{x:.2f}<br>Y: %{y:.2f}<br>Z: %{z:.2f}<extra></extra>'
-                        ))
-
-                        # カメラの向き（矢印）
-                        c2w_opencv = np.linalg.inv(w2c)
-                        cam_forward = -c2w_opencv[:3, 2]  # OpenCV: z軸の負方向が前
-                        arrow_len = 5.0
-                        fig_3d.add_trace(go.Scatter3d(
-                            x=[cam_pos[0], cam_pos[0] + cam_forward[0] * arrow_len],
-                            y=[cam_pos[1], cam_pos[1] + cam_forward[1] * arrow_len],
-                            z=[cam_pos[2], cam_pos[2] + cam_forward[2] * arrow_len],
-                            mode='lines',
-                            line=dict(color='red', width=4),
-                            name='Camera direction',
-                            showlegend=False
-                        ))
-
-                        # レイアウト設定
-                        fig_3d.update_layout(
-                            scene=dict(
-                                aspectmode='data',
-                                xaxis_title='X (m)',
-                                yaxis_title='Y (m)',
-                                zaxis_title='Z (m)',
-                                camera=dict(
-                                    eye=dict(x=1.5, y=1.5, z=1.5)
-                                )
-                            ),
-                            margin=dict(l=0, r=0, t=30, b=0),
-                            height=500,
-                            title=f"3D LiDAR Point Cloud (Frame {frame_idx})"
-                        )
-
-                        st.plotly_chart(fig_3d, use_container_width=True)
-                else:
-                    st.image(img, caption=f"Frame {frame_idx} / {n_frames - 1}  —  {frames[frame_idx]['file_path']}", use_container_width=True)
-                    st.warning(f"フレーム {frame_idx} のデータが見つかりません")
-            except Exception as e:
-                st.image(img, caption=f"Frame {frame_idx} / {n_frames - 1}  —  {frames[frame_idx]['file_path']}", use_container_width=True)
-                st.error(f"LiDAR overlay エラー: {e}")
-        elif display_mode == "Image + Mask" and has_masks:
-            # マスク表示
-            try:
-                import cv2
-                mask_path = transforms_path.parent / frames[frame_idx]["mask_path"]
-                if mask_path.exists():
-                    # マスクを読み込み
-                    mask = cv2.imread(str(mask_path), cv2.IMREAD_GRAYSCALE)
-
-                    # マスクカバレッジ率を計算
-                    total_pixels = mask.shape[0] * mask.shape[1]
-                    masked_pixels = np.sum(mask > 0)
-                    coverage = masked_pixels / total_pixels * 100
-
-                    # 画像とマスクをオーバーレイ
-                    img_array = np.array(img)
-                    img_with_mask = img_array.copy()
-
-                    # マスク領域を塗りつぶし（不透明度70%）
-                    mask_rgb = np.zeros_like(img_array)
-                    mask_rgb[mask > 0] = [255, 0, 0]  # 赤色
-                    overlay_alpha = 0.7  # より不透明に
-                    img_with_mask[mask > 0] = (
-                        img_array[mask > 0] * (1 - overlay_alpha) +
-                        mask_rgb[mask > 0] * overlay_alpha
-                    ).astype(np.uint8)
-
-                    # 輪郭線を追加（より明確に）
-                    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                    cv2.drawContours(img_with_mask, contours, -1, (255, 255, 0), 3)  # 黄色の太線
-
-                    img_with_mask_pil = Image.fromarray(img_with_mask)
-                    st.image(img_with_mask_pil, caption=f"Frame {frame_idx} (with Mask, Coverage: {coverage:.1f}%)", use_container_width=True)
-
-                    st.sidebar.info(f"Mask Coverage: {coverage:.1f}%")
-                    st.sidebar.info(f"Masked pixels: {masked_pixels:,} / {total_pixels:,}")
-                else:
-                    st.image(img, caption=f"Frame {frame_idx} / {n_frames - 1}  —  {frames[frame_idx]['file_path']}", use_container_width=True)
-                    st.warning(f"マスクファイルが見つかりません: {mask_path}")
-            except Exception as e:
-                st.image(img, caption=f"Frame {frame_idx} / {n_frames - 1}  —  {frames[frame_idx]['file_path']}", use_container_width=True)
-                st.error(f"マスク読み込みエラー: {e}")
-        elif display_mode == "Image + BBox":
-            # BBox 表示
-            try:
-                import cv2
-                from pyquaternion import Quaternion
-                from nuscenes.nuscenes import NuScenes
-                from nuscenes_gs.masks import compute_w2c, project_bbox_to_image, draw_bbox_on_image
-
-                # nuScenes を読み込み
-                nusc = NuScenes(version="v1.0-mini", dataroot="data/raw", verbose=False)
-
-                # シーン名を抽出
-                dir_name = transforms_path.parent.name
-                import re
-                match = re.match(r"(scene-\d+)", dir_name)
-                if match:
-                    scene_name = match.group(1)
-                else:
-                    scene_name = "_".join(dir_name.split("_")[:2])
-
-                # シーンを検索
-                scene_idx = [s["name"] for s in nusc.scene].index(scene_name)
-                scene = nusc.scene[scene_idx]
-
-                # フレーム token を取得
-                sample_token = scene["first_sample_token"]
-                for _ in range(frame_idx):
-                    sample = nusc.get("sample", sample_token)
-                    sample_token = sample["next"] if sample["next"] else None
-
-                if sample_token:
-                    sample = nusc.get("sample", sample_token)
-                    cam_token = sample["data"]["CAM_FRONT"]
-                    cam_data = nusc.get("sample_data", cam_token)
-
-                    # カメラパラメータ
-                    cam_ego_pose = nusc.get("ego_pose", cam_data["ego_pose_token"])
-                    cam_calib = nusc.get("calibrated_sensor", cam_data["calibrated_sensor_token"])
-                    w2c = compute_w2c(cam_ego_pose, cam_calib)
-                    K = np.array(cam_calib["camera_intrinsic"])
-                    image_shape = (img.height, img.width)
-
-                    # 画像を numpy array に変換
-                    img_with_bbox = np.array(img).copy()
-
-                    # sample の annotations を取得
-                    bbox_count = 0
-                    for ann_token in sample["anns"]:
-                        ann = nusc.get("sample_annotation", ann_token)
-
-                        # 動的オブジェクトのみフィルタ
-                        category = ann["category_name"]
-                        if not (category.startswith("vehicle.") or
-                                category.startswith("human.") or
-                                category.startswith("cycle.")):
-                            continue
-
-                        # bbox パラメータ
-                        bbox_center = np.array(ann["translation"])
-                        bbox_size = np.array(ann["size"])
-                        bbox_quat = Quaternion(ann["rotation"])
-                        bbox_rotation = bbox_quat.rotation_matrix
-
-                        # 2D 投影
-                        corners_2d, is_visible = project_bbox_to_image(
-                            bbox_center,
-                            bbox_size,
-                            bbox_rotation,
-                            w2c,
-                            K,
-                            image_shape,
-                        )
-
-                        if is_visible and corners_2d is not None:
-                            # カテゴリに応じて色を変更
-                            if category.startswith("vehicle."):
-                                color = (0, 255, 0)  # 緑
-                            elif category.startswith("human."):
-                                color = (255, 0, 0)  # 赤
-                            elif category.startswith("cycle."):
-                                color = (255, 255, 0)  # 黄色
-                            else:
-                                color = (128, 128, 128)  # 灰色
-
-                            img_with_bbox = draw_bbox_on_image(
-                                img_with_bbox,
-                                corners_2d,
-                                category,
-                                color=color,
-                                thickness=2,
-                            )
-                            bbox_count += 1
-
-                    img_with_bbox_pil = Image.fromarray(img_with_bbox)
-                    st.image(img_with_bbox_pil, caption=f"Frame {frame_idx} (with BBox, {bbox_count} objects)", use_container_width=True)
-                    st.sidebar.info(f"BBox count: {bbox_count}")
-                else:
-                    st.image(img, caption=f"Frame {frame_idx} / {n_frames - 1}  —  {frames[frame_idx]['file_path']}", use_container_width=True)
-                    st.warning(f"フレーム {frame_idx} のデータが見つかりません")
-            except Exception as e:
-                st.image(img, caption=f"Frame {frame_idx} / {n_frames - 1}  —  {frames[frame_idx]['file_path']}", use_container_width=True)
-                st.error(f"BBox 描画エラー: {e}")
-        else:
-            st.image(img, caption=f"Frame {frame_idx} / {n_frames - 1}  —  {frames[frame_idx]['file_path']}", use_container_width=True)
-    else:
+    if not img_path.exists():
         st.warning(f"画像が見つかりません: {img_path}")
+    elif display_mode == "LiDAR Only" and has_lidarseg:
+        try:
+            scene_name = scene_name_of(transforms_path.parent)
+            source_idx = source_frame_idx(frames[frame_idx])
+            proj = project_lidar(dataroot, scene_name, source_idx)
+            frame = load_frame_index(dataroot, scene_name)[source_idx]
+            # ボクセル LOD で点数を予算内に抑える（ブラウザに送る量を一定にする）
+            point_budget = st.sidebar.slider("Point budget", 1000, 50000, LIDAR_POINT_BUDGET, step=1000)
+            keep = decimate_points(proj["points_world"], point_budget)
+            valid_points_world = proj["points_world"][keep]
+
+            # カメラ位置を取得
+            cam_pos = np.array(frame["cam_ego_pose"]["translation"])
+
+            # 距離で色分け（正規化した距離 + オーバーレイと同じカラースケール）
+            distances = proj["distances"]
+            normalized_dist = (distances[keep] - distances.min()) / (np.ptp(distances) + 1e-6)
+            colorscale = [[stop, f"rgb{color}"] for stop, color in DISTANCE_COLORSCALE]
+
+            # 3D scatter plot
+            fig_3d = go.Figure()
+
+            # LiDAR点群
+            fig_3d.add_trace(go.Scatter3d(
+                x=valid_points_world[:, 0],
+                y=valid_points_world[:, 1],
+                z=valid_points_world[:, 2],
+                mode='markers',
+                marker=dict(
+                    size=2,
+                    color=normalized_dist,
+                    colorscale=colorscale,
+                    cmin=0.0,
+                    cmax=1.0,
+                    opacity=0.6
+                ),
+                name='LiDAR points',
+                hovertemplate='<b>Position</b><br>X: %{x:.2f}<br>Y: %{y:.2f}<br>Z: %{z:.2f}<extra></extra>'
+            ))
+
+            # カメラ位置
+            fig_3d.add_trace(go.Scatter3d(
+                x=[cam_pos[0]],
+                y=[cam_pos[1]],
+                z=[cam_pos[2]],
+                mode='markers',
+                marker=dict(size=8, color='red', symbol='diamond'),
+                name='Camera',
+                hovertemplate='<b>Camera</b><br>X: %{x:.2f}<br>Y: %{y:.2f}<br>Z: %{z:.2f}<extra></extra>'
+            ))
+
+            # カメラの向き（矢印）
+            cam_forward = -frame["c2w"][:3, 2]  # OpenGL: z軸の負方向が前
+            arrow_len = 5.0
+            fig_3d.add_trace(go.Scatter3d(
+                x=[cam_pos[0], cam_pos[0] + cam_forward[0] * arrow_len],
+                y=[cam_pos[1], cam_pos[1] + cam_forward[1] * arrow_len],
+                z=[cam_pos[2], cam_pos[2] + cam_forward[2] * arrow_len],
+                mode='lines',
+                line=dict(color='red', width=4),
+                name='Camera direction',
+                showlegend=False
+            ))
+
+            # レイアウト設定
+            fig_3d.update_layout(
+                scene=dict(
+                    aspectmode='data',
+                    xaxis_title='X (m)',
+                    yaxis_title='Y (m)',
+                    zaxis_title='Z (m)',
+                    camera=dict(
+                        eye=dict(x=1.5, y=1.5, z=1.5)
+                    )
+                ),
+                margin=dict(l=0, r=0, t=30, b=0),
+                height=500,
+                title=f"3D LiDAR Point Cloud (Frame {frame_idx})"
+            )
+
+            st.plotly_chart(fig_3d, use_container_width=True)
+            st.sidebar.info(f"投影点数={len(proj['uv'])}/{proj['num_points']}, 表示点数={len(keep)}")
+            prefetch_neighbours(export_dir, frame_idx, n_frames, display_mode, dataroot)
+        except Exception as e:
+            st.image(Image.open(img_path), caption=default_caption, use_container_width=True)
+            st.error(f"LiDAR overlay エラー: {e}")
+    else:
+        # LiDAR 表示で lidarseg がない / nuScenes を読めない場合は画像のみ
+        mode = display_mode
+        if (show_lidar and not has_lidarseg) or (display_mode == "Image + BBox" and not needs_nusc):
+            mode = "Image Only"
+        # マスクがないシーン・フレームも画像のみ
+        if display_mode == "Image + Mask":
+            mask_path = frames[frame_idx].get("mask_path")
+            if mask_path is None:
+                mode = "Image Only"
+                st.warning("このフレームにはマスクがありません")
+            elif not (transforms_path.parent / mask_path).exists():
+                mode = "Image Only"
+                st.warning(f"マスクファイルが見つかりません: {transforms_path.parent / mask_path}")
+        try:
+            img_array, caption, info = render_frame(export_dir, frame_idx, mode, dataroot)
+            st.image(img_array, caption=caption, use_container_width=True)
+            for line in info:
+                st.sidebar.info(line)
+            if mode != "Image Only":
+                prefetch_neighbours(export_dir, frame_idx, n_frames, mode, dataroot)
+        except Exception as e:
+            st.image(Image.open(img_path), caption=default_caption, use_container_width=True)
+            st.error(f"{display_mode} 描画エラー: {e}")
 
     fwd = forwards[frame_idx]
 
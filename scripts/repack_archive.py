@@ -0,0 +1,51 @@
+"""nuScenes 配布アーカイブを非圧縮 tar に詰め直し、メンバー索引を作るスクリプト."""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+# src/ をインポートパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from nuscenes_gs.archive import TarIndex, repack_archive
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Repack nuScenes .tgz/.tar.bz2 archives into uncompressed tars with a member index"
+    )
+    parser.add_argument(
+        "archives",
+        nargs="+",
+        type=str,
+        help="Compressed archives (e.g. v1.0-mini.tgz) or already uncompressed .tar files",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=str,
+        default="data/raw",
+        help="Directory for the uncompressed tars (default: data/raw)",
+    )
+    args = parser.parse_args()
+
+    tar_paths = []
+    for src in map(Path, args.archives):
+        if src.suffix == ".tar":
+            tar_paths.append(src)
+            continue
+        stem = src.name.removesuffix(".tgz").removesuffix(".tar.gz").removesuffix(".tar.bz2")
+        dst = Path(args.output_dir) / f"{stem}.tar"
+        print(f"Repacking {src} -> {dst} ...")
+        tar_paths.append(repack_archive(src, dst))
+
+    print("Building member index ...")
+    index = TarIndex.build(tar_paths)
+    print(f"  members: {len(index.names())}")
+    for p in tar_paths:
+        print(f"  index: {p.with_name(p.name + '.index.json')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""YAML で定義した実験パイプライン（export → train → eval）を実行するスクリプト.
+
+成果物は入力とパラメータのハッシュで管理し、完了済みのステージはスキップする。
+例: python scripts/run_pipeline.py experiments/05_depth_supervision/pipeline.yaml --dry-run
+
+--queue を付けると共有ディレクトリの作業キュー経由で実行する。共有ファイルシステムを
+持つ複数ノードで同じコマンドを実行すれば、項目を重複なく分担して全体を終える:
+    python scripts/run_pipeline.py pipeline.yaml --queue /shared/queues/trainval --workers 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# src/ をインポートパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from nuscenes_gs.runner import load_pipeline, run_pipeline
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run an experiment pipeline (stage DAG) defined in YAML")
+    parser.add_argument("config", type=str, help="Pipeline config (.yaml / .json)")
+    parser.add_argument("--scenes", nargs="+", type=str, default=None, help="Scene names (overrides the config)")
+    parser.add_argument(
+        "--stages",
+        nargs="+",
+        type=str,
+        default=None,
+        help="Run only these stages and their dependencies",
+    )
+    parser.add_argument("--workers", type=int, default=None, help="Parallel workers (default: config or CPU count)")
+    parser.add_argument("--dry-run", action="store_true", help="Only print which stages are done / to do")
+    parser.add_argument("--force", action="store_true", help="Rebuild artifacts even if they are complete")
+    parser.add_argument(
+        "--queue",
+        type=str,
+        default=None,
+        help="Shared work-queue directory; run the same command on every node to split the work",
+    )
+    parser.add_argument(
+        "--heartbeat",
+        type=float,
+        default=30.0,
+        help="With --queue: seconds between claim heartbeats (default: 30)",
+    )
+    parser.add_argument(
+        "--stale-after",
+        type=float,
+        default=300.0,
+        help="With --queue: requeue claims without a heartbeat for this many seconds (default: 300)",
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=3,
+        help="With --queue: mark an item failed after this many attempts (default: 3)",
+    )
+    parser.add_argument("--status", action="store_true", help="With --queue: only print the queue state")
+    args = parser.parse_args()
+
+    if args.queue and args.status:
+        from nuscenes_gs.coordinator import merge_index, queue_status
+
+        print(f"Queue: {args.queue} ({', '.join(f'{k}: {v}' for k, v in queue_status(args.queue).items())})")
+        print(f"Index: {merge_index(args.queue)}")
+        return
+
+    config = load_pipeline(args.config)
+    if args.stages:
+        wanted = set()
+        todo = list(args.stages)
+        while todo:
+            name = todo.pop()
+            if name not in config["stages"]:
+                parser.error(f"Unknown stage: {name}")
+            if name not in wanted:
+                wanted.add(name)
+                todo.extend(config["stages"][name].get("after", []))
+        config["stages"] = {k: v for k, v in config["stages"].items() if k in wanted}
+
+    # シーン名 → scene レコード（scene.json だけ読む）
+    version = config.get("version", "v1.0-mini")
+    if config.get("archive"):
+        from nuscenes_gs.archive import load_nuscenes_from_archive
+
+        all_scenes = load_nuscenes_from_archive(config["archive"], version=version, verbose=False).scene
+    else:
+        with open(Path(config.get("dataroot", "data/raw")) / version / "scene.json") as f:
+            all_scenes = json.load(f)
+    names = args.scenes or config.get("scenes") or [scene["name"] for scene in all_scenes]
+    by_name = {scene["name"]: scene for scene in all_scenes}
+    missing = [name for name in names if name not in by_name]
+    if missing:
+        parser.error(f"Unknown scenes: {missing}")
+
+    print(f"Pipeline: {args.config} ({len(config['stages'])} stages x {len(names)} scenes)")
+    if args.queue and not args.dry_run:
+        from nuscenes_gs.coordinator import run_distributed
+
+        run_distributed(
+            config,
+            [by_name[name] for name in names],
+            args.queue,
+            num_workers=args.workers,
+            force=args.force,
+            heartbeat=args.heartbeat,
+            stale_after=args.stale_after,
+            max_attempts=args.max_attempts,
+        )
+        return
+    run_pipeline(
+        config,
+        [by_name[name] for name in names],
+        num_workers=args.workers,
+        dry_run=args.dry_run,
+        force=args.force,
+    )
+
+
+if __name__ == "__main__":
+    main()
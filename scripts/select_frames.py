@@ -0,0 +1,81 @@
+"""ポーズ差分と LiDAR 共視性で冗長なフレームを間引き、選択結果を表示するスクリプト."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# src/ をインポートパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from nuscenes.nuscenes import NuScenes
+
+from nuscenes_gs.archive import load_nuscenes_from_archive
+from nuscenes_gs.frames import build_scene_frame_index, build_sweep_frame_index
+from nuscenes_gs.selection import select_frames
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Subsample redundant CAM_FRONT frames of a scene by pose deltas and LiDAR covisibility"
+    )
+    parser.add_argument("--dataroot", type=str, default="data/raw", help="nuScenes dataroot path")
+    parser.add_argument("--version", type=str, default="v1.0-mini", help="nuScenes version (default: v1.0-mini)")
+    parser.add_argument("--scene-index", type=int, default=0, help="Scene index (default: 0)")
+    parser.add_argument(
+        "--archive",
+        nargs="+",
+        type=str,
+        default=None,
+        help="Uncompressed nuScenes tar(s) to read directly instead of an extracted dataroot",
+    )
+    parser.add_argument(
+        "--sweeps",
+        action="store_true",
+        help="Select from all 12Hz CAM_FRONT sweeps instead of the 2Hz keyframes (the exporters use keyframes only)",
+    )
+    parser.add_argument("--target-frames", type=int, default=None, help="Number of frames to keep")
+    parser.add_argument(
+        "--max-overlap",
+        type=float,
+        default=0.95,
+        help="Covisibility above which a frame is redundant (used without --target-frames, default: 0.95)",
+    )
+    parser.add_argument("--output", type=str, default=None, help="Write the selection as JSON to this path")
+    args = parser.parse_args()
+
+    if args.archive:
+        nusc = load_nuscenes_from_archive(args.archive, version=args.version, verbose=False)
+    else:
+        nusc = NuScenes(version=args.version, dataroot=args.dataroot, verbose=False)
+
+    scene = nusc.scene[args.scene_index]
+    build_index = build_sweep_frame_index if args.sweeps else build_scene_frame_index
+    frames = build_index(nusc, scene["token"])
+
+    selected, stats = select_frames(nusc, frames, target_count=args.target_frames, max_overlap=args.max_overlap)
+
+    print(f"Scene: {scene['name']} ({scene['description']})")
+    print(f"  selected {len(selected)}/{len(frames)} frames")
+    for i in selected:
+        print(
+            f"  {i:4d}  t={stats['translation'][i]:6.2f} m  r={stats['rotation_deg'][i]:5.1f} deg"
+            f"  overlap={stats['overlap'][i]:.2f} (vs {stats['overlap_ref'][i]})"
+        )
+
+    if args.output:
+        selection = {
+            "scene_token": scene["token"],
+            "sample_data_tokens": [frames[i]["cam_token"] for i in selected],
+            "selected": selected,
+            **stats,
+        }
+        with open(args.output, "w") as f:
+            json.dump(selection, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""nuScenes アーカイブ (.tar) を展開せずに dataroot として読むためのバックエンド.
+
+tar のメンバーヘッダを1回だけ走査してオフセット索引を作り、以降は
+LiDAR 点群・lidarseg ラベル・画像をメンバーオフセットから ``os.pread`` で直接読む。
+ファイルオフセットを動かさないので、fork したワーカーやスレッドが同じ fd を共有しても壊れない。
+
+gzip/bz2 圧縮のままだとランダムアクセスできないので、配布物の
+``v1.0-mini.tgz`` 等は ``repack_archive`` で一度だけ非圧縮 tar に戻す
+（展開ではなくストリーム伸長なので、ファイル数ぶんの I/O は発生しない）。
+"""
+
+from __future__ import annotations
+
+import bz2
+import gzip
+import io
+import json
+import os
+import shutil
+import tarfile
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO
+
+import numpy as np
+
+from . import perf
+
+if TYPE_CHECKING:
+    from nuscenes.nuscenes import NuScenes
+
+
+# 索引キャッシュのフォーマットバージョン（構造を変えたら上げる）
+_INDEX_VERSION = 1
+
+
+def repack_archive(src: str | Path, dst: str | Path) -> Path:
+    """圧縮アーカイブ (.tgz / .tar.gz / .tar.bz2) を非圧縮 tar にストリーム伸長する.
+
+    Args:
+        src: 圧縮アーカイブのパス
+        dst: 出力する非圧縮 tar のパス
+
+    Returns:
+        出力した tar のパス
+    """
+    src, dst = Path(src), Path(dst)
+    name = src.name
+    if name.endswith((".tgz", ".tar.gz")):
+        opener = gzip.open
+    elif name.endswith((".tbz2", ".tar.bz2")):
+        opener = bz2.open
+    else:
+        raise ValueError(f"Unsupported archive type: {src}")
+
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_suffix(dst.suffix + ".part")
+    with opener(src, "rb") as fin, open(tmp, "wb") as fout:
+        shutil.copyfileobj(fin, fout, length=16 * 1024 * 1024)
+    tmp.replace(dst)
+    return dst
+
+
+def _normalize_member_name(name: str) -> str:
+    """tar メンバー名を dataroot 相対パスに揃える（先頭の "./" を除去）."""
+    while name.startswith("./"):
+        name = name[2:]
+    return name
+
+
+class TarIndex:
+    """非圧縮 tar 群のメンバーオフセット索引.
+
+    複数の tar（本体 + lidarseg パックなど）を1つの名前空間として扱う。
+    同名メンバーは後に渡した tar が優先される（lidarseg パックの category.json
+    が本体を上書きするのと同じ挙動）。
+    """
+
+    def __init__(
+        self,
+        tar_paths: list[Path],
+        members: dict[str, tuple[int, int, int]],
+    ) -> None:
+        """
+        Args:
+            tar_paths: 索引対象の tar パス
+            members: メンバー名 → (tar の番号, データ先頭オフセット, サイズ)
+        """
+        self.tar_paths = tar_paths
+        self.members = members
+        self._fds: dict[int, int] = {}
+
+    @classmethod
+    def build(cls, tar_paths: list[str | Path]) -> TarIndex:
+        """tar 群の索引を作る（``<tar>.index.json`` にキャッシュ）.
+
+        キャッシュは tar のサイズと mtime が一致する場合のみ再利用する。
+
+        Args:
+            tar_paths: 非圧縮 tar のパスのリスト
+
+        Returns:
+            TarIndex
+        """
+        paths = [Path(p) for p in tar_paths]
+        members: dict[str, tuple[int, int, int]] = {}
+        for archive_id, path in enumerate(paths):
+            for name, (offset, size) in _load_or_build_member_table(path).items():
+                members[name] = (archive_id, offset, size)
+        return cls(paths, members)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.members
+
+    def names(self) -> list[str]:
+        """索引に含まれる全メンバー名."""
+        return list(self.members)
+
+    def size(self, name: str) -> int:
+        """メンバーのバイトサイズ."""
+        return self.members[name][2]
+
+    def _locate(self, name: str) -> tuple[int, int, int]:
+        """メンバーの (fd, データ先頭オフセット, サイズ)."""
+        archive_id, offset, size = self.members[name]
+        fd = self._fds.get(archive_id)
+        if fd is None:
+            fd = os.open(self.tar_paths[archive_id], os.O_RDONLY)
+            self._fds[archive_id] = fd
+        return fd, offset, size
+
+    def read_bytes(self, name: str) -> bytes:
+        """メンバーの中身を bytes で返す."""
+        fd, offset, size = self._locate(name)
+        buf = bytearray(size)
+        _pread_into(fd, memoryview(buf), offset)
+        return bytes(buf)
+
+    def read_array(self, name: str, dtype: np.dtype | type) -> np.ndarray:
+        """メンバーの中身を書き込み可能な 1D ndarray に直接読み込む."""
+        fd, offset, size = self._locate(name)
+        dtype = np.dtype(dtype)
+        arr = np.empty(size // dtype.itemsize, dtype=dtype)
+        _pread_into(fd, memoryview(arr).cast("B"), offset)
+        return arr
+
+    def open(self, name: str) -> BinaryIO:
+        """メンバーを読み取り専用のファイルオブジェクトとして開く."""
+        return io.BytesIO(self.read_bytes(name))
+
+    def extract(self, name: str, dst: str | Path) -> Path:
+        """メンバー1つをファイルに書き出す."""
+        dst = Path(dst)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        fd, offset, size = self._locate(name)
+        with open(dst, "wb") as out:
+            end = offset + size
+            while offset < end:
+                chunk = os.pread(fd, min(end - offset, 4 * 1024 * 1024), offset)
+                if not chunk:
+                    break
+                out.write(chunk)
+                offset += len(chunk)
+        return dst
+
+    def close(self) -> None:
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+
+
+def _pread_into(fd: int, buf: memoryview, offset: int) -> None:
+    """fd の offset から buf を埋める（ファイルオフセットは動かさない）."""
+    pos = 0
+    while pos < len(buf):
+        if hasattr(os, "preadv"):
+            n = os.preadv(fd, [buf[pos:]], offset + pos)
+        else:
+            chunk = os.pread(fd, len(buf) - pos, offset + pos)
+            n = len(chunk)
+            buf[pos:pos + n] = chunk
+        if n == 0:
+            raise EOFError(f"Unexpected end of archive at offset {offset + pos}")
+        pos += n
+
+
+def _load_or_build_member_table(tar_path: Path) -> dict[str, tuple[int, int]]:
+    """1つの tar のメンバー表（名前 → (offset, size)）をキャッシュ付きで取得."""
+    stat = tar_path.stat()
+    cache_path = tar_path.with_name(tar_path.name + ".index.json")
+
+    if cache_path.exists():
+        with open(cache_path) as f:
+            cached = json.load(f)
+        if (
+            cached.get("version") == _INDEX_VERSION
+            and cached.get("size") == stat.st_size
+            and cached.get("mtime") == stat.st_mtime
+        ):
+            return {name: tuple(v) for name, v in cached["members"].items()}
+
+    members: dict[str, tuple[int, int]] = {}
+    # "r:" = 非圧縮のみ。圧縮 tar はここで ReadError になる（repack_archive を使う）
+    with tarfile.open(tar_path, "r:") as tar:
+        for info in tar:
+            if info.isfile():
+                members[_normalize_member_name(info.name)] = (info.offset_data, info.size)
+
+    with open(cache_path, "w") as f:
+        json.dump(
+            {
+                "version": _INDEX_VERSION,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "members": members,
+            },
+            f,
+        )
+    return members
+
+
+def load_nuscenes_from_archive(
+    tar_paths: list[str | Path],
+    version: str = "v1.0-mini",
+    cache_dir: str | Path = "data/cache/nuscenes_tables",
+    verbose: bool = False,
+) -> NuScenes:
+    """非圧縮 tar から直接 NuScenes インスタンスを作る.
+
+    devkit はテーブル JSON と map PNG をファイルシステムから読むため、
+    これら（数十 MB 程度）だけを ``cache_dir`` に書き出す。
+    点群・画像・lidarseg ラベルは展開せず、``nusc.archive`` 経由で読む。
+
+    lidarseg ラベルは devkit がファイル数をレコード数と照合するので、
+    ``cache_dir`` 側には同名の空ファイルだけを置く。
+
+    Args:
+        tar_paths: 非圧縮 tar のパスのリスト（本体 + lidarseg パック等）
+        version: nuScenes バージョン
+        cache_dir: テーブル類の書き出し先（= NuScenes の dataroot）
+        verbose: NuScenes のロードログを出すか
+
+    Returns:
+        ``archive`` 属性に TarIndex を持つ NuScenes インスタンス
+    """
+    from nuscenes.nuscenes import NuScenes
+
+    index = TarIndex.build(tar_paths)
+    cache_dir = Path(cache_dir)
+
+    for name in index.names():
+        dst = cache_dir / name
+        if name.endswith(".json") or name.startswith("maps/"):
+            if not dst.exists() or dst.stat().st_size != index.size(name):
+                index.extract(name, dst)
+        elif name.startswith(("lidarseg/", "panoptic/")) and not dst.exists():
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            dst.touch()
+
+    nusc = NuScenes(version=version, dataroot=str(cache_dir), verbose=verbose)
+    nusc.archive = index
+    return nusc
+
+
+def _get_archive(nusc: NuScenes, filename: str) -> TarIndex | None:
+    archive = getattr(nusc, "archive", None)
+    if archive is not None and filename in archive:
+        return archive
+    return None
+
+
+def read_dataroot_array(
+    nusc: NuScenes,
+    filename: str,
+    dtype: np.dtype | type,
+) -> np.ndarray:
+    """dataroot 相対パスのバイナリを 1D ndarray として読む（アーカイブ対応）.
+
+    Args:
+        nusc: NuScenes instance
+        filename: dataroot からの相対パス（sample_data["filename"] 等）
+        dtype: 要素の dtype
+
+    Returns:
+        (N,) ndarray
+    """
+    archive = _get_archive(nusc, filename)
+    if archive is not None:
+        arr = archive.read_array(filename, dtype)
+    else:
+        arr = np.fromfile(Path(nusc.dataroot) / filename, dtype=dtype)
+    perf.count("bytes_read", arr.nbytes)
+    return arr
+
+
+def open_dataroot_file(nusc: NuScenes, filename: str) -> BinaryIO:
+    """dataroot 相対パスのファイルをバイナリモードで開く（アーカイブ対応）."""
+    archive = _get_archive(nusc, filename)
+    if archive is not None:
+        return archive.open(filename)
+    return open(Path(nusc.dataroot) / filename, "rb")
+
+
+def copy_dataroot_file(nusc: NuScenes, filename: str, dst: str | Path) -> Path:
+    """dataroot 相対パスのファイルを dst にコピーする（アーカイブ対応）."""
+    archive = _get_archive(nusc, filename)
+    if archive is not None:
+        dst = archive.extract(filename, dst)
+    else:
+        shutil.copy2(Path(nusc.dataroot) / filename, dst)
+        dst = Path(dst)
+    nbytes = dst.stat().st_size
+    perf.count("bytes_read", nbytes)
+    perf.count("bytes_written", nbytes)
+    return dst
@@ -0,0 +1,85 @@
+"""投影後のラスタライズ（scatter-min・円のスタンプ）のバックエンド切り替え.
+
+``project_lidar_to_depth`` / ``project_lidar_to_mask`` / ``create_label_overlay`` などは
+投影（行列1回）までを共通の NumPy で行い、画素への書き込みをバックエンドに任せる。
+入力が同じなので、どのバックエンドでも出力はビット単位で一致する
+（``scripts/benchmark.py --backends`` で golden と照合する）。
+
+* ``numpy``: リファレンス実装（``np.minimum.at`` とフットプリントのオフセットごとの一括書き込み）
+* ``numba``: 行ごとに ``prange`` で並列化した JIT カーネル（要 numba）
+* ``torch``: CPU テンソルの ``scatter_reduce``。複数フレームを1回の scatter でまとめて処理する
+
+選択は ``set_backend`` / ``use_backend``、または環境変数 ``NUSCENES_GS_BACKEND``。
+"""
+
+from __future__ import annotations
+
+import importlib
+import os
+from contextlib import contextmanager
+from typing import Iterator
+
+from .base import Backend
+
+BACKENDS = ("numpy", "numba", "torch")
+DEFAULT_BACKEND = "numpy"
+
+_MODULES = {
+    "numpy": "numpy_backend",
+    "numba": "numba_backend",
+    "torch": "torch_backend",
+}
+
+_instances: dict[str, Backend] = {}
+_active: str | None = None
+
+
+def load_backend(name: str) -> Backend:
+    """バックエンドを生成（同じ名前は使い回す）.
+
+    Raises:
+        ValueError: 未知の名前
+        ImportError: numba / torch が入っていない
+    """
+    if name not in _MODULES:
+        raise ValueError(f"Unknown backend: {name} (expected one of {BACKENDS})")
+    if name not in _instances:
+        module = importlib.import_module(f".{_MODULES[name]}", __name__)
+        _instances[name] = module.create_backend()
+    return _instances[name]
+
+
+def get_backend() -> Backend:
+    """現在のバックエンド（未設定なら ``NUSCENES_GS_BACKEND``、既定は numpy）."""
+    return load_backend(_active or os.environ.get("NUSCENES_GS_BACKEND", DEFAULT_BACKEND))
+
+
+def set_backend(name: str) -> None:
+    """以降の処理で使うバックエンドを切り替える（読み込めることをここで確認する）."""
+    global _active
+    load_backend(name)
+    _active = name
+
+
+@contextmanager
+def use_backend(name: str) -> Iterator[Backend]:
+    """ブロック内だけバックエンドを切り替える."""
+    global _active
+    prev = _active
+    set_backend(name)
+    try:
+        yield get_backend()
+    finally:
+        _active = prev
+
+
+def available_backends() -> list[str]:
+    """この環境で読み込めるバックエンド名."""
+    names = []
+    for name in BACKENDS:
+        try:
+            load_backend(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
@@ -0,0 +1,82 @@
+"""バックエンドの共通インターフェース.
+
+カーネルは画素番号・画素座標まで求めた後の書き込みだけを受け持つ:
+
+* ``scatter_min``: 画素ごとの最小値（深度マップの z-buffer）
+* ``stamp``: 各中心にフットプリント（円）を置いた二値画像（LiDAR マスク）
+* ``stamp_owner``: 画素ごとに、そこを覆うフットプリントのうち番号最大の点（色付きオーバーレイ）
+
+中心はすべて画像内にある前提（範囲外の判定は呼び出し側で行う）。
+"""
+
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+class Backend(ABC):
+    """ラスタライズカーネルの集合. サブクラスが単一フレーム版を実装する."""
+
+    name = "base"
+
+    @abstractmethod
+    def scatter_min(self, pixel: np.ndarray, values: np.ndarray, image_shape: tuple[int, int]) -> np.ndarray:
+        """画素ごとの values の最小値.
+
+        Args:
+            pixel: (N,) int64 flat pixel index（v * W + u, 画像内）
+            values: (N,) float32 正の値
+            image_shape: (height, width)
+
+        Returns:
+            (H, W) float32, 点のない画素は 0
+        """
+
+    def scatter_min_batch(
+        self,
+        pixels: list[np.ndarray],
+        values: list[np.ndarray],
+        image_shape: tuple[int, int],
+    ) -> list[np.ndarray]:
+        """同じ画像サイズの複数フレーム分の ``scatter_min``（既定はフレームごとに呼ぶ）."""
+        return [self.scatter_min(p, v, image_shape) for p, v in zip(pixels, values)]
+
+    @abstractmethod
+    def stamp(self, image_shape: tuple[int, int], centers: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """各中心にフットプリントを置いた二値画像.
+
+        Args:
+            image_shape: (height, width)
+            centers: (N, 2) int64 [u, v]（画像内）
+            offsets: (K, 2) int64 フットプリントの画素オフセット [dy, dx]
+
+        Returns:
+            (H, W) bool
+        """
+
+    @abstractmethod
+    def stamp_owner(self, image_shape: tuple[int, int], centers: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """画素ごとに、そこを覆うフットプリントのうち番号が最大の点.
+
+        Returns:
+            (H, W) int32, どの点にも覆われない画素は -1
+        """
+
+
+def footprint_rows(offsets: np.ndarray) -> tuple[int, np.ndarray, np.ndarray]:
+    """フットプリントを行ごとの列範囲 [dx_lo, dx_hi] に直す（円なので各行は連続）.
+
+    Returns:
+        radius: 行方向の半径
+        dx_lo, dx_hi: (2 * radius + 1,) int64, dy = -radius ... radius の順
+    """
+    radius = int(np.abs(offsets[:, 0]).max()) if len(offsets) else 0
+    dx_lo = np.zeros(2 * radius + 1, dtype=np.int64)
+    dx_hi = np.full(2 * radius + 1, -1, dtype=np.int64)
+    for dy in range(-radius, radius + 1):
+        dx = offsets[offsets[:, 0] == dy, 1]
+        if len(dx):
+            dx_lo[dy + radius], dx_hi[dy + radius] = dx.min(), dx.max()
+    return radius, dx_lo, dx_hi
@@ -0,0 +1,112 @@
+"""Numba JIT カーネル（出力画像の行ごとに ``prange`` で並列化）.
+
+各反復は出力の1行だけに書くので、scatter-min もスタンプもスレッド間で競合しない。
+点は事前に行番号で counting sort しておき、各行は自分に関係する点の範囲だけを見る。
+"""
+
+from __future__ import annotations
+
+import numpy as np
+from numba import njit, prange
+
+from .base import Backend, footprint_rows
+
+
+@njit(cache=True)
+def _row_buckets(rows, h):
+    """行番号で点を並べ替えた順序と、行ごとの開始位置（starts[r]:starts[r + 1]）."""
+    starts = np.zeros(h + 1, dtype=np.int64)
+    for r in rows:
+        starts[r + 1] += 1
+    for r in range(h):
+        starts[r + 1] += starts[r]
+    fill = starts[:-1].copy()
+    order = np.empty(len(rows), dtype=np.int64)
+    for i in range(len(rows)):
+        r = rows[i]
+        order[fill[r]] = i
+        fill[r] += 1
+    return starts, order
+
+
+@njit(parallel=True, cache=True)
+def _scatter_min(pixel, values, h, w):
+    starts, order = _row_buckets(pixel // w, h)
+    out = np.zeros(h * w, dtype=np.float32)
+    for r in prange(h):
+        for j in range(starts[r], starts[r + 1]):
+            i = order[j]
+            p = pixel[i]
+            if out[p] == 0 or values[i] < out[p]:
+                out[p] = values[i]
+    return out
+
+
+@njit(parallel=True, cache=True)
+def _stamp(h, w, cu, cv, radius, dx_lo, dx_hi):
+    starts, order = _row_buckets(cv, h)
+    out = np.zeros((h, w), dtype=np.bool_)
+    for y in prange(h):
+        for dy in range(-radius, radius + 1):
+            cy = y - dy
+            if cy < 0 or cy >= h:
+                continue
+            lo = dx_lo[dy + radius]
+            hi = dx_hi[dy + radius]
+            for j in range(starts[cy], starts[cy + 1]):
+                cx = cu[order[j]]
+                for x in range(max(cx + lo, 0), min(cx + hi, w - 1) + 1):
+                    out[y, x] = True
+    return out
+
+
+@njit(parallel=True, cache=True)
+def _stamp_owner(h, w, cu, cv, radius, dx_lo, dx_hi):
+    starts, order = _row_buckets(cv, h)
+    out = np.full((h, w), -1, dtype=np.int32)
+    for y in prange(h):
+        for dy in range(-radius, radius + 1):
+            cy = y - dy
+            if cy < 0 or cy >= h:
+                continue
+            lo = dx_lo[dy + radius]
+            hi = dx_hi[dy + radius]
+            for j in range(starts[cy], starts[cy + 1]):
+                i = order[j]
+                cx = cu[i]
+                for x in range(max(cx + lo, 0), min(cx + hi, w - 1) + 1):
+                    if i > out[y, x]:
+                        out[y, x] = i
+    return out
+
+
+class NumbaBackend(Backend):
+    name = "numba"
+
+    def scatter_min(self, pixel: np.ndarray, values: np.ndarray, image_shape: tuple[int, int]) -> np.ndarray:
+        h, w = image_shape
+        out = _scatter_min(
+            np.ascontiguousarray(pixel, dtype=np.int64), np.ascontiguousarray(values, dtype=np.float32), h, w
+        )
+        return out.reshape(h, w)
+
+    def stamp(self, image_shape: tuple[int, int], centers: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        return _stamp(*image_shape, *_split_centers(centers), *footprint_rows(offsets))
+
+    def stamp_owner(self, image_shape: tuple[int, int], centers: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        return _stamp_owner(*image_shape, *_split_centers(centers), *footprint_rows(offsets))
+
+
+def _split_centers(centers: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    centers = np.asarray(centers, dtype=np.int64).reshape(-1, 2)
+    return np.ascontiguousarray(centers[:, 0]), np.ascontiguousarray(centers[:, 1])
+
+
+def create_backend() -> Backend:
+    backend = NumbaBackend()
+    # JIT（キャッシュの読み込み）を生成時に済ませ、最初のフレームの処理時間に含めない
+    offsets = np.zeros((1, 2), dtype=np.int64)
+    backend.scatter_min(np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.float32), (1, 1))
+    backend.stamp((1, 1), np.zeros((1, 2), dtype=np.int64), offsets)
+    backend.stamp_owner((1, 1), np.zeros((1, 2), dtype=np.int64), offsets)
+    return backend
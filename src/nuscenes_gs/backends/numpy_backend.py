@@ -0,0 +1,54 @@
+"""リファレンス実装（NumPy のみ）."""
+
+from __future__ import annotations
+
+import numpy as np
+
+from .base import Backend
+
+
+class NumpyBackend(Backend):
+    name = "numpy"
+
+    def scatter_min(self, pixel: np.ndarray, values: np.ndarray, image_shape: tuple[int, int]) -> np.ndarray:
+        h, w = image_shape
+        out = np.full(h * w, np.inf, dtype=np.float32)
+        np.minimum.at(out, pixel, values)
+        out[np.isinf(out)] = 0
+        return out.reshape(h, w)
+
+    def stamp(self, image_shape: tuple[int, int], centers: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        canvas, base, pw, pad = _padded_canvas(image_shape, centers, offsets, False)
+        # オフセットごとに全点を一括で書く（余白付きなので範囲チェック不要）
+        for dy, dx in offsets:
+            canvas[base + (dy * pw + dx)] = True
+        return _crop(canvas, image_shape, pw, pad)
+
+    def stamp_owner(self, image_shape: tuple[int, int], centers: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        canvas, base, pw, pad = _padded_canvas(image_shape, centers, offsets, -1)
+        point_idx = np.arange(len(centers), dtype=np.int32)
+        for dy, dx in offsets:
+            flat = base + (dy * pw + dx)
+            # 同じ画素に落ちる点が複数あっても番号の昇順に書くので、最後（最大）の点が残る
+            canvas[flat] = np.maximum(canvas[flat], point_idx)
+        return _crop(canvas, image_shape, pw, pad)
+
+
+def _padded_canvas(image_shape, centers, offsets, fill):
+    """フットプリント半径分の余白を付けた 1 次元キャンバスと各中心の flat index."""
+    h, w = image_shape
+    pad = int(np.abs(offsets).max()) if len(offsets) else 0
+    pw = w + 2 * pad
+    dtype = np.bool_ if isinstance(fill, bool) else np.int32
+    canvas = np.full((h + 2 * pad) * pw, fill, dtype=dtype)
+    base = (centers[:, 1] + pad) * pw + centers[:, 0] + pad
+    return canvas, base, pw, pad
+
+
+def _crop(canvas, image_shape, pw, pad):
+    h, w = image_shape
+    return canvas.reshape(h + 2 * pad, pw)[pad:pad + h, pad:pad + w]
+
+
+def create_backend() -> Backend:
+    return NumpyBackend()
@@ -0,0 +1,74 @@
+"""PyTorch（CPU テンソル）実装.
+
+``scatter_min_batch`` は全フレームの点を (フレーム, 画素) の通し番号に直して
+1回の ``scatter_reduce(amin)`` で処理する。スタンプは (点, オフセット) の全組を
+1つの index テンソルにして一括で書く。
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import torch
+
+from .base import Backend
+
+
+class TorchBackend(Backend):
+    name = "torch"
+
+    def scatter_min(self, pixel: np.ndarray, values: np.ndarray, image_shape: tuple[int, int]) -> np.ndarray:
+        return self.scatter_min_batch([pixel], [values], image_shape)[0]
+
+    def scatter_min_batch(
+        self,
+        pixels: list[np.ndarray],
+        values: list[np.ndarray],
+        image_shape: tuple[int, int],
+    ) -> list[np.ndarray]:
+        if not pixels:
+            return []
+        h, w = image_shape
+        n_frames = len(pixels)
+        frame = torch.repeat_interleave(
+            torch.arange(n_frames, dtype=torch.int64), torch.tensor([len(p) for p in pixels], dtype=torch.int64)
+        )
+        index = torch.from_numpy(np.concatenate(pixels).astype(np.int64, copy=False)) + frame * (h * w)
+        src = torch.from_numpy(np.concatenate(values).astype(np.float32, copy=False))
+
+        out = torch.full((n_frames * h * w,), float("inf"), dtype=torch.float32)
+        out.scatter_reduce_(0, index, src, reduce="amin", include_self=True)
+        out[torch.isinf(out)] = 0
+        return list(out.view(n_frames, h, w).numpy())
+
+    def stamp(self, image_shape: tuple[int, int], centers: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        index, shape, pad = _stamp_index(image_shape, centers, offsets)
+        canvas = torch.zeros(shape[0] * shape[1], dtype=torch.bool)
+        canvas[index.reshape(-1)] = True
+        return _crop(canvas, image_shape, shape, pad)
+
+    def stamp_owner(self, image_shape: tuple[int, int], centers: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        index, shape, pad = _stamp_index(image_shape, centers, offsets)
+        owner = torch.arange(len(index), dtype=torch.int64)[:, None].expand_as(index)
+        canvas = torch.full((shape[0] * shape[1],), -1, dtype=torch.int64)
+        canvas.scatter_reduce_(0, index.reshape(-1), owner.reshape(-1), reduce="amax", include_self=True)
+        return _crop(canvas, image_shape, shape, pad).astype(np.int32)
+
+
+def _stamp_index(image_shape, centers, offsets):
+    """余白付きキャンバス上の (点, オフセット) ごとの flat index（(N, K) テンソル）."""
+    h, w = image_shape
+    pad = int(np.abs(offsets).max()) if len(offsets) else 0
+    shape = (h + 2 * pad, w + 2 * pad)
+    centers = torch.from_numpy(np.asarray(centers, dtype=np.int64).reshape(-1, 2))
+    base = (centers[:, 1] + pad) * shape[1] + centers[:, 0] + pad
+    delta = torch.from_numpy(np.asarray(offsets, dtype=np.int64) @ np.array([shape[1], 1], dtype=np.int64))
+    return base[:, None] + delta[None, :], shape, pad
+
+
+def _crop(canvas, image_shape, shape, pad):
+    h, w = image_shape
+    return canvas.view(shape)[pad:pad + h, pad:pad + w].numpy().copy()
+
+
+def create_backend() -> Backend:
+    return TorchBackend()
@@ -0,0 +1,250 @@
+"""LiDAR レイの free-space carving による静的点群からの動的残留物の除去.
+
+lidarseg で静的とラベルされた点にも、停車後に動き出した車や誤ラベルの物体が
+残り、深度教師（``project_lidar_to_depth``）や集約した点群に入り込む。ここでは
+各スイープのセンサ → 点のレイをボクセルグリッド上で 3D DDA（Amanatides-Woo）で
+辿り、他のスイープで「レイが素通りした（空いていた）」回数の多いボクセルの点を落とす。
+
+* DDA はスイープ内の全レイを同時に1ボクセルずつ進める（ループはステップ数だけ）
+* 記録するのは静的点のあるボクセルだけで、その集合は外接箱上のビット列で持つ
+  （ステップごとの所属判定が O(1) の配列参照になる）
+* 各ボクセルについて「素通りしたスイープ数」と「点が返ってきたスイープ数」を数え、
+  素通りが min_free 回以上かつ割合が free_ratio 以上なら carve する
+* 地面系のクラス（かすめるレイで誤って carve されやすい）は落とさない
+
+結果は ``carve_free_space`` の dict（ボクセル一辺・グリッド原点・carve したボクセル）で、
+``carved_point_mask`` で任意の点群に適用できる。
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from . import perf
+from .masks import DEFAULT_DYNAMIC_CLASSES, load_lidar_points_and_labels, transform_lidar_to_world
+from .poses import make_transform
+
+if TYPE_CHECKING:
+    from nuscenes.nuscenes import NuScenes
+
+# かすめるレイで誤って carve されやすいので落とさない lidarseg クラス
+# driveable_surface(24), other_flat(25), sidewalk(26), terrain(27)
+DEFAULT_PROTECTED_CLASSES = (24, 25, 26, 27)
+
+# 候補から除くクラス: noise(0) と vehicle.ego(31)
+_IGNORED_CLASSES = (0, 31)
+
+
+def _voxel_index(points: np.ndarray, grid_origin: np.ndarray, voxel_size: float) -> np.ndarray:
+    return np.floor((points - grid_origin) / voxel_size).astype(np.int64)
+
+
+class _OccupancyGrid:
+    """候補ボクセルの集合を、その外接箱上のビット列で持つ（O(1) で所属判定できるハッシュ）."""
+
+    def __init__(self, ijk: np.ndarray):
+        self.lo = ijk.min(axis=0)
+        self.hi = ijk.max(axis=0)
+        self.shape = self.hi - self.lo + 1
+        self.flat = np.unique(self.flatten(ijk[:, 0], ijk[:, 1], ijk[:, 2]))
+        self.bits = np.zeros((int(np.prod(self.shape)) + 7) // 8, dtype=np.uint8)
+        np.bitwise_or.at(self.bits, self.flat >> 3, (1 << (self.flat & 7)).astype(np.uint8))
+
+    def flatten(self, i: np.ndarray, j: np.ndarray, k: np.ndarray) -> np.ndarray:
+        return ((i - self.lo[0]) * self.shape[1] + (j - self.lo[1])) * self.shape[2] + (k - self.lo[2])
+
+    def lookup(self, i: np.ndarray, j: np.ndarray, k: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """(i, j, k) が候補かどうかと flat index（候補でなければ不定）."""
+        inside = (
+            (i >= self.lo[0]) & (i <= self.hi[0])
+            & (j >= self.lo[1]) & (j <= self.hi[1])
+            & (k >= self.lo[2]) & (k <= self.hi[2])
+        )
+        flat = np.where(inside, self.flatten(i, j, k), 0)
+        hit = inside & ((self.bits[flat >> 3] >> (flat & 7)) & 1).astype(bool)
+        return hit, flat
+
+
+def _traverse_rays(
+    origin: np.ndarray,
+    endpoints: np.ndarray,
+    grid_origin: np.ndarray,
+    voxel_size: float,
+    occupancy: _OccupancyGrid,
+    end_margin: int = 1,
+) -> np.ndarray:
+    """1つのセンサ位置からのレイを 3D DDA で同時に辿り、素通りした候補ボクセル（flat index）を返す.
+
+    終点ボクセルからチェビシェフ距離 end_margin 以内に入ったレイはそこで止める。
+    """
+    g_origin = (origin - grid_origin) / voxel_size
+    direction = (endpoints - grid_origin) / voxel_size - g_origin  # ボクセル単位, t ∈ [0, 1]
+    start = np.floor(g_origin).astype(np.int64)
+    end = np.floor(g_origin + direction).astype(np.int64)
+
+    # 終点がセンサのすぐ近くのレイは辿らない
+    keep = np.abs(end - start).max(axis=1) > end_margin
+    direction, end = direction[keep], end[keep]
+    n = len(direction)
+
+    # 軸ごとの 1 次元配列で持つ（(N, 3) の fancy index より速い）
+    cur = [np.full(n, start[a]) for a in range(3)]
+    ends = [end[:, a].copy() for a in range(3)]
+    steps, t_max, t_delta = [], [], []
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for a in range(3):
+            d = direction[:, a]
+            steps.append(np.sign(d).astype(np.int64))
+            inv = np.where(d != 0, 1.0 / d, np.inf)
+            t_max.append(np.where(d != 0, (start[a] + (d > 0) - g_origin[a]) * inv, np.inf))
+            t_delta.append(np.abs(inv))
+
+    visited = []
+    while n:
+        # 最も近い境界を越えて隣のボクセルへ
+        mx = (t_max[0] <= t_max[1]) & (t_max[0] <= t_max[2])
+        my = ~mx & (t_max[1] <= t_max[2])
+        mz = ~(mx | my)
+        crossed = np.where(mx, t_max[0], np.where(my, t_max[1], t_max[2]))
+        for a, m in enumerate((mx, my, mz)):
+            cur[a] += steps[a] * m
+            np.add(t_max[a], t_delta[a], out=t_max[a], where=m)
+
+        chebyshev = np.maximum(np.maximum(np.abs(cur[0] - ends[0]), np.abs(cur[1] - ends[1])), np.abs(cur[2] - ends[2]))
+        active = (chebyshev > end_margin) & (crossed < 1.0)
+        if not active.all():
+            cur, ends, steps, t_max, t_delta = (
+                [x[active] for x in arrays] for arrays in (cur, ends, steps, t_max, t_delta)
+            )
+            n = len(cur[0])
+            if not n:
+                break
+
+        hit, flat = occupancy.lookup(*cur)
+        if hit.any():
+            visited.append(flat[hit])
+
+    perf.count("rays_traversed", len(endpoints))
+    if not visited:
+        return np.zeros(0, dtype=np.int64)
+    return np.unique(np.concatenate(visited))
+
+
+def carve_free_space(
+    sweeps: list[tuple[np.ndarray, np.ndarray, np.ndarray]],
+    voxel_size: float = 0.3,
+    min_free: int = 2,
+    free_ratio: float = 0.5,
+    end_margin: int = 1,
+    ray_decimation: float = 2.0,
+    dynamic_classes: list[int] | None = None,
+) -> dict:
+    """スイープ群のレイで素通りされたボクセルを求める.
+
+    Args:
+        sweeps: スイープごとの (センサ位置 (3,), 点 (N, 3) world, ラベル (N,))
+        voxel_size: ボクセル一辺 [m]
+        min_free: carve するのに必要な素通りスイープ数
+        free_ratio: carve するのに必要な 素通り / (素通り + 点が返った) スイープ数の割合
+        end_margin: 終点からこのボクセル数以内は素通りとみなさない
+        ray_decimation: 終点がこのボクセル数の立方体に入るレイはスイープごとに1本だけ辿る
+            （ほぼ同じボクセルを通るので結果はほとんど変わらず、レイ数が数分の一になる）
+        dynamic_classes: 候補から除く（もともと静的点群に入らない）クラス. If None, use default.
+
+    Returns:
+        {"voxel_size", "grid_origin": (3,), "carved": (C, 3) carve したボクセル座標}
+    """
+    if dynamic_classes is None:
+        dynamic_classes = DEFAULT_DYNAMIC_CLASSES
+    excluded = list(dynamic_classes) + list(_IGNORED_CLASSES)
+
+    all_points = np.concatenate([points for _, points, _ in sweeps] + [np.zeros((0, 3))])
+    grid_origin = all_points.min(axis=0) if len(all_points) else np.zeros(3)
+
+    # 候補 = 静的点のあるボクセル、点が返ってきたスイープ数も数える
+    with perf.stage("voxelize"):
+        static_ijk = [
+            _voxel_index(points[~np.isin(labels, excluded)], grid_origin, voxel_size) for _, points, labels in sweeps
+        ]
+        static_ijk = [ijk for ijk in static_ijk if len(ijk)]
+        if not static_ijk:
+            return {"voxel_size": voxel_size, "grid_origin": grid_origin, "carved": np.zeros((0, 3), dtype=np.int64)}
+        occupancy = _OccupancyGrid(np.concatenate(static_ijk))
+        hit_count = np.zeros(len(occupancy.flat), dtype=np.int64)
+        for ijk in static_ijk:
+            flat = np.unique(occupancy.flatten(ijk[:, 0], ijk[:, 1], ijk[:, 2]))
+            hit_count[np.searchsorted(occupancy.flat, flat)] += 1
+
+    free_count = np.zeros(len(occupancy.flat), dtype=np.int64)
+    with perf.stage("raycast"):
+        for origin, points, _ in sweeps:
+            if ray_decimation > 0 and len(points):
+                cell = _voxel_index(points, grid_origin, voxel_size * ray_decimation)
+                _, first = np.unique((cell[:, 0] << 42) | (cell[:, 1] << 21) | cell[:, 2], return_index=True)
+                points = points[first]
+            visited = _traverse_rays(origin, points, grid_origin, voxel_size, occupancy, end_margin=end_margin)
+            free_count[np.searchsorted(occupancy.flat, visited)] += 1
+
+    carved = (free_count >= min_free) & (free_count >= free_ratio * (free_count + hit_count))
+    if perf.enabled():
+        perf.count("voxels_carved", int(carved.sum()))
+    flat = occupancy.flat[carved]
+    ijk = np.stack(np.unravel_index(flat, occupancy.shape), axis=1) + occupancy.lo
+    return {"voxel_size": voxel_size, "grid_origin": grid_origin, "carved": ijk}
+
+
+def carved_point_mask(
+    points: np.ndarray,
+    carving: dict,
+    labels: np.ndarray | None = None,
+    protected_classes: tuple[int, ...] = DEFAULT_PROTECTED_CLASSES,
+) -> np.ndarray:
+    """carve されたボクセルに入る点の bool マスク（labels 指定時は保護クラスの点を除く）."""
+    carved = carving["carved"]
+    if len(points) == 0 or len(carved) == 0:
+        return np.zeros(len(points), dtype=bool)
+
+    grid = _OccupancyGrid(carved)
+    ijk = _voxel_index(points, carving["grid_origin"], carving["voxel_size"])
+    mask, _ = grid.lookup(ijk[:, 0], ijk[:, 1], ijk[:, 2])
+    if labels is not None:
+        mask &= ~np.isin(labels, protected_classes)
+    return mask
+
+
+def lidar_sensor_position(frame: dict) -> np.ndarray:
+    """フレームの LiDAR センサ位置（world）."""
+    T = make_transform(frame["lidar_ego_pose"]["translation"], frame["lidar_ego_pose"]["rotation"]) @ make_transform(
+        frame["lidar_calib"]["translation"], frame["lidar_calib"]["rotation"]
+    )
+    return T[:3, 3]
+
+
+def build_scene_carving(
+    nusc: NuScenes,
+    scene_token: str,
+    min_range: float = 2.0,
+    **params,
+) -> dict:
+    """シーンの全 keyframe の LiDAR で ``carve_free_space`` を行う.
+
+    Args:
+        nusc: NuScenes instance
+        scene_token: Scene token
+        min_range: LiDAR からこの距離 [m] 未満の点（自車のはね返り）はレイに使わない
+        **params: ``carve_free_space`` に渡す引数
+
+    Returns:
+        ``carve_free_space`` の出力
+    """
+    from .frames import build_scene_frame_index
+
+    sweeps = []
+    for frame in build_scene_frame_index(nusc, scene_token):
+        points_lidar, labels = load_lidar_points_and_labels(nusc, frame["lidar_token"])
+        keep = np.einsum("ij,ij->i", points_lidar, points_lidar) >= min_range ** 2
+        points_world = transform_lidar_to_world(points_lidar[keep], frame["lidar_ego_pose"], frame["lidar_calib"])
+        sweeps.append((lidar_sensor_position(frame), points_world, labels[keep]))
+    return carve_free_space(sweeps, **params)
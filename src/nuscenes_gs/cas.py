@@ -0,0 +1,261 @@
+"""エクスポート成果物の content-addressed blob store（``data/derived/.cas``）.
+
+``scene-XXXX_front`` / ``_front_lidar_masked`` / ``_front_bbox_masked`` / 深度付きなどの
+バリアントは同じ画像・同じ深度マップを持つことが多い。ここではファイルの中身を
+SHA-256 で1回だけ ``objects/`` に保存し、各バリアントのディレクトリにはハードリンクで
+置く（ディスク使用量と I/O がバリアント数に比例しなくなる）。
+
+* ``refs/`` は「成果物キー（入力とパラメータのハッシュ）→ 中身のハッシュ」の対応で、
+  キーがヒットすれば生成もコピーもせずにリンクだけ張る（``link_or_build``）
+* キーで管理しない出力（マスク・縮小版など）は ``absorb`` で後から重複排除する
+* どのバリアントからもリンクされていない blob（リンク数 1）は ``gc`` で消す
+
+blob のモードは変えない（読み取り専用にするとリンクした出力も書き込めなくなる）。
+ハードリンクは inode を共有するので、リンク先をその場で上書きすると他のバリアントの
+中身も変わる。エクスポータは書き始める前に ``prepare_output_dir`` で、以前 store 付きで
+書いたディレクトリ（``LINKED_MARKER`` がある）のリンクを外す。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Callable
+
+from . import perf
+
+DEFAULT_CAS_DIR = Path("data/derived/.cas")
+
+# ``absorb`` で重複排除する拡張子（transforms.json などの小さく書き換わるファイルは除く）
+ABSORB_SUFFIXES = (".jpg", ".png", ".ply", ".bin", ".npy")
+
+# store からリンクを置いた出力ディレクトリの印（再エクスポートでリンクを外す必要があるか）
+LINKED_MARKER = ".cas_linked"
+
+# 成果物キーに混ぜるバージョン. 生成コードや出力フォーマットを変えたら上げる
+# （古い ref がヒットして前の形式の blob がリンクされないようにする）
+ARTIFACT_VERSION = 1
+
+_CHUNK_SIZE = 1 << 20
+
+
+def artifact_key(*parts) -> str:
+    """成果物キー: ``ARTIFACT_VERSION`` と入力の識別子・パラメータ（JSON にできる値）の SHA-256."""
+    payload = json.dumps([ARTIFACT_VERSION, *parts], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def file_digest(path: str | Path) -> str:
+    """ファイルの中身の SHA-256."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_CHUNK_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def detach_links(directory: str | Path) -> int:
+    """directory 以下のハードリンク（リンク数 2 以上のファイル）を unlink する.
+
+    store から置いたファイルにエクスポートをやり直すとき、その場の上書きで
+    blob と他のバリアントを壊さないようにする。
+
+    Returns:
+        外したファイル数
+    """
+    count = 0
+    for path in Path(directory).rglob("*"):
+        if path.is_file() and not path.is_symlink() and path.stat().st_nlink > 1:
+            path.unlink()
+            count += 1
+    return count
+
+
+def prepare_output_dir(directory: str | Path, use_store: bool) -> None:
+    """エクスポートを書き始める前に、以前 store 付きで書いた出力のリンクを外す.
+
+    ``LINKED_MARKER`` のないディレクトリにはリンクがないので、ファイルを走査しない。
+    今回 store を使うなら印を置き、使わないなら外した後に印を消す。
+    """
+    marker = Path(directory) / LINKED_MARKER
+    if marker.exists():
+        detach_links(directory)
+        if not use_store:
+            marker.unlink()
+    elif use_store:
+        marker.touch()
+
+
+class BlobStore:
+    """ハードリンクで成果物を共有する content-addressed store.
+
+    レイアウト::
+
+        <root>/objects/ab/cdef...   中身（SHA-256 で命名）
+        <root>/refs/12/3456...      成果物キー → 中身の SHA-256（テキスト）
+
+    root とエクスポート先は同じファイルシステムに置く（別なら ``materialize`` はコピーになる）。
+    """
+
+    def __init__(self, root: str | Path = DEFAULT_CAS_DIR):
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.refs_dir = self.root / "refs"
+
+    def object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest[2:]
+
+    def _ref_path(self, key: str) -> Path:
+        return self.refs_dir / key[:2] / key[2:]
+
+    def lookup(self, key: str) -> str | None:
+        """成果物キーに対応する中身の SHA-256（未登録または blob が消えていれば None）."""
+        try:
+            digest = self._ref_path(key).read_text().strip()
+        except FileNotFoundError:
+            return None
+        return digest if self.object_path(digest).exists() else None
+
+    def record(self, key: str, digest: str) -> None:
+        """成果物キー → 中身の対応を登録する."""
+        path = self._ref_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(digest)
+        os.replace(tmp, path)
+
+    def put_file(self, path: str | Path) -> str:
+        """ファイルを store に入れ、path を blob へのハードリンクに置き換える.
+
+        同じ中身の blob がすでにあれば path をそれへのリンクにする（path の中身は捨てる）。
+
+        Returns:
+            中身の SHA-256
+        """
+        path = Path(path)
+        with perf.stage("cas_hash"):
+            digest = file_digest(path)
+        blob = self.object_path(digest)
+        if blob.exists():
+            self.materialize(digest, path)
+            if perf.enabled():
+                perf.count("cas_deduplicated_bytes", blob.stat().st_size)
+            return digest
+
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(path, blob)
+        except FileExistsError:
+            # 別プロセスが同じ中身を先に入れた
+            self.materialize(digest, path)
+            return digest
+        except OSError:
+            # 別ファイルシステム: blob をコピーで作る
+            shutil.copyfile(path, blob)
+        return digest
+
+    def materialize(self, digest: str, dst: str | Path) -> Path:
+        """blob を dst にハードリンクで置く（既存の dst は unlink してから）."""
+        dst = Path(dst)
+        blob = self.object_path(digest)
+        dst.unlink(missing_ok=True)
+        try:
+            os.link(blob, dst)
+        except OSError:
+            shutil.copyfile(blob, dst)
+            if perf.enabled():
+                perf.count("bytes_written", dst.stat().st_size)
+        perf.count("cas_links", 1)
+        return dst
+
+    def link_or_build(self, key: str, dst: str | Path, build: Callable[[Path], object]) -> bool:
+        """キーがヒットすれば blob をリンクし、なければ build(dst) で作って store に入れる.
+
+        Args:
+            key: ``artifact_key`` で作った成果物キー
+            dst: 出力パス
+            build: dst に成果物を書く関数
+
+        Returns:
+            キーがヒットした（build しなかった）か
+        """
+        dst = Path(dst)
+        digest = self.lookup(key)
+        if digest is not None:
+            self.materialize(digest, dst)
+            perf.count("cas_hits", 1)
+            return True
+
+        # 以前のエクスポートが残したリンクを上書きして blob を壊さないように
+        dst.unlink(missing_ok=True)
+        build(dst)
+        self.put(key, dst)
+        return False
+
+    def link_cached(self, outputs: dict[str, Path]) -> bool:
+        """複数の出力（キー → パス）のキーがすべてヒットすればリンクして True を返す.
+
+        1回の計算で複数のファイルを書く段階（深度 + 信頼度など）用。ヒットしなければ
+        何もしないので、計算して書いた後に ``put`` で登録する。
+        """
+        digests = {key: self.lookup(key) for key in outputs}
+        if any(digest is None for digest in digests.values()):
+            return False
+        for key, path in outputs.items():
+            self.materialize(digests[key], path)
+        perf.count("cas_hits", len(outputs))
+        return True
+
+    def put(self, key: str, path: str | Path) -> str:
+        """書き終えたファイルを store に入れ、成果物キーを登録する（``put_file`` + ``record``）."""
+        digest = self.put_file(path)
+        self.record(key, digest)
+        perf.count("cas_misses", 1)
+        return digest
+
+    def absorb(self, directory: str | Path, suffixes: tuple[str, ...] = ABSORB_SUFFIXES) -> int:
+        """directory 以下のファイルを store に入れてハードリンクに置き換える（重複排除）.
+
+        リンク数が 2 以上のファイルは store に入っているものとみなして読まない。
+
+        Returns:
+            新たに store に入れたファイル数
+        """
+        count = 0
+        for path in sorted(Path(directory).rglob("*")):
+            if path.suffix not in suffixes or not path.is_file() or path.is_symlink():
+                continue
+            if path.stat().st_nlink > 1:
+                continue
+            self.put_file(path)
+            count += 1
+        return count
+
+    def gc(self, dry_run: bool = False) -> dict:
+        """どのバリアントからもリンクされていない blob と、消えた blob を指す ref を削除する.
+
+        Returns:
+            {"objects": 削除した blob 数, "bytes": 解放したバイト数, "refs": 削除した ref 数}
+        """
+        removed = {"objects": 0, "bytes": 0, "refs": 0}
+        if self.objects_dir.exists():
+            for blob in self.objects_dir.glob("*/*"):
+                st = blob.stat()
+                if st.st_nlink > 1:
+                    continue
+                removed["objects"] += 1
+                removed["bytes"] += st.st_size
+                if not dry_run:
+                    blob.unlink()
+        if self.refs_dir.exists():
+            for ref in self.refs_dir.glob("*/*"):
+                digest = ref.read_text().strip()
+                blob = self.object_path(digest)
+                if not blob.exists() or (dry_run and blob.stat().st_nlink == 1):
+                    removed["refs"] += 1
+                    if not dry_run:
+                        ref.unlink()
+        return removed
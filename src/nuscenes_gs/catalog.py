@@ -0,0 +1,230 @@
+"""全シーンの統計（速度・停止率・旋回・動的物体数・lidarseg 有無・夜/雨）カタログ.
+
+シーンごとに sample の連結リストを辿る代わりに、sample_data / ego_pose /
+sample_annotation テーブルを1回ずつ配列化し、シーン番号で並べて一括集計する。
+速度は 0.5 秒固定ではなく実際のタイムスタンプ差から計算する。
+
+結果は列ごとの配列を持つ dict（``build_instance_tracks`` と同じ形）で、
+CSV（標準ライブラリ）または Parquet（pandas + pyarrow がある場合）にキャッシュする。
+"""
+
+from __future__ import annotations
+
+import csv
+import inspect
+import json
+import re
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from nuscenes.nuscenes import NuScenes
+
+# 動いている物体を表す annotation 属性
+MOVING_ATTRIBUTES = ("vehicle.moving", "cycle.with_rider", "pedestrian.moving")
+
+# 列名 → 型（CSV から読み戻すときに使う）
+CATALOG_COLUMNS = {
+    "scene_token": str,
+    "name": str,
+    "description": str,
+    "location": str,
+    "num_samples": int,
+    "duration_s": float,
+    "path_length_m": float,
+    "avg_speed_ms": float,
+    "max_speed_ms": float,
+    "stop_ratio": float,
+    "mean_yaw_rate_dps": float,
+    "dynamic_per_frame": float,
+    "moving_per_frame": float,
+    "lidarseg_ratio": float,
+    "night": bool,
+    "rain": bool,
+}
+
+
+def _yaw(quaternions: np.ndarray) -> np.ndarray:
+    """(N, 4) クォータニオン [w, x, y, z] の yaw 角 [rad]（一括）."""
+    w, x, y, z = quaternions.T
+    return np.arctan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z))
+
+
+def build_scene_catalog(
+    nusc: NuScenes,
+    camera: str = "CAM_FRONT",
+    stop_speed: float = 1.0,
+    dynamic_categories: list[str] | None = None,
+) -> dict[str, np.ndarray]:
+    """全シーンの統計を計算.
+
+    Args:
+        nusc: NuScenes instance
+        camera: ego 速度の計算に使う keyframe のカメラ
+        stop_speed: これ未満の速度 [m/s] を停止とみなす
+        dynamic_categories: 動的物体とみなす category 名の接頭辞. None の場合は
+            vehicle. / human. / cycle.
+
+    Returns:
+        CATALOG_COLUMNS の列ごとの (S,) 配列を持つ dict（nusc.scene の順）
+            stop_ratio: 停止していた時間の割合（時間重み）
+            mean_yaw_rate_dps: ヨーレートの絶対値の時間平均 [deg/s]
+            dynamic_per_frame / moving_per_frame: 1 sample あたりの動的 / 移動中 annotation 数
+            lidarseg_ratio: LIDAR_TOP の lidarseg ラベルがある sample の割合
+    """
+    if dynamic_categories is None:
+        from .masks import DEFAULT_DYNAMIC_CATEGORIES
+
+        dynamic_categories = DEFAULT_DYNAMIC_CATEGORIES
+    num_scenes = len(nusc.scene)
+    scene_idx = {scene["token"]: i for i, scene in enumerate(nusc.scene)}
+    sample_scene = {sample["token"]: scene_idx[sample["scene_token"]] for sample in nusc.sample}
+    sample_scene_arr = np.fromiter(sample_scene.values(), dtype=np.int64, count=len(sample_scene))
+
+    # 1. keyframe のカメラ → (scene, timestamp, ego pose)
+    pose_idx = {pose["token"]: i for i, pose in enumerate(nusc.ego_pose)}
+    cams = [sd for sd in nusc.sample_data if sd["is_key_frame"] and sd["channel"] == camera]
+    cam_scene = np.array([sample_scene[sd["sample_token"]] for sd in cams], dtype=np.int64)
+    cam_time = np.array([sd["timestamp"] for sd in cams], dtype=np.int64)
+    cam_pose = np.array([pose_idx[sd["ego_pose_token"]] for sd in cams], dtype=np.int64)
+
+    order = np.lexsort((cam_time, cam_scene))
+    cam_scene, cam_time, cam_pose = cam_scene[order], cam_time[order], cam_pose[order]
+    translation = np.array([nusc.ego_pose[i]["translation"] for i in cam_pose]).reshape(-1, 3)
+    yaw = _yaw(np.array([nusc.ego_pose[i]["rotation"] for i in cam_pose]).reshape(-1, 4))
+
+    # 2. 同じシーン内の隣接 keyframe 間の区間
+    same_scene = cam_scene[1:] == cam_scene[:-1]
+    interval_scene = cam_scene[1:][same_scene]
+    dt = (np.diff(cam_time) * 1e-6)[same_scene]
+    dist = np.linalg.norm(np.diff(translation[:, :2], axis=0), axis=1)[same_scene]
+    dyaw = ((np.diff(yaw) + np.pi) % (2 * np.pi) - np.pi)[same_scene]
+    speed = dist / np.maximum(dt, 1e-6)
+
+    duration = np.bincount(interval_scene, weights=dt, minlength=num_scenes)
+    path_length = np.bincount(interval_scene, weights=dist, minlength=num_scenes)
+    stopped = np.bincount(interval_scene, weights=dt * (speed < stop_speed), minlength=num_scenes)
+    turned = np.bincount(interval_scene, weights=np.abs(dyaw), minlength=num_scenes)
+    max_speed = np.zeros(num_scenes)
+    np.maximum.at(max_speed, interval_scene, speed)
+    safe_duration = np.maximum(duration, 1e-6)
+
+    # 3. annotation 数（sample あたり）
+    num_samples = np.bincount(sample_scene_arr, minlength=num_scenes)
+    moving_attrs = {attr["token"] for attr in nusc.attribute if attr["name"] in MOVING_ATTRIBUTES}
+    prefixes = tuple(dynamic_categories)
+    anns = nusc.sample_annotation
+    ann_scene = np.array([sample_scene[ann["sample_token"]] for ann in anns], dtype=np.int64)
+    ann_dynamic = np.array([ann["category_name"].startswith(prefixes) for ann in anns], dtype=bool)
+    ann_moving = np.array([not moving_attrs.isdisjoint(ann["attribute_tokens"]) for ann in anns], dtype=bool)
+    safe_samples = np.maximum(num_samples, 1)
+
+    # 4. lidarseg の有無
+    lidarseg_tokens = {rec["sample_data_token"] for rec in getattr(nusc, "lidarseg", [])}
+    has_lidarseg = np.array(
+        [sample["data"].get("LIDAR_TOP") in lidarseg_tokens for sample in nusc.sample], dtype=np.float64
+    )
+
+    descriptions = [scene["description"] for scene in nusc.scene]
+    return {
+        "scene_token": np.array([scene["token"] for scene in nusc.scene], dtype=object),
+        "name": np.array([scene["name"] for scene in nusc.scene], dtype=object),
+        "description": np.array(descriptions, dtype=object),
+        "location": np.array(
+            [nusc.get("log", scene["log_token"])["location"] for scene in nusc.scene], dtype=object
+        ),
+        "num_samples": num_samples,
+        "duration_s": duration,
+        "path_length_m": path_length,
+        "avg_speed_ms": path_length / safe_duration,
+        "max_speed_ms": max_speed,
+        "stop_ratio": stopped / safe_duration,
+        "mean_yaw_rate_dps": np.degrees(turned / safe_duration),
+        "dynamic_per_frame": np.bincount(ann_scene, weights=ann_dynamic, minlength=num_scenes) / safe_samples,
+        "moving_per_frame": np.bincount(ann_scene, weights=ann_moving, minlength=num_scenes) / safe_samples,
+        "lidarseg_ratio": np.bincount(sample_scene_arr, weights=has_lidarseg, minlength=num_scenes) / safe_samples,
+        "night": np.array(["night" in d.lower() for d in descriptions], dtype=bool),
+        # "train" / "terrain" などに一致しないよう単語単位で探す
+        "rain": np.array([re.search(r"\brain\b", d, re.I) is not None for d in descriptions], dtype=bool),
+    }
+
+
+def write_scene_catalog(catalog: dict[str, np.ndarray], path: str | Path) -> Path:
+    """カタログを CSV（.parquet 拡張子なら Parquet）に書く."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    if path.suffix == ".parquet":
+        try:
+            import pandas as pd
+        except ImportError as e:
+            raise ImportError("Parquet catalogs need pandas and pyarrow; use a .csv path instead") from e
+        pd.DataFrame({k: catalog[k] for k in CATALOG_COLUMNS}).to_parquet(path, index=False)
+        return path
+
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CATALOG_COLUMNS)
+        writer.writerows(zip(*(catalog[k].tolist() for k in CATALOG_COLUMNS)))
+    return path
+
+
+def load_scene_catalog(path: str | Path) -> dict[str, np.ndarray]:
+    """``write_scene_catalog`` で書いたカタログを列ごとの配列として読む."""
+    path = Path(path)
+    if path.suffix == ".parquet":
+        import pandas as pd
+
+        df = pd.read_parquet(path)
+        return {k: df[k].to_numpy() for k in CATALOG_COLUMNS}
+
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    catalog = {}
+    for key, kind in CATALOG_COLUMNS.items():
+        values = [row[key] for row in rows]
+        if kind is str:
+            catalog[key] = np.array(values, dtype=object)
+        elif kind is bool:
+            catalog[key] = np.array([v == "True" for v in values], dtype=bool)
+        else:
+            catalog[key] = np.array(values, dtype=kind)
+    return catalog
+
+
+def load_or_build_scene_catalog(
+    nusc: NuScenes,
+    cache_path: str | Path,
+    refresh: bool = False,
+    **kwargs,
+) -> dict[str, np.ndarray]:
+    """キャッシュが同じシーン集合・同じ引数で作られていればそれを読み、なければ計算して書く.
+
+    引数は ``<cache>.params.json`` に残し、既定値を補った上で比較する。
+
+    Args:
+        nusc: NuScenes instance
+        cache_path: キャッシュファイル（.csv / .parquet）
+        refresh: True ならキャッシュを無視して計算し直す
+        **kwargs: ``build_scene_catalog`` に渡す引数
+    """
+    cache_path = Path(cache_path)
+    params_path = cache_path.with_name(cache_path.name + ".params.json")
+    bound = inspect.signature(build_scene_catalog).bind(nusc, **kwargs)
+    bound.apply_defaults()
+    params = json.loads(json.dumps({k: v for k, v in bound.arguments.items() if k != "nusc"}))
+
+    if cache_path.exists() and params_path.exists() and not refresh:
+        with open(params_path) as f:
+            cached_params = json.load(f)
+        catalog = load_scene_catalog(cache_path)
+        if cached_params == params and set(catalog["scene_token"]) == {scene["token"] for scene in nusc.scene}:
+            return catalog
+
+    catalog = build_scene_catalog(nusc, **kwargs)
+    write_scene_catalog(catalog, cache_path)
+    with open(params_path, "w") as f:
+        json.dump(params, f, indent=2)
+    return catalog
@@ -0,0 +1,218 @@
+"""既知のポーズから COLMAP sparse model（cameras.bin / images.bin / points3D.bin）を書く.
+
+gsplat の simple_trainer や 3DGS 系の実装は COLMAP の sparse model を入力に取る。
+nuScenes はポーズが既知なので SfM は不要で、``compute_w2c``（OpenCV 規約）を
+そのまま COLMAP の画像ポーズ（world → camera）として書き、静的 LiDAR 点群を
+points3D.bin の初期点にする。
+
+フォーマットは COLMAP の ``read_write_model.py`` のバイナリ形式（little-endian）。
+nuScenes の画像は歪み補正済みなので、カメラモデルは PINHOLE（fx, fy, cx, cy）を使う。
+2D 観測（points2D・track）は持たないので空で書く。
+"""
+
+from __future__ import annotations
+
+import struct
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from . import perf
+
+if TYPE_CHECKING:
+    from nuscenes.nuscenes import NuScenes
+
+# COLMAP の camera model ID
+PINHOLE_MODEL_ID = 1
+
+# points3D.bin の1点分（track_length = 0）
+_POINT3D_DTYPE = np.dtype(
+    [
+        ("id", "<u8"),
+        ("xyz", "<f8", 3),
+        ("rgb", "u1", 3),
+        ("error", "<f8"),
+        ("track_length", "<u8"),
+    ]
+)
+
+
+def rotation_matrices_to_quaternions(R: np.ndarray) -> np.ndarray:
+    """(N, 3, 3) 回転行列を (N, 4) 単位クォータニオン [w, x, y, z] に変換（一括）.
+
+    対角成分が最大の分岐を選ぶ Shepperd の方法で、w が負にならないよう符号を揃える。
+
+    Args:
+        R: (N, 3, 3) rotation matrices
+
+    Returns:
+        (N, 4) quaternions [qw, qx, qy, qz]
+    """
+    R = np.asarray(R, dtype=np.float64)
+    m00, m11, m22 = R[:, 0, 0], R[:, 1, 1], R[:, 2, 2]
+    trace = m00 + m11 + m22
+    branch = np.argmax(np.stack([trace, m00, m11, m22], axis=1), axis=1)
+
+    q = np.empty((len(R), 4))
+    # trace が最大
+    s = np.sqrt(np.maximum(1.0 + trace, 1e-12)) * 2
+    q_w = np.stack(
+        [0.25 * s, (R[:, 2, 1] - R[:, 1, 2]) / s, (R[:, 0, 2] - R[:, 2, 0]) / s, (R[:, 1, 0] - R[:, 0, 1]) / s],
+        axis=1,
+    )
+    # m00 が最大
+    s = np.sqrt(np.maximum(1.0 + m00 - m11 - m22, 1e-12)) * 2
+    q_x = np.stack(
+        [(R[:, 2, 1] - R[:, 1, 2]) / s, 0.25 * s, (R[:, 0, 1] + R[:, 1, 0]) / s, (R[:, 0, 2] + R[:, 2, 0]) / s],
+        axis=1,
+    )
+    # m11 が最大
+    s = np.sqrt(np.maximum(1.0 + m11 - m00 - m22, 1e-12)) * 2
+    q_y = np.stack(
+        [(R[:, 0, 2] - R[:, 2, 0]) / s, (R[:, 0, 1] + R[:, 1, 0]) / s, 0.25 * s, (R[:, 1, 2] + R[:, 2, 1]) / s],
+        axis=1,
+    )
+    # m22 が最大
+    s = np.sqrt(np.maximum(1.0 + m22 - m00 - m11, 1e-12)) * 2
+    q_z = np.stack(
+        [(R[:, 1, 0] - R[:, 0, 1]) / s, (R[:, 0, 2] + R[:, 2, 0]) / s, (R[:, 1, 2] + R[:, 2, 1]) / s, 0.25 * s],
+        axis=1,
+    )
+
+    for b, candidate in enumerate((q_w, q_x, q_y, q_z)):
+        q[branch == b] = candidate[branch == b]
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    q[q[:, 0] < 0] *= -1
+    return q
+
+
+def write_cameras_bin(path: str | Path, intrinsics: np.ndarray, sizes: np.ndarray) -> None:
+    """cameras.bin を書く（camera_id は 1 始まりの連番）.
+
+    Args:
+        path: 出力パス
+        intrinsics: (C, 4) [fx, fy, cx, cy]
+        sizes: (C, 2) [width, height]
+    """
+    records = np.empty(
+        len(intrinsics),
+        dtype=[("camera_id", "<i4"), ("model_id", "<i4"), ("width", "<u8"), ("height", "<u8"), ("params", "<f8", 4)],
+    )
+    records["camera_id"] = np.arange(1, len(intrinsics) + 1)
+    records["model_id"] = PINHOLE_MODEL_ID
+    records["width"], records["height"] = sizes[:, 0], sizes[:, 1]
+    records["params"] = intrinsics
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(records)))
+        records.tofile(f)
+
+
+def write_images_bin(
+    path: str | Path,
+    w2c: np.ndarray,
+    camera_ids: np.ndarray,
+    names: list[str],
+) -> None:
+    """images.bin を書く（image_id は 1 始まりの連番、points2D は空）.
+
+    Args:
+        path: 出力パス
+        w2c: (N, 4, 4) world → camera（OpenCV 規約）
+        camera_ids: (N,) cameras.bin の camera_id
+        names: 画像ファイル名（images/ からの相対パス）
+    """
+    qvec = rotation_matrices_to_quaternions(w2c[:, :3, :3])
+    tvec = w2c[:, :3, 3]
+
+    # 名前が可変長なのでレコードごとに詰める（固定長部分は一括計算済み）
+    chunks = [struct.pack("<Q", len(names))]
+    for i, name in enumerate(names):
+        chunks.append(struct.pack("<i4d3di", i + 1, *qvec[i], *tvec[i], int(camera_ids[i])))
+        chunks.append(name.encode("utf-8") + b"\0")
+        chunks.append(struct.pack("<Q", 0))
+    with open(path, "wb") as f:
+        f.write(b"".join(chunks))
+
+
+def write_points3d_bin(path: str | Path, points: np.ndarray, colors: np.ndarray) -> None:
+    """points3D.bin を書く（point3D_id は 1 始まりの連番、track は空）.
+
+    Args:
+        path: 出力パス
+        points: (N, 3) world frame
+        colors: (N, 3) uint8 RGB
+    """
+    records = np.zeros(len(points), dtype=_POINT3D_DTYPE)
+    records["id"] = np.arange(1, len(points) + 1)
+    records["xyz"] = points
+    records["rgb"] = colors
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(records)))
+        records.tofile(f)
+    perf.count("bytes_written", 8 + records.nbytes)
+
+
+def export_colmap_model(
+    nusc: NuScenes,
+    frames: list[dict],
+    output_dir: str | Path,
+    dynamic_classes: list[int] | None = None,
+    voxel_size: float = 0.2,
+    points: np.ndarray | None = None,
+    transform: np.ndarray | None = None,
+) -> Path:
+    """シーンの COLMAP sparse model を ``output_dir/sparse/0/`` に書き出す.
+
+    画像は ``output_dir/images/{frame_idx:04d}.jpg`` にエクスポート済みである前提
+    （gsplat / 3DGS の COLMAP ローダが期待するレイアウト）。
+
+    Args:
+        nusc: NuScenes instance
+        frames: ``build_scene_frame_index`` の出力
+        output_dir: エクスポートディレクトリ
+        dynamic_classes: 初期点群から除外する semantic class IDs. If None, use default.
+        voxel_size: 初期点群のボクセル一辺 [m]
+        points: (N, 3) 集約済みの静的点（world）. 指定時は LiDAR を読み直さない
+        transform: (4, 4) 剛体変換（world → 正規化座標など）. 指定時は姿勢と点をこの座標で書く
+
+    Returns:
+        sparse model ディレクトリ（``output_dir/sparse/0``）
+    """
+    from .pointcloud import build_static_point_cloud
+
+    output_dir = Path(output_dir)
+    sparse_dir = output_dir / "sparse" / "0"
+    sparse_dir.mkdir(parents=True, exist_ok=True)
+
+    # intrinsics が同じフレームは同じ camera を共有する
+    intrinsics = np.array(
+        [[f["K"][0, 0], f["K"][1, 1], f["K"][0, 2], f["K"][1, 2], f["image_shape"][1], f["image_shape"][0]] for f in frames]
+    )
+    unique, camera_idx = np.unique(intrinsics, axis=0, return_inverse=True)
+    names = [f"{f['frame_idx']:04d}.jpg" for f in frames]
+
+    points, colors = build_static_point_cloud(
+        nusc,
+        frames,
+        [output_dir / "images" / name for name in names],
+        dynamic_classes=dynamic_classes,
+        voxel_size=voxel_size,
+        points=points,
+        transform=transform,
+    )
+    w2c = np.stack([f["w2c"] for f in frames])
+    if transform is not None:
+        w2c = w2c @ np.linalg.inv(transform)
+
+    with perf.stage("write"):
+        write_cameras_bin(sparse_dir / "cameras.bin", unique[:, :4], unique[:, 4:].astype(np.int64))
+        write_images_bin(
+            sparse_dir / "images.bin",
+            w2c,
+            camera_idx.reshape(-1) + 1,
+            names,
+        )
+        write_points3d_bin(sparse_dir / "points3D.bin", points, colors)
+
+    return sparse_dir
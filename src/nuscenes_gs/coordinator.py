@@ -0,0 +1,480 @@
+"""共有ファイルシステムだけで複数ノードにエクスポートを分散する作業キュー.
+
+スケジューラのない CPU ノード群で trainval 全体をエクスポートするためのもの。
+``runner.plan_pipeline`` の (ステージ, シーン, カメラ) ノードを作業項目として共有
+ディレクトリに書き出し、各ノードで同じコマンドを実行すれば重複なく全項目が終わる::
+
+    <queue>/
+        manifest.json          # パイプライン設定と全項目（最初に来たノードが1回だけ作る）
+        todo/<id>.json         # 未着手
+        claimed/<id>@<worker>.json  # 実行中（mtime がハートビート）
+        done/<id>.json         # 完了（成果物パス・所要時間・ワーカー）
+        failed/<id>.json       # max_attempts 回失敗
+        workers/<worker>       # ワーカーごとの生存時刻（ファイルシステムの時計の代わり）
+        index.json             # done/ を集約したグローバルな索引
+
+* 取得は ``todo/<id>.json`` → ``claimed/<id>@<worker>.json`` の rename。rename は原子的なので
+  同じ項目を取れるのは1ワーカーだけ
+* 実行中はハートビートスレッドが claim ファイルの mtime を更新し続ける。``stale_after`` 秒
+  更新のない claim（ノードが落ちた）はどのワーカーからでも ``todo/`` に戻される
+* 成果物は claim を持つワーカーが最終パスに直接書き（コマンドの ``{output}`` もそのまま
+  使える）、完了は rename で置く ``.complete.json`` で判定する。途中で落ちたノードの書きかけは
+  マーカーがないので成果物として扱われず、次に取ったワーカーが消して作り直す
+* claim には取得ごとのトークンを書き、マーカー・done/ の記録・claim の削除はその claim を
+  まだ持っている場合だけ行う。古いと判定された後も動いていたワーカーは何も公開しない
+* 時刻はノードの時計ではなく、共有ファイルシステム上で touch したファイルの mtime で比べる
+  （ノード間の時計のずれで claim を誤って古いと判定しない）
+"""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from .runner import COMPLETE_MARKER, PublishAborted, _execute, _load_nuscenes, _update_link, node_label, plan_pipeline
+
+MANIFEST = "manifest.json"
+INDEX = "index.json"
+STATES = ("todo", "claimed", "done", "failed")
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def item_id(node: dict) -> str:
+    """作業項目の ID（ステージ--シーン[--カメラ]）."""
+    parts = [node["stage"], node["scene"]] + ([node["camera"]] if node.get("camera") else [])
+    return "--".join(parts)
+
+
+def _write_json(path: Path, data: dict, tag: str) -> None:
+    """一時ファイルに書いてから rename する（他ノードから書きかけが見えない）."""
+    tmp = path.with_name(f".{path.name}.{tag}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2, default=str)
+    os.replace(tmp, path)
+
+
+def _read_json(path: Path) -> dict | None:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _fs_now(queue: Path, worker_id: str) -> float:
+    """共有ファイルシステムの現在時刻（workers/<worker_id> を touch した mtime）."""
+    path = queue / "workers" / worker_id
+    path.touch()
+    return path.stat().st_mtime
+
+
+def _last_touched(path: Path) -> float:
+    # rename で ctime が更新されるので、取得直後の claim が古い mtime のまま判定されることはない
+    st = path.stat()
+    return max(st.st_mtime, st.st_ctime)
+
+
+def init_queue(queue_dir: str | Path, config: dict, scenes: list[dict], force: bool = False,
+               stale_after: float = 300.0) -> dict:
+    """作業キューを作る（作成済みなら計画が同じことを確認するだけ）.
+
+    全ノードが同時に呼んでよい。``init.lock`` を O_EXCL で作れた1ノードだけが項目を書き、
+    最後に manifest.json を置く。他のノードは manifest.json が現れるまで待つ。
+    成果物が完了済みの項目は（force でなければ）最初から ``done/`` に入れる。
+
+    Args:
+        queue_dir: 共有ディレクトリ
+        config: ``load_pipeline`` の出力
+        scenes: 対象シーンの scene レコード
+        force: True なら完了済みの成果物も作り直す
+        stale_after: 作成中のノードが落ちたとみなす init.lock の経過時間 [s]
+
+    Returns:
+        manifest（config, items）
+
+    Raises:
+        ValueError: 既存のキューが別の計画（ステージ・シーン・パラメータ）で作られている
+    """
+    queue = Path(queue_dir)
+    for state in STATES + ("workers",):
+        (queue / state).mkdir(parents=True, exist_ok=True)
+    tag = f"init-{default_worker_id()}"
+
+    nodes = plan_pipeline(config, scenes)
+    items = []
+    for node in nodes:
+        items.append(
+            {
+                "id": item_id(node),
+                "stage": node["stage"],
+                "scene": node["scene"],
+                "scene_token": node["scene_token"],
+                "camera": node["camera"],
+                "key": node["key"],
+                "output": str(node["output"]),
+                "deps": [item_id(dep) for dep in node["deps"]],
+            }
+        )
+
+    manifest_path = queue / MANIFEST
+    lock = queue / "init.lock"
+    while not manifest_path.exists():
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            # 別ノードが作成中. 作成者が落ちていればロックを外してやり直す
+            try:
+                if _fs_now(queue, tag) - _last_touched(lock) > stale_after:
+                    lock.unlink(missing_ok=True)
+            except FileNotFoundError:
+                pass
+            time.sleep(1.0)
+            continue
+
+        try:
+            for item, node in zip(items, nodes):
+                if node["done"] and not force:
+                    _write_json(queue / "done" / f"{item['id']}.json", {**item, "worker": None, "seconds": None}, tag)
+                else:
+                    _write_json(queue / "todo" / f"{item['id']}.json", {**item, "attempts": 0}, tag)
+            _write_json(manifest_path, {"config": config, "items": items}, tag)
+        finally:
+            lock.unlink(missing_ok=True)
+        print(f"Queue created: {queue} ({len(items)} items)")
+
+    manifest = _read_json(manifest_path)
+    if [item["key"] for item in manifest["items"]] != [item["key"] for item in items]:
+        raise ValueError(
+            f"{queue} was created for a different plan (stages / scenes / params); use a new queue directory"
+        )
+    return manifest
+
+
+def scan_queue(queue_dir: str | Path) -> dict[str, str]:
+    """項目 ID → 状態（todo / claimed / done / failed / blocked）."""
+    queue = Path(queue_dir)
+    manifest = _read_json(queue / MANIFEST)
+    state: dict[str, str] = {}
+    for name in ("todo", "claimed", "failed", "done"):  # 後の状態を優先（done が最優先）
+        for path in (queue / name).glob("*.json"):
+            state[path.name[: -len(".json")].partition("@")[0]] = name
+
+    # 依存が失敗した（または blocked の）未着手項目は blocked（manifest はトポロジカル順）
+    for item in manifest["items"]:
+        if state.get(item["id"]) == "todo" and any(state.get(dep) in ("failed", "blocked") for dep in item["deps"]):
+            state[item["id"]] = "blocked"
+    return state
+
+
+def requeue_stale(queue_dir: str | Path, stale_after: float, worker_id: str | None = None) -> list[str]:
+    """ハートビートが stale_after 秒途絶えた claim を todo/ に戻す. 戻した項目 ID を返す."""
+    queue = Path(queue_dir)
+    now = _fs_now(queue, worker_id or default_worker_id())
+    requeued = []
+    for path in (queue / "claimed").glob("*.json"):
+        item, _, owner = path.stem.partition("@")
+        try:
+            if now - _last_touched(path) < stale_after:
+                continue
+            # rename できたワーカーだけが戻す（同時に見つけても1回だけ）
+            os.rename(path, queue / "todo" / f"{item}.json")
+        except FileNotFoundError:
+            continue
+        requeued.append(item)
+        print(f"  [stale] {item} (claimed by {owner}) -> todo")
+    return requeued
+
+
+class _Heartbeat(threading.Thread):
+    """claim ファイルの mtime を interval 秒ごとに更新する. ファイルが消えたら lost."""
+
+    def __init__(self, path: Path, interval: float):
+        super().__init__(daemon=True)
+        self.path = path
+        self.interval = interval
+        self.lost = False
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                self.lost = True
+                return
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+
+def _exclusive_lock(queue: Path):
+    """ノード内で ``exclusive`` ステージを1つずつにするためのローカルなロック（取れなければ None）."""
+    digest = hashlib.sha256(str(queue.resolve()).encode()).hexdigest()[:12]
+    f = open(Path(tempfile.gettempdir()) / f"nuscenes_gs_exclusive_{digest}.lock", "w")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        f.close()
+        return None
+    return f
+
+
+def _claim(queue: Path, item: dict, worker_id: str) -> Path | None:
+    """todo → claimed の rename で項目を取る（他のワーカーが先に取れば None）."""
+    claim = queue / "claimed" / f"{item['id']}@{worker_id}.json"
+    try:
+        os.rename(queue / "todo" / f"{item['id']}.json", claim)
+    except FileNotFoundError:
+        return None
+    os.utime(claim)
+    return claim
+
+
+def _owns(claim: Path, token: str) -> bool:
+    """claim ファイルがまだ残っていて、この取得のトークンを持っているか."""
+    return (_read_json(claim) or {}).get("claim_token") == token
+
+
+def run_worker(
+    queue_dir: str | Path,
+    worker_id: str | None = None,
+    heartbeat: float = 30.0,
+    stale_after: float = 300.0,
+    poll: float = 10.0,
+    max_attempts: int = 3,
+) -> dict[str, int]:
+    """キューが空になるまで項目を取って実行する.
+
+    依存がすべて done の項目を manifest の順に取る。取れる項目がなくても他のワーカーが
+    実行中なら（依存待ち・ノード障害の再キュー待ち）poll 秒ごとに見直し、
+    未着手も実行中もなくなったら終わる。
+
+    Args:
+        queue_dir: ``init_queue`` で作った共有ディレクトリ
+        worker_id: ワーカー名（None = ホスト名-PID）
+        heartbeat: claim の mtime を更新する間隔 [s]
+        stale_after: この秒数ハートビートのない claim を todo に戻す（heartbeat より十分長く）
+        poll: 取れる項目がないときの待ち時間 [s]
+        max_attempts: 失敗（またはノード障害）がこの回数に達した項目は failed にする
+
+    Returns:
+        このワーカーが実行した項目数（done, failed）
+    """
+    queue = Path(queue_dir)
+    worker_id = worker_id or default_worker_id()
+    manifest = _read_json(queue / MANIFEST)
+    config = manifest["config"]
+    stages = config["stages"]
+    items = {item["id"]: item for item in manifest["items"]}
+    dataset = {
+        "version": config.get("version", "v1.0-mini"),
+        "dataroot": config.get("dataroot", "data/raw"),
+        "archive": config.get("archive"),
+    }
+    counts = {"done": 0, "failed": 0}
+
+    while True:
+        requeue_stale(queue, stale_after, worker_id)
+        state = scan_queue(queue)
+
+        claim = lock = None
+        for item in manifest["items"]:
+            if state.get(item["id"]) != "todo" or any(state.get(dep) != "done" for dep in item["deps"]):
+                continue
+            if stages[item["stage"]].get("exclusive"):
+                lock = _exclusive_lock(queue)
+                if lock is None:
+                    continue
+            claim = _claim(queue, item, worker_id)
+            if claim is not None:
+                break
+            if lock is not None:
+                lock.close()
+                lock = None
+
+        if claim is None:
+            if not any(s in ("todo", "claimed") for s in state.values()):
+                break
+            time.sleep(poll)
+            continue
+
+        try:
+            counts[_run_claimed(queue, items, item, claim, stages, dataset, worker_id, heartbeat, max_attempts)] += 1
+        finally:
+            if lock is not None:
+                lock.close()
+
+    return counts
+
+
+def _run_claimed(queue, items, item, claim, stages, dataset, worker_id, heartbeat, max_attempts) -> str:
+    """取った項目を実行して done / todo（再試行）/ failed に移す."""
+    record = {**item, **(_read_json(claim) or {})}
+    record["attempts"] = record.get("attempts", 0) + 1
+    record["worker"] = worker_id
+    # 同じワーカー名で取り直されても区別できるよう、取得ごとにトークンを変える
+    record["claim_token"] = token = uuid.uuid4().hex
+    tag = worker_id
+    output = Path(item["output"])
+
+    if record["attempts"] > max_attempts:
+        # ノード障害で何度も再キューされた（実行中に落ちる項目など）
+        record["error"] = record.get("error") or "worker lost repeatedly"
+        _write_json(queue / "failed" / f"{item['id']}.json", record, tag)
+        claim.unlink(missing_ok=True)
+        print(f"  [FAIL] {item['stage']:<12s} {node_label(item)}: {record['error']}")
+        return "failed"
+    _write_json(claim, record, tag)
+
+    beat = _Heartbeat(claim, heartbeat)
+    beat.start()
+    try:
+        if (output / COMPLETE_MARKER).exists():
+            # 前の実行者が成果物を置いてから落ちた
+            seconds = 0.0
+        else:
+            # claim を持つのは1ワーカーだけなので最終パスに直接書く（書きかけは _execute が消す）
+            print(f"  [run ] {item['stage']:<12s} {node_label(item)} ({worker_id})")
+            node = {
+                **item,
+                "output": output,
+                "deps": [{"stage": items[dep]["stage"], "output": Path(items[dep]["output"])} for dep in item["deps"]],
+            }
+            seconds = _execute(node, stages[item["stage"]], dataset, can_publish=lambda: _owns(claim, token))
+    except Exception as e:
+        beat.stop()
+        record["error"] = f"{type(e).__name__}: {e}"
+        if not isinstance(e, PublishAborted):
+            traceback.print_exc()
+        if beat.lost or not _owns(claim, token):
+            # 古いと判定されて他のワーカーに渡った項目はそちらに任せる
+            print(f"  [lost] {item['stage']:<12s} {node_label(item)}: {record['error']}")
+            return "failed"
+        if record["attempts"] < max_attempts:
+            # 別のノードでもう一度試す
+            _write_json(claim, record, tag)
+            try:
+                os.rename(claim, queue / "todo" / f"{item['id']}.json")
+            except FileNotFoundError:
+                pass
+            print(f"  [retry] {item['stage']:<12s} {node_label(item)}: {record['error']}")
+            return "failed"
+        _write_json(queue / "failed" / f"{item['id']}.json", record, tag)
+        claim.unlink(missing_ok=True)
+        print(f"  [FAIL] {item['stage']:<12s} {node_label(item)}: {record['error']}")
+        return "failed"
+
+    beat.stop()
+    if not _owns(claim, token):
+        # マーカーを置いた直後に再キューされた. 新しい取得者が作り直すか完了済みとして扱う
+        print(f"  [lost] {item['stage']:<12s} {node_label(item)}: claim was requeued while running")
+        return "failed"
+    record.pop("error", None)
+    record["seconds"] = seconds
+    _write_json(queue / "done" / f"{item['id']}.json", record, tag)
+    claim.unlink(missing_ok=True)
+    print(f"  [ok  ] {item['stage']:<12s} {node_label(item)} ({seconds:.1f} s)")
+    return "done"
+
+
+def merge_index(queue_dir: str | Path) -> Path:
+    """done/ の記録を manifest の順に集約して index.json を書く（どのノードが書いても同じ内容）."""
+    queue = Path(queue_dir)
+    manifest = _read_json(queue / MANIFEST)
+    state = scan_queue(queue)
+    done = []
+    for item in manifest["items"]:
+        if state.get(item["id"]) == "done":
+            record = _read_json(queue / "done" / f"{item['id']}.json")
+            done.append({k: record.get(k) for k in ("id", "stage", "scene", "camera", "key", "output", "worker", "seconds")})
+    counts = {s: sum(1 for v in state.values() if v == s) for s in STATES + ("blocked",)}
+    path = queue / INDEX
+    _write_json(path, {"counts": counts, "items": done}, f"index-{default_worker_id()}")
+    return path
+
+
+def queue_status(queue_dir: str | Path) -> dict[str, int]:
+    """状態ごとの項目数."""
+    state = scan_queue(queue_dir)
+    return {s: sum(1 for v in state.values() if v == s) for s in STATES + ("blocked",)}
+
+
+def run_distributed(
+    config: dict,
+    scenes: list[dict],
+    queue_dir: str | Path,
+    num_workers: int | None = None,
+    force: bool = False,
+    heartbeat: float = 30.0,
+    stale_after: float = 300.0,
+    poll: float = 10.0,
+    max_attempts: int = 3,
+) -> dict[str, int]:
+    """このノードでキューを（なければ作って）消化し、index.json を更新する.
+
+    各ノードで同じ引数のまま実行すればよい。ノード内では num_workers 個の
+    ワーカープロセスが独立に項目を取る。
+
+    Returns:
+        キュー全体の状態ごとの項目数
+
+    Raises:
+        RuntimeError: failed / blocked の項目がある（他ノードの分も含む）
+    """
+    queue = Path(queue_dir)
+    manifest = init_queue(queue, config, scenes, force=force, stale_after=stale_after)
+    config = manifest["config"]
+    num_workers = num_workers or config.get("workers") or os.cpu_count() or 1
+
+    if config.get("backend"):
+        os.environ["NUSCENES_GS_BACKEND"] = config["backend"]
+
+    kwargs = {"heartbeat": heartbeat, "stale_after": stale_after, "poll": poll, "max_attempts": max_attempts}
+    if num_workers == 1:
+        run_worker(queue, **kwargs)
+    else:
+        # fork するワーカーが NuScenes を読み直さないよう、親で先に読んでおく
+        if any("function" in stage for stage in config["stages"].values()):
+            nusc = _load_nuscenes(
+                config.get("version", "v1.0-mini"), config.get("dataroot", "data/raw"), config.get("archive")
+            )
+            # tar の索引だけ共有し、fd は各ワーカーが開き直す（読み出しは pread なので共有しても
+            # オフセットは壊れないが、親がテーブル展開で開いた fd をワーカーに持ち越さない）
+            if getattr(nusc, "archive", None) is not None:
+                nusc.archive.close()
+        host = default_worker_id()
+        with ProcessPoolExecutor(max_workers=num_workers) as pool:
+            futures = [pool.submit(run_worker, queue, f"{host}-{i}", **kwargs) for i in range(num_workers)]
+            for future in futures:
+                future.result()
+
+    # 人が読める名前のリンク（他ノードと同時に張り替えても壊れないよう失敗は無視）
+    state = scan_queue(queue)
+    for item in manifest["items"]:
+        if state.get(item["id"]) == "done":
+            try:
+                _update_link({**item, "output": Path(item["output"])}, config["stages"][item["stage"]])
+            except OSError:
+                pass
+
+    index = merge_index(queue)
+    counts = queue_status(queue)
+    print(f"Index: {index} ({', '.join(f'{k}: {v}' for k, v in counts.items())})")
+    if counts["failed"] or counts["blocked"]:
+        failed = [i for i, s in state.items() if s in ("failed", "blocked")]
+        raise RuntimeError(f"Distributed export has failed items: {', '.join(sorted(failed))}")
+    return counts
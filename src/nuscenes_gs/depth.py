@@ -5,6 +5,7 @@ This module provides functions to:
 2. Filter dynamic objects (vehicles, humans, cycles)
 3. Project static LiDAR points onto 2D images
 4. Generate sparse depth maps for depth supervision
+5. Optionally densify them (morphological completion + RGB-guided filter) with a confidence map
 """
 
 from __future__ import annotations
@@ -15,123 +16,368 @@ from typing import TYPE_CHECKING
 import cv2
 import numpy as np
 
-from .masks import load_lidar_points_and_labels, transform_lidar_to_world, compute_w2c
+from . import perf
+from .archive import read_dataroot_array
+from .backends import get_backend
+from .cas import artifact_key
+from .masks import (
+    DEFAULT_DYNAMIC_CLASSES,
+    compute_w2c,
+    load_lidar_points_and_labels,
+    transform_lidar_to_world,
+    write_png,
+)
+from .carving import build_scene_carving, carved_point_mask
+from .semantics import build_static_label_map, project_lidar_to_labels
 
 if TYPE_CHECKING:
     from nuscenes.nuscenes import NuScenes
 
+    from .cas import BlobStore
 
-def project_lidar_to_depth(
+
+def _project_static_pixels(
     points_world: np.ndarray,
     labels: np.ndarray,
     w2c: np.ndarray,
     K: np.ndarray,
     image_shape: tuple[int, int],
-    dynamic_classes: list[int] | None = None,
-    depth_range: tuple[float, float] = (0.1, 80.0),
-) -> np.ndarray:
-    """LiDAR 静的点群からスパース深度マップを生成.
-
-    Args:
-        points_world: (N, 3) LiDAR points in world frame
-        labels: (N,) semantic class IDs
-        w2c: 4x4 world-to-camera transform matrix
-        K: 3x3 camera intrinsic matrix
-        image_shape: (height, width)
-        dynamic_classes: List of semantic class IDs to exclude. If None, use default.
-        depth_range: (min_depth, max_depth) in meters
+    dynamic_classes: list[int] | None,
+    depth_range: tuple[float, float],
+) -> tuple[np.ndarray, np.ndarray]:
+    """静的点を投影し、画像内に落ちる点の flat pixel index と深度を返す.
 
     Returns:
-        Depth map (H, W) uint16, values in millimeters (0 = no depth)
+        pixel: (M,) int64 flat pixel index（v * W + u）
+        depths: (M,) float32 カメラ座標系の z [m]
     """
     h, w = image_shape
     min_depth, max_depth = depth_range
+    empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
 
     # デフォルトの動的クラス
     if dynamic_classes is None:
-        dynamic_classes = (
-            [17, 18, 19, 20, 21, 22, 23] +  # vehicle.*
-            [2, 3, 4, 5, 6, 7] +             # human.*
-            [14, 15, 16]                     # cycle.*
-        )
+        dynamic_classes = DEFAULT_DYNAMIC_CLASSES
 
     # 動的オブジェクトを除外（静的点のみ残す）
     static_mask = ~np.isin(labels, dynamic_classes)
     static_points = points_world[static_mask]
 
     if len(static_points) == 0:
-        # 静的点がない場合は空の深度マップを返す
-        return np.zeros((h, w), dtype=np.uint16)
+        # 静的点がない場合は空の深度マップ
+        return empty
 
-    # World → camera 座標系に変換
-    points_homo = np.hstack([static_points, np.ones((len(static_points), 1))])
-    points_cam_homo = (w2c @ points_homo.T).T  # (N, 4)
-    points_cam = points_cam_homo[:, :3]  # (N, 3)
+    with perf.stage("project"):
+        # World → camera 座標系に変換
+        points_homo = np.hstack([static_points, np.ones((len(static_points), 1))])
+        points_cam_homo = (w2c @ points_homo.T).T  # (N, 4)
+        points_cam = points_cam_homo[:, :3]  # (N, 3)
 
-    # カメラ背後の点をフィルタ（z > 0のみ）
-    valid_mask = points_cam[:, 2] > 0
-    points_cam = points_cam[valid_mask]
+        # カメラ背後の点をフィルタ（z > 0のみ）
+        valid_mask = points_cam[:, 2] > 0
+        points_cam = points_cam[valid_mask]
 
-    if len(points_cam) == 0:
-        return np.zeros((h, w), dtype=np.uint16)
+        if len(points_cam) == 0:
+            return empty
 
-    # 深度値を取得（カメラ座標系の z 値）
-    depths = points_cam[:, 2]
+        # 深度値を取得（カメラ座標系の z 値）
+        depths = points_cam[:, 2]
 
-    # 深度範囲でフィルタ
-    depth_valid = (depths >= min_depth) & (depths <= max_depth)
-    points_cam = points_cam[depth_valid]
-    depths = depths[depth_valid]
+        # 深度範囲でフィルタ
+        depth_valid = (depths >= min_depth) & (depths <= max_depth)
+        points_cam = points_cam[depth_valid]
+        depths = depths[depth_valid]
 
-    if len(points_cam) == 0:
-        return np.zeros((h, w), dtype=np.uint16)
+        if len(points_cam) == 0:
+            return empty
 
-    # 2D 投影
-    points_2d_homo = (K @ points_cam.T).T  # (M, 3)
-    uv = points_2d_homo[:, :2] / points_2d_homo[:, 2:3]  # (M, 2)
+        # 2D 投影
+        points_2d_homo = (K @ points_cam.T).T  # (M, 3)
+        uv = points_2d_homo[:, :2] / points_2d_homo[:, 2:3]  # (M, 2)
+
+        # 画像境界内の点のみ
+        in_bounds = (
+            (uv[:, 0] >= 0) & (uv[:, 0] < w) &
+            (uv[:, 1] >= 0) & (uv[:, 1] < h)
+        )
 
-    # 画像境界内の点のみ
-    in_bounds = (
-        (uv[:, 0] >= 0) & (uv[:, 0] < w) &
-        (uv[:, 1] >= 0) & (uv[:, 1] < h)
-    )
+        uv = uv[in_bounds]
+        depths = depths[in_bounds]
 
-    uv = uv[in_bounds]
-    depths = depths[in_bounds]
+        # 最近傍の画素（四捨五入で境界外に出る点は落とす）
+        uv_int = np.round(uv).astype(np.int64)
+        on_image = (uv_int[:, 0] < w) & (uv_int[:, 1] < h)
+        pixel = uv_int[on_image, 1] * w + uv_int[on_image, 0]
+        depths = depths[on_image].astype(np.float32)
 
-    # 深度マップを初期化（0 = 深度なし）
-    depth_map = np.zeros((h, w), dtype=np.float32)
+    perf.count("points_projected", len(uv))
+    perf.count("points_culled", len(points_world) - len(uv))
+    return pixel, depths
 
-    # 各ピクセルに深度値を格納（複数点が同じピクセルに投影される場合は最小深度を使用）
-    for (u, v), depth in zip(uv, depths):
-        u_int, v_int = int(round(u)), int(round(v))
-        if 0 <= u_int < w and 0 <= v_int < h:
-            # 既に深度値がある場合は最小値を保持（手前の点を優先）
-            if depth_map[v_int, u_int] == 0 or depth < depth_map[v_int, u_int]:
-                depth_map[v_int, u_int] = depth
 
+def _depth_map_to_mm(depth_map: np.ndarray) -> np.ndarray:
     # メートル → ミリメートルに変換して 16-bit に格納
     # 0 = 深度なし、1~ = 深度値（mm）
     depth_map_mm = (depth_map * 1000).astype(np.uint16)
-
+    if perf.enabled():
+        perf.count("pixels_written", cv2.countNonZero(depth_map_mm))
     return depth_map_mm
 
 
+def project_lidar_to_depth(
+    points_world: np.ndarray,
+    labels: np.ndarray,
+    w2c: np.ndarray,
+    K: np.ndarray,
+    image_shape: tuple[int, int],
+    dynamic_classes: list[int] | None = None,
+    depth_range: tuple[float, float] = (0.1, 80.0),
+) -> np.ndarray:
+    """LiDAR 静的点群からスパース深度マップを生成.
+
+    複数点が同じピクセルに投影される場合は最小深度（手前の点）を使う。
+    画素への書き込みは ``backends`` で選んだ実装の scatter-min で行う。
+
+    Args:
+        points_world: (N, 3) LiDAR points in world frame
+        labels: (N,) semantic class IDs
+        w2c: 4x4 world-to-camera transform matrix
+        K: 3x3 camera intrinsic matrix
+        image_shape: (height, width)
+        dynamic_classes: List of semantic class IDs to exclude. If None, use default.
+        depth_range: (min_depth, max_depth) in meters
+
+    Returns:
+        Depth map (H, W) uint16, values in millimeters (0 = no depth)
+    """
+    pixel, depths = _project_static_pixels(points_world, labels, w2c, K, image_shape, dynamic_classes, depth_range)
+    if len(pixel) == 0:
+        return np.zeros(image_shape, dtype=np.uint16)
+
+    with perf.stage("rasterize"):
+        depth_map = get_backend().scatter_min(pixel, depths, image_shape)
+        return _depth_map_to_mm(depth_map)
+
+
+def project_lidar_to_depth_batch(
+    points_world: list[np.ndarray],
+    labels: list[np.ndarray],
+    w2cs: list[np.ndarray],
+    Ks: list[np.ndarray],
+    image_shape: tuple[int, int],
+    dynamic_classes: list[int] | None = None,
+    depth_range: tuple[float, float] = (0.1, 80.0),
+) -> list[np.ndarray]:
+    """同じ画像サイズの複数フレームの深度マップをまとめて生成.
+
+    各フレームの出力は ``project_lidar_to_depth`` と一致する。torch バックエンドでは
+    全フレームの scatter-min が1回の ``scatter_reduce`` になる。
+
+    Returns:
+        Depth maps, each (H, W) uint16 in millimeters
+    """
+    projected = [
+        _project_static_pixels(p, l, w2c, K, image_shape, dynamic_classes, depth_range)
+        for p, l, w2c, K in zip(points_world, labels, w2cs, Ks)
+    ]
+    if not projected:
+        return []
+
+    with perf.stage("rasterize"):
+        depth_maps = get_backend().scatter_min_batch(
+            [pixel for pixel, _ in projected], [depths for _, depths in projected], image_shape
+        )
+        return [_depth_map_to_mm(depth_map) for depth_map in depth_maps]
+
+
+def _fast_guided_filter(
+    guide: np.ndarray,
+    sources: list[np.ndarray],
+    radius: int,
+    eps: float,
+    subsample: int = 4,
+) -> list[np.ndarray]:
+    """He らの fast guided filter（係数を 1/subsample 解像度で求めて拡大する）.
+
+    同じガイドで複数の入力を処理するので、ガイドの平均・分散は1回だけ計算する。
+    """
+    h, w = guide.shape
+    small = (max(w // subsample, 1), max(h // subsample, 1))
+    ksize = (2 * max(radius // subsample, 1) + 1,) * 2
+
+    def box(x):
+        return cv2.boxFilter(x, -1, ksize, borderType=cv2.BORDER_REFLECT)
+
+    guide_s = cv2.resize(guide, small, interpolation=cv2.INTER_AREA)
+    mean_i = box(guide_s)
+    var_i = box(guide_s * guide_s) - mean_i * mean_i
+
+    outputs = []
+    for src in sources:
+        src_s = cv2.resize(src, small, interpolation=cv2.INTER_AREA)
+        mean_p = box(src_s)
+        a = (box(guide_s * src_s) - mean_i * mean_p) / (var_i + eps)
+        b = mean_p - a * mean_i
+        mean_a = cv2.resize(box(a), (w, h), interpolation=cv2.INTER_LINEAR)
+        mean_b = cv2.resize(box(b), (w, h), interpolation=cv2.INTER_LINEAR)
+        outputs.append(mean_a * guide + mean_b)
+    return outputs
+
+
+def _min_pool_sparse(depth_mm: np.ndarray, valid: np.ndarray, scale: int) -> np.ndarray:
+    """疎な深度マップを scale 倍に縮小（各ブロックの最小有効深度、端数は最後のブロックへ）."""
+    h, w = depth_mm.shape
+    hs, ws = max(h // scale, 1), max(w // scale, 1)
+    ys, xs = np.nonzero(valid)
+    values = depth_mm[ys, xs]
+    order = np.argsort(values, kind="stable")[::-1]  # 最後に書いた（最小の）値が残る
+    small = np.zeros((hs, ws), dtype=depth_mm.dtype)
+    small[np.minimum(ys[order] // scale, hs - 1), np.minimum(xs[order] // scale, ws - 1)] = values[order]
+    return small
+
+
+def complete_depth(
+    depth_mm: np.ndarray,
+    image: np.ndarray | None = None,
+    max_depth: float = 80.0,
+    bin_edges: tuple[float, ...] = (15.0, 30.0),
+    kernel_sizes: tuple[int, ...] = (15, 9, 5),
+    hole_kernel_size: int = 15,
+    guided_radius: int = 8,
+    guided_eps: float = 1e-3,
+    confidence_scale: float = 8.0,
+    scale: int = 2,
+) -> tuple[np.ndarray, np.ndarray]:
+    """スパース深度マップを CPU で密にする（IP-Basic 風の古典的補間）.
+
+    1. 深度ビンごとに距離に応じたカーネルで膨張（近いほど LiDAR のリング間隔が広い）
+    2. クロージング + 大きめのカーネルで穴埋め（LiDAR の最上段より上＝空は埋めない）
+    3. RGB 画像をガイドにした guided filter で補間画素をエッジに沿わせる
+
+    1〜2 は ``scale`` 倍に縮小した（最小深度プーリングした）グリッドで行い、
+    3 はフル解像度のガイド画像で行う。深度を ``max_depth + 1 - d`` に反転して扱うので、
+    膨張では手前の点が優先される。LiDAR で実測した画素の値はそのまま残す。
+
+    Args:
+        depth_mm: (H, W) uint16 スパース深度 [mm]（0 = 深度なし）
+        image: (H, W, 3) BGR 画像（None なら guided filter を省略）
+        max_depth: 最大深度 [m]
+        bin_edges: 深度ビンの境界 [m]
+        kernel_sizes: 各深度ビンの膨張カーネルサイズ [px, フル解像度]（len(bin_edges) + 1 個、近い順）
+        hole_kernel_size: 穴埋めのカーネルサイズ [px, フル解像度]
+        guided_radius: guided filter の半径 [px]
+        guided_eps: guided filter の正則化（輝度 [0, 1] の分散スケール）
+        confidence_scale: 信頼度が 1/e になる実測画素からの距離 [px]
+        scale: モルフォロジー処理の縮小率
+
+    Returns:
+        dense_mm: (H, W) uint16 補間済み深度 [mm]（0 = 深度なし）
+        confidence: (H, W) uint8（実測画素 = 255、補間画素は実測画素から離れるほど小さい、深度なし = 0）
+    """
+    h, w = depth_mm.shape
+    valid = depth_mm > 0
+    if not valid.any():
+        return depth_mm.copy(), np.zeros((h, w), dtype=np.uint8)
+
+    def odd(size: int) -> int:
+        return max(size // scale, 1) | 1
+
+    with perf.stage("dilate"):
+        sparse = _min_pool_sparse(depth_mm, valid, scale) if scale > 1 else depth_mm
+        sparse_valid = sparse > 0
+        depth = sparse.astype(np.float32) * 0.001
+        inverted = np.where(sparse_valid, max_depth + 1.0 - depth, 0.0).astype(np.float32)
+
+        # 深度ビンごとの膨張（手前優先で max 合成）
+        dense = np.zeros(sparse.shape, dtype=np.float32)
+        edges = (0.0, *bin_edges, np.inf)
+        for lo, hi, ksize in zip(edges[:-1], edges[1:], kernel_sizes):
+            in_bin = sparse_valid & (depth >= lo) & (depth < hi)
+            if not in_bin.any():
+                continue
+            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (odd(ksize), odd(ksize)))
+            np.maximum(dense, cv2.dilate(np.where(in_bin, inverted, 0.0).astype(np.float32), kernel), out=dense)
+
+        # クロージング + 穴埋め
+        dense = cv2.morphologyEx(dense, cv2.MORPH_CLOSE, np.ones((odd(5), odd(5)), np.uint8))
+        empty = dense == 0
+        filled = cv2.dilate(dense, np.ones((odd(hole_kernel_size), odd(hole_kernel_size)), np.uint8))
+        dense[empty] = filled[empty]
+
+        # 列ごとに LiDAR の最上段より上（空）は埋めない
+        rows = dense.shape[0]
+        top = np.where(sparse_valid.any(axis=0), sparse_valid.argmax(axis=0), rows)
+        dense[np.arange(rows)[:, None] < top[None, :]] = 0
+
+        # 孤立した誤補間を除く
+        blurred = cv2.medianBlur(dense, 5)
+        dense = np.where((dense > 0) & (blurred > 0), blurred, dense)
+        dense = np.where(dense > 0, max_depth + 1.0 - dense, 0.0).astype(np.float32)
+
+    with perf.stage("confidence"):
+        # 実測画素からの距離で減衰（縮小グリッド上で計算して拡大）
+        dist = cv2.distanceTransform((~sparse_valid).astype(np.uint8), cv2.DIST_L2, 3)
+        confidence = np.rint(255.0 * np.exp(-dist * (scale / confidence_scale))).astype(np.uint8)
+        if scale > 1:
+            dense = cv2.resize(dense, (w, h), interpolation=cv2.INTER_NEAREST)
+            confidence = cv2.resize(confidence, (w, h), interpolation=cv2.INTER_LINEAR)
+
+    has_depth = dense > 0
+
+    if image is not None:
+        with perf.stage("filter"):
+            guide = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY).astype(np.float32) * (1.0 / 255.0)
+            weight = has_depth.astype(np.float32)
+            # 深度なし画素を 0 として混ぜないよう正規化する
+            num, den = _fast_guided_filter(guide, [dense, weight], guided_radius, guided_eps)
+            dense = np.where(has_depth & (den > 0.5), num / np.maximum(den, 1e-6), dense)
+
+    dense_mm = np.clip(np.rint(dense * 1000.0), 0, np.iinfo(np.uint16).max).astype(np.uint16)
+    dense_mm[~has_depth] = 0
+    dense_mm[valid] = depth_mm[valid]
+
+    confidence[valid] = 255
+    confidence[dense_mm == 0] = 0
+    if perf.enabled():
+        perf.count("pixels_filled", int(np.count_nonzero(dense_mm)) - int(np.count_nonzero(valid)))
+
+    return dense_mm, confidence
+
+
 def generate_depth_maps_for_scene(
     nusc,
     scene_token: str,
     output_dir: Path,
     dynamic_classes: list[int] | None = None,
     depth_range: tuple[float, float] = (0.1, 80.0),
+    completion: bool = False,
+    store: BlobStore | None = None,
+    semantics: dict | None = None,
+    carving: dict | None = None,
 ) -> dict[int, Path]:
     """シーン全体の全フレームについてスパース深度マップを生成.
 
+    completion=True のときは ``complete_depth`` で密にした深度を depth/ に、
+    信頼度マップを depth_confidence/ に書く。store を渡すと (カメラ, LiDAR, パラメータ)
+    が同じフレームは計算せずに blob をリンクする。
+
+    semantics を渡すと、同じ点群からラベル画像 semantics/ も書く
+    （``project_lidar_to_labels``。深度と違って動的クラスの点も投影する）。
+
+    carving を渡すと、シーン全体のレイで素通りされたボクセルの点（静的ラベルの
+    動的残留物）を深度から落とす（``build_scene_carving``、最初の未キャッシュフレームで1回だけ計算）。
+
     Args:
         nusc: NuScenes instance
         scene_token: Scene token
         output_dir: Output directory for depth maps
         dynamic_classes: List of semantic class IDs to exclude. If None, use default.
         depth_range: (min_depth, max_depth) in meters
+        completion: 深度補間を行うか
+        store: 深度マップを共有する content-addressed store
+        semantics: ラベル画像のパラメータ（dilation: クラス ID → 膨張サイズ [px],
+            densify: 静的ボクセル地図で埋めるか, voxel_size: 地図のボクセル一辺 [m]）
+        carving: free-space carving のパラメータ（``build_scene_carving`` に渡す）
 
     Returns:
         Dictionary mapping frame_idx to depth_path
@@ -139,6 +385,15 @@ def generate_depth_maps_for_scene(
     scene = nusc.get("scene", scene_token)
     depth_dir = Path(output_dir) / "depth"
     depth_dir.mkdir(parents=True, exist_ok=True)
+    confidence_dir = Path(output_dir) / "depth_confidence"
+    if completion:
+        confidence_dir.mkdir(parents=True, exist_ok=True)
+    semantics_dir = Path(output_dir) / "semantics"
+    if semantics is not None:
+        semantics_dir.mkdir(parents=True, exist_ok=True)
+        dilation = {int(label): size for label, size in (semantics.get("dilation") or {}).items()}
+    static_map = None
+    carve = None
 
     depth_paths = {}
     sample_token = scene["first_sample_token"]
@@ -151,6 +406,25 @@ def generate_depth_maps_for_scene(
         cam_token = sample["data"]["CAM_FRONT"]
         lidar_token = sample["data"]["LIDAR_TOP"]
 
+        depth_path = depth_dir / f"{frame_idx:04d}.png"
+        depth_paths[frame_idx] = depth_path
+        outputs = {}
+        if store is not None:
+            key = artifact_key("depth", cam_token, lidar_token, dynamic_classes, list(depth_range), completion)
+            if carving is not None:
+                # carving はシーン全体のスイープに依存する
+                key = artifact_key(key, "carving", scene_token, carving)
+            outputs = {key: depth_path}
+            if completion:
+                outputs[artifact_key(key, "confidence")] = confidence_dir / f"{frame_idx:04d}.png"
+            if semantics is not None:
+                # densify の地図はシーン全体の点群に依存する
+                outputs[artifact_key(key, "semantics", scene_token, semantics)] = semantics_dir / f"{frame_idx:04d}.png"
+            if store.link_cached(outputs):
+                sample_token = sample["next"] if sample["next"] else None
+                frame_idx += 1
+                continue
+
         cam_data = nusc.get("sample_data", cam_token)
         lidar_data = nusc.get("sample_data", lidar_token)
 
@@ -168,16 +442,24 @@ def generate_depth_maps_for_scene(
         w2c = compute_w2c(cam_ego_pose, cam_calib)
         K = np.array(cam_calib["camera_intrinsic"])
 
-        # 画像サイズを取得
-        from PIL import Image as PILImage
-        img_path = Path(nusc.dataroot) / cam_data["filename"]
-        with PILImage.open(img_path) as img:
-            image_shape = (img.height, img.width)
+        # 画像サイズを取得（sample_data に記録済みなので画像は開かない）
+        image_shape = (cam_data["height"], cam_data["width"])
+
+        # free-space carving で素通りされたボクセルの点を深度から落とす
+        depth_points, depth_labels = points_world, labels
+        if carving is not None:
+            if carve is None:
+                with perf.stage("carving"):
+                    carve = build_scene_carving(nusc, scene_token, **carving)
+            keep = ~carved_point_mask(points_world, carve, labels)
+            if perf.enabled():
+                perf.count("points_carved", int(len(keep) - keep.sum()))
+            depth_points, depth_labels = points_world[keep], labels[keep]
 
         # 深度マップ生成
         depth_map = project_lidar_to_depth(
-            points_world,
-            labels,
+            depth_points,
+            depth_labels,
             w2c,
             K,
             image_shape,
@@ -185,10 +467,33 @@ def generate_depth_maps_for_scene(
             depth_range=depth_range,
         )
 
+        # 深度補間（RGB ガイド付き）
+        if completion:
+            with perf.stage("load"):
+                image = cv2.imdecode(read_dataroot_array(nusc, cam_data["filename"], np.uint8), cv2.IMREAD_COLOR)
+            depth_map, confidence = complete_depth(depth_map, image, max_depth=depth_range[1])
+            write_png(confidence_dir / f"{frame_idx:04d}.png", confidence)
+
+        # ラベル画像（同じ点群を投影）
+        if semantics is not None:
+            with perf.stage("semantics"):
+                if semantics.get("densify") and static_map is None:
+                    static_map = build_static_label_map(
+                        nusc, scene_token, semantics.get("voxel_size", 0.1), dynamic_classes
+                    )
+                sem_points, sem_labels = points_world, labels
+                if static_map is not None:
+                    sem_points = np.concatenate([points_world, static_map[0]])
+                    sem_labels = np.concatenate([labels, static_map[1]])
+                label_map = project_lidar_to_labels(
+                    sem_points, sem_labels, w2c, K, image_shape, depth_range=depth_range, dilation=dilation
+                )
+            write_png(semantics_dir / f"{frame_idx:04d}.png", label_map)
+
         # 深度マップを保存
-        depth_path = depth_dir / f"{frame_idx:04d}.png"
-        cv2.imwrite(str(depth_path), depth_map)
-        depth_paths[frame_idx] = depth_path
+        write_png(depth_path, depth_map)
+        for key, path in outputs.items():
+            store.put(key, path)
 
         # 次のフレームへ
         sample_token = sample["next"] if sample["next"] else None
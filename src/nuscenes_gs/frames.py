@@ -0,0 +1,152 @@
+"""シーンのフレーム索引（keyframe ごとの token・pose・intrinsics）.
+
+各処理が ``sample["next"]`` を辿って同じ ego_pose / calibrated_sensor を
+何度も引き直さないよう、1シーン分を1回でまとめて引いておく。
+フレーム番号はエクスポート側の連番（images/0000.jpg ...）と一致する。
+
+``build_sweep_frame_index`` は keyframe 以外も含むカメラの全 sample_data（12Hz）版。
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from .masks import compute_w2c
+from .poses import compute_c2w
+
+if TYPE_CHECKING:
+    from nuscenes.nuscenes import NuScenes
+
+
+def build_scene_frame_index(
+    nusc: NuScenes,
+    scene_token: str,
+    camera: str = "CAM_FRONT",
+    lidar: str = "LIDAR_TOP",
+) -> list[dict]:
+    """1シーンの keyframe ごとのカメラ・LiDAR 情報をまとめる.
+
+    Args:
+        nusc: NuScenes instance
+        scene_token: Scene token
+        camera: カメラチャンネル名
+        lidar: LiDAR チャンネル名
+
+    Returns:
+        フレームごとの dict のリスト. 各 dict のキー:
+            frame_idx, sample, sample_token,
+            cam_token, cam_data, cam_ego_pose, cam_calib,
+            lidar_token, lidar_data, lidar_ego_pose, lidar_calib,
+            K (3x3), image_shape (height, width),
+            w2c (4x4, OpenCV), c2w (4x4, OpenGL)
+    """
+    scene = nusc.get("scene", scene_token)
+    sample_token = scene["first_sample_token"]
+
+    frames: list[dict] = []
+    while sample_token:
+        sample = nusc.get("sample", sample_token)
+        cam_token = sample["data"][camera]
+        lidar_token = sample["data"][lidar]
+
+        cam_data = nusc.get("sample_data", cam_token)
+        lidar_data = nusc.get("sample_data", lidar_token)
+        cam_ego_pose = nusc.get("ego_pose", cam_data["ego_pose_token"])
+        cam_calib = nusc.get("calibrated_sensor", cam_data["calibrated_sensor_token"])
+
+        frames.append(
+            {
+                "frame_idx": len(frames),
+                "sample": sample,
+                "sample_token": sample_token,
+                "cam_token": cam_token,
+                "cam_data": cam_data,
+                "cam_ego_pose": cam_ego_pose,
+                "cam_calib": cam_calib,
+                "lidar_token": lidar_token,
+                "lidar_data": lidar_data,
+                "lidar_ego_pose": nusc.get("ego_pose", lidar_data["ego_pose_token"]),
+                "lidar_calib": nusc.get("calibrated_sensor", lidar_data["calibrated_sensor_token"]),
+                "K": np.array(cam_calib["camera_intrinsic"]),
+                "image_shape": (cam_data["height"], cam_data["width"]),
+                "w2c": compute_w2c(cam_ego_pose, cam_calib),
+                "c2w": compute_c2w(cam_ego_pose, cam_calib),
+            }
+        )
+        sample_token = sample["next"] if sample["next"] else None
+
+    return frames
+
+
+def build_sweep_frame_index(
+    nusc: NuScenes,
+    scene_token: str,
+    camera: str = "CAM_FRONT",
+    lidar: str = "LIDAR_TOP",
+) -> list[dict]:
+    """1シーンのカメラ全 sample_data（keyframe 以外も含む 12Hz）の索引.
+
+    各カメラフレームには時刻が最も近い LiDAR sweep を対応付ける。
+    非 keyframe の LiDAR には lidarseg ラベルが無いので、ラベルを使う処理には使えない。
+
+    Args:
+        nusc: NuScenes instance
+        scene_token: Scene token
+        camera: カメラチャンネル名
+        lidar: LiDAR チャンネル名
+
+    Returns:
+        ``build_scene_frame_index`` と同じキーを持つ dict のリスト
+        （"sample" は sample_data が属する keyframe の sample）
+    """
+    scene = nusc.get("scene", scene_token)
+    first_sample = nusc.get("sample", scene["first_sample_token"])
+
+    def walk(token: str) -> list[dict]:
+        records = []
+        while token:
+            record = nusc.get("sample_data", token)
+            records.append(record)
+            token = record["next"]
+        return records
+
+    # 最初の sample より前の sweep は含めない（sample_data チェーンは keyframe から始める）
+    cam_records = walk(first_sample["data"][camera])
+    lidar_records = walk(first_sample["data"][lidar])
+    last_timestamp = nusc.get("sample", scene["last_sample_token"])["timestamp"]
+    cam_records = [r for r in cam_records if r["timestamp"] <= last_timestamp]
+
+    lidar_ts = np.array([r["timestamp"] for r in lidar_records])
+    cam_ts = np.array([r["timestamp"] for r in cam_records])
+    right = np.clip(np.searchsorted(lidar_ts, cam_ts), 0, len(lidar_ts) - 1)
+    left = np.maximum(right - 1, 0)
+    nearest = np.where(np.abs(lidar_ts[left] - cam_ts) <= np.abs(lidar_ts[right] - cam_ts), left, right)
+
+    frames: list[dict] = []
+    for cam_data, lidar_idx in zip(cam_records, nearest):
+        lidar_data = lidar_records[lidar_idx]
+        cam_ego_pose = nusc.get("ego_pose", cam_data["ego_pose_token"])
+        cam_calib = nusc.get("calibrated_sensor", cam_data["calibrated_sensor_token"])
+        frames.append(
+            {
+                "frame_idx": len(frames),
+                "sample": nusc.get("sample", cam_data["sample_token"]),
+                "sample_token": cam_data["sample_token"],
+                "cam_token": cam_data["token"],
+                "cam_data": cam_data,
+                "cam_ego_pose": cam_ego_pose,
+                "cam_calib": cam_calib,
+                "lidar_token": lidar_data["token"],
+                "lidar_data": lidar_data,
+                "lidar_ego_pose": nusc.get("ego_pose", lidar_data["ego_pose_token"]),
+                "lidar_calib": nusc.get("calibrated_sensor", lidar_data["calibrated_sensor_token"]),
+                "K": np.array(cam_calib["camera_intrinsic"]),
+                "image_shape": (cam_data["height"], cam_data["width"]),
+                "w2c": compute_w2c(cam_ego_pose, cam_calib),
+                "c2w": compute_c2w(cam_ego_pose, cam_calib),
+            }
+        )
+
+    return frames
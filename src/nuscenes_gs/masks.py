@@ -16,12 +16,29 @@ import cv2
 import numpy as np
 from nuscenes.utils.data_classes import LidarPointCloud
 
+from . import perf
+from .archive import read_dataroot_array
+from .backends import get_backend
 from .poses import compute_c2w, make_transform
 
 if TYPE_CHECKING:
     from nuscenes.nuscenes import NuScenes
 
 
+# デフォルトでマスク・除外する lidarseg の動的クラス
+DEFAULT_DYNAMIC_CLASSES = (
+    [17, 18, 19, 20, 21, 22, 23] +  # vehicle.*
+    [2, 3, 4, 5, 6, 7] +             # human.*
+    [14, 15, 16]                     # cycle.*
+)
+
+# デフォルトで bbox をマスクする annotation の category prefix
+DEFAULT_DYNAMIC_CATEGORIES = ["vehicle.", "human.", "cycle."]
+
+# 深度適応膨張（dilation_meters）のカーネル径の上限 [px]
+DEFAULT_MAX_DILATION = 128
+
+
 def load_lidar_points_and_labels(
     nusc: NuScenes,
     lidar_token: str,
@@ -39,17 +56,17 @@ def load_lidar_points_and_labels(
     Raises:
         KeyError: If lidarseg data is not available for this token
     """
-    # 点群読み込み
-    lidar_data = nusc.get("sample_data", lidar_token)
-    pc = LidarPointCloud.from_file(str(Path(nusc.dataroot) / lidar_data["filename"]))
-    points = pc.points.T  # (N, 4) -> transpose to (N, 4)
-
-    # semantic labels読み込み
-    lidarseg_data = nusc.get("lidarseg", lidar_token)
-    labels = np.fromfile(
-        Path(nusc.dataroot) / lidarseg_data["filename"],
-        dtype=np.uint8,
-    )
+    # 点群読み込み（LidarPointCloud.from_file と同じ (x, y, z, intensity, ring) 形式）
+    with perf.stage("load"):
+        lidar_data = nusc.get("sample_data", lidar_token)
+        scan = read_dataroot_array(nusc, lidar_data["filename"], np.float32)
+        pc = LidarPointCloud(scan.reshape((-1, 5))[:, :LidarPointCloud.nbr_dims()].T)
+        points = pc.points.T  # (N, 4) -> transpose to (N, 4)
+
+        # semantic labels読み込み
+        lidarseg_data = nusc.get("lidarseg", lidar_token)
+        labels = read_dataroot_array(nusc, lidarseg_data["filename"], np.uint8)
+    perf.count("points_loaded", len(points))
 
     return points[:, :3], labels  # (N, 3), (N,)
 
@@ -86,11 +103,12 @@ def transform_lidar_to_world(
     # lidar → world
     T_world_lidar = T_world_ego @ T_ego_lidar
 
-    # 点群をhomogeneous座標に変換
-    points_homo = np.hstack([points_lidar, np.ones((len(points_lidar), 1))])
+    with perf.stage("transform"):
+        # 点群をhomogeneous座標に変換
+        points_homo = np.hstack([points_lidar, np.ones((len(points_lidar), 1))])
 
-    # 変換適用
-    points_world_homo = (T_world_lidar @ points_homo.T).T
+        # 変換適用
+        points_world_homo = (T_world_lidar @ points_homo.T).T
 
     return points_world_homo[:, :3]
 
@@ -116,34 +134,151 @@ def project_points_to_image(
     """
     h, w = image_shape
 
-    # World → camera座標系に変換
-    points_homo = np.hstack([points_world, np.ones((len(points_world), 1))])
-    points_cam_homo = (w2c @ points_homo.T).T  # (N, 4)
-    points_cam = points_cam_homo[:, :3]  # (N, 3)
+    with perf.stage("project"):
+        # World → camera座標系に変換
+        points_homo = np.hstack([points_world, np.ones((len(points_world), 1))])
+        points_cam_homo = (w2c @ points_homo.T).T  # (N, 4)
+        points_cam = points_cam_homo[:, :3]  # (N, 3)
 
-    # カメラ背後の点をフィルタ（z > 0のみ）
-    valid_mask = points_cam[:, 2] > 0
+        # カメラ背後の点をフィルタ（z > 0のみ）
+        valid_mask = points_cam[:, 2] > 0
 
-    # 2D投影
-    points_2d = (K @ points_cam[valid_mask].T).T  # (M, 3)
-    uv = points_2d[:, :2] / points_2d[:, 2:3]  # (M, 2)
+        # 2D投影
+        points_2d = (K @ points_cam[valid_mask].T).T  # (M, 3)
+        uv = points_2d[:, :2] / points_2d[:, 2:3]  # (M, 2)
 
-    # 距離を取得（カメラ座標系のz値）
-    distances = points_cam[valid_mask, 2]
+        # 距離を取得（カメラ座標系のz値）
+        distances = points_cam[valid_mask, 2]
 
-    # 画像境界内の点のみ
-    in_bounds = (
-        (uv[:, 0] >= 0) & (uv[:, 0] < w) &
-        (uv[:, 1] >= 0) & (uv[:, 1] < h)
-    )
+        # 画像境界内の点のみ
+        in_bounds = (
+            (uv[:, 0] >= 0) & (uv[:, 0] < w) &
+            (uv[:, 1] >= 0) & (uv[:, 1] < h)
+        )
 
-    # valid_maskを更新（カメラ背後 + 境界外をフィルタ）
-    valid_indices = np.where(valid_mask)[0]
-    valid_mask[valid_indices[~in_bounds]] = False
+        # valid_maskを更新（カメラ背後 + 境界外をフィルタ）
+        valid_indices = np.where(valid_mask)[0]
+        valid_mask[valid_indices[~in_bounds]] = False
+
+    n_projected = int(in_bounds.sum())
+    perf.count("points_projected", n_projected)
+    perf.count("points_culled", len(points_world) - n_projected)
 
     return uv[in_bounds], valid_mask, distances[in_bounds]
 
 
+# 距離オーバーレイの色（近い=0.0 → 遠い=1.0）: 青 → 緑 → 黄 → 赤 の区分線形
+DISTANCE_COLORSCALE = ((0.0, (0, 0, 255)), (0.33, (0, 255, 0)), (0.67, (255, 255, 0)), (1.0, (255, 0, 0)))
+
+# lidarseg クラスの表示色: 動的オブジェクトを赤系、静的背景を青/緑系で表現
+DEFAULT_LABEL_COLORS = {
+    # Vehicle (red-orange)
+    17: (255, 50, 50), 18: (255, 100, 50), 19: (255, 150, 50),
+    20: (200, 50, 50), 21: (200, 100, 50), 22: (200, 150, 50),
+    23: (150, 50, 50),
+    # Human (yellow)
+    2: (255, 255, 0), 3: (200, 200, 0), 4: (150, 150, 0),
+    5: (255, 200, 0), 6: (200, 150, 0), 7: (150, 100, 0),
+    # Cycle (purple)
+    14: (255, 0, 255), 15: (200, 0, 200), 16: (150, 0, 150),
+    # Static background (blue-green)
+    1: (0, 100, 200), 8: (0, 150, 150), 9: (0, 200, 100),
+    10: (100, 200, 100), 11: (150, 200, 50), 12: (200, 200, 50),
+    13: (100, 150, 100),
+    # Movable objects (orange)
+    24: (255, 150, 0), 25: (200, 120, 0), 26: (150, 100, 0),
+    27: (100, 80, 0), 28: (255, 180, 50), 29: (200, 150, 50),
+    30: (150, 120, 50), 31: (100, 90, 50),
+}
+
+
+def _distance_lut() -> np.ndarray:
+    """DISTANCE_COLORSCALE を 256 段階に展開した (256, 3) uint8 LUT."""
+    t = np.linspace(0.0, 1.0, 256)
+    stops = np.array([stop for stop, _ in DISTANCE_COLORSCALE])
+    colors = np.array([color for _, color in DISTANCE_COLORSCALE], dtype=np.float64)
+    return np.stack([np.interp(t, stops, colors[:, c]) for c in range(3)], axis=1).astype(np.uint8)
+
+
+DISTANCE_LUT = _distance_lut()
+
+
+def label_lut(colormap: dict[int, tuple[int, int, int]] | None = None) -> np.ndarray:
+    """クラス ID → RGB の (256, 3) uint8 LUT（未定義のクラスは灰色）."""
+    lut = np.full((256, 3), 128, dtype=np.uint8)
+    for label, color in (DEFAULT_LABEL_COLORS if colormap is None else colormap).items():
+        lut[label] = color
+    return lut
+
+
+def distance_colors(distances: np.ndarray) -> np.ndarray:
+    """距離を min-max 正規化して DISTANCE_LUT で色付けする（一括）.
+
+    Returns:
+        (N, 3) uint8 RGB
+    """
+    if len(distances) == 0:
+        return np.zeros((0, 3), dtype=np.uint8)
+    min_dist = distances.min()
+    normalized = (distances - min_dist) / (distances.max() - min_dist + 1e-6)
+    return DISTANCE_LUT[np.clip((normalized * 255).astype(np.int64), 0, 255)]
+
+
+def disk_offsets(radius: int) -> np.ndarray:
+    """``cv2.circle``（塗りつぶし）と同じ画素集合の円フットプリントのオフセット (K, 2) [dy, dx]."""
+    footprint = cv2.circle(np.zeros((2 * radius + 1, 2 * radius + 1), np.uint8), (radius, radius), radius, 1, -1)
+    return np.argwhere(footprint) - radius
+
+
+def stamp_disks(image_shape: tuple[int, int], uv: np.ndarray, colors: np.ndarray, radius: int = 5) -> np.ndarray:
+    """各点に塗りつぶし円を描いた RGB 画像（後の点が前の点を上書き）.
+
+    ``cv2.circle`` を点ごとに呼ぶ代わりに、円の画素オフセットを1回だけ求め、
+    画素ごとに最後に描かれる（番号が最大の）点をバックエンドの ``stamp_owner`` で求める。
+    描画結果は点ごとの ``cv2.circle`` と一致する。
+
+    Args:
+        image_shape: (height, width)
+        uv: (N, 2) pixel coordinates [u, v]
+        colors: (N, 3) uint8 RGB
+        radius: 円の半径 [px]
+
+    Returns:
+        (H, W, 3) uint8, 点のない画素は 0
+    """
+    h, w = image_shape
+    center = np.round(uv).astype(np.int64).reshape(-1, 2)
+    inside = (center[:, 0] >= 0) & (center[:, 0] < w) & (center[:, 1] >= 0) & (center[:, 1] < h)
+    point_idx = np.flatnonzero(inside)
+    if len(point_idx) == 0:
+        return np.zeros((h, w, 3), dtype=np.uint8)
+
+    owner = get_backend().stamp_owner(image_shape, center[point_idx], disk_offsets(radius))
+
+    # 番号 -1（点なし）→ 黒、それ以外 → 点の色
+    palette = np.concatenate([np.zeros((1, 3), dtype=np.uint8), colors[point_idx].astype(np.uint8, copy=False)])
+    return np.take(palette, owner + 1, axis=0)
+
+
+def stamp_circles(image_shape: tuple[int, int], uv: np.ndarray, radius: int = 3) -> np.ndarray:
+    """各点に塗りつぶし円を描いた二値画像（255 = 円の内側）. 点ごとの ``cv2.circle`` と一致する.
+
+    Args:
+        image_shape: (height, width)
+        uv: (N, 2) pixel coordinates [u, v]（四捨五入して画像外の点は描かない）
+        radius: 円の半径 [px]
+
+    Returns:
+        (H, W) uint8
+    """
+    h, w = image_shape
+    center = np.round(uv).astype(np.int64).reshape(-1, 2)
+    inside = (center[:, 0] >= 0) & (center[:, 0] < w) & (center[:, 1] >= 0) & (center[:, 1] < h)
+    if not inside.any():
+        return np.zeros((h, w), dtype=np.uint8)
+    return get_backend().stamp(image_shape, center[inside], disk_offsets(radius)).view(np.uint8) * np.uint8(255)
+
+
 def create_label_overlay(
     image_shape: tuple[int, int],
     uv: np.ndarray,
@@ -165,71 +300,12 @@ def create_label_overlay(
     Returns:
         overlay: (H, W, 3) RGB image with colored points
     """
-    h, w = image_shape
-    overlay = np.zeros((h, w, 3), dtype=np.uint8)
-
-    # 距離ベースの色分けを使用する場合
     if distances is not None:
-        # 距離を正規化（近い=0.0、遠い=1.0）
-        min_dist = distances.min()
-        max_dist = distances.max()
-        normalized_dist = (distances - min_dist) / (max_dist - min_dist + 1e-6)
-
-        # 各点を円として描画（距離で色分け）
-        for (u, v), dist_norm in zip(uv, normalized_dist):
-            u_int, v_int = int(round(u)), int(round(v))
-            if 0 <= u_int < w and 0 <= v_int < h:
-                # 青（近い） → 緑 → 黄 → 赤（遠い）のカラーマップ
-                if dist_norm < 0.33:
-                    # 青 → 緑
-                    r = 0
-                    g = int(255 * (dist_norm / 0.33))
-                    b = int(255 * (1 - dist_norm / 0.33))
-                elif dist_norm < 0.67:
-                    # 緑 → 黄
-                    r = int(255 * ((dist_norm - 0.33) / 0.34))
-                    g = 255
-                    b = 0
-                else:
-                    # 黄 → 赤
-                    r = 255
-                    g = int(255 * (1 - (dist_norm - 0.67) / 0.33))
-                    b = 0
-
-                color = (int(r), int(g), int(b))
-                cv2.circle(overlay, (u_int, v_int), radius=point_radius, color=color, thickness=-1)
+        # 青（近い） → 緑 → 黄 → 赤（遠い）
+        colors = distance_colors(distances)
     else:
-        # Semantic labelベースの色分けを使用
-        if colormap is None:
-            # 動的オブジェクトを赤系、静的背景を青/緑系で表現
-            colormap = {
-                # Vehicle (red-orange)
-                17: (255, 50, 50), 18: (255, 100, 50), 19: (255, 150, 50),
-                20: (200, 50, 50), 21: (200, 100, 50), 22: (200, 150, 50),
-                23: (150, 50, 50),
-                # Human (yellow)
-                2: (255, 255, 0), 3: (200, 200, 0), 4: (150, 150, 0),
-                5: (255, 200, 0), 6: (200, 150, 0), 7: (150, 100, 0),
-                # Cycle (purple)
-                14: (255, 0, 255), 15: (200, 0, 200), 16: (150, 0, 150),
-                # Static background (blue-green)
-                1: (0, 100, 200), 8: (0, 150, 150), 9: (0, 200, 100),
-                10: (100, 200, 100), 11: (150, 200, 50), 12: (200, 200, 50),
-                13: (100, 150, 100),
-                # Movable objects (orange)
-                24: (255, 150, 0), 25: (200, 120, 0), 26: (150, 100, 0),
-                27: (100, 80, 0), 28: (255, 180, 50), 29: (200, 150, 50),
-                30: (150, 120, 50), 31: (100, 90, 50),
-            }
-
-        # 各点を円として描画
-        for (u, v), label in zip(uv, labels):
-            u_int, v_int = int(round(u)), int(round(v))
-            if 0 <= u_int < w and 0 <= v_int < h:
-                color = colormap.get(label, (128, 128, 128))  # Gray for unknown
-                cv2.circle(overlay, (u_int, v_int), radius=point_radius, color=color, thickness=-1)
-
-    return overlay
+        colors = label_lut(colormap)[np.asarray(labels, dtype=np.int64) & 0xFF]
+    return stamp_disks(image_shape, uv, colors, radius=point_radius)
 
 
 def compute_w2c(ego_pose: dict, calibrated_sensor: dict) -> np.ndarray:
@@ -260,6 +336,22 @@ def compute_w2c(ego_pose: dict, calibrated_sensor: dict) -> np.ndarray:
     return w2c
 
 
+def write_png(path: Path, image: np.ndarray) -> None:
+    """画像を PNG で保存（encode / write を分けて計測）.
+
+    Args:
+        path: 出力パス
+        image: (H, W) or (H, W, 3) uint8 / uint16 image
+    """
+    with perf.stage("encode"):
+        ok, buf = cv2.imencode(".png", image)
+    if not ok:
+        raise RuntimeError(f"Failed to encode PNG: {path}")
+    with perf.stage("write"):
+        buf.tofile(str(path))
+    perf.count("bytes_written", buf.nbytes)
+
+
 def project_lidar_to_mask(
     points_world: np.ndarray,
     labels: np.ndarray,
@@ -268,6 +360,9 @@ def project_lidar_to_mask(
     image_shape: tuple[int, int],
     dynamic_classes: list[int] | None = None,
     dilation_size: int = 8,
+    dilation_meters: float | None = None,
+    depth_bins: int = 4,
+    max_dilation_size: int = DEFAULT_MAX_DILATION,
 ) -> np.ndarray:
     """LiDAR点群から2Dバイナリマスクを生成.
 
@@ -278,7 +373,10 @@ def project_lidar_to_mask(
         K: 3x3 camera intrinsic matrix
         image_shape: (height, width)
         dynamic_classes: List of semantic class IDs to mask. If None, use default.
-        dilation_size: Morphological dilation kernel size
+        dilation_size: Morphological dilation kernel size (dilation_meters 指定時は使わない)
+        dilation_meters: 指定時は深度に応じて膨張する（カーネル径 ≈ dilation_meters * fx / z）
+        depth_bins: 深度適応膨張で点を分ける深度ビン数
+        max_dilation_size: 深度適応膨張のカーネル径の上限 [px]
 
     Returns:
         Binary mask (H, W) uint8 (Nerfstudio convention: 0=exclude from training, 255=include)
@@ -287,11 +385,7 @@ def project_lidar_to_mask(
 
     # デフォルトの動的クラス
     if dynamic_classes is None:
-        dynamic_classes = (
-            [17, 18, 19, 20, 21, 22, 23] +  # vehicle.*
-            [2, 3, 4, 5, 6, 7] +             # human.*
-            [14, 15, 16]                     # cycle.*
-        )
+        dynamic_classes = DEFAULT_DYNAMIC_CLASSES
 
     # 動的オブジェクトの点をフィルタ
     dynamic_mask = np.isin(labels, dynamic_classes)
@@ -302,23 +396,28 @@ def project_lidar_to_mask(
         return np.full((h, w), 255, dtype=np.uint8)
 
     # 2D投影（既存の関数を利用）
-    uv, _, _ = project_points_to_image(dynamic_points, w2c, K, image_shape)
+    uv, _, distances = project_points_to_image(dynamic_points, w2c, K, image_shape)
 
-    # バイナリマスクを初期化
-    mask = np.zeros((h, w), dtype=np.uint8)
+    if dilation_meters is not None:
+        mask = _rasterize_with_depth_adaptive_dilation(
+            uv, distances, K[0, 0], image_shape, dilation_meters, max_dilation_size, depth_bins
+        )
+        if perf.enabled():
+            perf.count("pixels_written", cv2.countNonZero(mask))
+        return cv2.bitwise_not(mask)
 
     # 投影された点の位置に円を描画（半径3ピクセル）
     # LiDAR点は疎なので、各点を小さい円として描画することで連続した領域を作る
-    for u, v in uv:
-        u_int, v_int = int(round(u)), int(round(v))
-        if 0 <= u_int < w and 0 <= v_int < h:
-            # 1ピクセルではなく、半径3の円として描画
-            cv2.circle(mask, (u_int, v_int), radius=3, color=255, thickness=-1)
+    with perf.stage("rasterize"):
+        mask = stamp_circles(image_shape, uv, radius=3)
 
     # モルフォロジー膨張を適用
     if dilation_size > 0:
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (dilation_size, dilation_size))
-        mask = cv2.dilate(mask, kernel, iterations=1)
+        with perf.stage("dilate"):
+            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (dilation_size, dilation_size))
+            mask = cv2.dilate(mask, kernel, iterations=1)
+    if perf.enabled():
+        perf.count("pixels_written", cv2.countNonZero(mask))
 
     # Nerfstudio規約に合わせてマスクを反転
     # Nerfstudio: 0=exclude from training (dynamic), 255=include (static)
@@ -328,21 +427,149 @@ def project_lidar_to_mask(
     return mask
 
 
+def _rasterize_with_depth_adaptive_dilation(
+    uv: np.ndarray,
+    distances: np.ndarray,
+    focal: float,
+    image_shape: tuple[int, int],
+    dilation_meters: float,
+    max_dilation_size: int,
+    depth_bins: int,
+) -> np.ndarray:
+    """投影点を深度ビンごとに描画・膨張して論理和を取る（動的領域=255）.
+
+    カーネル径は各ビンの手前側の深度で決める（dilation_meters * focal / z）。
+    膨張は各ビンの点を囲む ROI の中だけで行うので、近距離ビンの大きなカーネルでも
+    画像全体のモルフォロジーにはならない。
+    """
+    h, w = image_shape
+    mask = np.zeros((h, w), dtype=np.uint8)
+    if len(uv) == 0:
+        return mask
+
+    z_near = max(float(distances.min()), 0.1)
+    z_far = max(float(distances.max()), z_near * (1.0 + 1e-6))
+    edges = np.geomspace(z_near, z_far, depth_bins + 1)
+    bin_idx = np.clip(np.searchsorted(edges, distances, side="right") - 1, 0, depth_bins - 1)
+    uv_int = np.rint(uv).astype(np.int64)
+
+    for b in range(depth_bins):
+        pts = uv_int[bin_idx == b]
+        pts = pts[(pts[:, 0] < w) & (pts[:, 1] < h)]
+        if len(pts) == 0:
+            continue
+        size = int(np.clip(round(dilation_meters * focal / edges[b]), 1, max(max_dilation_size, 1)))
+
+        with perf.stage("rasterize"):
+            pad = size // 2 + 4  # 半径3の円 + カーネル半径
+            x0, y0 = np.maximum(pts.min(axis=0) - pad, 0)
+            x1, y1 = np.minimum(pts.max(axis=0) + pad + 1, (w, h))
+            roi = stamp_circles((y1 - y0, x1 - x0), pts - (x0, y0), radius=3)
+
+        if size > 1:
+            with perf.stage("dilate"):
+                kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size))
+                roi = cv2.dilate(roi, kernel, iterations=1)
+        np.bitwise_or(mask[y0:y1, x0:x1], roi, out=mask[y0:y1, x0:x1])
+
+    return mask
+
+
+def write_mask_stats(output_dir: Path, stats: list[dict], summary: dict | None = None) -> Path:
+    """フレームごとのマスク統計を output_dir/mask_stats.json に書く.
+
+    Args:
+        output_dir: エクスポートディレクトリ
+        stats: フレームごとの dict（frame_idx, masked_pixels, masked_ratio など）
+        summary: シーン全体の集計（トップレベルのキーとして書く）
+
+    Returns:
+        mask_stats.json のパス
+    """
+    import json
+
+    path = Path(output_dir) / "mask_stats.json"
+    with open(path, "w") as f:
+        json.dump({**(summary or {}), "frames": stats}, f, indent=2)
+    return path
+
+
+def _pixels_gained(mask: np.ndarray, static_mask: np.ndarray) -> int:
+    """静止インスタンスだけのマスクで除外され、動体マスクでは学習に使える画素数."""
+    return cv2.countNonZero(cv2.bitwise_and(mask, cv2.bitwise_not(static_mask)))
+
+
+def _scene_motion(nusc, scene_token: str, motion_threshold: float | None) -> tuple[set[str], set[str]] | None:
+    """motion_threshold 指定時のみ (moving, static) instance tokens を返す."""
+    if motion_threshold is None:
+        return None
+    from .motion import moving_instances
+
+    return moving_instances(nusc, scene_token, min_displacement=motion_threshold)
+
+
+def _motion_summary(motion: tuple[set[str], set[str]] | None, stats: list[dict]) -> dict | None:
+    if motion is None:
+        return None
+    return {
+        "moving_instances": len(motion[0]),
+        "static_instances": len(motion[1]),
+        "pixels_gained": sum(fr["pixels_gained"] for fr in stats),
+    }
+
+
+def _mask_frame_stats(frame_idx: int, mask: np.ndarray) -> dict:
+    """マスク（0=exclude）の除外画素数と割合."""
+    masked = int(mask.size - cv2.countNonZero(mask))
+    return {"frame_idx": frame_idx, "masked_pixels": masked, "masked_ratio": masked / mask.size}
+
+
+def _add_radar_mask(
+    nusc,
+    sample: dict,
+    cam_data: dict,
+    mask: np.ndarray,
+    w2c: np.ndarray,
+    K: np.ndarray,
+    radar: dict,
+) -> tuple[np.ndarray, int]:
+    """RADAR の動体領域をマスク（0=exclude）に足し、RADAR が除外した画素数も返す."""
+    from .radar import radar_mask_for_sample
+
+    with perf.stage("radar"):
+        radar_mask = radar_mask_for_sample(nusc, sample, cam_data, w2c, K, mask.shape, **radar)
+    return cv2.bitwise_and(mask, radar_mask), int(radar_mask.size - cv2.countNonZero(radar_mask))
+
+
 def generate_lidar_masks_for_scene(
     nusc,
     scene_token: str,
     output_dir: Path,
     dynamic_classes: list[int] | None = None,
     dilation_size: int = 8,
+    dilation_meters: float | None = None,
+    depth_bins: int = 4,
+    max_dilation_size: int = DEFAULT_MAX_DILATION,
+    motion_threshold: float | None = None,
+    radar: dict | None = None,
 ) -> dict[int, Path]:
     """シーン全体の全フレームについてLiDARマスクを生成.
 
+    フレームごとの除外画素数は output_dir/mask_stats.json に書く。
+    motion_threshold 指定時は、静止インスタンスの bbox に入る LiDAR 点をマスクせず、
+    それによって学習に使えるようになった画素数（pixels_gained）も書く。
+
     Args:
         nusc: NuScenes instance
         scene_token: Scene token
         output_dir: Output directory for masks
         dynamic_classes: List of semantic class IDs to mask. If None, use default.
         dilation_size: Morphological dilation kernel size
+        dilation_meters: 指定時は深度適応膨張（``project_lidar_to_mask`` 参照）
+        depth_bins: 深度適応膨張の深度ビン数
+        max_dilation_size: 深度適応膨張のカーネル径の上限 [px]
+        motion_threshold: 指定時はシーン内でこれ以上動いたインスタンスだけマスクする [m]
+        radar: 指定時は RADAR の動体領域も同じループで足す（``radar_mask_for_sample`` の引数）
 
     Returns:
         Dictionary mapping frame_idx to mask_path
@@ -350,10 +577,14 @@ def generate_lidar_masks_for_scene(
     from pathlib import Path
 
     scene = nusc.get("scene", scene_token)
+    motion = _scene_motion(nusc, scene_token, motion_threshold)
+    if dynamic_classes is None:
+        dynamic_classes = DEFAULT_DYNAMIC_CLASSES
     masks_dir = Path(output_dir) / "masks"
     masks_dir.mkdir(parents=True, exist_ok=True)
 
     mask_paths = {}
+    stats: list[dict] = []
     sample_token = scene["first_sample_token"]
     frame_idx = 0
 
@@ -381,32 +612,50 @@ def generate_lidar_masks_for_scene(
         w2c = compute_w2c(cam_ego_pose, cam_calib)
         K = np.array(cam_calib["camera_intrinsic"])
 
-        # 画像サイズを取得
-        from PIL import Image as PILImage
-        img_path = Path(nusc.dataroot) / cam_data["filename"]
-        with PILImage.open(img_path) as img:
-            image_shape = (img.height, img.width)
+        # 画像サイズを取得（sample_data に記録済みなので画像は開かない）
+        image_shape = (cam_data["height"], cam_data["width"])
+
+        # 静止インスタンスの点を除く
+        keep = None
+        if motion is not None:
+            from .motion import drop_points_of_instances
+
+            keep = drop_points_of_instances(nusc, sample, points_world, labels, motion[1], dynamic_classes)
 
         # マスク生成
-        mask = project_lidar_to_mask(
-            points_world,
-            labels,
-            w2c,
-            K,
-            image_shape,
+        mask_kwargs = dict(
             dynamic_classes=dynamic_classes,
             dilation_size=dilation_size,
+            dilation_meters=dilation_meters,
+            depth_bins=depth_bins,
+            max_dilation_size=max_dilation_size,
         )
+        if keep is None:
+            mask = project_lidar_to_mask(points_world, labels, w2c, K, image_shape, **mask_kwargs)
+        else:
+            mask = project_lidar_to_mask(points_world[keep], labels[keep], w2c, K, image_shape, **mask_kwargs)
+        if radar is not None:
+            mask, radar_pixels = _add_radar_mask(nusc, sample, cam_data, mask, w2c, K, radar)
 
         # マスクを保存
         mask_path = masks_dir / f"{frame_idx:04d}.png"
-        cv2.imwrite(str(mask_path), mask)
+        write_png(mask_path, mask)
         mask_paths[frame_idx] = mask_path
+        stats.append(_mask_frame_stats(frame_idx, mask))
+        if radar is not None:
+            stats[-1]["radar_pixels"] = radar_pixels
+
+        if keep is not None:
+            static_mask = project_lidar_to_mask(
+                points_world[~keep], labels[~keep], w2c, K, image_shape, **mask_kwargs
+            )
+            stats[-1]["pixels_gained"] = _pixels_gained(mask, static_mask)
 
         # 次のフレームへ
         sample_token = sample["next"] if sample["next"] else None
         frame_idx += 1
 
+    write_mask_stats(output_dir, stats, _motion_summary(motion, stats))
     return mask_paths
 
 
@@ -503,6 +752,59 @@ def project_bbox_to_image(
     return corners_2d_visible, is_visible
 
 
+def project_bboxes_to_image(
+    bbox_centers: np.ndarray,
+    bbox_sizes: np.ndarray,
+    bbox_rotations: np.ndarray,
+    w2c: np.ndarray,
+    K: np.ndarray,
+    image_shape: tuple[int, int],
+) -> list[np.ndarray | None]:
+    """複数の 3D bounding box をまとめて 2D 画像に投影（各 bbox の結果は ``project_bbox_to_image`` と一致）.
+
+    Args:
+        bbox_centers: (B, 3) bbox centers in world frame
+        bbox_sizes: (B, 3) bbox sizes [width, length, height]
+        bbox_rotations: (B, 3, 3) rotation matrices
+        w2c: 4x4 world-to-camera transform matrix
+        K: 3x3 camera intrinsic matrix
+        image_shape: (height, width)
+
+    Returns:
+        bbox ごとのカメラ前方の corners (N, 2)。見えない bbox は None
+    """
+    h, w = image_shape
+    n_boxes = len(bbox_centers)
+    if n_boxes == 0:
+        return []
+
+    # get_bbox_corners_3d と同じ順序の 8 corners（ローカル座標の符号）
+    signs = np.array([
+        [-1, -1, -1], [1, -1, -1], [1, 1, -1], [-1, 1, -1],
+        [-1, -1, 1], [1, -1, 1], [1, 1, 1], [-1, 1, 1],
+    ], dtype=np.float64)
+    half = np.asarray(bbox_sizes, dtype=np.float64)[:, [1, 0, 2]] / 2  # (l, w, h) / 2
+    corners_local = signs[None] * half[:, None]  # (B, 8, 3)
+    corners_world = (
+        np.matmul(bbox_rotations, corners_local.transpose(0, 2, 1)).transpose(0, 2, 1) + bbox_centers[:, None]
+    )
+
+    # World → camera → 画像（全 corners を1回の行列積で）
+    corners_homo = np.hstack([corners_world.reshape(-1, 3), np.ones((n_boxes * 8, 1))])
+    corners_cam = (w2c @ corners_homo.T).T[:, :3]  # (B*8, 3)
+    corners_2d_homo = (K @ corners_cam.T).T
+    corners_2d = (corners_2d_homo[:, :2] / corners_2d_homo[:, 2:3]).reshape(n_boxes, 8, 2)
+    in_front = (corners_cam[:, 2] > 0).reshape(n_boxes, 8)
+    in_bounds = (
+        in_front &
+        (corners_2d[..., 0] >= 0) & (corners_2d[..., 0] < w) &
+        (corners_2d[..., 1] >= 0) & (corners_2d[..., 1] < h)
+    )
+
+    # 少なくとも 1 点がカメラ前方かつ画像内にあれば可視
+    return [corners_2d[i][in_front[i]] if in_bounds[i].any() else None for i in range(n_boxes)]
+
+
 def draw_bbox_on_image(
     image: np.ndarray,
     corners_2d: np.ndarray,
@@ -591,12 +893,20 @@ def project_bbox_to_mask(
 
     # マスク初期化
     mask = np.zeros((h, w), dtype=np.uint8)
+    _fill_bbox(mask, corners_2d)
+    return mask
+
+
+def _fill_bbox(mask: np.ndarray, corners_2d: np.ndarray) -> None:
+    """投影した corners の凸包を mask に 255 で塗る（in-place）."""
+    from scipy.spatial import ConvexHull
+
+    h, w = mask.shape
 
     # corners_2d を整数に変換
     corners_int = corners_2d.astype(np.int32)
 
     # 凸包を計算してpolygonを塗りつぶし
-    from scipy.spatial import ConvexHull
     try:
         hull = ConvexHull(corners_int)
         hull_points = corners_int[hull.vertices]
@@ -609,8 +919,6 @@ def project_bbox_to_mask(
         y_max = min(h, int(corners_int[:, 1].max()))
         mask[y_min:y_max, x_min:x_max] = 255
 
-    return mask
-
 
 def project_bboxes_to_mask(
     nusc,
@@ -620,6 +928,7 @@ def project_bboxes_to_mask(
     image_shape: tuple[int, int],
     dynamic_categories: list[str] | None = None,
     dilation_size: int = 5,
+    instance_tokens: set[str] | None = None,
 ) -> np.ndarray:
     """1フレームの全bboxから統合された2Dバイナリマスクを生成.
 
@@ -631,6 +940,7 @@ def project_bboxes_to_mask(
         image_shape: (height, width)
         dynamic_categories: マスク対象のcategory prefix list. If None, use default.
         dilation_size: Morphological dilation kernel size
+        instance_tokens: 指定時はこの instance の bbox だけマスクする
 
     Returns:
         Binary mask (H, W) uint8 (Nerfstudio convention: 0=exclude, 255=include)
@@ -641,12 +951,13 @@ def project_bboxes_to_mask(
 
     # デフォルトの動的category
     if dynamic_categories is None:
-        dynamic_categories = ["vehicle.", "human.", "cycle."]
+        dynamic_categories = DEFAULT_DYNAMIC_CATEGORIES
 
     # マスク初期化（全て0 = 動的領域なし）
     combined_mask = np.zeros((h, w), dtype=np.uint8)
 
-    # 各annotationを処理
+    # 対象の annotation を集める
+    centers, sizes, rotations = [], [], []
     for ann_token in sample["anns"]:
         ann = nusc.get("sample_annotation", ann_token)
         category_name = ann["category_name"]
@@ -655,25 +966,35 @@ def project_bboxes_to_mask(
         is_dynamic = any(category_name.startswith(prefix) for prefix in dynamic_categories)
         if not is_dynamic:
             continue
+        if instance_tokens is not None and ann["instance_token"] not in instance_tokens:
+            continue
 
         # bbox パラメータを取得
-        bbox_center = np.array(ann["translation"])
-        bbox_size = np.array(ann["size"])
-        bbox_rotation = Quaternion(ann["rotation"]).rotation_matrix
-
-        # マスク生成
-        bbox_mask = project_bbox_to_mask(
-            bbox_center, bbox_size, bbox_rotation, w2c, K, image_shape
-        )
-
-        if bbox_mask is not None:
-            # 論理和（複数のbboxを統合）
-            combined_mask = cv2.bitwise_or(combined_mask, bbox_mask)
+        centers.append(ann["translation"])
+        sizes.append(ann["size"])
+        rotations.append(Quaternion(ann["rotation"]).rotation_matrix)
+
+    if centers:
+        # 全 bbox を一括で投影し、凸包を直接 combined_mask に塗る（論理和と同じ）
+        with perf.stage("project"):
+            projected = project_bboxes_to_image(
+                np.array(centers, dtype=np.float64),
+                np.array(sizes, dtype=np.float64),
+                np.stack(rotations),
+                w2c, K, image_shape,
+            )
+        with perf.stage("rasterize"):
+            for corners_2d in projected:
+                if corners_2d is not None:
+                    _fill_bbox(combined_mask, corners_2d)
 
     # モルフォロジー膨張を適用
     if dilation_size > 0:
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (dilation_size, dilation_size))
-        combined_mask = cv2.dilate(combined_mask, kernel, iterations=1)
+        with perf.stage("dilate"):
+            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (dilation_size, dilation_size))
+            combined_mask = cv2.dilate(combined_mask, kernel, iterations=1)
+    if perf.enabled():
+        perf.count("pixels_written", cv2.countNonZero(combined_mask))
 
     # Nerfstudio規約に合わせてマスクを反転
     # Nerfstudio: 0=exclude from training (dynamic), 255=include (static)
@@ -689,24 +1010,34 @@ def generate_bbox_masks_for_scene(
     output_dir: Path,
     dynamic_categories: list[str] | None = None,
     dilation_size: int = 5,
+    motion_threshold: float | None = None,
+    radar: dict | None = None,
 ) -> dict[int, Path]:
     """シーン全体の全フレームについてbboxマスクを生成.
 
+    フレームごとの除外画素数は output_dir/mask_stats.json に書く。
+    motion_threshold 指定時は動いているインスタンスの bbox だけをマスクし、
+    それによって学習に使えるようになった画素数（pixels_gained）も書く。
+
     Args:
         nusc: NuScenes instance
         scene_token: Scene token
         output_dir: Output directory for masks
         dynamic_categories: マスク対象のcategory prefix list. If None, use default.
         dilation_size: Morphological dilation kernel size
+        motion_threshold: 指定時はシーン内でこれ以上動いたインスタンスだけマスクする [m]
+        radar: 指定時は RADAR の動体領域も同じループで足す（``radar_mask_for_sample`` の引数）
 
     Returns:
         Dictionary mapping frame_idx to mask_path
     """
     scene = nusc.get("scene", scene_token)
+    motion = _scene_motion(nusc, scene_token, motion_threshold)
     masks_dir = Path(output_dir) / "masks"
     masks_dir.mkdir(parents=True, exist_ok=True)
 
     mask_paths = {}
+    stats: list[dict] = []
     sample_token = scene["first_sample_token"]
     frame_idx = 0
 
@@ -723,11 +1054,8 @@ def generate_bbox_masks_for_scene(
         w2c = compute_w2c(cam_ego_pose, cam_calib)
         K = np.array(cam_calib["camera_intrinsic"])
 
-        # 画像サイズを取得
-        from PIL import Image as PILImage
-        img_path = Path(nusc.dataroot) / cam_data["filename"]
-        with PILImage.open(img_path) as img:
-            image_shape = (img.height, img.width)
+        # 画像サイズを取得（sample_data に記録済みなので画像は開かない）
+        image_shape = (cam_data["height"], cam_data["width"])
 
         # マスク生成
         mask = project_bboxes_to_mask(
@@ -738,15 +1066,288 @@ def generate_bbox_masks_for_scene(
             image_shape,
             dynamic_categories=dynamic_categories,
             dilation_size=dilation_size,
+            instance_tokens=motion[0] if motion is not None else None,
         )
+        if radar is not None:
+            mask, radar_pixels = _add_radar_mask(nusc, sample, cam_data, mask, w2c, K, radar)
 
         # マスクを保存
         mask_path = masks_dir / f"{frame_idx:04d}.png"
-        cv2.imwrite(str(mask_path), mask)
+        write_png(mask_path, mask)
         mask_paths[frame_idx] = mask_path
+        stats.append(_mask_frame_stats(frame_idx, mask))
+        if radar is not None:
+            stats[-1]["radar_pixels"] = radar_pixels
+
+        if motion is not None:
+            static_mask = project_bboxes_to_mask(
+                nusc,
+                sample,
+                w2c,
+                K,
+                image_shape,
+                dynamic_categories=dynamic_categories,
+                dilation_size=dilation_size,
+                instance_tokens=motion[1],
+            )
+            stats[-1]["pixels_gained"] = _pixels_gained(mask, static_mask)
 
         # 次のフレームへ
         sample_token = sample["next"] if sample["next"] else None
         frame_idx += 1
 
+    write_mask_stats(output_dir, stats, _motion_summary(motion, stats))
+    return mask_paths
+
+
+# mask_type="fused" の統合方針
+FUSION_POLICIES = ("union", "range", "refine")
+
+
+def project_fused_mask(
+    nusc,
+    sample: dict,
+    points_world: np.ndarray,
+    labels: np.ndarray,
+    w2c: np.ndarray,
+    K: np.ndarray,
+    image_shape: tuple[int, int],
+    policy: str = "union",
+    dynamic_classes: list[int] | None = None,
+    dynamic_categories: list[str] | None = None,
+    lidar_dilation_size: int = 8,
+    bbox_dilation_size: int = 5,
+    dilation_meters: float | None = None,
+    max_dilation_size: int = DEFAULT_MAX_DILATION,
+    near_range: float = 20.0,
+    instance_tokens: set[str] | None = None,
+) -> tuple[np.ndarray, dict]:
+    """bbox マスクと LiDAR マスクを統合した1フレーム分のマスクを生成.
+
+    policy:
+        "union": bbox ∪ LiDAR
+        "range": カメラから near_range [m] 以内は LiDAR、それより遠い物体は bbox
+            （遠方は LiDAR 点が疎なので bbox で補う）
+        "refine": bbox の内側に当たった LiDAR 点（膨張前の投影）の凸包で形を詰める
+            （LiDAR 点が1つも当たらない bbox は bbox のまま残す）
+
+    Args:
+        nusc: NuScenes instance
+        sample: sample データ
+        points_world: (N, 3) LiDAR points in world frame
+        labels: (N,) semantic class IDs
+        w2c: 4x4 world-to-camera transform matrix
+        K: 3x3 camera intrinsic matrix
+        image_shape: (height, width)
+        policy: 統合方針（``FUSION_POLICIES``）
+        dynamic_classes: LiDAR でマスクする semantic class IDs. If None, use default.
+        dynamic_categories: bbox でマスクする category prefix list. If None, use default.
+        lidar_dilation_size: LiDAR マスクの膨張カーネルサイズ
+        bbox_dilation_size: bbox マスクの膨張カーネルサイズ
+        dilation_meters: LiDAR マスクの深度適応膨張（``project_lidar_to_mask`` 参照）
+        max_dilation_size: 深度適応膨張のカーネル径の上限 [px]
+        near_range: "range" で LiDAR を使う距離の上限 [m]
+        instance_tokens: 指定時はこの instance だけマスクする（他の instance の bbox に
+            入る LiDAR 点も除く。bbox に入らない動的点はマスクに残す）
+
+    Returns:
+        mask: (H, W) uint8 (Nerfstudio convention: 0=exclude, 255=include)
+        coverage: ソースごとの動的画素数 {"bbox_pixels", "lidar_pixels", "overlap_pixels"}
+    """
+    from pyquaternion import Quaternion
+
+    if policy not in FUSION_POLICIES:
+        raise ValueError(f"Unknown fusion policy: {policy} (expected one of {FUSION_POLICIES})")
+    if dynamic_categories is None:
+        dynamic_categories = DEFAULT_DYNAMIC_CATEGORIES
+
+    h, w = image_shape
+    depth_row = w2c[2]  # world 点のカメラ z = depth_row[:3] @ p + depth_row[3]
+
+    # LiDAR 側（動的領域=255 に戻して扱う）
+    if instance_tokens is not None:
+        from .motion import drop_points_of_instances
+
+        others = {nusc.get("sample_annotation", t)["instance_token"] for t in sample["anns"]} - instance_tokens
+        keep = drop_points_of_instances(
+            nusc,
+            sample,
+            points_world,
+            labels,
+            others,
+            DEFAULT_DYNAMIC_CLASSES if dynamic_classes is None else dynamic_classes,
+        )
+        points_world, labels = points_world[keep], labels[keep]
+    if policy == "range":
+        near = points_world @ depth_row[:3] + depth_row[3] <= near_range
+        points_world, labels = points_world[near], labels[near]
+    lidar_mask = cv2.bitwise_not(
+        project_lidar_to_mask(
+            points_world,
+            labels,
+            w2c,
+            K,
+            image_shape,
+            dynamic_classes=dynamic_classes,
+            dilation_size=lidar_dilation_size,
+            dilation_meters=dilation_meters,
+            max_dilation_size=max_dilation_size,
+        )
+    )
+    # refine は膨張前の投影で形を決める（膨張済みのマスクは bbox からはみ出して形が残らない）
+    raw_lidar_mask = None
+    if policy == "refine":
+        raw_lidar_mask = cv2.bitwise_not(
+            project_lidar_to_mask(
+                points_world, labels, w2c, K, image_shape, dynamic_classes=dynamic_classes, dilation_size=0
+            )
+        )
+
+    # bbox 側
+    bbox_mask = np.zeros((h, w), dtype=np.uint8)
+    refined = np.zeros((h, w), dtype=np.uint8) if policy == "refine" else None
+    for ann_token in sample["anns"]:
+        ann = nusc.get("sample_annotation", ann_token)
+        if not any(ann["category_name"].startswith(prefix) for prefix in dynamic_categories):
+            continue
+        if instance_tokens is not None and ann["instance_token"] not in instance_tokens:
+            continue
+
+        bbox_center = np.array(ann["translation"])
+        if policy == "range" and bbox_center @ depth_row[:3] + depth_row[3] <= near_range:
+            continue
+
+        with perf.stage("rasterize"):
+            box = project_bbox_to_mask(
+                bbox_center, np.array(ann["size"]), Quaternion(ann["rotation"]).rotation_matrix, w2c, K, image_shape
+            )
+        if box is None:
+            continue
+        cv2.bitwise_or(bbox_mask, box, dst=bbox_mask)
+
+        if refined is not None:
+            hit = cv2.findNonZero(cv2.bitwise_and(box, raw_lidar_mask))
+            if hit is None:
+                cv2.bitwise_or(refined, box, dst=refined)
+                continue
+            shape = np.zeros_like(box)
+            cv2.fillConvexPoly(shape, cv2.convexHull(hit), 255)
+            cv2.bitwise_or(refined, cv2.bitwise_and(shape, box), dst=refined)
+
+    if bbox_dilation_size > 0:
+        with perf.stage("dilate"):
+            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (bbox_dilation_size, bbox_dilation_size))
+            bbox_mask = cv2.dilate(bbox_mask, kernel, iterations=1)
+            if refined is not None:
+                refined = cv2.dilate(refined, kernel, iterations=1)
+
+    fused = refined if refined is not None else cv2.bitwise_or(bbox_mask, lidar_mask)
+    coverage = {
+        "bbox_pixels": cv2.countNonZero(bbox_mask),
+        "lidar_pixels": cv2.countNonZero(lidar_mask),
+        "overlap_pixels": cv2.countNonZero(cv2.bitwise_and(bbox_mask, lidar_mask)),
+    }
+
+    # Nerfstudio規約（0=exclude, 255=include）に反転
+    return cv2.bitwise_not(fused), coverage
+
+
+def generate_fused_masks_for_scene(
+    nusc,
+    scene_token: str,
+    output_dir: Path,
+    policy: str = "union",
+    dynamic_classes: list[int] | None = None,
+    dynamic_categories: list[str] | None = None,
+    lidar_dilation_size: int = 8,
+    bbox_dilation_size: int = 5,
+    dilation_meters: float | None = None,
+    max_dilation_size: int = DEFAULT_MAX_DILATION,
+    near_range: float = 20.0,
+    motion_threshold: float | None = None,
+    radar: dict | None = None,
+) -> dict[int, Path]:
+    """シーン全体の全フレームについて bbox + LiDAR の統合マスクを1パスで生成.
+
+    フレームごとの除外画素数とソース別の動的画素数は output_dir/mask_stats.json に書く。
+    motion_threshold 指定時は動いているインスタンスだけをマスクし、pixels_gained も書く。
+
+    Args:
+        nusc: NuScenes instance
+        scene_token: Scene token
+        output_dir: Output directory for masks
+        policy: 統合方針（``project_fused_mask`` 参照）
+        dynamic_classes: LiDAR でマスクする semantic class IDs. If None, use default.
+        dynamic_categories: bbox でマスクする category prefix list. If None, use default.
+        lidar_dilation_size: LiDAR マスクの膨張カーネルサイズ
+        bbox_dilation_size: bbox マスクの膨張カーネルサイズ
+        dilation_meters: LiDAR マスクの深度適応膨張
+        max_dilation_size: 深度適応膨張のカーネル径の上限 [px]
+        near_range: "range" で LiDAR を使う距離の上限 [m]
+        motion_threshold: 指定時はシーン内でこれ以上動いたインスタンスだけマスクする [m]
+        radar: 指定時は RADAR の動体領域も同じループで足す（``radar_mask_for_sample`` の引数）
+
+    Returns:
+        Dictionary mapping frame_idx to mask_path
+    """
+    from .frames import build_scene_frame_index
+
+    motion = _scene_motion(nusc, scene_token, motion_threshold)
+
+    masks_dir = Path(output_dir) / "masks"
+    masks_dir.mkdir(parents=True, exist_ok=True)
+
+    mask_paths = {}
+    stats: list[dict] = []
+    for frame in build_scene_frame_index(nusc, scene_token):
+        points_lidar, labels = load_lidar_points_and_labels(nusc, frame["lidar_token"])
+        points_world = transform_lidar_to_world(points_lidar, frame["lidar_ego_pose"], frame["lidar_calib"])
+
+        fuse_kwargs = dict(
+            policy=policy,
+            dynamic_classes=dynamic_classes,
+            dynamic_categories=dynamic_categories,
+            lidar_dilation_size=lidar_dilation_size,
+            bbox_dilation_size=bbox_dilation_size,
+            dilation_meters=dilation_meters,
+            max_dilation_size=max_dilation_size,
+            near_range=near_range,
+        )
+        mask, coverage = project_fused_mask(
+            nusc,
+            frame["sample"],
+            points_world,
+            labels,
+            frame["w2c"],
+            frame["K"],
+            frame["image_shape"],
+            instance_tokens=motion[0] if motion is not None else None,
+            **fuse_kwargs,
+        )
+        if radar is not None:
+            mask, coverage["radar_pixels"] = _add_radar_mask(
+                nusc, frame["sample"], frame["cam_data"], mask, frame["w2c"], frame["K"], radar
+            )
+
+        frame_idx = frame["frame_idx"]
+        mask_path = masks_dir / f"{frame_idx:04d}.png"
+        write_png(mask_path, mask)
+        mask_paths[frame_idx] = mask_path
+        stats.append({**_mask_frame_stats(frame_idx, mask), **coverage})
+
+        if motion is not None:
+            static_mask, _ = project_fused_mask(
+                nusc,
+                frame["sample"],
+                points_world,
+                labels,
+                frame["w2c"],
+                frame["K"],
+                frame["image_shape"],
+                instance_tokens=motion[1],
+                **fuse_kwargs,
+            )
+            stats[-1]["pixels_gained"] = _pixels_gained(mask, static_mask)
+
+    write_mask_stats(output_dir, stats, _motion_summary(motion, stats))
     return mask_paths
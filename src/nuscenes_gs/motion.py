@@ -0,0 +1,187 @@
+"""annotation インスタンスの動き（変位・速度）と、実際に動く物体だけのマスク対象選択.
+
+``project_bboxes_to_mask`` などは vehicle.* / human.* / cycle.* の bbox を全てマスクするので、
+駐車車両のような静止物体まで学習から外してしまう。ここではシーン内の全
+sample_annotation をインスタンスごとに時刻順に並べ（prev/next の連結順と同じ）、
+変位と速度を一括で計算して「動いているインスタンス」を選ぶ。
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+from pyquaternion import Quaternion
+
+if TYPE_CHECKING:
+    from nuscenes.nuscenes import NuScenes
+
+
+def build_instance_tracks(nusc: NuScenes, scene_token: str) -> dict[str, np.ndarray]:
+    """シーン内の全インスタンスについて軌跡の統計量を計算.
+
+    Args:
+        nusc: NuScenes instance
+        scene_token: Scene token
+
+    Returns:
+        インスタンスごとの配列を持つ dict:
+            instance_token: (I,) instance tokens
+            category_name: (I,) category 名
+            num_annotations: (I,) annotation 数
+            max_displacement: (I,) 最初の位置からの最大水平変位 [m]
+            path_length: (I,) 水平移動距離の合計 [m]
+            max_speed: (I,) 隣接 annotation 間の最大水平速度 [m/s]
+    """
+    scene = nusc.get("scene", scene_token)
+
+    ann_instance, ann_category, ann_time, ann_xy = [], [], [], []
+    sample_token = scene["first_sample_token"]
+    while sample_token:
+        sample = nusc.get("sample", sample_token)
+        for ann_token in sample["anns"]:
+            ann = nusc.get("sample_annotation", ann_token)
+            ann_instance.append(ann["instance_token"])
+            ann_category.append(ann["category_name"])
+            ann_time.append(sample["timestamp"])
+            ann_xy.append(ann["translation"][:2])
+        sample_token = sample["next"] if sample["next"] else None
+
+    if not ann_instance:
+        empty = np.zeros(0)
+        return {
+            "instance_token": np.zeros(0, dtype=object),
+            "category_name": np.zeros(0, dtype=object),
+            "num_annotations": np.zeros(0, dtype=np.int64),
+            "max_displacement": empty,
+            "path_length": empty,
+            "max_speed": empty,
+        }
+
+    instance_tokens, inst_idx = np.unique(np.array(ann_instance, dtype=object), return_inverse=True)
+    inst_idx = inst_idx.reshape(-1)
+    t = np.array(ann_time, dtype=np.int64)
+    xy = np.array(ann_xy, dtype=np.float64)
+
+    # インスタンス → 時刻の順に並べる（prev/next を辿った順と一致）
+    order = np.lexsort((t, inst_idx))
+    inst_idx, t, xy = inst_idx[order], t[order], xy[order]
+    first = np.r_[True, inst_idx[1:] != inst_idx[:-1]]
+    starts = np.flatnonzero(first)
+    group = np.cumsum(first) - 1
+
+    displacement = np.linalg.norm(xy - xy[starts][group], axis=1)
+    step = np.linalg.norm(np.diff(xy, axis=0), axis=1)
+    dt = np.diff(t) * 1e-6
+    same_track = ~first[1:]
+    step = np.where(same_track, step, 0.0)
+    speed = np.where(same_track & (dt > 0), step / np.maximum(dt, 1e-6), 0.0)
+
+    return {
+        "instance_token": instance_tokens,
+        "category_name": np.array(ann_category, dtype=object)[order][starts],
+        "num_annotations": np.diff(np.r_[starts, len(inst_idx)]),
+        "max_displacement": np.maximum.reduceat(displacement, starts),
+        "path_length": np.add.reduceat(np.r_[0.0, step], starts),
+        "max_speed": np.maximum.reduceat(np.r_[0.0, speed], starts),
+    }
+
+
+def moving_instances(
+    nusc: NuScenes,
+    scene_token: str,
+    min_displacement: float = 1.0,
+) -> tuple[set[str], set[str]]:
+    """シーン内で動いているインスタンスと静止しているインスタンスに分ける.
+
+    annotation の位置ずれ（数十 cm）で静止物体を動体と判定しないよう、
+    速度ではなくシーン全体での最大変位で判定する。
+
+    Args:
+        nusc: NuScenes instance
+        scene_token: Scene token
+        min_displacement: これ以上動いたインスタンスを動体とみなす [m]
+
+    Returns:
+        moving: 動いている instance tokens
+        static: 静止している instance tokens
+    """
+    tracks = build_instance_tracks(nusc, scene_token)
+    is_moving = tracks["max_displacement"] >= min_displacement
+    return set(tracks["instance_token"][is_moving]), set(tracks["instance_token"][~is_moving])
+
+
+def points_in_boxes(
+    points: np.ndarray,
+    centers: np.ndarray,
+    sizes: np.ndarray,
+    rotations: np.ndarray,
+    margin: float = 0.0,
+) -> np.ndarray:
+    """各点を含む bbox の番号を返す（複数に含まれる場合は最初の bbox）.
+
+    Args:
+        points: (N, 3) world frame
+        centers: (M, 3) bbox centers
+        sizes: (M, 3) bbox sizes [width, length, height]
+        rotations: (M, 3, 3) bbox rotation matrices
+        margin: bbox の各辺を広げる量 [m]
+
+    Returns:
+        (N,) int64 bbox index, どの bbox にも含まれない点は -1
+    """
+    box_idx = np.full(len(points), -1, dtype=np.int64)
+    if len(points) == 0 or len(centers) == 0:
+        return box_idx
+
+    # bbox ローカル座標（x=前, y=左, z=上）: (M, N, 3)
+    local = np.einsum("mji,mnj->mni", rotations, points[None, :, :] - centers[:, None, :])
+    half = np.stack([sizes[:, 1], sizes[:, 0], sizes[:, 2]], axis=1) / 2 + margin
+    inside = np.all(np.abs(local) <= half[:, None, :], axis=2)  # (M, N)
+
+    hit = inside.any(axis=0)
+    box_idx[hit] = np.argmax(inside[:, hit], axis=0)
+    return box_idx
+
+
+def drop_points_of_instances(
+    nusc: NuScenes,
+    sample: dict,
+    points_world: np.ndarray,
+    labels: np.ndarray,
+    instance_tokens: set[str],
+    dynamic_classes: list[int],
+    margin: float = 0.2,
+) -> np.ndarray:
+    """指定インスタンスの bbox に入る動的クラスの LiDAR 点を除くための keep マスク.
+
+    bbox に入らない動的点（annotation 漏れ等）は残す（安全側にマスクされる）。
+
+    Args:
+        nusc: NuScenes instance
+        sample: sample データ
+        points_world: (N, 3) LiDAR points in world frame
+        labels: (N,) semantic class IDs
+        instance_tokens: 点を除く instance tokens
+        dynamic_classes: 動的クラスの semantic class IDs
+        margin: point-in-box 判定で bbox を広げる量 [m]
+
+    Returns:
+        (N,) bool keep mask
+    """
+    keep = np.ones(len(points_world), dtype=bool)
+    anns = [nusc.get("sample_annotation", t) for t in sample["anns"]]
+    anns = [a for a in anns if a["instance_token"] in instance_tokens]
+    dynamic_idx = np.flatnonzero(np.isin(labels, dynamic_classes))
+    if not anns or len(dynamic_idx) == 0:
+        return keep
+
+    box_idx = points_in_boxes(
+        points_world[dynamic_idx],
+        np.array([a["translation"] for a in anns]),
+        np.array([a["size"] for a in anns]),
+        np.stack([Quaternion(a["rotation"]).rotation_matrix for a in anns]),
+        margin=margin,
+    )
+    keep[dynamic_idx[box_idx >= 0]] = False
+    return keep
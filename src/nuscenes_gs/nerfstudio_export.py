@@ -1,21 +1,40 @@
-"""nuScenes 1シーン → Nerfstudio transforms.json + images/ へのエクスポート."""
+"""nuScenes 1シーン → Nerfstudio transforms.json + images/ へのエクスポート.
+
+各エクスポートは transforms.json の隣にステージ別の計測結果 perf.json も書く
+（``NUSCENES_GS_PERF=0`` で無効化）。
+"""
 
 from __future__ import annotations
 
 import json
-import shutil
+from contextlib import AbstractContextManager, nullcontext
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import numpy as np
 from nuscenes.nuscenes import NuScenes
 
+from nuscenes_gs import perf
+from nuscenes_gs.archive import copy_dataroot_file
+from nuscenes_gs.cas import BlobStore, artifact_key, prepare_output_dir
 from nuscenes_gs.poses import compute_c2w
 
+if TYPE_CHECKING:
+    from nuscenes_gs.quality import QualityScorer
+
 
+@perf.profiled_export
 def export_scene_front(
     nusc: NuScenes,
     scene_token: str,
     output_dir: str | Path,
+    export_point_cloud: bool = False,
+    downscale_factors: tuple[int, ...] = (),
+    export_colmap: bool = False,
+    frame_selection: dict | None = None,
+    quality_filter: dict | None = None,
+    blob_store: str | Path | None = None,
+    scene_normalization: dict | None = None,
 ) -> Path:
     """1シーンの CAM_FRONT を Nerfstudio 形式でエクスポートする.
 
@@ -23,6 +42,18 @@ def export_scene_front(
         nusc: NuScenes インスタンス
         scene_token: 対象シーンの token
         output_dir: 出力ディレクトリ
+        export_point_cloud: 静的 LiDAR 点群 points3D.ply も書き出すか
+        downscale_factors: 縮小版 images_N/ masks_N/ depths_N/ を作る縮小率（例: (2, 4, 8)）
+        export_colmap: COLMAP sparse model（sparse/0/*.bin）も書き出すか
+        frame_selection: 指定時は ``select_frames`` の引数として冗長なフレームを間引く
+            （transforms.json からのみ除き、画像・マスク・深度は全フレーム分残す。
+            選ぶのは keyframe の中からだけで、12Hz sweep は出力に入らない）
+        quality_filter: 指定時は画像を採点して quality.json に書き、``filter_frames`` の
+            しきい値（例: {"min_sharpness": 50.0}）を満たさないフレームを除く
+        blob_store: 指定時はこのディレクトリの content-addressed store に成果物を入れ、
+            出力はハードリンクで置く（同じ画像・深度の他バリアントと共有する）
+        scene_normalization: 指定時は ``normalize_scene_transforms`` の引数（例: {"quantile": 0.01}）で
+            姿勢を重力方向・AABB 中心に揃え、applied_transform と scene_box を書く
 
     Returns:
         生成した transforms.json のパス
@@ -30,6 +61,9 @@ def export_scene_front(
     output_dir = Path(output_dir)
     images_dir = output_dir / "images"
     images_dir.mkdir(parents=True, exist_ok=True)
+    # store から置いた以前の出力をその場で上書きしないよう、リンクを外しておく
+    prepare_output_dir(output_dir, use_store=blob_store is not None)
+    store = BlobStore(blob_store) if blob_store is not None else None
 
     scene = nusc.get("scene", scene_token)
     sample_token = scene["first_sample_token"]
@@ -39,45 +73,57 @@ def export_scene_front(
     width, height = None, None
     idx = 0
 
-    while sample_token:
-        sample = nusc.get("sample", sample_token)
-        cam_token = sample["data"]["CAM_FRONT"]
-        cam_data = nusc.get("sample_data", cam_token)
-
-        ego_pose = nusc.get("ego_pose", cam_data["ego_pose_token"])
-        calib = nusc.get(
-            "calibrated_sensor", cam_data["calibrated_sensor_token"]
-        )
-
-        # intrinsic は1回だけ取得（CAM_FRONTはシーン内で固定）
-        if intrinsic is None:
-            K = np.array(calib["camera_intrinsic"])
-            intrinsic = {
-                "fl_x": K[0, 0],
-                "fl_y": K[1, 1],
-                "cx": K[0, 2],
-                "cy": K[1, 2],
-            }
-            width = cam_data["width"]
-            height = cam_data["height"]
-
-        # c2w 計算
-        c2w = compute_c2w(ego_pose, calib)
-
-        # 画像コピー
-        src_path = Path(nusc.dataroot) / cam_data["filename"]
-        dst_name = f"{idx:04d}.jpg"
-        shutil.copy2(src_path, images_dir / dst_name)
-
-        frames.append(
-            {
-                "file_path": f"images/{dst_name}",
-                "transform_matrix": c2w.tolist(),
-            }
-        )
-
-        idx += 1
-        sample_token = sample["next"] if sample["next"] else None
+    # 画像はコピーするごとに採点に回し、コピーの残り・マスク・深度の生成と並行させる
+    with _quality_scorer(output_dir, quality_filter) as scorer:
+        while sample_token:
+            sample = nusc.get("sample", sample_token)
+            cam_token = sample["data"]["CAM_FRONT"]
+            cam_data = nusc.get("sample_data", cam_token)
+
+            ego_pose = nusc.get("ego_pose", cam_data["ego_pose_token"])
+            calib = nusc.get(
+                "calibrated_sensor", cam_data["calibrated_sensor_token"]
+            )
+
+            # intrinsic は1回だけ取得（CAM_FRONTはシーン内で固定）
+            if intrinsic is None:
+                K = np.array(calib["camera_intrinsic"])
+                intrinsic = {
+                    "fl_x": K[0, 0],
+                    "fl_y": K[1, 1],
+                    "cx": K[0, 2],
+                    "cy": K[1, 2],
+                }
+                width = cam_data["width"]
+                height = cam_data["height"]
+
+            # c2w 計算
+            c2w = compute_c2w(ego_pose, calib)
+
+            # 画像コピー
+            dst_name = f"{idx:04d}.jpg"
+            with perf.stage("copy"):
+                _copy_image(nusc, cam_data["filename"], images_dir / dst_name, store)
+            if scorer is not None:
+                scorer.add(images_dir / dst_name)
+
+            frames.append(
+                {
+                    "file_path": f"images/{dst_name}",
+                    "transform_matrix": c2w.tolist(),
+                }
+            )
+
+            idx += 1
+            sample_token = sample["next"] if sample["next"] else None
+
+        selected = None
+        if quality_filter is not None:
+            selected = _filter_by_quality(output_dir, scorer, quality_filter)
+    if frame_selection is not None:
+        selected = _select_frames(nusc, scene_token, output_dir, frame_selection, selected)
+    if selected is not None:
+        frames = [frames[i] for i in selected]
 
     transforms = {
         "camera_model": "OPENCV",
@@ -87,19 +133,51 @@ def export_scene_front(
         "frames": frames,
     }
 
+    # 姿勢の正規化・点群・COLMAP は同じ静的点から同じ座標系で書く
+    _export_scene_geometry(
+        nusc,
+        scene_token,
+        output_dir,
+        transforms,
+        selected,
+        export_point_cloud=export_point_cloud,
+        export_colmap=export_colmap,
+        scene_normalization=scene_normalization,
+    )
+
+    if downscale_factors:
+        _export_pyramid(output_dir, frames, downscale_factors)
+
+    # マスク・縮小版・点群などキーで管理しない出力も重複排除する
+    if store is not None:
+        store.absorb(output_dir)
+
     out_path = output_dir / "transforms.json"
-    with open(out_path, "w") as f:
-        json.dump(transforms, f, indent=2)
+    with perf.stage("write"):
+        with open(out_path, "w") as f:
+            json.dump(transforms, f, indent=2)
 
     return out_path
 
 
+@perf.profiled_export
 def export_scene_front_with_lidar_masks(
     nusc: NuScenes,
     scene_token: str,
     output_dir: str | Path,
     dynamic_classes: list[int] | None = None,
     dilation_size: int = 8,
+    dilation_meters: float | None = None,
+    max_dilation_size: int = 128,
+    motion_threshold: float | None = None,
+    radar: dict | None = None,
+    export_point_cloud: bool = False,
+    downscale_factors: tuple[int, ...] = (),
+    export_colmap: bool = False,
+    frame_selection: dict | None = None,
+    quality_filter: dict | None = None,
+    blob_store: str | Path | None = None,
+    scene_normalization: dict | None = None,
 ) -> Path:
     """1シーンの CAM_FRONT を LiDAR マスク付きで Nerfstudio 形式でエクスポートする.
 
@@ -108,7 +186,24 @@ def export_scene_front_with_lidar_masks(
         scene_token: 対象シーンの token
         output_dir: 出力ディレクトリ
         dynamic_classes: マスクする semantic class IDs のリスト. None の場合はデフォルト.
-        dilation_size: モルフォロジー膨張カーネルサイズ
+        dilation_size: モルフォロジー膨張カーネルサイズ（dilation_meters 指定時は使わない）
+        dilation_meters: 指定時は深度適応膨張（カーネル径 ≈ dilation_meters * fx / z）
+        max_dilation_size: 深度適応膨張のカーネル径の上限 [px]
+        motion_threshold: 指定時はシーン内でこれ以上 [m] 動いたインスタンスだけマスクする
+        radar: 指定時は RADAR の速度付き点で遠方の動体もマスクする
+            （``radar_mask_for_sample`` の引数, 例: {"min_speed": 1.0}）
+        export_point_cloud: 静的 LiDAR 点群 points3D.ply も書き出すか
+        downscale_factors: 縮小版 images_N/ masks_N/ depths_N/ を作る縮小率（例: (2, 4, 8)）
+        export_colmap: COLMAP sparse model（sparse/0/*.bin）も書き出すか
+        frame_selection: 指定時は ``select_frames`` の引数として冗長なフレームを間引く
+            （transforms.json からのみ除き、画像・マスク・深度は全フレーム分残す。
+            選ぶのは keyframe の中からだけで、12Hz sweep は出力に入らない）
+        quality_filter: 指定時は画像を採点して quality.json に書き、``filter_frames`` の
+            しきい値（例: {"min_sharpness": 50.0}）を満たさないフレームを除く
+        blob_store: 指定時はこのディレクトリの content-addressed store に成果物を入れ、
+            出力はハードリンクで置く（同じ画像・深度の他バリアントと共有する）
+        scene_normalization: 指定時は ``normalize_scene_transforms`` の引数（例: {"quantile": 0.01}）で
+            姿勢を重力方向・AABB 中心に揃え、applied_transform と scene_box を書く
 
     Returns:
         生成した transforms.json のパス
@@ -118,6 +213,9 @@ def export_scene_front_with_lidar_masks(
     output_dir = Path(output_dir)
     images_dir = output_dir / "images"
     images_dir.mkdir(parents=True, exist_ok=True)
+    # store から置いた以前の出力をその場で上書きしないよう、リンクを外しておく
+    prepare_output_dir(output_dir, use_store=blob_store is not None)
+    store = BlobStore(blob_store) if blob_store is not None else None
 
     scene = nusc.get("scene", scene_token)
     sample_token = scene["first_sample_token"]
@@ -127,60 +225,76 @@ def export_scene_front_with_lidar_masks(
     width, height = None, None
     idx = 0
 
-    # 1. 画像をエクスポート
-    while sample_token:
-        sample = nusc.get("sample", sample_token)
-        cam_token = sample["data"]["CAM_FRONT"]
-        cam_data = nusc.get("sample_data", cam_token)
-
-        ego_pose = nusc.get("ego_pose", cam_data["ego_pose_token"])
-        calib = nusc.get(
-            "calibrated_sensor", cam_data["calibrated_sensor_token"]
-        )
-
-        # intrinsic は1回だけ取得（CAM_FRONTはシーン内で固定）
-        if intrinsic is None:
-            K = np.array(calib["camera_intrinsic"])
-            intrinsic = {
-                "fl_x": K[0, 0],
-                "fl_y": K[1, 1],
-                "cx": K[0, 2],
-                "cy": K[1, 2],
-            }
-            width = cam_data["width"]
-            height = cam_data["height"]
-
-        # c2w 計算
-        c2w = compute_c2w(ego_pose, calib)
-
-        # 画像コピー
-        src_path = Path(nusc.dataroot) / cam_data["filename"]
-        dst_name = f"{idx:04d}.jpg"
-        shutil.copy2(src_path, images_dir / dst_name)
-
-        frames.append(
-            {
-                "file_path": f"images/{dst_name}",
-                "transform_matrix": c2w.tolist(),
-                "mask_path": f"masks/{idx:04d}.png",  # マスクパスを追加
-            }
+    # 画像はコピーするごとに採点に回し、コピーの残り・マスク・深度の生成と並行させる
+    with _quality_scorer(output_dir, quality_filter) as scorer:
+        # 1. 画像をエクスポート
+        while sample_token:
+            sample = nusc.get("sample", sample_token)
+            cam_token = sample["data"]["CAM_FRONT"]
+            cam_data = nusc.get("sample_data", cam_token)
+
+            ego_pose = nusc.get("ego_pose", cam_data["ego_pose_token"])
+            calib = nusc.get(
+                "calibrated_sensor", cam_data["calibrated_sensor_token"]
+            )
+
+            # intrinsic は1回だけ取得（CAM_FRONTはシーン内で固定）
+            if intrinsic is None:
+                K = np.array(calib["camera_intrinsic"])
+                intrinsic = {
+                    "fl_x": K[0, 0],
+                    "fl_y": K[1, 1],
+                    "cx": K[0, 2],
+                    "cy": K[1, 2],
+                }
+                width = cam_data["width"]
+                height = cam_data["height"]
+
+            # c2w 計算
+            c2w = compute_c2w(ego_pose, calib)
+
+            # 画像コピー
+            dst_name = f"{idx:04d}.jpg"
+            with perf.stage("copy"):
+                _copy_image(nusc, cam_data["filename"], images_dir / dst_name, store)
+            if scorer is not None:
+                scorer.add(images_dir / dst_name)
+
+            frames.append(
+                {
+                    "file_path": f"images/{dst_name}",
+                    "transform_matrix": c2w.tolist(),
+                    "mask_path": f"masks/{idx:04d}.png",  # マスクパスを追加
+                }
+            )
+
+            idx += 1
+            sample_token = sample["next"] if sample["next"] else None
+
+        # 2. LiDAR マスクを生成
+        print(f"Generating LiDAR masks for {idx} frames...")
+        mask_paths = generate_lidar_masks_for_scene(
+            nusc,
+            scene_token,
+            output_dir,
+            dynamic_classes=dynamic_classes,
+            dilation_size=dilation_size,
+            dilation_meters=dilation_meters,
+            max_dilation_size=max_dilation_size,
+            motion_threshold=motion_threshold,
+            radar=radar,
         )
+        print(f"Generated {len(mask_paths)} masks")
 
-        idx += 1
-        sample_token = sample["next"] if sample["next"] else None
+        # 3. transforms.json を保存
+        selected = None
+        if quality_filter is not None:
+            selected = _filter_by_quality(output_dir, scorer, quality_filter)
+    if frame_selection is not None:
+        selected = _select_frames(nusc, scene_token, output_dir, frame_selection, selected)
+    if selected is not None:
+        frames = [frames[i] for i in selected]
 
-    # 2. LiDAR マスクを生成
-    print(f"Generating LiDAR masks for {idx} frames...")
-    mask_paths = generate_lidar_masks_for_scene(
-        nusc,
-        scene_token,
-        output_dir,
-        dynamic_classes=dynamic_classes,
-        dilation_size=dilation_size,
-    )
-    print(f"Generated {len(mask_paths)} masks")
-
-    # 3. transforms.json を保存
     transforms = {
         "camera_model": "OPENCV",
         "w": width,
@@ -189,19 +303,49 @@ def export_scene_front_with_lidar_masks(
         "frames": frames,
     }
 
+    # 姿勢の正規化・点群・COLMAP は同じ静的点から同じ座標系で書く
+    _export_scene_geometry(
+        nusc,
+        scene_token,
+        output_dir,
+        transforms,
+        selected,
+        export_point_cloud=export_point_cloud,
+        export_colmap=export_colmap,
+        scene_normalization=scene_normalization,
+    )
+
+    if downscale_factors:
+        _export_pyramid(output_dir, frames, downscale_factors)
+
+    # マスク・縮小版・点群などキーで管理しない出力も重複排除する
+    if store is not None:
+        store.absorb(output_dir)
+
     out_path = output_dir / "transforms.json"
-    with open(out_path, "w") as f:
-        json.dump(transforms, f, indent=2)
+    with perf.stage("write"):
+        with open(out_path, "w") as f:
+            json.dump(transforms, f, indent=2)
 
     return out_path
 
 
+@perf.profiled_export
 def export_scene_front_with_bbox_masks(
     nusc: NuScenes,
     scene_token: str,
     output_dir: str | Path,
     dynamic_categories: list[str] | None = None,
     dilation_size: int = 5,
+    motion_threshold: float | None = None,
+    radar: dict | None = None,
+    export_point_cloud: bool = False,
+    downscale_factors: tuple[int, ...] = (),
+    export_colmap: bool = False,
+    frame_selection: dict | None = None,
+    quality_filter: dict | None = None,
+    blob_store: str | Path | None = None,
+    scene_normalization: dict | None = None,
 ) -> Path:
     """1シーンの CAM_FRONT を bbox マスク付きで Nerfstudio 形式でエクスポートする.
 
@@ -211,6 +355,21 @@ def export_scene_front_with_bbox_masks(
         output_dir: 出力ディレクトリ
         dynamic_categories: マスクする category prefix のリスト. None の場合はデフォルト.
         dilation_size: モルフォロジー膨張カーネルサイズ
+        motion_threshold: 指定時はシーン内でこれ以上 [m] 動いたインスタンスだけマスクする
+        radar: 指定時は RADAR の速度付き点で遠方の動体もマスクする
+            （``radar_mask_for_sample`` の引数, 例: {"min_speed": 1.0}）
+        export_point_cloud: 静的 LiDAR 点群 points3D.ply も書き出すか
+        downscale_factors: 縮小版 images_N/ masks_N/ depths_N/ を作る縮小率（例: (2, 4, 8)）
+        export_colmap: COLMAP sparse model（sparse/0/*.bin）も書き出すか
+        frame_selection: 指定時は ``select_frames`` の引数として冗長なフレームを間引く
+            （transforms.json からのみ除き、画像・マスク・深度は全フレーム分残す。
+            選ぶのは keyframe の中からだけで、12Hz sweep は出力に入らない）
+        quality_filter: 指定時は画像を採点して quality.json に書き、``filter_frames`` の
+            しきい値（例: {"min_sharpness": 50.0}）を満たさないフレームを除く
+        blob_store: 指定時はこのディレクトリの content-addressed store に成果物を入れ、
+            出力はハードリンクで置く（同じ画像・深度の他バリアントと共有する）
+        scene_normalization: 指定時は ``normalize_scene_transforms`` の引数（例: {"quantile": 0.01}）で
+            姿勢を重力方向・AABB 中心に揃え、applied_transform と scene_box を書く
 
     Returns:
         生成した transforms.json のパス
@@ -220,6 +379,9 @@ def export_scene_front_with_bbox_masks(
     output_dir = Path(output_dir)
     images_dir = output_dir / "images"
     images_dir.mkdir(parents=True, exist_ok=True)
+    # store から置いた以前の出力をその場で上書きしないよう、リンクを外しておく
+    prepare_output_dir(output_dir, use_store=blob_store is not None)
+    store = BlobStore(blob_store) if blob_store is not None else None
 
     scene = nusc.get("scene", scene_token)
     sample_token = scene["first_sample_token"]
@@ -229,60 +391,74 @@ def export_scene_front_with_bbox_masks(
     width, height = None, None
     idx = 0
 
-    # 1. 画像をエクスポート
-    while sample_token:
-        sample = nusc.get("sample", sample_token)
-        cam_token = sample["data"]["CAM_FRONT"]
-        cam_data = nusc.get("sample_data", cam_token)
-
-        ego_pose = nusc.get("ego_pose", cam_data["ego_pose_token"])
-        calib = nusc.get(
-            "calibrated_sensor", cam_data["calibrated_sensor_token"]
-        )
-
-        # intrinsic は1回だけ取得（CAM_FRONTはシーン内で固定）
-        if intrinsic is None:
-            K = np.array(calib["camera_intrinsic"])
-            intrinsic = {
-                "fl_x": K[0, 0],
-                "fl_y": K[1, 1],
-                "cx": K[0, 2],
-                "cy": K[1, 2],
-            }
-            width = cam_data["width"]
-            height = cam_data["height"]
-
-        # c2w 計算
-        c2w = compute_c2w(ego_pose, calib)
-
-        # 画像コピー
-        src_path = Path(nusc.dataroot) / cam_data["filename"]
-        dst_name = f"{idx:04d}.jpg"
-        shutil.copy2(src_path, images_dir / dst_name)
-
-        frames.append(
-            {
-                "file_path": f"images/{dst_name}",
-                "transform_matrix": c2w.tolist(),
-                "mask_path": f"masks/{idx:04d}.png",  # マスクパスを追加
-            }
+    # 画像はコピーするごとに採点に回し、コピーの残り・マスク・深度の生成と並行させる
+    with _quality_scorer(output_dir, quality_filter) as scorer:
+        # 1. 画像をエクスポート
+        while sample_token:
+            sample = nusc.get("sample", sample_token)
+            cam_token = sample["data"]["CAM_FRONT"]
+            cam_data = nusc.get("sample_data", cam_token)
+
+            ego_pose = nusc.get("ego_pose", cam_data["ego_pose_token"])
+            calib = nusc.get(
+                "calibrated_sensor", cam_data["calibrated_sensor_token"]
+            )
+
+            # intrinsic は1回だけ取得（CAM_FRONTはシーン内で固定）
+            if intrinsic is None:
+                K = np.array(calib["camera_intrinsic"])
+                intrinsic = {
+                    "fl_x": K[0, 0],
+                    "fl_y": K[1, 1],
+                    "cx": K[0, 2],
+                    "cy": K[1, 2],
+                }
+                width = cam_data["width"]
+                height = cam_data["height"]
+
+            # c2w 計算
+            c2w = compute_c2w(ego_pose, calib)
+
+            # 画像コピー
+            dst_name = f"{idx:04d}.jpg"
+            with perf.stage("copy"):
+                _copy_image(nusc, cam_data["filename"], images_dir / dst_name, store)
+            if scorer is not None:
+                scorer.add(images_dir / dst_name)
+
+            frames.append(
+                {
+                    "file_path": f"images/{dst_name}",
+                    "transform_matrix": c2w.tolist(),
+                    "mask_path": f"masks/{idx:04d}.png",  # マスクパスを追加
+                }
+            )
+
+            idx += 1
+            sample_token = sample["next"] if sample["next"] else None
+
+        # 2. bbox マスクを生成
+        print(f"Generating bbox masks for {idx} frames...")
+        mask_paths = generate_bbox_masks_for_scene(
+            nusc,
+            scene_token,
+            output_dir,
+            dynamic_categories=dynamic_categories,
+            dilation_size=dilation_size,
+            motion_threshold=motion_threshold,
+            radar=radar,
         )
+        print(f"Generated {len(mask_paths)} masks")
 
-        idx += 1
-        sample_token = sample["next"] if sample["next"] else None
-
-    # 2. bbox マスクを生成
-    print(f"Generating bbox masks for {idx} frames...")
-    mask_paths = generate_bbox_masks_for_scene(
-        nusc,
-        scene_token,
-        output_dir,
-        dynamic_categories=dynamic_categories,
-        dilation_size=dilation_size,
-    )
-    print(f"Generated {len(mask_paths)} masks")
+        # 3. transforms.json を保存
+        selected = None
+        if quality_filter is not None:
+            selected = _filter_by_quality(output_dir, scorer, quality_filter)
+    if frame_selection is not None:
+        selected = _select_frames(nusc, scene_token, output_dir, frame_selection, selected)
+    if selected is not None:
+        frames = [frames[i] for i in selected]
 
-    # 3. transforms.json を保存
     transforms = {
         "camera_model": "OPENCV",
         "w": width,
@@ -291,13 +467,34 @@ def export_scene_front_with_bbox_masks(
         "frames": frames,
     }
 
+    # 姿勢の正規化・点群・COLMAP は同じ静的点から同じ座標系で書く
+    _export_scene_geometry(
+        nusc,
+        scene_token,
+        output_dir,
+        transforms,
+        selected,
+        export_point_cloud=export_point_cloud,
+        export_colmap=export_colmap,
+        scene_normalization=scene_normalization,
+    )
+
+    if downscale_factors:
+        _export_pyramid(output_dir, frames, downscale_factors)
+
+    # マスク・縮小版・点群などキーで管理しない出力も重複排除する
+    if store is not None:
+        store.absorb(output_dir)
+
     out_path = output_dir / "transforms.json"
-    with open(out_path, "w") as f:
-        json.dump(transforms, f, indent=2)
+    with perf.stage("write"):
+        with open(out_path, "w") as f:
+            json.dump(transforms, f, indent=2)
 
     return out_path
 
 
+@perf.profiled_export
 def export_scene_front_with_depth(
     nusc: NuScenes,
     scene_token: str,
@@ -305,6 +502,17 @@ def export_scene_front_with_depth(
     mask_type: str | None = None,
     mask_params: dict | None = None,
     depth_range: tuple[float, float] = (0.1, 80.0),
+    depth_completion: bool = False,
+    semantics: dict | None = None,
+    export_normals: bool = False,
+    carving: dict | None = None,
+    export_point_cloud: bool = False,
+    downscale_factors: tuple[int, ...] = (),
+    export_colmap: bool = False,
+    frame_selection: dict | None = None,
+    quality_filter: dict | None = None,
+    blob_store: str | Path | None = None,
+    scene_normalization: dict | None = None,
 ) -> Path:
     """1シーンの CAM_FRONT を深度マップ付きで Nerfstudio 形式でエクスポートする.
 
@@ -312,9 +520,30 @@ def export_scene_front_with_depth(
         nusc: NuScenes インスタンス
         scene_token: 対象シーンの token
         output_dir: 出力ディレクトリ
-        mask_type: マスクタイプ（"lidar", "bbox", None）
-        mask_params: マスク生成パラメータ（dilation_size など）
+        mask_type: マスクタイプ（"lidar", "bbox", "fused", None）
+        mask_params: マスク生成パラメータ（dilation_size, dilation_meters, depth_bins など.
+            dilation_meters 指定時の膨張上限は max_dilation_size.
+            "fused" は policy, lidar_dilation_size, bbox_dilation_size, near_range.
+            共通で motion_threshold, radar（RADAR の動体領域も足す））
         depth_range: (min_depth, max_depth) in meters
+        depth_completion: 深度を密に補間し、信頼度マップ depth_confidence/ も書くか
+        semantics: 指定時は lidarseg のラベル画像 semantics/ と semantics.json も書く
+            （dilation: クラス ID → 膨張サイズ [px], densify, voxel_size）
+        export_normals: 静的 LiDAR 点群の法線から法線マップ normals/ も書くか
+        carving: 指定時は free-space carving（``build_scene_carving`` の引数, 例: {"voxel_size": 0.3}）で
+            レイに素通りされたボクセルの点を深度と points3D.ply から除く
+        export_point_cloud: 静的 LiDAR 点群 points3D.ply も書き出すか
+        downscale_factors: 縮小版 images_N/ masks_N/ depths_N/ を作る縮小率（例: (2, 4, 8)）
+        export_colmap: COLMAP sparse model（sparse/0/*.bin）も書き出すか
+        frame_selection: 指定時は ``select_frames`` の引数として冗長なフレームを間引く
+            （transforms.json からのみ除き、画像・マスク・深度は全フレーム分残す。
+            選ぶのは keyframe の中からだけで、12Hz sweep は出力に入らない）
+        quality_filter: 指定時は画像を採点して quality.json に書き、``filter_frames`` の
+            しきい値（例: {"min_sharpness": 50.0}）を満たさないフレームを除く
+        blob_store: 指定時はこのディレクトリの content-addressed store に成果物を入れ、
+            出力はハードリンクで置く（同じ画像・深度の他バリアントと共有する）
+        scene_normalization: 指定時は ``normalize_scene_transforms`` の引数（例: {"quantile": 0.01}）で
+            姿勢を重力方向・AABB 中心に揃え、applied_transform と scene_box を書く
 
     Returns:
         生成した transforms.json のパス
@@ -324,6 +553,9 @@ def export_scene_front_with_depth(
     output_dir = Path(output_dir)
     images_dir = output_dir / "images"
     images_dir.mkdir(parents=True, exist_ok=True)
+    # store から置いた以前の出力をその場で上書きしないよう、リンクを外しておく
+    prepare_output_dir(output_dir, use_store=blob_store is not None)
+    store = BlobStore(blob_store) if blob_store is not None else None
 
     scene = nusc.get("scene", scene_token)
     sample_token = scene["first_sample_token"]
@@ -333,91 +565,146 @@ def export_scene_front_with_depth(
     width, height = None, None
     idx = 0
 
-    # 1. 画像をエクスポート
-    while sample_token:
-        sample = nusc.get("sample", sample_token)
-        cam_token = sample["data"]["CAM_FRONT"]
-        cam_data = nusc.get("sample_data", cam_token)
-
-        ego_pose = nusc.get("ego_pose", cam_data["ego_pose_token"])
-        calib = nusc.get(
-            "calibrated_sensor", cam_data["calibrated_sensor_token"]
-        )
-
-        # intrinsic は1回だけ取得（CAM_FRONTはシーン内で固定）
-        if intrinsic is None:
-            K = np.array(calib["camera_intrinsic"])
-            intrinsic = {
-                "fl_x": K[0, 0],
-                "fl_y": K[1, 1],
-                "cx": K[0, 2],
-                "cy": K[1, 2],
+    # 画像はコピーするごとに採点に回し、コピーの残り・マスク・深度の生成と並行させる
+    with _quality_scorer(output_dir, quality_filter) as scorer:
+        # 1. 画像をエクスポート
+        while sample_token:
+            sample = nusc.get("sample", sample_token)
+            cam_token = sample["data"]["CAM_FRONT"]
+            cam_data = nusc.get("sample_data", cam_token)
+
+            ego_pose = nusc.get("ego_pose", cam_data["ego_pose_token"])
+            calib = nusc.get(
+                "calibrated_sensor", cam_data["calibrated_sensor_token"]
+            )
+
+            # intrinsic は1回だけ取得（CAM_FRONTはシーン内で固定）
+            if intrinsic is None:
+                K = np.array(calib["camera_intrinsic"])
+                intrinsic = {
+                    "fl_x": K[0, 0],
+                    "fl_y": K[1, 1],
+                    "cx": K[0, 2],
+                    "cy": K[1, 2],
+                }
+                width = cam_data["width"]
+                height = cam_data["height"]
+
+            # c2w 計算
+            from nuscenes_gs.poses import compute_c2w
+            c2w = compute_c2w(ego_pose, calib)
+
+            # 画像コピー
+            dst_name = f"{idx:04d}.jpg"
+            with perf.stage("copy"):
+                _copy_image(nusc, cam_data["filename"], images_dir / dst_name, store)
+            if scorer is not None:
+                scorer.add(images_dir / dst_name)
+
+            # フレーム情報
+            frame_data = {
+                "file_path": f"images/{dst_name}",
+                "transform_matrix": c2w.tolist(),
+                "depth_file_path": f"depth/{idx:04d}.png",
             }
-            width = cam_data["width"]
-            height = cam_data["height"]
-
-        # c2w 計算
-        from nuscenes_gs.poses import compute_c2w
-        c2w = compute_c2w(ego_pose, calib)
-
-        # 画像コピー
-        src_path = Path(nusc.dataroot) / cam_data["filename"]
-        dst_name = f"{idx:04d}.jpg"
-        shutil.copy2(src_path, images_dir / dst_name)
-
-        # フレーム情報
-        frame_data = {
-            "file_path": f"images/{dst_name}",
-            "transform_matrix": c2w.tolist(),
-            "depth_file_path": f"depth/{idx:04d}.png",
-        }
+            if depth_completion:
+                frame_data["depth_confidence_path"] = f"depth_confidence/{idx:04d}.png"
+            if semantics is not None:
+                frame_data["semantics_path"] = f"semantics/{idx:04d}.png"
+            if export_normals:
+                frame_data["normal_path"] = f"normals/{idx:04d}.png"
 
-        # マスクパス追加（オプション）
-        if mask_type is not None:
-            frame_data["mask_path"] = f"masks/{idx:04d}.png"
+            # マスクパス追加（オプション）
+            if mask_type is not None:
+                frame_data["mask_path"] = f"masks/{idx:04d}.png"
 
-        frames.append(frame_data)
+            frames.append(frame_data)
 
-        idx += 1
-        sample_token = sample["next"] if sample["next"] else None
+            idx += 1
+            sample_token = sample["next"] if sample["next"] else None
 
-    # 2. 深度マップを生成
-    print(f"Generating depth maps for {idx} frames...")
-    depth_paths = generate_depth_maps_for_scene(
-        nusc,
-        scene_token,
-        output_dir,
-        depth_range=depth_range,
-    )
-    print(f"Generated {len(depth_paths)} depth maps")
-
-    # 3. マスクを生成（オプション）
-    if mask_type == "lidar":
-        from nuscenes_gs.masks import generate_lidar_masks_for_scene
-        print(f"Generating LiDAR masks for {idx} frames...")
-        params = mask_params or {}
-        mask_paths = generate_lidar_masks_for_scene(
-            nusc,
-            scene_token,
-            output_dir,
-            dynamic_classes=params.get("dynamic_classes"),
-            dilation_size=params.get("dilation_size", 64),
-        )
-        print(f"Generated {len(mask_paths)} LiDAR masks")
-    elif mask_type == "bbox":
-        from nuscenes_gs.masks import generate_bbox_masks_for_scene
-        print(f"Generating bbox masks for {idx} frames...")
-        params = mask_params or {}
-        mask_paths = generate_bbox_masks_for_scene(
+        # 2. 深度マップを生成
+        print(f"Generating depth maps for {idx} frames...")
+        depth_paths = generate_depth_maps_for_scene(
             nusc,
             scene_token,
             output_dir,
-            dynamic_categories=params.get("dynamic_categories"),
-            dilation_size=params.get("dilation_size", 5),
+            depth_range=depth_range,
+            completion=depth_completion,
+            store=store,
+            semantics=semantics,
+            carving=carving,
         )
-        print(f"Generated {len(mask_paths)} bbox masks")
+        print(f"Generated {len(depth_paths)} depth maps")
+
+        if export_normals:
+            from nuscenes_gs.normals import generate_normal_maps_for_scene
+            normal_paths = generate_normal_maps_for_scene(nusc, scene_token, output_dir, depth_range=depth_range)
+            print(f"Generated {len(normal_paths)} normal maps")
+
+        # 3. マスクを生成（オプション）
+        if mask_type == "lidar":
+            from nuscenes_gs.masks import generate_lidar_masks_for_scene
+            print(f"Generating LiDAR masks for {idx} frames...")
+            params = mask_params or {}
+            mask_paths = generate_lidar_masks_for_scene(
+                nusc,
+                scene_token,
+                output_dir,
+                dynamic_classes=params.get("dynamic_classes"),
+                dilation_size=params.get("dilation_size", 64),
+                dilation_meters=params.get("dilation_meters"),
+                depth_bins=params.get("depth_bins", 4),
+                max_dilation_size=params.get("max_dilation_size", 128),
+                motion_threshold=params.get("motion_threshold"),
+                radar=params.get("radar"),
+            )
+            print(f"Generated {len(mask_paths)} LiDAR masks")
+        elif mask_type == "bbox":
+            from nuscenes_gs.masks import generate_bbox_masks_for_scene
+            print(f"Generating bbox masks for {idx} frames...")
+            params = mask_params or {}
+            mask_paths = generate_bbox_masks_for_scene(
+                nusc,
+                scene_token,
+                output_dir,
+                dynamic_categories=params.get("dynamic_categories"),
+                dilation_size=params.get("dilation_size", 5),
+                motion_threshold=params.get("motion_threshold"),
+                radar=params.get("radar"),
+            )
+            print(f"Generated {len(mask_paths)} bbox masks")
+        elif mask_type == "fused":
+            from nuscenes_gs.masks import generate_fused_masks_for_scene
+            params = mask_params or {}
+            policy = params.get("policy", "union")
+            print(f"Generating fused bbox + LiDAR masks ({policy}) for {idx} frames...")
+            mask_paths = generate_fused_masks_for_scene(
+                nusc,
+                scene_token,
+                output_dir,
+                policy=policy,
+                dynamic_classes=params.get("dynamic_classes"),
+                dynamic_categories=params.get("dynamic_categories"),
+                lidar_dilation_size=params.get("lidar_dilation_size", 64),
+                bbox_dilation_size=params.get("bbox_dilation_size", 5),
+                dilation_meters=params.get("dilation_meters"),
+                max_dilation_size=params.get("max_dilation_size", 128),
+                near_range=params.get("near_range", 20.0),
+                motion_threshold=params.get("motion_threshold"),
+                radar=params.get("radar"),
+            )
+            print(f"Generated {len(mask_paths)} fused masks")
+
+        # 4. transforms.json を保存
+        selected = None
+        if quality_filter is not None:
+            selected = _filter_by_quality(output_dir, scorer, quality_filter)
+    if frame_selection is not None:
+        selected = _select_frames(nusc, scene_token, output_dir, frame_selection, selected)
+    if selected is not None:
+        frames = [frames[i] for i in selected]
 
-    # 4. transforms.json を保存
     transforms = {
         "camera_model": "OPENCV",
         "w": width,
@@ -427,8 +714,180 @@ def export_scene_front_with_depth(
         "frames": frames,
     }
 
+    if semantics is not None:
+        from nuscenes_gs.semantics import write_semantics_metadata
+        transforms["semantics"] = write_semantics_metadata(nusc, output_dir, semantics)
+
+    # 姿勢の正規化・点群・COLMAP は同じ静的点から同じ座標系で書く
+    _export_scene_geometry(
+        nusc,
+        scene_token,
+        output_dir,
+        transforms,
+        selected,
+        export_point_cloud=export_point_cloud,
+        export_colmap=export_colmap,
+        scene_normalization=scene_normalization, carving=carving,
+    )
+
+    if downscale_factors:
+        _export_pyramid(output_dir, frames, downscale_factors)
+
+    # マスク・縮小版・点群などキーで管理しない出力も重複排除する
+    if store is not None:
+        store.absorb(output_dir)
+
     out_path = output_dir / "transforms.json"
-    with open(out_path, "w") as f:
-        json.dump(transforms, f, indent=2)
+    with perf.stage("write"):
+        with open(out_path, "w") as f:
+            json.dump(transforms, f, indent=2)
 
     return out_path
+
+
+def _copy_image(nusc: NuScenes, filename: str, dst: Path, store: BlobStore | None) -> None:
+    """dataroot の画像を dst にコピーする（store 指定時は同じ画像の blob をリンクする）."""
+    if store is None:
+        copy_dataroot_file(nusc, filename, dst)
+        return
+    key = artifact_key("image", nusc.version, filename)
+    store.link_or_build(key, dst, lambda path: copy_dataroot_file(nusc, filename, path))
+
+
+def _export_scene_geometry(
+    nusc: NuScenes,
+    scene_token: str,
+    output_dir: Path,
+    transforms: dict,
+    selected: list[int] | None,
+    export_point_cloud: bool = False,
+    export_colmap: bool = False,
+    scene_normalization: dict | None = None,
+    carving: dict | None = None,
+) -> None:
+    """静的 LiDAR 点を1回だけ集め、姿勢の正規化・points3D.ply・COLMAP sparse model に使う.
+
+    正規化は点群・COLMAP を書く前に求め、どちらも transforms.json と同じ正規化座標で書く
+    （Nerfstudio は points3D.ply に applied_transform を適用しない）。
+    """
+    if not (export_point_cloud or export_colmap or scene_normalization is not None):
+        return
+
+    from nuscenes_gs.frames import build_scene_frame_index
+    from nuscenes_gs.pointcloud import accumulate_static_points
+
+    frames = build_scene_frame_index(nusc, scene_token)
+    carve = None
+    if carving is not None:
+        from nuscenes_gs.carving import build_scene_carving
+        with perf.stage("carving"):
+            carve = build_scene_carving(nusc, scene_token, **carving)
+    points, _ = accumulate_static_points(nusc, frames, carving=carve)
+
+    transform = None
+    if scene_normalization is not None:
+        from nuscenes_gs.scene_box import normalize_scene_transforms
+
+        with perf.stage("normalize"):
+            transform = normalize_scene_transforms(frames, transforms, points, **scene_normalization)["transform"]
+
+    if export_point_cloud:
+        transforms["ply_file_path"] = _export_point_cloud(nusc, frames, output_dir, points, transform)
+
+    if export_colmap:
+        _export_colmap(nusc, frames, output_dir, points, transform, selected)
+
+
+def _export_point_cloud(
+    nusc: NuScenes,
+    frames: list[dict],
+    output_dir: Path,
+    points: np.ndarray,
+    transform: np.ndarray | None = None,
+) -> str:
+    """静的 LiDAR 点群を points3D.ply に書き出し、transforms.json 用の相対パスを返す."""
+    from nuscenes_gs.pointcloud import export_static_point_cloud
+
+    print("Exporting static LiDAR point cloud...")
+    ply_path = export_static_point_cloud(nusc, frames, output_dir, points=points, transform=transform)
+    print(f"Wrote {ply_path}")
+    return ply_path.name
+
+
+def _export_pyramid(output_dir: Path, frames: list[dict], factors: tuple[int, ...]) -> None:
+    """画像・マスク・深度の縮小版（images_N/ masks_N/ depths_N/）を書き出す."""
+    from nuscenes_gs.pyramid import export_pyramid
+
+    print(f"Exporting downscaled copies (factors: {', '.join(map(str, factors))})...")
+    with perf.stage("pyramid"):
+        export_pyramid(output_dir, frames, factors)
+
+
+def _export_colmap(
+    nusc: NuScenes,
+    frames: list[dict],
+    output_dir: Path,
+    points: np.ndarray,
+    transform: np.ndarray | None = None,
+    selected: list[int] | None = None,
+) -> None:
+    """既知ポーズと静的 LiDAR 点群から COLMAP sparse model を書き出す."""
+    from nuscenes_gs.colmap import export_colmap_model
+
+    print("Exporting COLMAP sparse model...")
+    if selected is not None:
+        frames = [frames[i] for i in selected]
+    sparse_dir = export_colmap_model(nusc, frames, output_dir, points=points, transform=transform)
+    print(f"Wrote {sparse_dir}")
+
+
+def _select_frames(
+    nusc: NuScenes,
+    scene_token: str,
+    output_dir: Path,
+    params: dict,
+    candidates: list[int] | None = None,
+) -> list[int]:
+    """冗長なフレームを間引き、選択結果を frame_selection.json に書いて残す frame_idx を返す.
+
+    candidates 指定時はその frame_idx の中から選ぶ（品質フィルタ後のフレーム等）。
+    """
+    from nuscenes_gs.frames import build_scene_frame_index
+    from nuscenes_gs.selection import select_frames
+
+    frames = build_scene_frame_index(nusc, scene_token)
+    if candidates is not None:
+        frames = [frames[i] for i in candidates]
+    with perf.stage("selection"):
+        picks, stats = select_frames(nusc, frames, **params)
+    selected = [frames[i]["frame_idx"] for i in picks]
+    print(f"Selected {len(selected)}/{len(frames)} frames")
+
+    with open(output_dir / "frame_selection.json", "w") as f:
+        json.dump(
+            {"params": params, "selected": selected, "candidates": [fr["frame_idx"] for fr in frames], **stats},
+            f,
+            indent=2,
+        )
+    return selected
+
+
+def _quality_scorer(output_dir: Path, quality_filter: dict | None) -> AbstractContextManager:
+    """品質フィルタ指定時は画像を順に採点する ``QualityScorer``（なければ None を返す文脈）."""
+    if quality_filter is None:
+        return nullcontext()
+    from nuscenes_gs.quality import QualityScorer
+
+    return QualityScorer(output_dir)
+
+
+def _filter_by_quality(output_dir: Path, scorer: QualityScorer, thresholds: dict) -> list[int]:
+    """採点結果を quality.json に書き、しきい値を満たす frame_idx を返す."""
+    from nuscenes_gs.quality import filter_frames, write_quality_table
+
+    with perf.stage("quality"):
+        table = scorer.result()
+    kept = filter_frames(table, **thresholds)
+    write_quality_table(output_dir, table, thresholds, kept)
+    print(f"Quality filter kept {len(kept)}/{len(table)} frames")
+    return kept
@@ -0,0 +1,131 @@
+"""エクスポート処理のステージ別タイマー・カウンタ.
+
+使い方:
+    with perf.stage("project"):
+        ...
+    perf.count("points_projected", len(uv))
+
+``profile()`` で Profiler を有効化している間だけ計測する。無効時の
+``stage()`` は共有の no-op コンテキスト、``count()`` は即 return なので、
+ホットパスに置いたままでもオーバーヘッドはほぼゼロ。ただし ``count()`` の引数は
+無効時も評価されるので、画素数のように数えるだけで全画素を走査する値は
+``if perf.enabled():`` の中で数える。
+
+環境変数 ``NUSCENES_GS_PERF=0`` で ``profiled_export`` による perf.json 出力を止める。
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Callable, Iterator
+
+import numpy as np
+
+_NULL_STAGE = nullcontext()
+
+
+class Profiler:
+    """ステージごとの所要時間とカウンタを蓄積する."""
+
+    def __init__(self) -> None:
+        self.durations: dict[str, list[int]] = defaultdict(list)  # ns
+        self.counters: dict[str, int] = defaultdict(int)
+        self._start_ns = time.perf_counter_ns()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.durations[name].append(time.perf_counter_ns() - t0)
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counters[name] += int(value)
+
+    def summary(self) -> dict:
+        """ステージ別パーセンタイル（ms）とカウンタをまとめた dict を返す."""
+        stages = {}
+        for name, durs in self.durations.items():
+            ms = np.asarray(durs, dtype=np.float64) / 1e6
+            p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+            stages[name] = {
+                "calls": len(durs),
+                "total_ms": float(ms.sum()),
+                "mean_ms": float(ms.mean()),
+                "p50_ms": float(p50),
+                "p90_ms": float(p90),
+                "p99_ms": float(p99),
+                "max_ms": float(ms.max()),
+            }
+        return {
+            "wall_ms": (time.perf_counter_ns() - self._start_ns) / 1e6,
+            "stages": stages,
+            "counters": dict(self.counters),
+        }
+
+    def write_json(self, path: str | Path) -> Path:
+        path = Path(path)
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        return path
+
+
+# 現在有効な Profiler（None = 計測無効）
+_active: Profiler | None = None
+
+
+def stage(name: str):
+    """ステージ計測用コンテキストマネージャ（無効時は no-op）."""
+    if _active is None:
+        return _NULL_STAGE
+    return _active.stage(name)
+
+
+def count(name: str, value: int = 1) -> None:
+    """カウンタを加算（無効時は no-op）."""
+    if _active is None:
+        return
+    _active.count(name, value)
+
+
+def enabled() -> bool:
+    """計測が有効か. 値の計算自体が重いカウンタ（画素数など）はこれで囲む."""
+    return _active is not None
+
+
+@contextmanager
+def profile() -> Iterator[Profiler]:
+    """ブロック内で計測を有効化する. ネストした場合は内側の Profiler が優先."""
+    global _active
+    prev = _active
+    _active = Profiler()
+    try:
+        yield _active
+    finally:
+        _active = prev
+
+
+def enabled_by_env() -> bool:
+    return os.environ.get("NUSCENES_GS_PERF", "1") not in ("0", "false", "False", "")
+
+
+def profiled_export(func: Callable[..., Path]) -> Callable[..., Path]:
+    """エクスポート関数を計測し、返り値の transforms.json の隣に perf.json を書く."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs) -> Path:
+        if not enabled_by_env():
+            return func(*args, **kwargs)
+        with profile() as prof:
+            out_path = func(*args, **kwargs)
+        prof.write_json(Path(out_path).parent / "perf.json")
+        return out_path
+
+    return wrapper
@@ -0,0 +1,344 @@
+"""Gaussian 初期化用の静的 LiDAR 点群（points3D.ply）生成.
+
+This module provides functions to:
+1. Accumulate static LiDAR points over a scene (dynamic classes removed)
+2. Voxel-downsample the accumulated cloud
+3. Colorize points by multi-view sampling of the exported images (z-buffer visibility)
+4. Write a binary PLY that Nerfstudio reads via ``ply_file_path``
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import cv2
+import numpy as np
+
+from . import perf
+from .carving import carved_point_mask
+from .masks import DEFAULT_DYNAMIC_CLASSES, load_lidar_points_and_labels, transform_lidar_to_world
+
+if TYPE_CHECKING:
+    from nuscenes.nuscenes import NuScenes
+
+# 初期点群からは動的クラスに加えて noise(0) と vehicle.ego(31) も除く
+_NON_STATIC_EXTRA_CLASSES = [0, 31]
+
+
+def accumulate_static_points(
+    nusc: NuScenes,
+    frames: list[dict],
+    dynamic_classes: list[int] | None = None,
+    min_range: float = 2.0,
+    carving: dict | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """シーン全フレームの静的 LiDAR 点を world 座標系で集約.
+
+    Args:
+        nusc: NuScenes instance
+        frames: ``build_scene_frame_index`` の出力
+        dynamic_classes: 除外する semantic class IDs. If None, use default.
+        min_range: LiDAR からこの距離 [m] 未満の点を除外（自車のはね返り対策）
+        carving: ``carve_free_space`` の出力. 指定時は carve されたボクセルの点も除外
+
+    Returns:
+        points_world: (N, 3) float64
+        labels: (N,) uint8
+    """
+    if dynamic_classes is None:
+        dynamic_classes = DEFAULT_DYNAMIC_CLASSES
+    excluded = list(dynamic_classes) + _NON_STATIC_EXTRA_CLASSES
+
+    all_points, all_labels = [], []
+    for frame in frames:
+        points_lidar, labels = load_lidar_points_and_labels(nusc, frame["lidar_token"])
+        keep = ~np.isin(labels, excluded)
+        keep &= np.einsum("ij,ij->i", points_lidar, points_lidar) >= min_range ** 2
+        points_world = transform_lidar_to_world(
+            points_lidar[keep], frame["lidar_ego_pose"], frame["lidar_calib"]
+        )
+        labels = labels[keep]
+        if carving is not None:
+            static = ~carved_point_mask(points_world, carving, labels)
+            points_world, labels = points_world[static], labels[static]
+        all_points.append(points_world)
+        all_labels.append(labels)
+
+    if not all_points:
+        return np.zeros((0, 3)), np.zeros(0, dtype=np.uint8)
+    return np.concatenate(all_points), np.concatenate(all_labels)
+
+
+def voxel_downsample(
+    points: np.ndarray,
+    voxel_size: float,
+    labels: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray | None]:
+    """ボクセルごとに点の重心を取って間引く.
+
+    Args:
+        points: (N, 3)
+        voxel_size: ボクセル一辺 [m]
+        labels: (N,) 指定時は各ボクセルの代表点（最初の点）のラベルも返す
+
+    Returns:
+        points_ds: (M, 3) ボクセル重心
+        labels_ds: (M,) or None
+    """
+    if len(points) == 0:
+        return points, labels
+
+    with perf.stage("voxelize"):
+        keys = voxel_keys(points, voxel_size)
+        _, first_idx, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        counts = np.bincount(inverse)
+        points_ds = np.stack(
+            [np.bincount(inverse, weights=points[:, i]) for i in range(3)], axis=1
+        ) / counts[:, None]
+
+    return points_ds, (labels[first_idx] if labels is not None else None)
+
+
+def voxel_keys(points: np.ndarray, voxel_size: float) -> np.ndarray:
+    """点ごとのボクセル座標を 1 つの int64 キーに詰める（各軸 21bit）.
+
+    Args:
+        points: (N, 3)
+        voxel_size: ボクセル一辺 [m]
+
+    Returns:
+        (N,) int64 voxel keys
+    """
+    ijk = np.floor((points - points.min(axis=0)) / voxel_size).astype(np.int64)
+    if ijk.max(initial=0) >= 1 << 21:
+        raise ValueError(f"Point cloud extent too large for voxel_size={voxel_size}")
+    return (ijk[:, 0] << 42) | (ijk[:, 1] << 21) | ijk[:, 2]
+
+
+def decimate_points(points: np.ndarray, budget: int, voxel_size: float = 0.05) -> np.ndarray:
+    """点数が budget 以下になるまでボクセルを倍々に粗くし、ボクセルごとに1点残す（LOD 用）.
+
+    Args:
+        points: (N, 3)
+        budget: 残す最大点数（1 未満は 1 とみなす）
+        voxel_size: 最初に試すボクセル一辺 [m]
+
+    Returns:
+        (M,) 残す点のインデックス（昇順、M <= budget）
+    """
+    # ボクセルを粗くしても 1 点未満にはならないので、budget < 1 だと終わらない
+    budget = max(int(budget), 1)
+    if len(points) <= budget:
+        return np.arange(len(points))
+
+    while True:
+        _, first_idx = np.unique(voxel_keys(points, voxel_size), return_index=True)
+        if len(first_idx) <= budget:
+            return np.sort(first_idx)
+        voxel_size *= 2
+
+
+def colorize_points(
+    points_world: np.ndarray,
+    frames: list[dict],
+    image_paths: list[Path],
+    zbuffer_downscale: int = 8,
+    depth_tolerance: float = 0.05,
+    max_depth: float = 80.0,
+) -> tuple[np.ndarray, np.ndarray]:
+    """各点を複数視点の画像からサンプリングして色付けする.
+
+    点群は疎なので、フル解像度の z-buffer では手前の点が奥の点を隠せない。
+    画像を ``zbuffer_downscale`` 倍粗くしたグリッドで最小深度を取り、
+    その深度から ``depth_tolerance``（相対）以内の点だけを可視とみなす。
+
+    Args:
+        points_world: (N, 3) world frame
+        frames: ``build_scene_frame_index`` の出力
+        image_paths: frames と同順の画像パス
+        zbuffer_downscale: z-buffer グリッドの縮小率
+        depth_tolerance: 可視判定の相対深度許容幅
+        max_depth: これより遠い点はサンプリングしない [m]
+
+    Returns:
+        colors: (N, 3) uint8 RGB（未観測点は 0）
+        n_views: (N,) 各点が可視だった視点数
+    """
+    n = len(points_world)
+    color_sum = np.zeros((n, 3), dtype=np.float64)
+    weight_sum = np.zeros(n, dtype=np.float64)
+    n_views = np.zeros(n, dtype=np.int32)
+    points_homo = np.hstack([points_world, np.ones((n, 1))])
+
+    for frame, image_path in zip(frames, image_paths):
+        h, w = frame["image_shape"]
+
+        with perf.stage("project"):
+            points_cam = (points_homo @ frame["w2c"].T)[:, :3]
+            z = points_cam[:, 2]
+            in_front = (z > 0.1) & (z < max_depth)
+            idx = np.flatnonzero(in_front)
+            uvw = points_cam[idx] @ frame["K"].T
+            u = uvw[:, 0] / uvw[:, 2]
+            v = uvw[:, 1] / uvw[:, 2]
+            in_bounds = (u >= 0) & (u < w) & (v >= 0) & (v < h)
+            idx, u, v, z_vis = idx[in_bounds], u[in_bounds], v[in_bounds], z[idx[in_bounds]]
+
+        if len(idx) == 0:
+            continue
+
+        with perf.stage("zbuffer"):
+            gw = (w + zbuffer_downscale - 1) // zbuffer_downscale
+            cell = (v.astype(np.int64) // zbuffer_downscale) * gw + (u.astype(np.int64) // zbuffer_downscale)
+            zbuf = np.full(gw * ((h + zbuffer_downscale - 1) // zbuffer_downscale), np.inf)
+            np.minimum.at(zbuf, cell, z_vis)
+            visible = z_vis <= zbuf[cell] * (1.0 + depth_tolerance)
+            idx, u, v, z_vis = idx[visible], u[visible], v[visible], z_vis[visible]
+
+        with perf.stage("sample"):
+            image = cv2.imread(str(image_path), cv2.IMREAD_COLOR)
+            rgb = image[v.astype(np.int64), u.astype(np.int64), ::-1].astype(np.float64)
+            weight = 1.0 / np.maximum(z_vis, 1.0)  # 近い視点ほど解像度が高い
+            # idx は視点内で重複しないのでそのまま加算できる
+            color_sum[idx] += rgb * weight[:, None]
+            weight_sum[idx] += weight
+            n_views[idx] += 1
+
+    observed = weight_sum > 0
+    colors = np.zeros((n, 3), dtype=np.uint8)
+    colors[observed] = np.clip(
+        np.rint(color_sum[observed] / weight_sum[observed, None]), 0, 255
+    ).astype(np.uint8)
+    return colors, n_views
+
+
+def write_ply(path: str | Path, points: np.ndarray, colors: np.ndarray) -> Path:
+    """binary little-endian PLY (xyz float32 + rgb uchar) を書く.
+
+    Args:
+        path: 出力パス
+        points: (N, 3)
+        colors: (N, 3) uint8 RGB
+
+    Returns:
+        出力パス
+    """
+    path = Path(path)
+    vertex = np.empty(
+        len(points),
+        dtype=[
+            ("x", "<f4"), ("y", "<f4"), ("z", "<f4"),
+            ("red", "u1"), ("green", "u1"), ("blue", "u1"),
+        ],
+    )
+    vertex["x"], vertex["y"], vertex["z"] = points[:, 0], points[:, 1], points[:, 2]
+    vertex["red"], vertex["green"], vertex["blue"] = colors[:, 0], colors[:, 1], colors[:, 2]
+
+    header = (
+        "ply\n"
+        "format binary_little_endian 1.0\n"
+        f"element vertex {len(points)}\n"
+        "property float x\n"
+        "property float y\n"
+        "property float z\n"
+        "property uchar red\n"
+        "property uchar green\n"
+        "property uchar blue\n"
+        "end_header\n"
+    )
+    with perf.stage("write"):
+        with open(path, "wb") as f:
+            f.write(header.encode("ascii"))
+            vertex.tofile(f)
+    perf.count("bytes_written", len(header) + vertex.nbytes)
+    return path
+
+
+def build_static_point_cloud(
+    nusc: NuScenes,
+    frames: list[dict],
+    image_paths: list[Path],
+    dynamic_classes: list[int] | None = None,
+    voxel_size: float = 0.2,
+    keep_unobserved: bool = False,
+    carving: dict | None = None,
+    points: np.ndarray | None = None,
+    transform: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """シーンの静的 LiDAR 点群を集約・間引き・色付けする.
+
+    Args:
+        nusc: NuScenes instance
+        frames: ``build_scene_frame_index`` の出力
+        image_paths: frames と同順のエクスポート済み画像パス
+        dynamic_classes: 除外する semantic class IDs. If None, use default.
+        voxel_size: ダウンサンプリングのボクセル一辺 [m]
+        keep_unobserved: どのカメラからも見えない点も残すか（色は灰色）
+        carving: ``carve_free_space`` の出力. 指定時は carve されたボクセルの点を除外
+        points: (N, 3) ``accumulate_static_points`` で集約済みの world 点. 指定時は読み直さない
+            （dynamic_classes / carving は集約時に適用済みとみなす）
+        transform: (4, 4) 指定時は色付け後の点をこの変換（world → 正規化座標など）で返す
+
+    Returns:
+        points: (M, 3) world frame（transform 指定時は変換後）
+        colors: (M, 3) uint8 RGB
+    """
+    if points is None:
+        points, _ = accumulate_static_points(nusc, frames, dynamic_classes=dynamic_classes, carving=carving)
+    points, _ = voxel_downsample(points, voxel_size)
+    colors, n_views = colorize_points(points, frames, image_paths)
+
+    if keep_unobserved:
+        colors[n_views == 0] = 128
+    else:
+        points, colors = points[n_views > 0], colors[n_views > 0]
+    if transform is not None:
+        points = points @ transform[:3, :3].T + transform[:3, 3]
+    perf.count("init_points", len(points))
+    return points, colors
+
+
+def export_static_point_cloud(
+    nusc: NuScenes,
+    frames: list[dict],
+    output_dir: str | Path,
+    dynamic_classes: list[int] | None = None,
+    voxel_size: float = 0.2,
+    keep_unobserved: bool = False,
+    carving: dict | None = None,
+    points: np.ndarray | None = None,
+    transform: np.ndarray | None = None,
+) -> Path:
+    """シーンの静的 LiDAR 点群を色付きで points3D.ply に書き出す.
+
+    画像は ``output_dir/images/{frame_idx:04d}.jpg`` にエクスポート済みである前提。
+
+    Args:
+        nusc: NuScenes instance
+        frames: ``build_scene_frame_index`` の出力
+        output_dir: エクスポートディレクトリ
+        dynamic_classes: 除外する semantic class IDs. If None, use default.
+        voxel_size: ダウンサンプリングのボクセル一辺 [m]
+        keep_unobserved: どのカメラからも見えない点も残すか（色は灰色）
+        carving: ``carve_free_space`` の出力. 指定時は carve されたボクセルの点を除外
+        points: (N, 3) 集約済みの静的点（world）. 指定時は読み直さない
+        transform: (4, 4) 指定時はこの変換後の座標で書く（transforms.json の正規化座標に合わせる）
+
+    Returns:
+        points3D.ply のパス
+    """
+    output_dir = Path(output_dir)
+    image_paths = [output_dir / "images" / f"{f['frame_idx']:04d}.jpg" for f in frames]
+    points, colors = build_static_point_cloud(
+        nusc,
+        frames,
+        image_paths,
+        dynamic_classes=dynamic_classes,
+        voxel_size=voxel_size,
+        keep_unobserved=keep_unobserved,
+        carving=carving,
+        points=points,
+        transform=transform,
+    )
+    return write_ply(output_dir / "points3D.ply", points, colors)
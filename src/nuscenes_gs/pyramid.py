@@ -0,0 +1,133 @@
+"""画像・マスク・深度の多解像度ピラミッド（images_N/ masks_N/ depths_N/）生成.
+
+Nerfstudio の ``downscale_factor`` はフォルダ ``images_N/`` などが存在すれば
+そこから読むので、学習のたびにフル解像度 JPEG をデコード・リサイズしなくて済む。
+
+縮小方法:
+    * 画像: cv2.resize (INTER_AREA)
+    * マスク: min-pooling（ブロック内に 1 画素でも除外 (0) があれば除外）
+    * 深度: 有効画素のみの min-pooling（0 = 深度なし は無視、最も手前を採用）
+
+出力サイズは Nerfstudio と同じく ``(W // N, H // N)``。端数の画素は最後の
+ブロックに含めるので、マスクの除外領域が縮小で消えることはない。
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from . import perf
+
+# Nerfstudio dataparser が downscale 時に参照するフォルダ接頭辞
+_FOLDER_PREFIX = {
+    "file_path": "images_",
+    "mask_path": "masks_",
+    "depth_file_path": "depths_",
+}
+
+
+def _block_starts(size: int, out_size: int) -> np.ndarray:
+    """出力画素 i が入力 [starts[i], starts[i+1]) を覆うようなブロック先頭."""
+    return (np.arange(out_size) * size) // out_size
+
+
+def min_pool(image: np.ndarray, factor: int) -> np.ndarray:
+    """(H, W) 画像をブロック最小値で (H // factor, W // factor) に縮小.
+
+    Args:
+        image: (H, W) array
+        factor: 縮小率
+
+    Returns:
+        (H // factor, W // factor) array（dtype は入力と同じ）
+    """
+    h, w = image.shape[:2]
+    rows = np.minimum.reduceat(image, _block_starts(h, h // factor), axis=0)
+    return np.minimum.reduceat(rows, _block_starts(w, w // factor), axis=1)
+
+
+def downscale_image(image: np.ndarray, factor: int) -> np.ndarray:
+    """RGB 画像を INTER_AREA で縮小."""
+    h, w = image.shape[:2]
+    return cv2.resize(image, (w // factor, h // factor), interpolation=cv2.INTER_AREA)
+
+
+def downscale_mask(mask: np.ndarray, factor: int) -> np.ndarray:
+    """マスク（0=exclude, 255=include）を保守的に縮小（min-pooling）."""
+    return min_pool(mask, factor)
+
+
+def downscale_depth(depth: np.ndarray, factor: int) -> np.ndarray:
+    """uint16 深度マップ（0=深度なし）を有効画素の最小深度で縮小."""
+    invalid = np.iinfo(depth.dtype).max
+    pooled = min_pool(np.where(depth == 0, invalid, depth), factor)
+    pooled[pooled == invalid] = 0
+    return pooled
+
+
+def _downscale_file(src: Path, key: str, factors: tuple[int, ...]) -> None:
+    """1ファイルから全縮小率の出力を作る（デコードは1回だけ）."""
+    with perf.stage("load"):
+        flags = cv2.IMREAD_COLOR if key == "file_path" else cv2.IMREAD_UNCHANGED
+        image = cv2.imread(str(src), flags)
+    if image is None:
+        raise FileNotFoundError(src)
+
+    for factor in factors:
+        with perf.stage("downscale"):
+            if key == "file_path":
+                out = downscale_image(image, factor)
+            elif key == "mask_path":
+                out = downscale_mask(image, factor)
+            else:
+                out = downscale_depth(image, factor)
+        dst = src.parent.parent / f"{_FOLDER_PREFIX[key]}{factor}" / src.name
+        with perf.stage("write"):
+            cv2.imwrite(str(dst), out)
+
+
+def export_pyramid(
+    output_dir: str | Path,
+    frames: list[dict],
+    factors: tuple[int, ...] = (2, 4, 8),
+    num_workers: int | None = None,
+) -> dict[str, list[Path]]:
+    """エクスポート済みの images/ masks/ depth/ から縮小版を生成.
+
+    Args:
+        output_dir: エクスポートディレクトリ
+        frames: transforms.json の frames（file_path / mask_path / depth_file_path）
+        factors: 縮小率のリスト
+        num_workers: スレッド数（None = CPU 数に応じて自動）
+
+    Returns:
+        フレームキー（"file_path" 等）→ 生成したディレクトリのリスト
+    """
+    output_dir = Path(output_dir)
+    factors = tuple(sorted(set(int(f) for f in factors if f > 1)))
+    if not factors:
+        return {}
+
+    jobs: list[tuple[Path, str]] = []
+    created: dict[str, list[Path]] = {}
+    for key, prefix in _FOLDER_PREFIX.items():
+        paths = [output_dir / fr[key] for fr in frames if key in fr]
+        if not paths:
+            continue
+        created[key] = []
+        for factor in factors:
+            d = output_dir / f"{prefix}{factor}"
+            d.mkdir(parents=True, exist_ok=True)
+            created[key].append(d)
+        jobs += [(p, key) for p in paths]
+
+    # cv2 の imread / resize / imwrite は GIL を解放するのでスレッドで並列化できる
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        for _ in pool.map(lambda job: _downscale_file(job[0], job[1], factors), jobs):
+            pass
+
+    return created
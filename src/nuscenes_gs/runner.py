@@ -0,0 +1,429 @@
+"""YAML で定義した実験パイプライン（export → 初期点群など → train → eval）の DAG 実行.
+
+各 ``experiments/*/run.sh`` はシーン名のハードコード・``[ ! -d "$DATA_DIR" ]`` の確認・
+export と ``ns-train`` の手動連結を繰り返していた。ここではステージを DAG として定義し、
+シーンごとのノードに展開して実行する。
+
+* 成果物はステージ名・パラメータ・シーン token・依存ノードのキーから計算した
+  ハッシュで ``<artifacts>/<stage>/<scene>-<hash12>/`` に置く（ディレクトリ名を変えても
+  再エクスポートされず、パラメータを変えれば別の成果物になる）
+* 完了マーカー ``.complete.json`` がある成果物はスキップする
+* ``python`` ステージ（CPU）はシーン間でプロセスプールで並列に、
+  ``exclusive: true`` のステージ（GPU 学習など）は1つずつ実行する
+
+設定ファイルの例（``experiments/05_depth_supervision/pipeline.yaml``）::
+
+    version: v1.0-mini
+    dataroot: data/raw
+    artifacts: data/derived/runs
+    scenes: [scene-0757]
+    stages:
+      export:
+        function: nuscenes_gs.nerfstudio_export:export_scene_front_with_depth
+        params: {mask_type: lidar, mask_params: {dilation_size: 64}, export_point_cloud: true}
+        link: data/derived/{scene}_front_depth_lidar_masked
+      train:
+        after: [export]
+        exclusive: true
+        command: [ns-train, depth-nerfacto, --data, "{export}", --output-dir, "{output}"]
+
+トップレベルの ``cameras: [CAM_FRONT, CAM_BACK]`` でノードをカメラごとにも分けられる
+（パラメータ・コマンドの ``{camera}`` をカメラ名に置き換える）。複数ノードへの分散は
+``coordinator`` を参照。
+
+トップレベルの ``backend: numba`` などでラスタライズのバックエンド（``nuscenes_gs.backends``）を
+選べる。どのバックエンドでも出力は同じなので、成果物のハッシュには含めない。
+
+``python`` ステージの関数は ``fn(nusc, scene_token, output_dir, **params)``
+（``export_scene_front*`` と同じ形）で呼ぶ。文字列のパラメータ・コマンドの
+``{output}`` / ``{scene}`` / ``{<依存ステージ名>}`` は成果物のパスに置き換える
+（それ以外の ``{...}`` は JSON やシェルの波括弧としてそのまま残す）。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import importlib
+import json
+import os
+import re
+import shutil
+import signal
+import subprocess
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable
+
+from .backends import BACKENDS, set_backend
+
+COMPLETE_MARKER = ".complete.json"
+
+
+class PublishAborted(RuntimeError):
+    """完了マーカーを置く直前の確認（``can_publish``）が偽だった."""
+
+
+# 設定ファイルのステージで使えるキー
+STAGE_KEYS = {"function", "command", "shell", "params", "after", "exclusive", "link"}
+
+# パラメータ・コマンド中の置き換え対象 {name}
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+# ワーカープロセスごとに1回だけ読み込む NuScenes（fork 前に親で読めば共有される）
+_NUSC_CACHE: dict[tuple[str, str, tuple[str, ...] | None], object] = {}
+
+
+def load_pipeline(path: str | Path) -> dict:
+    """パイプライン設定（YAML / JSON）を読み、ステージ定義を検証する."""
+    path = Path(path)
+    with open(path) as f:
+        if path.suffix == ".json":
+            config = json.load(f)
+        else:
+            import yaml
+
+            config = yaml.safe_load(f)
+
+    stages = config.get("stages") or {}
+    if not stages:
+        raise ValueError(f"{path}: no stages defined")
+    for name, stage in stages.items():
+        unknown = set(stage) - STAGE_KEYS
+        if unknown:
+            raise ValueError(f"Stage {name!r}: unknown keys {sorted(unknown)}")
+        if ("function" in stage) == ("command" in stage):
+            raise ValueError(f"Stage {name!r}: specify exactly one of 'function' or 'command'")
+        for dep in stage.get("after", []):
+            if dep not in stages:
+                raise ValueError(f"Stage {name!r}: unknown dependency {dep!r}")
+    backend = config.get("backend")
+    if backend is not None and backend not in BACKENDS:
+        raise ValueError(f"{path}: unknown backend {backend!r} (expected one of {BACKENDS})")
+    stage_order(stages)
+    return config
+
+
+def stage_order(stages: dict[str, dict]) -> list[str]:
+    """ステージのトポロジカル順（循環があれば ValueError）."""
+    order: list[str] = []
+    state: dict[str, str] = {}
+
+    def visit(name: str) -> None:
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "visiting":
+            raise ValueError(f"Stage dependency cycle through {name!r}")
+        state[name] = "visiting"
+        for dep in stages[name].get("after", []):
+            visit(dep)
+        state[name] = "done"
+        order.append(name)
+
+    for name in stages:
+        visit(name)
+    return order
+
+
+def artifact_key(
+    stage_name: str,
+    stage: dict,
+    scene_token: str,
+    version: str,
+    dep_keys: list[str],
+    camera: str | None = None,
+) -> str:
+    """成果物のキー: ステージ定義・シーン・（カメラ）・データセット版・依存ノードのキーの SHA-256."""
+    payload = {
+        "stage": stage_name,
+        "function": stage.get("function"),
+        "command": stage.get("command"),
+        "params": stage.get("params", {}),
+        "scene_token": scene_token,
+        "version": version,
+        "deps": dep_keys,
+    }
+    # cameras を指定しない設定では従来と同じキー（既存の成果物を作り直さない）
+    if camera is not None:
+        payload["camera"] = camera
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def plan_pipeline(config: dict, scenes: list[dict]) -> list[dict]:
+    """ステージ × シーン（× カメラ）のノードにキーと成果物パスを割り当てる（トポロジカル順）.
+
+    設定のトップレベルに ``cameras: [CAM_FRONT, CAM_FRONT_LEFT, ...]`` があれば
+    ノードをカメラごとにも分け、パラメータ・コマンドの ``{camera}`` をカメラ名に置き換える。
+
+    Args:
+        config: ``load_pipeline`` の出力
+        scenes: 対象シーンの scene レコード
+
+    Returns:
+        ノードの dict のリスト（stage, scene, scene_token, camera, key, output, deps, done）
+    """
+    stages = config["stages"]
+    root = Path(config.get("artifacts", "data/derived/runs"))
+    version = config.get("version", "v1.0-mini")
+    cameras = config.get("cameras") or [None]
+
+    nodes: list[dict] = []
+    by_id: dict[tuple[str, str, str | None], dict] = {}
+    for stage_name in stage_order(stages):
+        stage = stages[stage_name]
+        for scene in scenes:
+            for camera in cameras:
+                deps = [by_id[(dep, scene["token"], camera)] for dep in stage.get("after", [])]
+                key = artifact_key(stage_name, stage, scene["token"], version, [d["key"] for d in deps], camera)
+                name = scene["name"] if camera is None else f"{scene['name']}-{camera}"
+                output = root / stage_name / f"{name}-{key[:12]}"
+                node = {
+                    "stage": stage_name,
+                    "scene": scene["name"],
+                    "scene_token": scene["token"],
+                    "camera": camera,
+                    "key": key,
+                    "output": output,
+                    "deps": deps,
+                    "done": (output / COMPLETE_MARKER).exists(),
+                }
+                nodes.append(node)
+                by_id[(stage_name, scene["token"], camera)] = node
+    return nodes
+
+
+def node_label(node: dict) -> str:
+    """ログ用のノード名（シーン、カメラ別ならシーン/カメラ）."""
+    return node["scene"] if node.get("camera") is None else f"{node['scene']}/{node['camera']}"
+
+
+def _substitute(value, mapping: dict[str, str]):
+    """文字列中の {name} を成果物パスに置き換える（dict / list は再帰、mapping にない名前は残す）."""
+    if isinstance(value, str):
+        return _PLACEHOLDER.sub(lambda m: mapping.get(m.group(1), m.group(0)), value)
+    if isinstance(value, list):
+        return [_substitute(v, mapping) for v in value]
+    if isinstance(value, dict):
+        return {k: _substitute(v, mapping) for k, v in value.items()}
+    return value
+
+
+def _load_nuscenes(version: str, dataroot: str, archive: list[str] | None):
+    cache_key = (version, dataroot, tuple(archive) if archive else None)
+    if cache_key not in _NUSC_CACHE:
+        if archive:
+            from .archive import load_nuscenes_from_archive
+
+            _NUSC_CACHE[cache_key] = load_nuscenes_from_archive(archive, version=version, verbose=False)
+        else:
+            from nuscenes.nuscenes import NuScenes
+
+            _NUSC_CACHE[cache_key] = NuScenes(version=version, dataroot=dataroot, verbose=False)
+    return _NUSC_CACHE[cache_key]
+
+
+def _run_function(function: str, params: dict, scene_token: str, output: str, dataset: dict) -> None:
+    """``module:function`` を (nusc, scene_token, output_dir, **params) で呼ぶ（ワーカープロセス内）."""
+    module_name, func_name = function.split(":")
+    func = getattr(importlib.import_module(module_name), func_name)
+    nusc = _load_nuscenes(dataset["version"], dataset["dataroot"], dataset.get("archive"))
+    func(nusc, scene_token, output, **params)
+
+
+def _run_command(command, shell: bool, output: str, keep_running: Callable[[], bool] | None = None) -> None:
+    """外部コマンドを実行し、出力を成果物ディレクトリの log.txt に残す.
+
+    keep_running 指定時は1秒ごとに呼び、偽になったらコマンド（のプロセスグループ）を止めて
+    ``PublishAborted`` を送出する。
+    """
+    with open(Path(output) / "log.txt", "w") as log:
+        # 止めるときにシェルの子プロセスごと kill できるよう、確認する場合は別セッションで起動する
+        proc = subprocess.Popen(
+            command, shell=shell, stdout=log, stderr=subprocess.STDOUT, start_new_session=keep_running is not None
+        )
+        try:
+            while True:
+                try:
+                    returncode = proc.wait(timeout=1.0 if keep_running is not None else None)
+                    break
+                except subprocess.TimeoutExpired:
+                    if not keep_running():
+                        raise PublishAborted(f"{output}: command stopped, ownership was lost") from None
+        except BaseException:
+            if keep_running is not None:
+                os.killpg(proc.pid, signal.SIGKILL)
+            else:
+                proc.kill()
+            proc.wait()
+            raise
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command)
+
+
+def _execute(node: dict, stage: dict, dataset: dict, can_publish: Callable[[], bool] | None = None) -> float:
+    """1ノードを実行して完了マーカーを書く. 所要時間 [s] を返す.
+
+    can_publish 指定時はマーカーを置く直前に呼び、偽なら置かずに ``PublishAborted`` を送出する
+    （分散キューで claim を他のワーカーに取られた場合など）。command ステージは実行中も
+    確認して止める（function ステージはプロセス内なので途中では止められない）。
+    """
+    output = node["output"]
+    # 途中で失敗した成果物は作り直す
+    if output.exists():
+        shutil.rmtree(output)
+    output.mkdir(parents=True)
+
+    mapping = {"output": str(output), "scene": node["scene"], "camera": node.get("camera") or ""}
+    mapping.update({dep["stage"]: str(dep["output"]) for dep in node["deps"]})
+    t0 = time.perf_counter()
+    if "function" in stage:
+        _run_function(
+            stage["function"], _substitute(stage.get("params", {}), mapping), node["scene_token"], str(output), dataset
+        )
+    else:
+        _run_command(_substitute(stage["command"], mapping), stage.get("shell", False), str(output), can_publish)
+    elapsed = time.perf_counter() - t0
+
+    # マーカーは rename で置く（他ノードから書きかけのマーカーが完了に見えない）
+    tmp_marker = output / f".{COMPLETE_MARKER}.tmp"
+    with open(tmp_marker, "w") as f:
+        json.dump(
+            {
+                "stage": node["stage"],
+                "scene": node["scene"],
+                "camera": node.get("camera"),
+                "key": node["key"],
+                "deps": {dep["stage"]: str(dep["output"]) for dep in node["deps"]},
+                "seconds": elapsed,
+            },
+            f,
+            indent=2,
+        )
+    if can_publish is not None and not can_publish():
+        tmp_marker.unlink(missing_ok=True)
+        raise PublishAborted(f"{output}: not publishing, ownership was lost")
+    os.replace(tmp_marker, output / COMPLETE_MARKER)
+    return elapsed
+
+
+def _update_link(node: dict, stage: dict) -> None:
+    """``link`` 指定時は人が読める名前のシンボリックリンクを最新の成果物に向ける."""
+    if "link" not in stage:
+        return
+    link = Path(stage["link"].format(scene=node["scene"], camera=node.get("camera") or ""))
+    link.parent.mkdir(parents=True, exist_ok=True)
+    if link.is_symlink():
+        link.unlink()
+    elif link.exists():
+        print(f"  [link] {link} exists and is not a symlink, leaving it")
+        return
+    link.symlink_to(os.path.relpath(node["output"], link.parent), target_is_directory=True)
+
+
+def run_pipeline(
+    config: dict,
+    scenes: list[dict],
+    num_workers: int | None = None,
+    dry_run: bool = False,
+    force: bool = False,
+) -> list[dict]:
+    """パイプラインを実行する.
+
+    依存が揃ったノードから順に投入し、``function`` ステージはプロセスプール
+    （num_workers 並列）、``command`` ステージはスレッドで実行する。
+    ``exclusive: true`` のステージは同時に1ノードしか走らせない。
+
+    Args:
+        config: ``load_pipeline`` の出力
+        scenes: 対象シーンの scene レコード
+        num_workers: 並列数（None = 設定の workers、なければ CPU 数）
+        dry_run: True なら実行せずに計画（done / todo）だけ表示
+        force: True なら完了済みの成果物も作り直す
+
+    Returns:
+        ノードのリスト（status: skipped / done / failed / blocked、seconds）
+
+    Raises:
+        RuntimeError: 失敗したノードがある場合（他の独立したノードは最後まで実行する）
+    """
+    stages = config["stages"]
+    nodes = plan_pipeline(config, scenes)
+    if force:
+        for node in nodes:
+            node["done"] = False
+
+    for node in nodes:
+        status = "done" if node["done"] else "todo"
+        print(f"  [{status:4s}] {node['stage']:<12s} {node_label(node):<12s} -> {node['output']}")
+    if dry_run:
+        return nodes
+
+    dataset = {
+        "version": config.get("version", "v1.0-mini"),
+        "dataroot": config.get("dataroot", "data/raw"),
+        "archive": config.get("archive"),
+    }
+    num_workers = num_workers or config.get("workers") or os.cpu_count() or 1
+
+    # ワーカープロセスにも引き継ぐため、プールを作る前に環境変数で指定する
+    if config.get("backend"):
+        set_backend(config["backend"])
+        os.environ["NUSCENES_GS_BACKEND"] = config["backend"]
+
+    # fork するワーカーが NuScenes を読み直さないよう、親で先に読んでおく
+    if any("function" in stages[n["stage"]] and not n["done"] for n in nodes):
+        _load_nuscenes(dataset["version"], dataset["dataroot"], dataset["archive"])
+
+    for node in nodes:
+        node["status"] = "skipped" if node["done"] else None
+        if node["done"]:
+            _update_link(node, stages[node["stage"]])
+
+    pending = [n for n in nodes if n["status"] is None]
+    running: dict[Future, dict] = {}
+    exclusive_busy = False
+    with ProcessPoolExecutor(max_workers=num_workers) as processes, ThreadPoolExecutor(max_workers=num_workers) as threads:
+        while pending or running:
+            # 依存が失敗したノードは実行しない
+            for node in pending:
+                if any(dep["status"] in ("failed", "blocked") for dep in node["deps"]):
+                    node["status"] = "blocked"
+            pending = [n for n in pending if n["status"] is None]
+
+            for node in list(pending):
+                stage = stages[node["stage"]]
+                if not all(dep["status"] in ("skipped", "done") for dep in node["deps"]):
+                    continue
+                if stage.get("exclusive") and exclusive_busy:
+                    continue
+                if len(running) >= num_workers:
+                    break
+                executor = processes if "function" in stage else threads
+                running[executor.submit(_execute, node, stage, dataset)] = node
+                exclusive_busy |= bool(stage.get("exclusive"))
+                pending.remove(node)
+                print(f"  [run ] {node['stage']:<12s} {node_label(node)}")
+
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                node = running.pop(future)
+                stage = stages[node["stage"]]
+                if stage.get("exclusive"):
+                    exclusive_busy = False
+                try:
+                    node["seconds"] = future.result()
+                    node["status"] = "done"
+                    _update_link(node, stage)
+                    print(f"  [ok  ] {node['stage']:<12s} {node_label(node)} ({node['seconds']:.1f} s)")
+                except Exception as e:
+                    node["status"] = "failed"
+                    print(f"  [FAIL] {node['stage']:<12s} {node_label(node)}: {e}")
+
+    failed = [n for n in nodes if n["status"] in ("failed", "blocked")]
+    if failed:
+        raise RuntimeError(
+            "Pipeline failed: " + ", ".join(f"{n['stage']}/{node_label(n)} ({n['status']})" for n in failed)
+        )
+    return nodes
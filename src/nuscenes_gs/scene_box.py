@@ -0,0 +1,163 @@
+"""シーンの正規化（重力方向の向き・中心・推奨スケール）と外れ値に強い AABB.
+
+transforms.json の nuScenes world 座標は並進が数百〜数千 m あり、Nerfstudio の
+dataparser は読み込みのたびに向き・中心・スケールを推定し直す。その scene box は
+原点中心の立方体なので、道路沿いに細長いシーンでは空の空間が大きく残る。
+
+ここではエクスポート時に
+
+1. ego pose の z 軸（の中央値）から重力方向の上向きを求め、走行方向（カメラ位置の
+   水平面での主成分）を x 軸に合わせた回転
+2. カメラ位置（全て含める）と静的 LiDAR 点（各軸の分位点で外れ値を除く）の AABB
+3. AABB 中心を原点に移す並進と、AABB が [-1, 1]^3 に収まる推奨スケール
+
+を求め、c2w に回転・並進を適用した上で ``applied_transform``（world → 正規化座標, 3x4）と
+``scene_box`` を transforms.json に書く。スケールは姿勢に焼き込まない（深度マップが m の
+まま使えるように）。Nerfstudio 側は ``--orientation-method none --center-method none
+--auto-scale-poses False --scale-factor <scene_box.scale_factor>`` で読めば変換はほぼ恒等に
+なり、scene box は AABB の最長辺に合う。Nerfstudio の dataparser は points3D.ply に
+``applied_transform`` を適用しないので、points3D.ply と COLMAP sparse model（姿勢・点）も
+エクスポータ側で同じ正規化座標に変換して書く。
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+from .poses import make_transform
+
+
+def gravity_aligned_rotation(ego_poses: list[dict], positions: np.ndarray) -> np.ndarray:
+    """world → 重力方向に揃えた座標系への回転（z = 上, x = 走行方向）.
+
+    Args:
+        ego_poses: nuScenes ego_pose レコード
+        positions: (N, 3) カメラ位置（world）
+
+    Returns:
+        R: (3, 3)。行が新しい x, y, z 軸
+    """
+    # 坂道やピッチングに引っ張られないよう、ego の z 軸の成分ごとの中央値を使う
+    ups = np.array([make_transform(p["translation"], p["rotation"])[:3, 2] for p in ego_poses])
+    up = np.median(ups, axis=0) if len(ups) else np.array([0.0, 0.0, 1.0])
+    up /= np.linalg.norm(up)
+
+    # 水平面に射影したカメラ位置の主成分を x 軸に（停車シーンなどで退化したら world の x）
+    flat = positions - np.outer(positions @ up, up)
+    flat = flat - flat.mean(axis=0)
+    x_axis = np.array([1.0, 0.0, 0.0])
+    if len(flat) >= 2 and np.linalg.norm(flat) > 1e-6:
+        x_axis = np.linalg.svd(flat, full_matrices=False)[2][0]
+        # 向きは走行方向（最初 → 最後）に合わせる
+        if (flat[-1] - flat[0]) @ x_axis < 0:
+            x_axis = -x_axis
+    x_axis = x_axis - (x_axis @ up) * up
+    if np.linalg.norm(x_axis) < 1e-6:
+        x_axis = np.cross(up, [0.0, 1.0, 0.0])
+    x_axis /= np.linalg.norm(x_axis)
+    return np.stack([x_axis, np.cross(up, x_axis), up])
+
+
+def robust_aabb(
+    camera_positions: np.ndarray,
+    points: np.ndarray,
+    quantile: float = 0.01,
+    margin: float = 2.0,
+) -> np.ndarray:
+    """カメラ位置と点群の AABB. 点は各軸の [quantile, 1 - quantile] 分位点で外れ値を除く.
+
+    カメラ位置は分位点で削らずに必ず含める。
+
+    Returns:
+        (2, 3) [[xmin, ymin, zmin], [xmax, ymax, zmax]]（margin [m] だけ広げる）
+    """
+    lo = camera_positions.min(axis=0)
+    hi = camera_positions.max(axis=0)
+    if len(points):
+        q_lo, q_hi = np.quantile(points, [quantile, 1.0 - quantile], axis=0)
+        lo, hi = np.minimum(lo, q_lo), np.maximum(hi, q_hi)
+    return np.stack([lo - margin, hi + margin])
+
+
+def compute_scene_normalization(
+    c2ws: np.ndarray,
+    ego_poses: list[dict],
+    points: np.ndarray,
+    quantile: float = 0.01,
+    margin: float = 2.0,
+) -> dict:
+    """world → 正規化座標の変換・AABB・推奨スケールを求める.
+
+    Args:
+        c2ws: (N, 4, 4) camera-to-world（world 座標）
+        ego_poses: 重力方向の推定に使う ego_pose レコード
+        points: (M, 3) 静的 LiDAR 点（world）
+        quantile: 点の外れ値として各軸の両端から除く割合
+        margin: AABB を広げる幅 [m]
+
+    Returns:
+        transform: (4, 4) world → 正規化座標（回転 + AABB 中心を原点へ）
+        aabb: (2, 3) 正規化座標での AABB [m]
+        scale_factor: AABB が [-1, 1]^3 に収まるスケール（1 / 最長の半辺）
+        up: (3,) world での上向き
+    """
+    positions = c2ws[:, :3, 3]
+    R = gravity_aligned_rotation(ego_poses, positions)
+    aabb = robust_aabb(positions @ R.T, points @ R.T, quantile=quantile, margin=margin)
+    center = aabb.mean(axis=0)
+
+    transform = np.eye(4)
+    transform[:3, :3] = R
+    transform[:3, 3] = -center
+    return {
+        "transform": transform,
+        "aabb": aabb - center,
+        "scale_factor": float(1.0 / max((aabb[1] - aabb[0]).max() / 2, 1e-6)),
+        "up": R[2],
+    }
+
+
+def normalize_scene_transforms(
+    frames: list[dict],
+    transforms: dict,
+    points: np.ndarray,
+    quantile: float = 0.01,
+    margin: float = 2.0,
+) -> dict:
+    """transforms.json の dict を正規化座標に書き換え、applied_transform と scene_box を足す.
+
+    Args:
+        frames: ``build_scene_frame_index`` の出力（重力方向の推定に ego pose を使う）
+        transforms: エクスポータが組み立てた transforms（frames の transform_matrix を書き換える）
+        points: (M, 3) エクスポータが集めた静的 LiDAR 点（world）
+        quantile: 点の外れ値として各軸の両端から除く割合
+        margin: AABB を広げる幅 [m]
+
+    Returns:
+        ``compute_scene_normalization`` の出力
+    """
+    c2ws = np.array([f["transform_matrix"] for f in transforms["frames"]], dtype=np.float64)
+    normalization = compute_scene_normalization(
+        c2ws, [f["cam_ego_pose"] for f in frames], points, quantile=quantile, margin=margin
+    )
+
+    transform = normalization["transform"]
+    for frame, c2w in zip(transforms["frames"], c2ws):
+        frame["transform_matrix"] = (transform @ c2w).tolist()
+    transforms["applied_transform"] = transform[:3].tolist()
+    transforms["scene_box"] = {
+        "aabb": normalization["aabb"].tolist(),
+        "scale_factor": normalization["scale_factor"],
+        "up": normalization["up"].tolist(),
+        "quantile": quantile,
+        "margin": margin,
+        # この設定で読めば dataparser の向き・中心・スケールの推定は不要
+        "dataparser": {
+            "orientation_method": "none",
+            "center_method": "none",
+            "auto_scale_poses": False,
+            "scale_factor": normalization["scale_factor"],
+            "scene_scale": 1.0,
+        },
+    }
+    return normalization
@@ -0,0 +1,158 @@
+"""ポーズ差分と LiDAR 共視性によるフレーム間引き.
+
+低速シーンは停止区間で連続フレームがほぼ同じ画像になり、学習時間を無駄にする。
+フレーム索引（``build_scene_frame_index`` / ``build_sweep_frame_index``）の上で、
+
+* 並進・回転の差分（ほぼ同じ位置のフレームを LiDAR を読まずに除く）
+* 共視性: フレーム A のカメラに写る A の LiDAR 点のうち、B のカメラにも写る割合
+
+を使って、冗長なフレームを除いた少数の散らばったフレームを選ぶ。
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from . import perf
+from .archive import read_dataroot_array
+from .masks import project_points_to_image, transform_lidar_to_world
+
+if TYPE_CHECKING:
+    from nuscenes.nuscenes import NuScenes
+
+
+def pose_deltas(frames: list[dict]) -> tuple[np.ndarray, np.ndarray]:
+    """連続フレーム間のカメラ並進 [m] と回転角 [deg]（一括計算）.
+
+    Returns:
+        translation: (N - 1,)
+        rotation_deg: (N - 1,)
+    """
+    c2w = np.stack([f["c2w"] for f in frames])
+    translation = np.linalg.norm(np.diff(c2w[:, :3, 3], axis=0), axis=1)
+    # 相対回転 R_a^T R_b の回転角 = arccos((trace - 1) / 2)
+    trace = np.einsum("nji,nji->n", c2w[:-1, :3, :3], c2w[1:, :3, :3])
+    rotation_deg = np.degrees(np.arccos(np.clip((trace - 1.0) / 2.0, -1.0, 1.0)))
+    return translation, rotation_deg
+
+
+def visible_lidar_points(nusc: NuScenes, frame: dict, max_points: int = 4096) -> np.ndarray:
+    """フレームのカメラに写る、そのフレームの LiDAR 点（world 座標、最大 max_points 点）.
+
+    非 keyframe の sweep にも使えるよう lidarseg ラベルは読まない。
+    """
+    scan = read_dataroot_array(nusc, frame["lidar_data"]["filename"], np.float32)
+    points_world = transform_lidar_to_world(
+        scan.reshape((-1, 5))[:, :3], frame["lidar_ego_pose"], frame["lidar_calib"]
+    )
+    _, visible, _ = project_points_to_image(points_world, frame["w2c"], frame["K"], frame["image_shape"])
+    points_world = points_world[visible]
+    stride = max(len(points_world) // max_points, 1)
+    return points_world[::stride]
+
+
+def covisibility(points_world: np.ndarray, frame: dict) -> float:
+    """点群（別フレームで可視だった点）のうち frame のカメラに写る割合."""
+    if len(points_world) == 0:
+        return 0.0
+    _, visible, _ = project_points_to_image(points_world, frame["w2c"], frame["K"], frame["image_shape"])
+    return float(visible.mean())
+
+
+def select_frames(
+    nusc: NuScenes,
+    frames: list[dict],
+    target_count: int | None = None,
+    max_overlap: float = 0.95,
+    min_translation: float = 0.5,
+    min_rotation_deg: float = 2.0,
+    max_points: int = 4096,
+) -> tuple[list[int], dict]:
+    """冗長なフレームを除いて残すフレームを選ぶ.
+
+    target_count 指定時: 連続フレーム間の「新規性」（1 - 共視性）を累積し、
+        その累積量が等間隔になるよう target_count 枚を選ぶ（停止区間は疎に、
+        旋回・走行区間は密になる）。停止区間は新規性がほぼ 0 なので、停止が長いと
+        target_count より少なくなる。
+    target_count 未指定時: 最後に残したフレームとの共視性が max_overlap 未満になったら残す。
+        並進 < min_translation かつ回転 < min_rotation_deg のフレームは LiDAR を読まずに除く。
+
+    Args:
+        nusc: NuScenes instance
+        frames: ``build_scene_frame_index`` / ``build_sweep_frame_index`` の出力
+        target_count: 残すフレーム数の目安（最初と最後のフレームは必ず残す）
+        max_overlap: 閾値モードで冗長とみなす共視性
+        min_translation: ほぼ同位置とみなす並進 [m]
+        min_rotation_deg: ほぼ同姿勢とみなす回転 [deg]
+        max_points: 共視性の計算に使う1フレームあたりの最大点数
+
+    Returns:
+        selected: 残すフレームの frame_idx（昇順）
+        stats: フレームごとの値（先頭は 0 / 0 / 1.0 / -1）
+            translation / rotation_deg: 前フレームとの並進 [m]・回転 [deg]
+            overlap: ``overlap_ref`` のフレームとの共視性。target_count 指定時は前フレーム、
+                閾値モードでは判定時点で最後に残したフレーム（残すかどうかを決めた値）。
+                ほぼ同位置として LiDAR を読まずに扱ったフレームは 1.0
+            overlap_ref: overlap の比較相手のフレーム番号
+    """
+    n = len(frames)
+    if n == 0:
+        return [], {"translation": [], "rotation_deg": [], "overlap": [], "overlap_ref": []}
+
+    translation, rotation_deg = pose_deltas(frames)
+    near_duplicate = (translation < min_translation) & (rotation_deg < min_rotation_deg)
+    points_cache: dict[int, np.ndarray] = {}
+
+    def points_of(i: int) -> np.ndarray:
+        if i not in points_cache:
+            with perf.stage("load"):
+                points_cache[i] = visible_lidar_points(nusc, frames[i], max_points=max_points)
+        return points_cache[i]
+
+    def overlap(i: int, j: int) -> float:
+        with perf.stage("covisibility"):
+            return covisibility(points_of(i), frames[j])
+
+    # 連続フレーム間の共視性（ほぼ同位置のペアは 1 とみなす）
+    consecutive = np.ones(n)
+    reference = np.arange(-1, n - 1)
+    if target_count is not None:
+        for i in range(1, n):
+            if not near_duplicate[i - 1]:
+                consecutive[i] = overlap(i - 1, i)
+                points_cache.pop(i - 1, None)
+
+        if target_count >= n:
+            selected = list(range(n))
+        else:
+            # 新規性の累積を等分（同点で同じフレームに寄らないよう微小な一様成分を足す）
+            novelty = np.r_[0.0, np.cumsum(1.0 - consecutive[1:] + 1e-6)]
+            targets = np.linspace(0.0, novelty[-1], max(target_count, 2))
+            picks = np.abs(novelty[None, :] - targets[:, None]).argmin(axis=1)
+            selected = sorted(set(picks.tolist()) | {0, n - 1})
+    else:
+        selected = [0]
+        for i in range(1, n):
+            last = selected[-1]
+            # 最後に残したフレームからの累積移動でほぼ同位置か判定
+            t = np.linalg.norm(frames[i]["c2w"][:3, 3] - frames[last]["c2w"][:3, 3])
+            r_trace = np.trace(frames[last]["c2w"][:3, :3].T @ frames[i]["c2w"][:3, :3])
+            r = np.degrees(np.arccos(np.clip((r_trace - 1.0) / 2.0, -1.0, 1.0)))
+            reference[i] = last
+            if t < min_translation and r < min_rotation_deg:
+                continue
+            consecutive[i] = overlap(last, i)
+            if consecutive[i] < max_overlap:
+                selected.append(i)
+                points_cache.pop(last, None)
+
+    perf.count("frames_selected", len(selected))
+    stats = {
+        "translation": np.r_[0.0, translation].tolist(),
+        "rotation_deg": np.r_[0.0, rotation_deg].tolist(),
+        "overlap": consecutive.tolist(),
+        "overlap_ref": reference.tolist(),
+    }
+    return selected, stats
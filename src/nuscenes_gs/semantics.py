@@ -0,0 +1,145 @@
+"""lidarseg からのピクセル単位セマンティックラベル画像（semantics/）生成.
+
+Semantic / relightable 系の Gaussian Splatting 向けに、ラベル付き LiDAR 点を
+z-buffer で投影した uint8 のラベル画像を書く（画素値 = lidarseg のクラス index、
+ラベルのない画素は IGNORE_LABEL）。
+
+* 同じ画素に複数の点が落ちたときは最も近い点のラベルを使う（一括の z-buffer）
+* クラスごとの膨張（例: 細い pole や遠くの車を太らせる）は空いている画素だけを埋める
+* ``densify`` 指定時は、シーン全体の静的点をボクセル化した地図も一緒に投影して
+  1 スイープでは疎な静的背景を埋める（近い点が勝つので手前の動的物体は上書きされない）
+
+深度マップと同じフレームループ（``generate_depth_maps_for_scene``）で計算し、
+点群の読み込みと座標変換を共有する。
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import cv2
+import numpy as np
+
+from . import perf
+from .masks import DEFAULT_LABEL_COLORS
+
+if TYPE_CHECKING:
+    from nuscenes.nuscenes import NuScenes
+
+# ラベルのない画素の値（Nerfstudio の学習では無視する）
+IGNORE_LABEL = 255
+
+# 投影しない lidarseg クラス: noise(0) と vehicle.ego(31)
+DEFAULT_IGNORED_CLASSES = (0, 31)
+
+
+def project_lidar_to_labels(
+    points_world: np.ndarray,
+    labels: np.ndarray,
+    w2c: np.ndarray,
+    K: np.ndarray,
+    image_shape: tuple[int, int],
+    depth_range: tuple[float, float] = (0.1, 80.0),
+    dilation: dict[int, int] | None = None,
+    ignored_classes: tuple[int, ...] = DEFAULT_IGNORED_CLASSES,
+) -> np.ndarray:
+    """ラベル付き LiDAR 点を z-buffer で投影したラベル画像を生成.
+
+    Args:
+        points_world: (N, 3) LiDAR points in world frame
+        labels: (N,) semantic class IDs
+        w2c: 4x4 world-to-camera transform matrix
+        K: 3x3 camera intrinsic matrix
+        image_shape: (height, width)
+        depth_range: (min_depth, max_depth) in meters
+        dilation: クラス ID → 膨張カーネルサイズ [px]. 指定順に、まだラベルのない画素だけを埋める
+        ignored_classes: 投影しないクラス ID
+
+    Returns:
+        Label image (H, W) uint8（IGNORE_LABEL = ラベルなし）
+    """
+    h, w = image_shape
+    min_depth, max_depth = depth_range
+    label_map = np.full((h, w), IGNORE_LABEL, dtype=np.uint8)
+
+    with perf.stage("project"):
+        points_cam = points_world @ w2c[:3, :3].T + w2c[:3, 3]
+        depths = points_cam[:, 2]
+        valid = (depths >= min_depth) & (depths <= max_depth) & ~np.isin(labels, ignored_classes)
+        points_cam, depths, labels = points_cam[valid], depths[valid], labels[valid]
+
+        uv = points_cam @ K.T
+        u = np.round(uv[:, 0] / uv[:, 2]).astype(np.int64)
+        v = np.round(uv[:, 1] / uv[:, 2]).astype(np.int64)
+        in_bounds = (u >= 0) & (u < w) & (v >= 0) & (v < h)
+        pixel = v[in_bounds] * w + u[in_bounds]
+        depths, labels = depths[in_bounds], labels[in_bounds]
+
+    perf.count("points_projected", len(pixel))
+
+    with perf.stage("rasterize"):
+        # 深度の昇順に並べ、画素ごとに最初（最も近い）の点を採用
+        order = np.argsort(depths, kind="stable")
+        pixel_sorted = pixel[order]
+        _, first = np.unique(pixel_sorted, return_index=True)
+        label_map.ravel()[pixel_sorted[first]] = labels[order[first]]
+
+        for label, size in (dilation or {}).items():
+            if size <= 1:
+                continue
+            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size))
+            grown = cv2.dilate((label_map == label).view(np.uint8), kernel)
+            label_map[(grown > 0) & (label_map == IGNORE_LABEL)] = label
+
+    if perf.enabled():
+        perf.count("pixels_written", int(np.count_nonzero(label_map != IGNORE_LABEL)))
+    return label_map
+
+
+def build_static_label_map(
+    nusc: NuScenes,
+    scene_token: str,
+    voxel_size: float = 0.1,
+    dynamic_classes: list[int] | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """シーン全フレームの静的点をボクセル化したラベル付き地図（densify 用）.
+
+    Returns:
+        points: (M, 3) world frame のボクセル重心
+        labels: (M,) uint8 各ボクセルの代表点のラベル
+    """
+    from .frames import build_scene_frame_index
+    from .pointcloud import accumulate_static_points, voxel_downsample
+
+    frames = build_scene_frame_index(nusc, scene_token)
+    points, labels = accumulate_static_points(nusc, frames, dynamic_classes=dynamic_classes)
+    points, labels = voxel_downsample(points, voxel_size, labels)
+    perf.count("semantic_map_points", len(points))
+    return points, labels
+
+
+def semantic_classes(nusc: NuScenes) -> list[str]:
+    """lidarseg のクラス名（index 順、欠番は空文字）."""
+    names = {cat["index"]: cat["name"] for cat in nusc.category if "index" in cat}
+    return [names.get(i, "") for i in range(max(names, default=-1) + 1)]
+
+
+def write_semantics_metadata(nusc: NuScenes, output_dir: str | Path, params: dict) -> dict:
+    """output_dir/semantics.json（クラス名・色・無視ラベル）を書き、transforms.json 用の dict を返す.
+
+    Nerfstudio の ``Semantics``（classes / colors / mask_classes）と同じ形にする。
+    """
+    classes = semantic_classes(nusc)
+    colors = [list(DEFAULT_LABEL_COLORS.get(i, (128, 128, 128))) for i in range(len(classes))]
+    metadata = {
+        "classes": classes,
+        "colors": colors,
+        "ignore_label": IGNORE_LABEL,
+        "mask_classes": [],
+        "params": params,
+    }
+    with open(Path(output_dir) / "semantics.json", "w") as f:
+        json.dump(metadata, f, indent=2)
+    return {"classes_file": "semantics.json", "ignore_label": IGNORE_LABEL}
@@ -0,0 +1,185 @@
+"""エクスポート結果を memory-mapped な学習用シャードにまとめる.
+
+images/ masks/ depth/ の小さなファイル群と transforms.json を、ストリームごとに
+1つの大きなバイナリファイルへ詰める。データローダはファイルを開き直さずに
+フレーム番号でランダムアクセスでき、raw 形式なら NumPy のゼロコピー view が返る。
+
+シャードディレクトリの構成:
+    images.bin   画像（raw: RGB uint8 (H, W, 3) / jpeg: 元の JPEG バイト列）
+    masks.bin    マスク uint8 (H, W)（いずれかのフレームにマスクがある場合）
+    depth.bin    深度 uint16 (H, W)（いずれかのフレームに深度がある場合）
+    poses.npy    (N, 4, 4) float64 c2w（transforms.json と同じ OpenGL 規約）
+    index.npy    (N, 3, 2) int64 固定長オフセット索引 [stream][offset, nbytes]
+    meta.json    transforms.json の frames 以外のキー + フレームごとのパス等
+
+マスク・深度を持たないフレームのレコードは空（nbytes = 0）で、読み出すと None になる。
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from . import perf
+
+STREAMS = ("images", "masks", "depth")
+_FRAME_KEYS = {"images": "file_path", "masks": "mask_path", "depth": "depth_file_path"}
+_DTYPES = {"images": np.uint8, "masks": np.uint8, "depth": np.uint16}
+
+# 各レコードの先頭をこの境界に揃える（uint16 view のアラインメント + キャッシュライン）
+_ALIGN = 64
+
+
+def _read_record(path: Path, stream: str, encode_images: bool) -> bytes | np.ndarray:
+    """1ファイルをシャードに書く形（raw 配列 or JPEG バイト列）で読む."""
+    if stream == "images" and encode_images:
+        return path.read_bytes()
+    if stream == "images":
+        image = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        if image is None:
+            raise FileNotFoundError(path)
+        return np.ascontiguousarray(image[:, :, ::-1])
+    image = cv2.imread(str(path), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise FileNotFoundError(path)
+    return image.astype(_DTYPES[stream], copy=False)
+
+
+def write_shard(
+    export_dir: str | Path,
+    shard_dir: str | Path | None = None,
+    encode_images: bool = False,
+) -> Path:
+    """エクスポートディレクトリ（transforms.json）をシャードに変換する.
+
+    Args:
+        export_dir: ``export_scene_front*`` の出力ディレクトリ
+        shard_dir: シャードの出力先（None = ``export_dir/shard``）
+        encode_images: True なら画像を JPEG のまま格納（小さいが読み出し時にデコードが必要）
+
+    Returns:
+        シャードディレクトリのパス
+    """
+    export_dir = Path(export_dir)
+    shard_dir = Path(shard_dir) if shard_dir is not None else export_dir / "shard"
+    shard_dir.mkdir(parents=True, exist_ok=True)
+
+    with open(export_dir / "transforms.json") as f:
+        transforms = json.load(f)
+    frames = transforms.pop("frames")
+
+    streams = [s for s in STREAMS if any(_FRAME_KEYS[s] in frame for frame in frames)]
+    index = np.zeros((len(frames), len(STREAMS), 2), dtype=np.int64)
+    shapes: dict[str, list[int]] = {}
+
+    for stream in streams:
+        key = _FRAME_KEYS[stream]
+        offset = 0
+        with open(shard_dir / f"{stream}.bin", "wb") as out:
+            for i, frame in enumerate(frames):
+                if key not in frame:
+                    continue
+                with perf.stage("load"):
+                    record = _read_record(export_dir / frame[key], stream, encode_images)
+                if isinstance(record, np.ndarray):
+                    shape = list(record.shape)
+                    if shapes.setdefault(stream, shape) != shape:
+                        raise ValueError(f"{frame[key]}: shape {shape} != {shapes[stream]}")
+                    record = record.tobytes()
+
+                pad = -offset % _ALIGN
+                with perf.stage("write"):
+                    out.write(b"\0" * pad)
+                    out.write(record)
+                offset += pad
+                index[i, STREAMS.index(stream)] = (offset, len(record))
+                offset += len(record)
+        perf.count("bytes_written", offset)
+
+    np.save(shard_dir / "poses.npy", np.array([fr["transform_matrix"] for fr in frames], dtype=np.float64))
+    np.save(shard_dir / "index.npy", index)
+
+    meta = {
+        "num_frames": len(frames),
+        "streams": streams,
+        "image_encoding": "jpeg" if encode_images else "raw",
+        "shapes": shapes,
+        "transforms": transforms,
+        "frames": [{k: v for k, v in fr.items() if k != "transform_matrix"} for fr in frames],
+    }
+    with open(shard_dir / "meta.json", "w") as f:
+        json.dump(meta, f, indent=2)
+
+    return shard_dir
+
+
+class ShardReader:
+    """``write_shard`` で書いたシャードをフレーム番号でランダムアクセスする.
+
+    raw 形式の画像・マスク・深度は memmap 上の読み取り専用 view（ゼロコピー）を返す。
+    書き換える場合は呼び出し側で ``.copy()`` すること。
+    """
+
+    def __init__(self, shard_dir: str | Path):
+        self.shard_dir = Path(shard_dir)
+        with open(self.shard_dir / "meta.json") as f:
+            self.meta = json.load(f)
+        self.index = np.load(self.shard_dir / "index.npy")
+        self.poses = np.load(self.shard_dir / "poses.npy", mmap_mode="r")
+        self._data = {
+            stream: np.memmap(self.shard_dir / f"{stream}.bin", dtype=np.uint8, mode="r")
+            for stream in self.meta["streams"]
+        }
+
+    def __len__(self) -> int:
+        return self.meta["num_frames"]
+
+    @property
+    def transforms(self) -> dict:
+        """frames 以外の transforms.json のキー（intrinsics 等）."""
+        return self.meta["transforms"]
+
+    def _record(self, stream: str, i: int) -> np.ndarray:
+        if stream not in self._data:
+            raise KeyError(f"Shard has no {stream} stream")
+        offset, nbytes = self.index[i, STREAMS.index(stream)]
+        return self._data[stream][offset:offset + nbytes]
+
+    def _array(self, stream: str, i: int) -> np.ndarray | None:
+        record = self._record(stream, i)
+        if not len(record):
+            return None
+        return record.view(_DTYPES[stream]).reshape(self.meta["shapes"][stream])
+
+    def image(self, i: int) -> np.ndarray:
+        """(H, W, 3) uint8 RGB. raw 形式ならゼロコピー view、jpeg 形式ならデコード結果."""
+        if self.meta["image_encoding"] == "jpeg":
+            return cv2.imdecode(self._record("images", i), cv2.IMREAD_COLOR)[:, :, ::-1]
+        return self._array("images", i)
+
+    def image_bytes(self, i: int) -> np.ndarray:
+        """画像レコードの生バイト列（jpeg 形式ならそのまま GPU デコーダ等に渡せる）."""
+        return self._record("images", i)
+
+    def mask(self, i: int) -> np.ndarray | None:
+        """(H, W) uint8 マスク（0=exclude, 255=include）. このフレームにマスクがなければ None."""
+        return self._array("masks", i)
+
+    def depth(self, i: int) -> np.ndarray | None:
+        """(H, W) uint16 深度 [mm]（0=深度なし）. このフレームに深度マップがなければ None."""
+        return self._array("depth", i)
+
+    def pose(self, i: int) -> np.ndarray:
+        """(4, 4) c2w（OpenGL 規約）."""
+        return self.poses[i]
+
+    def __getitem__(self, i: int) -> dict:
+        item = {"image": self.image(i), "pose": self.pose(i)}
+        if "masks" in self._data and (mask := self.mask(i)) is not None:
+            item["mask"] = mask
+        if "depth" in self._data and (depth := self.depth(i)) is not None:
+            item["depth"] = depth
+        return item
@@ -0,0 +1,708 @@
+"""nuScenes 形式の合成 dataroot 生成（ベンチマーク・動作確認用）.
+
+本物のデータセットなしでホットパス（投影・ラスタライズ・エクスポート）を
+計測できるように、devkit の ``NuScenes`` がそのまま読めるスキーマの
+テーブル JSON・画像・LiDAR 点群・lidarseg ラベルを書き出す。
+
+シーンの構成:
+    * ego は直線ルートを走行（途中に停止区間あり）
+    * 地面（driveable_surface / sidewalk）と両側の建物壁（manmade）
+    * 駐車車両・走行車両・歩行者・自転車の annotation（インスタンス追跡付き）
+    * RADAR 5チャンネル（インスタンスごとの速度付き反射点 + 壁の静止クラッタ）
+
+乱数シードを固定すれば出力はバイト単位で再現する。
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+from pyquaternion import Quaternion
+
+# nuScenes-lidarseg の category（index 順）
+LIDARSEG_CATEGORIES = [
+    "noise", "animal",
+    "human.pedestrian.adult", "human.pedestrian.child",
+    "human.pedestrian.construction_worker", "human.pedestrian.personal_mobility",
+    "human.pedestrian.police_officer", "human.pedestrian.stroller",
+    "human.pedestrian.wheelchair",
+    "movable_object.barrier", "movable_object.debris",
+    "movable_object.pushable_pullable", "movable_object.trafficcone",
+    "static_object.bicycle_rack",
+    "vehicle.bicycle", "vehicle.bus.bendy", "vehicle.bus.rigid", "vehicle.car",
+    "vehicle.construction", "vehicle.emergency.ambulance",
+    "vehicle.emergency.police", "vehicle.motorcycle", "vehicle.trailer",
+    "vehicle.truck",
+    "flat.driveable_surface", "flat.other", "flat.sidewalk", "flat.terrain",
+    "static.manmade", "static.other", "static.vegetation", "vehicle.ego",
+]
+_CLASS_INDEX = {name: i for i, name in enumerate(LIDARSEG_CATEGORIES)}
+
+# 合成 annotation のカテゴリ: (name, size [w, l, h], 走行速度 m/s, 出現比率)
+_OBJECT_TYPES = [
+    ("vehicle.car", (1.9, 4.6, 1.7), 6.0, 0.7),
+    ("human.pedestrian.adult", (0.7, 0.7, 1.8), 1.3, 0.2),
+    ("vehicle.bicycle", (0.6, 1.8, 1.5), 4.0, 0.1),
+]
+
+# 実データ（CAM_FRONT / LIDAR_TOP）に近い外部パラメータ
+_CAM_FRONT_CALIB = {
+    "translation": [1.70, 0.0, 1.51],
+    # OpenCV カメラ (x右, y下, z前) → ego (x前, y左, z上)
+    "rotation": [0.5, -0.5, 0.5, -0.5],
+}
+_LIDAR_TOP_CALIB = {
+    "translation": [0.94, 0.0, 1.84],
+    "rotation": list(Quaternion(axis=[0, 0, 1], angle=-np.pi / 2).elements),
+}
+
+_KEYFRAME_INTERVAL_US = 500_000  # 2Hz
+_LIDAR_RANGE = 60.0
+
+# RADAR 5チャンネル（nuScenes の取り付け位置に近い値, radar は x前 y左 z上）
+_RADAR_CALIBS = {
+    "RADAR_FRONT": ([3.41, 0.0, 0.50], 0.0),
+    "RADAR_FRONT_LEFT": ([2.42, 0.80, 0.78], np.pi / 2),
+    "RADAR_FRONT_RIGHT": ([2.42, -0.80, 0.78], -np.pi / 2),
+    "RADAR_BACK_LEFT": ([-0.56, 0.63, 0.53], np.pi),
+    "RADAR_BACK_RIGHT": ([-0.56, -0.63, 0.53], -np.pi),
+}
+_RADAR_RANGE = 150.0
+_RADAR_HALF_FOV = np.deg2rad(60.0)
+_RADAR_CLUTTER_POINTS = 40
+
+
+class _TokenFactory:
+    """シード付き乱数から 32 桁 hex の token を作る."""
+
+    def __init__(self, rng: np.random.Generator) -> None:
+        self.rng = rng
+
+    def __call__(self) -> str:
+        return self.rng.bytes(16).hex()
+
+
+def _yaw_quaternion(yaw: float) -> list[float]:
+    return list(Quaternion(axis=[0, 0, 1], angle=yaw).elements)
+
+
+def _pose_matrix(translation: np.ndarray, rotation: list[float]) -> np.ndarray:
+    T = np.eye(4)
+    T[:3, :3] = Quaternion(rotation).rotation_matrix
+    T[:3, 3] = translation
+    return T
+
+
+def _make_texture(rng: np.random.Generator, width: int, height: int) -> np.ndarray:
+    """フレーム間でスクロールさせる背景テクスチャ（空・建物・道路）."""
+    tex = np.empty((height, width * 2, 3), dtype=np.uint8)
+    horizon = height // 2
+    sky = np.linspace(230, 160, horizon, dtype=np.float32)[:, None]
+    tex[:horizon] = np.stack([sky + 10, sky, sky - 40], axis=-1).clip(0, 255).astype(np.uint8)
+    tex[horizon:] = 90
+    # 建物っぽい矩形
+    for _ in range(40):
+        x0 = int(rng.integers(0, width * 2 - 40))
+        w = int(rng.integers(40, 240))
+        h = int(rng.integers(height // 8, horizon))
+        color = tuple(int(c) for c in rng.integers(60, 200, 3))
+        cv2.rectangle(tex, (x0, horizon - h), (x0 + w, horizon), color, thickness=-1)
+    noise = rng.integers(0, 24, tex.shape, dtype=np.uint8)
+    return cv2.add(tex, noise)
+
+
+def _sample_box_surface(
+    rng: np.random.Generator,
+    n: int,
+    center: np.ndarray,
+    size: tuple[float, float, float],
+    yaw: float,
+) -> np.ndarray:
+    """bbox 表面上の点を一様サンプル（world 座標）."""
+    w, l, h = size
+    half = np.array([l / 2, w / 2, h / 2])
+    local = rng.uniform(-1.0, 1.0, (n, 3))
+    face_axis = rng.integers(0, 3, n)
+    local[np.arange(n), face_axis] = np.sign(local[np.arange(n), face_axis])
+    local *= half
+    c, s = np.cos(yaw), np.sin(yaw)
+    R = np.array([[c, -s, 0.0], [s, c, 0.0], [0.0, 0.0, 1.0]])
+    return local @ R.T + center
+
+
+def generate_synthetic_dataroot(
+    dataroot: str | Path,
+    version: str = "v1.0-mini",
+    n_scenes: int = 1,
+    frames_per_scene: int = 40,
+    points_per_sweep: int = 34_000,
+    annotations_per_frame: int = 30,
+    image_size: tuple[int, int] = (1600, 900),
+    sweeps_per_keyframe: int = 0,
+    ego_speed: float = 4.0,
+    stop_fraction: float = 0.3,
+    moving_fraction: float = 0.4,
+    object_point_fraction: float = 0.1,
+    seed: int = 0,
+) -> Path:
+    """nuScenes スキーマ互換の合成 dataroot を書き出す.
+
+    Args:
+        dataroot: 出力先（NuScenes の dataroot になる）
+        version: テーブルのバージョンディレクトリ名
+        n_scenes: シーン数
+        frames_per_scene: シーンあたりの keyframe (sample) 数
+        points_per_sweep: LiDAR 1スイープあたりの点数
+        annotations_per_frame: 各 sample に付く annotation（インスタンス）数
+        image_size: (width, height)
+        sweeps_per_keyframe: keyframe 間に挟む非 keyframe の CAM_FRONT / LIDAR_TOP 数
+        ego_speed: 走行区間の ego 速度 [m/s]
+        stop_fraction: シーン中央付近の停止区間の割合
+        moving_fraction: annotation のうち実際に動くインスタンスの割合
+        object_point_fraction: LiDAR 点のうち annotation 上に乗る点の割合
+        seed: 乱数シード
+
+    Returns:
+        dataroot のパス
+    """
+    dataroot = Path(dataroot)
+    rng = np.random.default_rng(seed)
+    new_token = _TokenFactory(rng)
+    # RADAR は別の乱数列で作る（RADAR 以外の出力は RADAR 追加前とバイト単位で同じ）
+    radar_rng = np.random.default_rng([seed, 1])
+    new_radar_token = _TokenFactory(radar_rng)
+    width, height = image_size
+
+    table_dir = dataroot / version
+    lidarseg_dir = dataroot / "lidarseg" / version
+    for d in (
+        table_dir,
+        lidarseg_dir,
+        dataroot / "maps",
+        dataroot / "samples" / "CAM_FRONT",
+        dataroot / "samples" / "LIDAR_TOP",
+        dataroot / "sweeps" / "CAM_FRONT",
+        dataroot / "sweeps" / "LIDAR_TOP",
+        *(dataroot / folder / channel for folder in ("samples", "sweeps") for channel in _RADAR_CALIBS),
+    ):
+        d.mkdir(parents=True, exist_ok=True)
+
+    tables: dict[str, list[dict]] = {
+        name: []
+        for name in (
+            "category", "attribute", "visibility", "instance", "sensor",
+            "calibrated_sensor", "ego_pose", "log", "scene", "sample",
+            "sample_data", "sample_annotation", "map", "lidarseg",
+        )
+    }
+
+    # --- 静的テーブル ---
+    category_tokens = {}
+    for idx, name in enumerate(LIDARSEG_CATEGORIES):
+        token = new_token()
+        category_tokens[name] = token
+        tables["category"].append(
+            {"token": token, "name": name, "description": name, "index": idx}
+        )
+    for name in ("vehicle.moving", "vehicle.parked", "pedestrian.moving", "cycle.with_rider"):
+        tables["attribute"].append({"token": new_token(), "name": name, "description": name})
+    for level, desc in enumerate(["v0-40", "v40-60", "v60-80", "v80-100"], start=1):
+        tables["visibility"].append(
+            {"token": str(level), "level": desc, "description": f"visibility {desc}"}
+        )
+
+    sensor_tokens = {}
+    for channel, modality in (("CAM_FRONT", "camera"), ("LIDAR_TOP", "lidar")):
+        token = new_token()
+        sensor_tokens[channel] = token
+        tables["sensor"].append({"token": token, "channel": channel, "modality": modality})
+
+    fx = 1266.4 * width / 1600
+    K = [[fx, 0.0, 816.3 * width / 1600], [0.0, fx, 491.5 * height / 900], [0.0, 0.0, 1.0]]
+    cam_calib_token = new_token()
+    lidar_calib_token = new_token()
+    tables["calibrated_sensor"] += [
+        {
+            "token": cam_calib_token,
+            "sensor_token": sensor_tokens["CAM_FRONT"],
+            **_CAM_FRONT_CALIB,
+            "camera_intrinsic": K,
+        },
+        {
+            "token": lidar_calib_token,
+            "sensor_token": sensor_tokens["LIDAR_TOP"],
+            **_LIDAR_TOP_CALIB,
+            "camera_intrinsic": [],
+        },
+    ]
+    T_ego_lidar = _pose_matrix(
+        np.array(_LIDAR_TOP_CALIB["translation"]), _LIDAR_TOP_CALIB["rotation"]
+    )
+
+    radar_calib_tokens, T_ego_radar = {}, {}
+    for channel, (translation, yaw) in _RADAR_CALIBS.items():
+        sensor_token, calib_token = new_radar_token(), new_radar_token()
+        tables["sensor"].append({"token": sensor_token, "channel": channel, "modality": "radar"})
+        tables["calibrated_sensor"].append(
+            {
+                "token": calib_token,
+                "sensor_token": sensor_token,
+                "translation": translation,
+                "rotation": _yaw_quaternion(yaw),
+                "camera_intrinsic": [],
+            }
+        )
+        radar_calib_tokens[channel] = calib_token
+        T_ego_radar[channel] = _pose_matrix(np.array(translation), _yaw_quaternion(yaw))
+
+    log_tokens = []
+    for scene_idx in range(n_scenes):
+        log_token = new_token()
+        log_tokens.append(log_token)
+        tables["log"].append(
+            {
+                "token": log_token,
+                "logfile": f"synthetic-log-{scene_idx:04d}",
+                "vehicle": "synthetic",
+                "date_captured": "2018-08-01",
+                "location": "singapore-onenorth",
+            }
+        )
+    map_token = new_token()
+    map_filename = f"maps/{map_token}.png"
+    cv2.imwrite(str(dataroot / map_filename), np.zeros((64, 64), dtype=np.uint8))
+    tables["map"].append(
+        {
+            "token": map_token,
+            "log_tokens": log_tokens,
+            "category": "semantic_prior",
+            "filename": map_filename,
+        }
+    )
+
+    n_sd = frames_per_scene * (sweeps_per_keyframe + 1)
+    sd_interval_us = _KEYFRAME_INTERVAL_US // (sweeps_per_keyframe + 1)
+
+    for scene_idx in range(n_scenes):
+        scene_token = new_token()
+        route_yaw = float(rng.uniform(-np.pi, np.pi))
+        origin = np.array([300.0 + 500.0 * scene_idx, 900.0 + 300.0 * scene_idx, 0.0])
+        R_route = np.array(
+            [
+                [np.cos(route_yaw), -np.sin(route_yaw), 0.0],
+                [np.sin(route_yaw), np.cos(route_yaw), 0.0],
+                [0.0, 0.0, 1.0],
+            ]
+        )
+        t0 = 1_532_402_927_647_951 + scene_idx * 100_000_000
+        duration_s = n_sd * sd_interval_us * 1e-6
+
+        # ego の進行距離（停止区間は速度 0）
+        stop_start = 0.5 * (1.0 - stop_fraction) * duration_s
+        stop_end = stop_start + stop_fraction * duration_s
+
+        def ego_distance(t_s: float) -> float:
+            moving = min(t_s, stop_start) + max(0.0, t_s - stop_end)
+            return ego_speed * moving
+
+        def route_to_world(p: np.ndarray) -> np.ndarray:
+            return p @ R_route.T + origin
+
+        # --- インスタンス配置（ルート座標系）---
+        route_len = ego_distance(duration_s)
+        weights = np.array([t[3] for t in _OBJECT_TYPES])
+        instances = []
+        for _ in range(annotations_per_frame):
+            name, size, speed, _ = _OBJECT_TYPES[rng.choice(len(_OBJECT_TYPES), p=weights)]
+            moving = bool(rng.random() < moving_fraction)
+            if name.startswith("human."):
+                lane_y = float(rng.choice([-7.5, 7.5]))
+            elif moving:
+                lane_y = float(rng.choice([-1.75, 1.75]))
+            else:
+                lane_y = float(rng.choice([-5.0, 5.0]))
+            direction = 1.0 if lane_y < 0 or name.startswith("human.") else -1.0
+            instances.append(
+                {
+                    "token": new_token(),
+                    "name": name,
+                    "size": size,
+                    "x0": float(rng.uniform(-10.0, route_len + _LIDAR_RANGE)),
+                    "y": lane_y,
+                    "velocity": direction * speed * float(rng.uniform(0.6, 1.2)) if moving else 0.0,
+                    "yaw": 0.0 if direction > 0 else np.pi,
+                    "ann_tokens": [],
+                }
+            )
+
+        def instance_state(inst: dict, t_s: float) -> tuple[np.ndarray, float]:
+            p = np.array([inst["x0"] + inst["velocity"] * t_s, inst["y"], inst["size"][2] / 2])
+            return route_to_world(p), route_yaw + inst["yaw"]
+
+        texture = _make_texture(rng, width, height)
+        sample_tokens = [new_token() for _ in range(frames_per_scene)]
+        prev_sd = {channel: "" for channel in ("CAM_FRONT", "LIDAR_TOP", *_RADAR_CALIBS)}
+        sd_records: dict[str, list[dict]] = {channel: [] for channel in prev_sd}
+
+        for sd_idx in range(n_sd):
+            frame_idx, sub_idx = divmod(sd_idx, sweeps_per_keyframe + 1)
+            is_key = sub_idx == 0
+            sample_token = sample_tokens[frame_idx]
+            lidar_ts = t0 + sd_idx * sd_interval_us
+
+            if is_key:
+                tables["sample"].append(
+                    {
+                        "token": sample_token,
+                        "timestamp": lidar_ts,
+                        "prev": sample_tokens[frame_idx - 1] if frame_idx > 0 else "",
+                        "next": sample_tokens[frame_idx + 1] if frame_idx + 1 < frames_per_scene else "",
+                        "scene_token": scene_token,
+                    }
+                )
+
+            for channel, ts_offset in (("LIDAR_TOP", 0), ("CAM_FRONT", 12_000)):
+                ts = lidar_ts + ts_offset
+                t_s = (ts - t0) * 1e-6
+                ego_t = np.array([ego_distance(t_s), 0.0, 0.0])
+                ego_pose = {
+                    "token": new_token(),
+                    "timestamp": ts,
+                    "rotation": _yaw_quaternion(route_yaw),
+                    "translation": route_to_world(ego_t).tolist(),
+                }
+                tables["ego_pose"].append(ego_pose)
+
+                folder = "samples" if is_key else "sweeps"
+                sd_token = new_token()
+                if channel == "CAM_FRONT":
+                    filename = f"{folder}/CAM_FRONT/synthetic_{scene_idx:04d}__CAM_FRONT__{ts}.jpg"
+                    shift = int(ego_t[0] * 8) % width
+                    img = np.ascontiguousarray(texture[:, shift:shift + width])
+                    cv2.imwrite(str(dataroot / filename), img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+                    calib_token, fileformat, w, h = cam_calib_token, "jpg", width, height
+                else:
+                    filename = f"{folder}/LIDAR_TOP/synthetic_{scene_idx:04d}__LIDAR_TOP__{ts}.pcd.bin"
+                    points, labels = _synthesize_sweep(
+                        rng,
+                        instances,
+                        instance_state,
+                        t_s,
+                        route_to_world,
+                        ego_t,
+                        ego_pose,
+                        T_ego_lidar,
+                        points_per_sweep,
+                        object_point_fraction,
+                    )
+                    points.tofile(dataroot / filename)
+                    if is_key:
+                        lidarseg_filename = f"lidarseg/{version}/{sd_token}_lidarseg.bin"
+                        labels.tofile(dataroot / lidarseg_filename)
+                        tables["lidarseg"].append(
+                            {
+                                "token": sd_token,
+                                "sample_data_token": sd_token,
+                                "filename": lidarseg_filename,
+                            }
+                        )
+                    calib_token, fileformat, w, h = lidar_calib_token, "pcd", 0, 0
+
+                record = {
+                    "token": sd_token,
+                    "sample_token": sample_token,
+                    "ego_pose_token": ego_pose["token"],
+                    "calibrated_sensor_token": calib_token,
+                    "timestamp": ts,
+                    "fileformat": fileformat,
+                    "is_key_frame": is_key,
+                    "height": h,
+                    "width": w,
+                    "filename": filename,
+                    "prev": prev_sd[channel],
+                    "next": "",
+                }
+                if sd_records[channel]:
+                    sd_records[channel][-1]["next"] = sd_token
+                sd_records[channel].append(record)
+                prev_sd[channel] = sd_token
+
+            # --- RADAR（別の乱数列）---
+            for radar_idx, channel in enumerate(_RADAR_CALIBS):
+                ts = lidar_ts + 20_000 + 5_000 * radar_idx
+                t_s = (ts - t0) * 1e-6
+                ego_t = np.array([ego_distance(t_s), 0.0, 0.0])
+                ego_pose = {
+                    "token": new_radar_token(),
+                    "timestamp": ts,
+                    "rotation": _yaw_quaternion(route_yaw),
+                    "translation": route_to_world(ego_t).tolist(),
+                }
+                tables["ego_pose"].append(ego_pose)
+                ego_velocity = R_route[:, 0] * (ego_distance(t_s + 0.01) - ego_distance(t_s)) / 0.01
+
+                folder = "samples" if is_key else "sweeps"
+                sd_token = new_radar_token()
+                filename = f"{folder}/{channel}/synthetic_{scene_idx:04d}__{channel}__{ts}.pcd"
+                T_world_ego = _pose_matrix(np.array(ego_pose["translation"]), ego_pose["rotation"])
+                scan = _synthesize_radar_sweep(
+                    radar_rng,
+                    instances,
+                    instance_state,
+                    t_s,
+                    route_to_world,
+                    R_route,
+                    ego_t,
+                    ego_velocity,
+                    T_world_ego @ T_ego_radar[channel],
+                )
+                _write_radar_pcd(dataroot / filename, scan)
+
+                record = {
+                    "token": sd_token,
+                    "sample_token": sample_token,
+                    "ego_pose_token": ego_pose["token"],
+                    "calibrated_sensor_token": radar_calib_tokens[channel],
+                    "timestamp": ts,
+                    "fileformat": "pcd",
+                    "is_key_frame": is_key,
+                    "height": 0,
+                    "width": 0,
+                    "filename": filename,
+                    "prev": prev_sd[channel],
+                    "next": "",
+                }
+                if sd_records[channel]:
+                    sd_records[channel][-1]["next"] = sd_token
+                sd_records[channel].append(record)
+                prev_sd[channel] = sd_token
+
+            # --- annotation（keyframe のみ）---
+            if is_key:
+                t_s = (lidar_ts - t0) * 1e-6
+                for inst in instances:
+                    center, yaw = instance_state(inst, t_s)
+                    ann_token = new_token()
+                    prev_ann = inst["ann_tokens"][-1] if inst["ann_tokens"] else ""
+                    inst["ann_tokens"].append(ann_token)
+                    tables["sample_annotation"].append(
+                        {
+                            "token": ann_token,
+                            "sample_token": sample_token,
+                            "instance_token": inst["token"],
+                            "visibility_token": "4",
+                            "attribute_tokens": [],
+                            "translation": center.tolist(),
+                            "size": list(inst["size"]),
+                            "rotation": _yaw_quaternion(yaw),
+                            "prev": prev_ann,
+                            "next": "",
+                            "num_lidar_pts": 1,
+                            "num_radar_pts": 0,
+                        }
+                    )
+        ann_index = {a["token"]: a for a in tables["sample_annotation"]}
+        for inst in instances:
+            for prev_tok, next_tok in zip(inst["ann_tokens"][:-1], inst["ann_tokens"][1:]):
+                ann_index[prev_tok]["next"] = next_tok
+            tables["instance"].append(
+                {
+                    "token": inst["token"],
+                    "category_token": category_tokens[inst["name"]],
+                    "nbr_annotations": len(inst["ann_tokens"]),
+                    "first_annotation_token": inst["ann_tokens"][0],
+                    "last_annotation_token": inst["ann_tokens"][-1],
+                }
+            )
+
+        for records in sd_records.values():
+            tables["sample_data"] += records
+        tables["scene"].append(
+            {
+                "token": scene_token,
+                "log_token": log_tokens[scene_idx],
+                "nbr_samples": frames_per_scene,
+                "first_sample_token": sample_tokens[0],
+                "last_sample_token": sample_tokens[-1],
+                "name": f"scene-{scene_idx + 1:04d}",
+                "description": f"Synthetic scene {scene_idx + 1}, parked cars, peds",
+            }
+        )
+
+    for name, records in tables.items():
+        with open(table_dir / f"{name}.json", "w") as f:
+            json.dump(records, f)
+
+    return dataroot
+
+
+def _synthesize_sweep(
+    rng: np.random.Generator,
+    instances: list[dict],
+    instance_state,
+    t_s: float,
+    route_to_world,
+    ego_t: np.ndarray,
+    ego_pose: dict,
+    T_ego_lidar: np.ndarray,
+    n_points: int,
+    object_point_fraction: float,
+) -> tuple[np.ndarray, np.ndarray]:
+    """1スイープ分の LiDAR 点（lidar 座標系, (N, 5) float32）とラベルを合成."""
+    lidar_route = ego_t + np.array([0.94, 0.0, 1.84])
+
+    # annotation 上の点（近いほど多い）
+    obj_points, obj_labels = [], []
+    n_obj_total = int(n_points * object_point_fraction)
+    states = [instance_state(inst, t_s) for inst in instances]
+    lidar_world = route_to_world(lidar_route)
+    dists = np.array([np.linalg.norm(c[:2] - lidar_world[:2]) for c, _ in states])
+    near = dists < _LIDAR_RANGE
+    if near.any() and n_obj_total > 0:
+        w = np.where(near, 1.0 / np.maximum(dists, 5.0) ** 2, 0.0)
+        counts = np.floor(n_obj_total * w / w.sum()).astype(int)
+        for inst, (center, yaw), n in zip(instances, states, counts):
+            if n <= 0:
+                continue
+            obj_points.append(_sample_box_surface(rng, n, center, inst["size"], yaw))
+            obj_labels.append(np.full(n, _CLASS_INDEX[inst["name"]], dtype=np.uint8))
+
+    n_static = n_points - sum(len(p) for p in obj_points)
+    n_ground = int(n_static * 0.6)
+    n_wall = n_static - n_ground
+
+    # 地面: 対数一様な半径（LiDAR のリング密度に近い）
+    r = 2.5 * (_LIDAR_RANGE / 2.5) ** rng.random(n_ground)
+    theta = rng.uniform(-np.pi, np.pi, n_ground)
+    ground = np.stack(
+        [lidar_route[0] + r * np.cos(theta), r * np.sin(theta), np.zeros(n_ground)], axis=1
+    )
+    ground_labels = np.where(
+        np.abs(ground[:, 1]) < 6.0,
+        _CLASS_INDEX["flat.driveable_surface"],
+        _CLASS_INDEX["flat.sidewalk"],
+    ).astype(np.uint8)
+
+    # 建物壁: ルート両側 y=±12m
+    wall = np.stack(
+        [
+            lidar_route[0] + rng.uniform(-_LIDAR_RANGE, _LIDAR_RANGE, n_wall),
+            rng.choice([-12.0, 12.0], n_wall),
+            rng.uniform(0.0, 10.0, n_wall),
+        ],
+        axis=1,
+    )
+    wall_labels = np.where(
+        rng.random(n_wall) < 0.8, _CLASS_INDEX["static.manmade"], _CLASS_INDEX["static.vegetation"]
+    ).astype(np.uint8)
+
+    points_world = np.concatenate(
+        [route_to_world(ground), route_to_world(wall)] + obj_points, axis=0
+    )
+    labels = np.concatenate([ground_labels, wall_labels] + obj_labels)
+
+    T_world_lidar = _pose_matrix(np.array(ego_pose["translation"]), ego_pose["rotation"]) @ T_ego_lidar
+    T_lidar_world = np.linalg.inv(T_world_lidar)
+    points_lidar = points_world @ T_lidar_world[:3, :3].T + T_lidar_world[:3, 3]
+
+    scan = np.zeros((len(points_lidar), 5), dtype=np.float32)
+    scan[:, :3] = points_lidar
+    scan[:, 3] = rng.uniform(0.0, 100.0, len(scan))
+    scan[:, 4] = rng.integers(0, 32, len(scan))
+    return scan, labels
+
+
+def _synthesize_radar_sweep(
+    rng: np.random.Generator,
+    instances: list[dict],
+    instance_state,
+    t_s: float,
+    route_to_world,
+    R_route: np.ndarray,
+    ego_t: np.ndarray,
+    ego_velocity: np.ndarray,
+    T_world_radar: np.ndarray,
+) -> np.ndarray:
+    """1スイープ分の RADAR 点（``RADAR_PCD_FIELDS`` の structured array）を合成.
+
+    視野内のインスタンスごとに 1〜3 点（速度付き）と、両側の壁の静止クラッタを置く。
+    """
+    from .radar import RADAR_PCD_DTYPE
+
+    T_radar_world = np.linalg.inv(T_world_radar)
+    positions, velocities = [], []
+    for inst in instances:
+        center, _ = instance_state(inst, t_s)
+        n = int(rng.integers(1, 4))
+        offsets = rng.normal(0.0, 0.25, (n, 3)) * np.asarray(inst["size"])
+        positions.append(center + offsets)
+        velocities.append(np.tile(R_route[:, 0] * inst["velocity"], (n, 1)))
+
+    n_clutter = _RADAR_CLUTTER_POINTS
+    wall = np.stack(
+        [
+            ego_t[0] + rng.uniform(-_RADAR_RANGE, _RADAR_RANGE, n_clutter),
+            rng.choice([-12.0, 12.0], n_clutter),
+            rng.uniform(0.0, 3.0, n_clutter),
+        ],
+        axis=1,
+    )
+    positions.append(route_to_world(wall))
+    velocities.append(np.zeros((n_clutter, 3)))
+
+    points = np.concatenate(positions) @ T_radar_world[:3, :3].T + T_radar_world[:3, 3]
+    velocities = np.concatenate(velocities) @ T_radar_world[:3, :3].T
+    ego_v = ego_velocity @ T_radar_world[:3, :3].T
+
+    # 視野・距離で切り、2D レーダーなので高さは 0
+    visible = (np.hypot(points[:, 0], points[:, 1]) < _RADAR_RANGE) & (
+        np.abs(np.arctan2(points[:, 1], points[:, 0])) < _RADAR_HALF_FOV
+    )
+    points, velocities = points[visible], velocities[visible]
+
+    scan = np.zeros(len(points), dtype=RADAR_PCD_DTYPE)
+    scan["x"], scan["y"] = points[:, 0], points[:, 1]
+    moving = np.hypot(velocities[:, 0], velocities[:, 1]) > 0.5
+    scan["dyn_prop"] = np.where(moving, 0, 1)
+    scan["id"] = np.arange(len(scan))
+    scan["rcs"] = rng.uniform(-5.0, 20.0, len(scan))
+    scan["vx_comp"], scan["vy_comp"] = velocities[:, 0], velocities[:, 1]
+    scan["vx"], scan["vy"] = velocities[:, 0] - ego_v[0], velocities[:, 1] - ego_v[1]
+    scan["is_quality_valid"] = 1
+    scan["ambig_state"] = 3
+    scan["x_rms"], scan["y_rms"], scan["vx_rms"], scan["vy_rms"] = 3, 3, 17, 17
+    scan["pdh0"] = 1
+    if len(scan) == 0:
+        # 実データと同様、点のないスイープは NaN の1点で表す
+        scan = np.zeros(1, dtype=RADAR_PCD_DTYPE)
+        scan["x"] = scan["y"] = scan["z"] = np.nan
+    return scan
+
+
+def _write_radar_pcd(path: Path, scan: np.ndarray) -> None:
+    """nuScenes RADAR と同じ形式のバイナリ PCD を書く（devkit の読み込みに合わせ末尾に改行を付ける）."""
+    from .radar import RADAR_PCD_FIELDS
+
+    header = "\n".join(
+        [
+            "# .PCD v0.7 - Point Cloud Data file format",
+            "VERSION 0.7",
+            "FIELDS " + " ".join(name for name, _, _ in RADAR_PCD_FIELDS),
+            "SIZE " + " ".join(str(size) for _, _, size in RADAR_PCD_FIELDS),
+            "TYPE " + " ".join(kind for _, kind, _ in RADAR_PCD_FIELDS),
+            "COUNT " + " ".join("1" for _ in RADAR_PCD_FIELDS),
+            f"WIDTH {len(scan)}",
+            "HEIGHT 1",
+            "VIEWPOINT 0 0 0 1 0 0 0",
+            f"POINTS {len(scan)}",
+            "DATA binary",
+            "",
+        ]
+    )
+    with open(path, "wb") as f:
+        f.write(header.encode("ascii"))
+        f.write(scan.tobytes())
+        f.write(b"\n")